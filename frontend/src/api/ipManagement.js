@@ -103,13 +103,26 @@ export const ipAPI = {
    * 获取Zabbix监控模板列表
    * @param {number|string} ipId - IP记录ID
    * @param {string} search - 搜索关键词
+   * @param {string} category - 模板分类（可选）
    * @returns {Promise} 模板列表响应
    */
-  getZabbixTemplates(ipId, search = '') {
-    const params = search ? { search } : {};
+  getZabbixTemplates(ipId, search = '', category = '') {
+    const params = {};
+    if (search) params.search = search;
+    if (category) params.category = category;
     return api.get(`/ip-management/records/${ipId}/zabbix-templates/`, { params });
   },
 
+  /**
+   * 获取Zabbix主机组列表
+   * @param {string} search - 搜索关键词
+   * @returns {Promise} 主机组列表响应
+   */
+  getZabbixHostGroups(search = '') {
+    const params = search ? { search } : {};
+    return api.get('/ip-management/records/zabbix-host-groups/', { params });
+  },
+
   /**
    * 为IP创建Zabbix监控主机
    * @param {number|string} ipId - IP记录ID
@@ -123,6 +136,31 @@ export const ipAPI = {
     return api.post(`/ip-management/records/${ipId}/create-monitoring/`, monitoringData);
   },
 
+  /**
+   * 批量为IP创建Zabbix监控主机（后台作业）
+   * @param {Array} ipIds - IP记录ID数组
+   * @param {Array} templateIds - 模板ID列表
+   * @param {Array} groupIds - 主机组ID列表（可选）
+   * @returns {Promise} 作业信息
+   */
+  batchCreateMonitoring(ipIds, templateIds, groupIds = []) {
+    return api.post('/ip-management/records/batch-create-monitoring/', {
+      ipIds,
+      template_ids: templateIds,
+      group_ids: groupIds
+    });
+  },
+
+  /**
+   * 获取批量创建监控主机作业状态
+   * @param {string} jobId - 作业ID
+   * @param {number} offset - 已读取的结果数
+   * @returns {Promise} 作业状态及新结果
+   */
+  getBatchCreateMonitoringStatus(jobId, offset = 0) {
+    return api.get(`/ip-management/records/batch-create-monitoring/${jobId}/`, { params: { offset } });
+  },
+
   /**
    * Ping测试单个IP
    * @param {number|string} ipId - IP记录ID
@@ -141,6 +179,46 @@ export const ipAPI = {
     return api.post('/ip-management/records/batch-ping/', { ipIds });
   },
 
+  /**
+   * 获取批量Ping作业状态
+   * @param {string} jobId - 作业ID
+   * @param {number} offset - 已获取的结果数，只返回之后的新结果
+   * @returns {Promise} 作业状态及新结果
+   */
+  getBatchPingJob(jobId, offset = 0) {
+    return api.get(`/ip-management/records/batch-ping/${jobId}/`, { params: { offset } });
+  },
+
+  /**
+   * 获取IP统计（全部记录的状态计数及各网段利用率）
+   * @returns {Promise} 统计数据
+   */
+  getIPStatistics() {
+    return api.get('/ip-management/records/statistics/');
+  },
+
+  /**
+   * 获取网段利用率
+   * @param {string} cidr - 网段，如 192.168.1.0/24
+   * @returns {Promise} 已用/预留/空闲地址数及最长空闲地址段
+   */
+  getSubnetSummary(cidr) {
+    return api.get('/ip-management/records/subnet-summary/', { params: { cidr } });
+  },
+
+  /**
+   * 分配网段内的空闲地址
+   * @param {Object} data - 分配参数
+   * @param {string} data.cidr - 网段
+   * @param {number} data.count - 分配数量
+   * @param {string} data.status - 分配后的状态（reserved/active）
+   * @param {string} data.description - 备注
+   * @returns {Promise} 分配到的地址
+   */
+  allocateIPs(data) {
+    return api.post('/ip-management/records/allocate/', data);
+  },
+
   /**
    * 导出IP列表
    * @param {Object} params - 导出参数
@@ -249,11 +327,41 @@ export const ipAPI = {
 
   /**
    * 同步特定扫描任务的Zabbix发现IP到数据库
+   * 同步在后台作业中执行，返回作业ID，通过 getZabbixDiscoveryJob 查询结果
    * @param {string} taskId - 任务ID
-   * @returns {Promise} 同步结果
+   * @param {Object} options - { rediscover: 先触发发现规则并等待完成, dry_run: 只计算差异 }
+   * @returns {Promise} 作业信息
+   */
+  syncTaskZabbixIPs(taskId, options = {}) {
+    return api.post(`/ip-management/scan-tasks/${taskId}/sync-zabbix-ips/`, options);
+  },
+
+  /**
+   * 在后台触发Zabbix发现规则执行，完成后同步发现的IP
+   * @param {string} druleid - 发现规则ID
+   * @param {string} taskId - 关联的扫描任务ID（可选）
+   * @returns {Promise} 作业信息
+   */
+  runZabbixDiscoveryRule(druleid, taskId = null) {
+    return api.post('/ip-management/zabbix/management/', { druleid, task_id: taskId });
+  },
+
+  /**
+   * 获取Zabbix发现作业状态
+   * @param {string} jobId - 作业ID
+   * @returns {Promise} 作业状态
+   */
+  getZabbixDiscoveryJob(jobId) {
+    return api.get(`/ip-management/zabbix/discovery-jobs/${jobId}/`);
+  },
+
+  /**
+   * 取消Zabbix发现作业
+   * @param {string} jobId - 作业ID
+   * @returns {Promise} 取消结果
    */
-  syncTaskZabbixIPs(taskId) {
-    return api.post(`/ip-management/scan-tasks/${taskId}/sync-zabbix-ips/`);
+  cancelZabbixDiscoveryJob(jobId) {
+    return api.delete(`/ip-management/zabbix/discovery-jobs/${jobId}/`);
   },
 
   /**
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class IpManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ip_management"
+
+    def ready(self):
+        """应用准备就绪时执行"""
+        # 导入信号处理器
+        from . import signals  # noqa: F401
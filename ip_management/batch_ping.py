@@ -0,0 +1,179 @@
+"""
+批量ping作业
+批量ping在进程内的扫描引擎（AsyncNetworkScanner + ICMP引擎）上后台执行，接口立即返回作业ID；
+每个IP的结果完成即追加到作业中，可按偏移量轮询或以NDJSON流式读取，
+ping_status / last_seen 按微批次用集合 UPDATE 写回 IPRecord
+"""
+
+import ipaddress
+import logging
+import time
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from .ip_scanner import AsyncNetworkScanner, NetworkScanner
+from .jobs import IncrementalJob, JobManager
+from .models import IPRecord
+
+logger = logging.getLogger(__name__)
+
+# 默认并发预算（同时在途的ping数）
+DEFAULT_MAX_CONCURRENT = 256
+# 状态写回数据库的批大小和最长间隔（秒）
+WRITE_BATCH_SIZE = 200
+WRITE_INTERVAL = 1.0
+
+
+def ping_ip(ip_address: str, timeout: float = 3) -> Dict:
+    """
+    对单个IP执行ping（与扫描器使用同一个ICMP引擎，引擎不可用时回退到系统ping命令）
+
+    Returns:
+        {'ip_address', 'is_online', 'response_time', 'status', 'message'}
+    """
+    try:
+        ipaddress.ip_address(ip_address)
+    except ValueError:
+        return _ping_result(ip_address, False, None, '无效的IP地址格式')
+
+    try:
+        scanner = NetworkScanner(ping_timeout=timeout, resolve_hostnames=False)
+        is_online, response_time = scanner.ping_host(ip_address)
+    except Exception as e:
+        return _ping_result(ip_address, False, None, f'Ping执行失败: {str(e)}')
+
+    return _ping_result(ip_address, is_online, response_time,
+                        'Ping成功' if is_online else f'Ping失败（{timeout}秒内无响应）')
+
+
+def _ping_result(ip_address: str, is_online: bool, response_time: Optional[float], message: str) -> Dict:
+    return {
+        'ip_address': ip_address,
+        'is_online': is_online,
+        'response_time': int(response_time) if is_online and response_time is not None else None,
+        'status': 'online' if is_online else 'offline',
+        'message': message
+    }
+
+
+class BatchPingJob(IncrementalJob):
+    """
+    一次批量ping作业
+
+    结果按完成顺序追加到 results 中，读取方按偏移量增量获取
+    """
+
+    def __init__(self, records: List[IPRecord], timeout: float, max_concurrent: int):
+        self.records = {record.ip_address: (record.id, record.hostname) for record in records}
+        super().__init__(len(self.records))
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.online = 0
+        self._scanner: Optional[AsyncNetworkScanner] = None
+
+    def _count(self, result: Dict):
+        if result['is_online']:
+            self.online += 1
+
+    def cancel(self):
+        """停止作业：不再派发新的ping，在途的ping立即结束，已完成的结果保留"""
+        super().cancel()
+        scanner = self._scanner
+        if scanner is not None:
+            scanner.cancel()
+
+    def summary(self) -> Dict:
+        """作业汇总"""
+        with self._cond:
+            done = len(self.results)
+            return {
+                'total': self.total,
+                'done': done,
+                'online': self.online,
+                'offline': done - self.online,
+                'progress': round(done / self.total * 100, 2) if self.total else 100,
+                'timeout': self.timeout,
+                'test_time': self.created_at.isoformat()
+            }
+
+    def run(self):
+        """执行作业（在工作线程中调用）"""
+        if not self._start():
+            return
+        pending_online: List[str] = []
+        pending_offline: List[str] = []
+        last_write = [time.monotonic()]
+
+        def write_statuses():
+            if pending_online:
+                IPRecord.objects.filter(ip_address__in=pending_online).update(
+                    ping_status='online', last_seen=timezone.now()
+                )
+                pending_online.clear()
+            if pending_offline:
+                IPRecord.objects.filter(ip_address__in=pending_offline).update(ping_status='offline')
+                pending_offline.clear()
+            last_write[0] = time.monotonic()
+
+        def on_progress(data):
+            scan_result = data.get('result')
+            if scan_result is None:
+                return
+            ip = scan_result.ip_address
+            record_id, hostname = self.records.get(ip, (None, None))
+            is_online = scan_result.status == 'online'
+            result = _ping_result(ip, is_online, scan_result.response_time,
+                                  'Ping成功' if is_online else 'Ping失败')
+            result.update({'ip_id': str(record_id) if record_id else None, 'hostname': hostname})
+            self._append(result)
+
+            (pending_online if is_online else pending_offline).append(ip)
+            if (len(pending_online) + len(pending_offline) >= WRITE_BATCH_SIZE
+                    or time.monotonic() - last_write[0] >= WRITE_INTERVAL):
+                write_statuses()
+
+        # 扫描器与作业共用取消事件，创建扫描器之前的取消同样生效
+        self._scanner = scanner = AsyncNetworkScanner(
+            max_concurrent=self.max_concurrent,
+            ping_timeout=self.timeout,
+            keep_results=False,
+            resolve_hostnames=False,
+            cancel_event=self._cancel_event
+        )
+        scanner.add_progress_callback(on_progress)
+
+        try:
+            if not self.cancelled:
+                scanner.scan_network(list(self.records), ping_only=True)
+            write_statuses()
+            self._finish('cancelled' if self.cancelled else 'completed')
+            summary = self.summary()
+            logger.info(f"批量ping作业 {self.id} 结束: 在线 {summary['online']}, 离线 {summary['offline']}")
+        except Exception as e:
+            logger.error(f"批量ping作业 {self.id} 失败: {e}")
+            try:
+                write_statuses()
+            except Exception:
+                pass
+            self._finish('failed', str(e))
+        finally:
+            self._scanner = None
+
+
+class BatchPingManager(JobManager):
+    """批量ping作业管理器（作业保存在进程内存中）"""
+
+    def __init__(self):
+        super().__init__('batch-ping')
+
+    def submit(self, records: List[IPRecord], timeout: float = 3,
+               max_concurrent: int = DEFAULT_MAX_CONCURRENT) -> BatchPingJob:
+        """创建作业并提交执行，立即返回（工作线程都在忙时作业以 pending 状态排队）"""
+        job = self.start(BatchPingJob(records, timeout, max_concurrent))
+        logger.info(f"批量ping作业 {job.id} 已提交: {job.total} 个IP, 超时 {timeout}秒, 并发 {max_concurrent}")
+        return job
+
+
+# 全局批量ping作业管理器
+batch_ping_manager = BatchPingManager()
@@ -0,0 +1,73 @@
+"""
+IP管理WebSocket消费者
+"""
+
+import json
+import logging
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .discovery_jobs import DISCOVERY_GROUP
+from .liveness import LIVENESS_GROUP
+
+logger = logging.getLogger(__name__)
+
+
+class IPLivenessConsumer(AsyncWebsocketConsumer):
+    """
+    IP存活状态消费者
+    订阅存活监控推送的 online/offline 状态变化
+    """
+
+    async def connect(self):
+        """处理WebSocket连接"""
+        self.user = self.scope.get('user')
+        if not self.user or self.user.is_anonymous:
+            logger.warning("未认证用户尝试订阅IP存活状态")
+            await self.close(code=4001)
+            return
+
+        await self.channel_layer.group_add(LIVENESS_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        """处理WebSocket断开连接"""
+        if self.user and not self.user.is_anonymous:
+            await self.channel_layer.group_discard(LIVENESS_GROUP, self.channel_name)
+
+    async def liveness_change(self, event):
+        """推送一批状态变化"""
+        await self.send(text_data=json.dumps({
+            'type': 'liveness_change',
+            'changes': event['changes']
+        }, ensure_ascii=False))
+
+
+class ZabbixDiscoveryConsumer(AsyncWebsocketConsumer):
+    """
+    Zabbix发现作业消费者
+    订阅发现作业结束（完成 / 失败 / 取消）事件
+    """
+
+    async def connect(self):
+        """处理WebSocket连接"""
+        self.user = self.scope.get('user')
+        if not self.user or self.user.is_anonymous:
+            logger.warning("未认证用户尝试订阅Zabbix发现作业")
+            await self.close(code=4001)
+            return
+
+        await self.channel_layer.group_add(DISCOVERY_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        """处理WebSocket断开连接"""
+        if self.user and not self.user.is_anonymous:
+            await self.channel_layer.group_discard(DISCOVERY_GROUP, self.channel_name)
+
+    async def discovery_job(self, event):
+        """推送作业结束事件"""
+        await self.send(text_data=json.dumps({
+            'type': 'discovery_job',
+            'job': event['job']
+        }, ensure_ascii=False))
+
@@ -0,0 +1,333 @@
+"""
+Zabbix自动发现作业
+触发发现规则、等待发现结果稳定、把发现的IP同步到数据库，全部在后台执行，接口立即返回作业ID；
+调度线程按退避间隔安排轮询，每次轮询用一个批量请求读取 drule.get / dhost.get，
+发现的主机数和最近活动时间连续几次不变即认为发现已完成，作业结束时通过WebSocket推送事件
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 作业事件推送的 Channels 组
+DISCOVERY_GROUP = 'zabbix_discovery'
+
+# 轮询间隔：首次间隔、退避倍数、最大间隔（秒）
+POLL_INITIAL = 2.0
+POLL_FACTOR = 1.5
+POLL_MAX = 30.0
+# 发现结果连续多少次轮询不变视为稳定
+SETTLE_POLLS = 2
+# 触发后一直没有新的发现活动时，至少等待多久才认为已稳定（秒）
+QUIET_PERIOD = 60.0
+# 等待发现完成的最长时间（秒），超时后仍同步已发现的结果
+MAX_WAIT = 900.0
+# 执行作业步骤（触发、轮询、同步）的线程数
+STEP_WORKERS = 4
+# 已结束的作业在内存中保留的时间（秒）
+JOB_RETENTION = 600
+
+
+class DiscoveryJob:
+    """
+    一次Zabbix发现作业
+
+    状态: pending -> triggering -> polling -> syncing -> completed / failed / cancelled；
+    rediscover 为False时跳过触发和轮询，直接同步已有的发现结果
+    """
+
+    def __init__(self, druleid: str, task_id: Optional[str] = None, created_by=None,
+                 rediscover: bool = True, dry_run: bool = False):
+        self.id = str(uuid.uuid4())
+        self.druleid = str(druleid)
+        self.task_id = str(task_id) if task_id else None
+        self.created_by = created_by
+        self.rediscover = rediscover
+        self.dry_run = dry_run
+
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.rule_name: Optional[str] = None
+        self.polls = 0
+        self.hosts = 0
+        self.timed_out = False
+        self.created_at = timezone.now()
+        self.finished_at: Optional[float] = None
+
+        self.triggered_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.delay = POLL_INITIAL
+        self.fingerprint = None
+        self.stable_polls = 0
+        self.cancelled = False
+        # 是否有步骤正在线程池中执行（由调度线程和 _cond 维护）
+        self.running = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def snapshot(self) -> Dict:
+        """作业状态"""
+        return {
+            'jobId': self.id,
+            'druleid': self.druleid,
+            'task_id': self.task_id,
+            'rule_name': self.rule_name,
+            'status': self.status,
+            'error': self.error,
+            'rediscover': self.rediscover,
+            'dry_run': self.dry_run,
+            'polls': self.polls,
+            'hosts': self.hosts,
+            'timed_out': self.timed_out,
+            'result': self.result,
+            'created_at': self.created_at.isoformat()
+        }
+
+
+class DiscoveryJobManager:
+    """
+    Zabbix发现作业管理器（作业保存在进程内存中）
+
+    一个调度线程维护按下次执行时间排序的堆，到期的作业步骤交给线程池执行，
+    等待发现完成期间不占用任何线程
+
+    Args:
+        discovery_factory: 创建 zabbix_auto_discovery 实例的函数
+        poll_initial / poll_factor / poll_max: 轮询退避参数（秒）
+        settle_polls / quiet_period / max_wait: 发现完成的判定参数
+    """
+
+    def __init__(self, discovery_factory: Optional[Callable] = None, poll_initial: float = POLL_INITIAL,
+                 poll_factor: float = POLL_FACTOR, poll_max: float = POLL_MAX, settle_polls: int = SETTLE_POLLS,
+                 quiet_period: float = QUIET_PERIOD, max_wait: Optional[float] = None):
+        self.discovery_factory = discovery_factory
+        self.poll_initial = poll_initial
+        self.poll_factor = poll_factor
+        self.poll_max = poll_max
+        self.settle_polls = settle_polls
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'ZABBIX_DISCOVERY_MAX_WAIT', MAX_WAIT)
+
+        self._jobs: Dict[str, DiscoveryJob] = {}
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._discovery = None
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+    def submit(self, druleid, task_id=None, created_by=None, rediscover: bool = True,
+               dry_run: bool = False) -> DiscoveryJob:
+        """创建作业并立即返回，作业在后台执行"""
+        job = DiscoveryJob(druleid, task_id=task_id, created_by=created_by, rediscover=rediscover, dry_run=dry_run)
+        with self._cond:
+            self._purge()
+            self._jobs[job.id] = job
+        self._ensure_started()
+        self._schedule(job, 0)
+        logger.info(f"Zabbix发现作业 {job.id} 已提交: 规则 {job.druleid}, 重新发现 {rediscover}, 任务 {job.task_id}")
+        return job
+
+    def get(self, job_id) -> Optional[DiscoveryJob]:
+        with self._cond:
+            return self._jobs.get(str(job_id))
+
+    def cancel(self, job_id) -> bool:
+        """
+        取消未结束的作业（正在执行的同步不会被中断）
+
+        作业有步骤正在执行时只做标记，由该步骤结束时结束作业，避免同一作业的两个步骤并发执行
+        """
+        with self._cond:
+            job = self._jobs.get(str(job_id))
+            if job is None or job.finished:
+                return False
+            job.cancelled = True
+            if job.running:
+                return True
+        self._schedule(job, 0)
+        return True
+
+    def wait(self, job_id, timeout: Optional[float] = None) -> Optional[DiscoveryJob]:
+        """等待作业结束（测试和命令行使用）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._jobs.get(str(job_id))
+            while job is not None and not job.finished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return job
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=STEP_WORKERS, thread_name_prefix='zabbix-discovery-job')
+            self._thread = threading.Thread(target=self._run, name='zabbix-discovery-scheduler', daemon=True)
+            self._thread.start()
+
+    def _schedule(self, job: DiscoveryJob, delay: float):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job.id))
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, job_id = heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is None or job.finished or job.running:
+                    continue
+                job.running = True
+            self._executor.submit(self._step, job)
+
+    def _get_discovery(self):
+        if self._discovery is None:
+            if self.discovery_factory is None:
+                from ops_assets_backend.zabbix_api import zabbix_auto_discovery
+                self.discovery_factory = zabbix_auto_discovery
+            self._discovery = self.discovery_factory()
+        return self._discovery
+
+    def _step(self, job: DiscoveryJob):
+        """执行作业的下一步；需要继续轮询时重新放回调度堆"""
+        try:
+            if job.cancelled:
+                self._finish(job, 'cancelled')
+            elif job.status == 'pending':
+                if job.rediscover:
+                    self._trigger(job)
+                else:
+                    self._sync(job)
+            elif job.status == 'polling':
+                self._poll(job)
+        except Exception as e:
+            logger.error(f"Zabbix发现作业 {job.id} 失败: {e}")
+            self._finish(job, 'failed', str(e))
+        finally:
+            with self._cond:
+                job.running = False
+                cancelled = job.cancelled and not job.finished
+            # 步骤执行期间被取消：已安排的下一次轮询在调度时因作业已结束而跳过
+            if cancelled:
+                self._finish(job, 'cancelled')
+            close_old_connections()
+
+    def _trigger(self, job: DiscoveryJob):
+        job.status = 'triggering'
+        result = self._get_discovery().force_discovery_rule_execution(job.druleid)
+        if not result.get('success'):
+            self._finish(job, 'failed', result.get('message') or '触发发现规则失败')
+            return
+        job.triggered_at = time.time()
+        job.deadline = time.monotonic() + self.max_wait
+        job.status = 'polling'
+        job.delay = self.poll_initial
+        self._schedule(job, job.delay)
+
+    def _poll(self, job: DiscoveryJob):
+        """读取规则和发现主机的状态，稳定或超时后进入同步"""
+        rules, hosts = self._get_discovery().zapi.batch([
+            ('drule.get', {'output': ['druleid', 'name', 'status'], 'druleids': [job.druleid]}),
+            ('dhost.get', {'output': ['dhostid', 'lastup', 'lastdown'], 'druleids': [job.druleid]}),
+        ])
+        job.polls += 1
+        if not rules:
+            self._finish(job, 'failed', f'发现规则 {job.druleid} 不存在')
+            return
+        job.rule_name = rules[0].get('name')
+        job.hosts = len(hosts)
+
+        activity = max((max(int(host.get('lastup') or 0), int(host.get('lastdown') or 0)) for host in hosts),
+                       default=0)
+        fingerprint = (len(hosts), activity)
+        if fingerprint == job.fingerprint:
+            job.stable_polls += 1
+            job.delay = min(job.delay * self.poll_factor, self.poll_max)
+        else:
+            job.fingerprint = fingerprint
+            job.stable_polls = 0
+            job.delay = self.poll_initial
+
+        # 触发后出现过新的发现活动，或者等待了足够长时间仍无活动（规则没有发现任何主机）
+        active = activity >= int(job.triggered_at) or time.time() - job.triggered_at >= self.quiet_period
+        if job.stable_polls >= self.settle_polls and active:
+            self._sync(job)
+        elif time.monotonic() >= job.deadline:
+            job.timed_out = True
+            logger.warning(f"Zabbix发现作业 {job.id} 等待发现完成超时，同步当前已发现的结果")
+            self._sync(job)
+        else:
+            self._schedule(job, job.delay)
+
+    def _sync(self, job: DiscoveryJob):
+        job.status = 'syncing'
+        result = self._get_discovery().save_discovered_ips_to_database(
+            druleid=job.druleid, task_id=job.task_id, created_by=job.created_by, dry_run=job.dry_run
+        )
+        job.result = {key: value for key, value in result.items() if key != 'success'}
+        job.hosts = result.get('total_hosts', job.hosts)
+        if result.get('success'):
+            self._finish(job, 'completed')
+        else:
+            self._finish(job, 'failed', result.get('message'))
+
+    def _finish(self, job: DiscoveryJob, status: str, error: Optional[str] = None):
+        with self._cond:
+            if job.finished:
+                return
+            job.status = status
+            job.error = error
+            job.finished_at = time.monotonic()
+            self._cond.notify_all()
+        logger.info(f"Zabbix发现作业 {job.id} 结束: {status}" + (f", {error}" if error else ''))
+        self._publish(job)
+
+    @staticmethod
+    def _publish(job: DiscoveryJob):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(DISCOVERY_GROUP, {'type': 'discovery.job', 'job': job.snapshot()})
+        except Exception as e:
+            logger.error(f"推送Zabbix发现作业事件失败: {e}")
+
+    def _purge(self):
+        """清理结束超过保留时间的作业（调用方持有 _cond）"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > JOB_RETENTION]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# 全局Zabbix发现作业管理器
+discovery_job_manager = DiscoveryJobManager()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内 ICMP 回显引擎
+所有探测共用一个 socket（原始套接字，或系统允许时使用非特权 SOCK_DGRAM ICMP 套接字），
+按 标识符/序列号 匹配回包，并根据报文中的时间戳计算往返时延，避免每个主机 fork 一次 ping 进程
+"""
+
+import asyncio
+import errno
+import heapq
+import itertools
+import ipaddress
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ICMP 报文类型
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# 负载：发送时间(纳秒) + 魔数，用于识别本引擎发出的报文
+_PAYLOAD_MAGIC = b'OPSSCAN!'
+_PAYLOAD_STRUCT = struct.Struct('!Q8s')
+
+# Linux 下用于获取内核接收时间戳的 socket 选项
+_SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', None)
+
+ProbeCallback = Callable[[bool, Optional[float]], None]
+
+
+class ICMPUnavailableError(RuntimeError):
+    """当前环境无法创建 ICMP 套接字"""
+
+
+def icmp_checksum(data: bytes) -> int:
+    """计算 ICMP 校验和（RFC 1071）"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(ident: int, seq: int, send_ns: int, version: int = 4) -> bytes:
+    """
+    构造 ICMP 回显请求报文
+
+    Args:
+        ident: 标识符
+        seq: 序列号
+        send_ns: 发送时间戳（纳秒），写入负载用于计算往返时延
+        version: IP协议版本，6 表示 ICMPv6（校验和由内核计算）
+    """
+    icmp_type = ICMPV6_ECHO_REQUEST if version == 6 else ICMP_ECHO_REQUEST
+    payload = _PAYLOAD_STRUCT.pack(send_ns, _PAYLOAD_MAGIC)
+    header = struct.pack('!BBHHH', icmp_type, 0, 0, ident, seq)
+    if version == 6:
+        return header + payload
+    checksum = icmp_checksum(header + payload)
+    return struct.pack('!BBHHH', icmp_type, 0, checksum, ident, seq) + payload
+
+
+def parse_echo_reply(data: bytes, has_ip_header: bool, version: int = 4) -> Optional[Tuple[int, int, int]]:
+    """
+    解析回显应答报文
+
+    Returns:
+        (标识符, 序列号, 发送时间戳ns)，不是本引擎的回显应答时返回None
+    """
+    offset = 0
+    if has_ip_header and version == 4:
+        if not data:
+            return None
+        offset = (data[0] & 0x0F) * 4
+    if len(data) < offset + 8 + _PAYLOAD_STRUCT.size:
+        return None
+
+    icmp_type, _code, _checksum, ident, seq = struct.unpack_from('!BBHHH', data, offset)
+    expected = ICMPV6_ECHO_REPLY if version == 6 else ICMP_ECHO_REPLY
+    if icmp_type != expected:
+        return None
+
+    send_ns, magic = _PAYLOAD_STRUCT.unpack_from(data, offset + 8)
+    if magic != _PAYLOAD_MAGIC:
+        return None
+    return ident, seq, send_ns
+
+
+class _Probe:
+    """一次在途探测"""
+
+    __slots__ = ('key', 'deadline', 'callback', 'event', 'alive', 'rtt', 'done')
+
+    def __init__(self, key, deadline: float, callback: Optional[ProbeCallback]):
+        self.key = key
+        self.deadline = deadline
+        self.callback = callback
+        self.event = None if callback else threading.Event()
+        self.alive = False
+        self.rtt = None
+        self.done = False
+
+
+class _FamilySocket:
+    """单个地址族的 ICMP 套接字"""
+
+    def __init__(self, sock: socket.socket, version: int, mode: str):
+        self.sock = sock
+        self.version = version
+        self.mode = mode  # raw / dgram
+        # Linux 的 IPv4 原始套接字回包包含IP头；ICMPv6 与 DGRAM 套接字都不包含
+        self.has_ip_header = (mode == 'raw' and version == 4)
+        self.use_kernel_timestamp = False
+        if _SO_TIMESTAMPNS is not None and hasattr(sock, 'recvmsg'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, _SO_TIMESTAMPNS, 1)
+                self.use_kernel_timestamp = True
+            except OSError:
+                pass
+
+
+class ICMPEngine:
+    """
+    单 socket ICMP 回显引擎
+
+    - 发送在调用方线程完成，接收由一个后台线程统一处理
+    - 原始套接字按 (IP, 标识符, 序列号) 匹配回包；DGRAM 套接字的标识符会被内核改写，按 (IP, 序列号) 匹配
+    - 往返时延 = 内核接收时间戳（不支持时为接收时刻）- 负载中的发送时间戳
+    """
+
+    def __init__(self, prefer_raw: bool = True):
+        self.prefer_raw = prefer_raw
+        self.ident = os.getpid() & 0xFFFF
+        self._sockets: Dict[int, Optional[_FamilySocket]] = {}
+        self._pending: Dict[tuple, _Probe] = {}
+        self._deadlines = []  # (deadline, 序号, key) 小顶堆
+        self._heap_counter = itertools.count()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._receiver: Optional[threading.Thread] = None
+        self._closed = False
+        # 自唤醒管道，用于关闭时立即结束 select
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    # ------------------------------------------------------------------
+    # 套接字管理
+    # ------------------------------------------------------------------
+    def _open_socket(self, version: int) -> Optional[_FamilySocket]:
+        """按优先级尝试打开原始或非特权 ICMP 套接字"""
+        family = socket.AF_INET6 if version == 6 else socket.AF_INET
+        proto = socket.IPPROTO_ICMPV6 if version == 6 else socket.IPPROTO_ICMP
+        modes = [('raw', socket.SOCK_RAW), ('dgram', socket.SOCK_DGRAM)]
+        if not self.prefer_raw:
+            modes.reverse()
+
+        for mode, sock_type in modes:
+            try:
+                sock = socket.socket(family, sock_type, proto)
+            except (OSError, ValueError) as e:
+                logger.debug(f"无法创建 IPv{version} ICMP {mode} 套接字: {e}")
+                continue
+            sock.setblocking(False)
+            try:
+                # 扩大接收缓冲区，避免大规模扫描时回包被内核丢弃
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            except OSError:
+                pass
+            logger.info(f"ICMP引擎使用 IPv{version} {mode} 套接字")
+            return _FamilySocket(sock, version, mode)
+        return None
+
+    def _get_socket(self, version: int) -> Optional[_FamilySocket]:
+        with self._lock:
+            if version not in self._sockets:
+                self._sockets[version] = self._open_socket(version)
+                self._ensure_receiver()
+                self._wake()
+            return self._sockets[version]
+
+    def _ensure_receiver(self):
+        """启动接收线程（需持有锁）"""
+        if self._receiver is None or not self._receiver.is_alive():
+            self._receiver = threading.Thread(
+                target=self._receive_loop,
+                name='icmp-engine-receiver',
+                daemon=True
+            )
+            self._receiver.start()
+
+    def _wake(self):
+        """唤醒接收线程，使其重新加载套接字列表"""
+        try:
+            self._wake_w.send(b'x')
+        except OSError:
+            pass
+
+    def is_available(self, version: int = 4) -> bool:
+        """当前环境是否能使用该地址族的 ICMP 套接字"""
+        return not self._closed and self._get_socket(version) is not None
+
+    @property
+    def mode(self) -> Optional[str]:
+        """IPv4 套接字模式: raw / dgram / None"""
+        fam = self._get_socket(4)
+        return fam.mode if fam else None
+
+    # ------------------------------------------------------------------
+    # 发送
+    # ------------------------------------------------------------------
+    def send_probe(self, ip: str, timeout: float, callback: Optional[ProbeCallback] = None) -> _Probe:
+        """
+        发送一次回显请求
+
+        Args:
+            ip: 目标地址
+            timeout: 超时时间（秒）
+            callback: 完成回调 callback(是否在线, 往返时延ms)，在接收线程中调用；为None时通过事件等待
+
+        Raises:
+            ICMPUnavailableError: 无可用的 ICMP 套接字
+        """
+        addr = ipaddress.ip_address(ip)
+        fam = self._get_socket(addr.version)
+        if fam is None or self._closed:
+            raise ICMPUnavailableError(f"IPv{addr.version} ICMP 套接字不可用")
+
+        ip = str(addr)
+        seq = next(self._seq) & 0xFFFF
+        key = self._make_key(fam, ip, self.ident, seq)
+        probe = _Probe(key, time.monotonic() + timeout, callback)
+
+        with self._lock:
+            self._pending[key] = probe
+            heapq.heappush(self._deadlines, (probe.deadline, next(self._heap_counter), key))
+
+        packet = build_echo_request(self.ident, seq, time.time_ns(), addr.version)
+        try:
+            fam.sock.sendto(packet, (ip, 0))
+        except OSError as e:
+            # ENOBUFS/EAGAIN 等发送失败视为探测失败，不影响其他探测
+            if e.errno not in (errno.ENOBUFS, errno.EAGAIN, errno.EHOSTUNREACH, errno.ENETUNREACH):
+                logger.debug(f"发送ICMP到 {ip} 失败: {e}")
+            self._finish(key, False, None)
+        return probe
+
+    def ping(self, ip: str, timeout: float = 1.0) -> Tuple[bool, Optional[float]]:
+        """
+        阻塞式 ping 单个主机
+
+        Returns:
+            (是否在线, 往返时延ms)
+        """
+        probe = self.send_probe(ip, timeout)
+        probe.event.wait(timeout)
+        if not probe.done:
+            self._finish(probe.key, False, None)
+        return probe.alive, probe.rtt
+
+    async def async_ping(self, ip: str, timeout: float = 1.0) -> Tuple[bool, Optional[float]]:
+        """
+        异步 ping 单个主机，回包由接收线程通过 call_soon_threadsafe 交回事件循环
+
+        Returns:
+            (是否在线, 往返时延ms)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(alive, rtt):
+            if not future.done():
+                future.set_result((alive, rtt))
+
+        def on_done(alive, rtt):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(resolve, alive, rtt)
+
+        probe = self.send_probe(ip, timeout, on_done)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._finish(probe.key, False, None)
+            raise
+
+    @staticmethod
+    def _make_key(fam: _FamilySocket, ip: str, ident: int, seq: int) -> tuple:
+        # DGRAM 套接字的标识符由内核分配，不参与匹配
+        if fam.mode == 'dgram':
+            return ip, seq
+        return ip, ident, seq
+
+    # ------------------------------------------------------------------
+    # 接收
+    # ------------------------------------------------------------------
+    def _finish(self, key, alive: bool, rtt: Optional[float]):
+        with self._lock:
+            probe = self._pending.pop(key, None)
+        if probe is None or probe.done:
+            return
+        probe.alive = alive
+        probe.rtt = rtt
+        probe.done = True
+        if probe.callback:
+            try:
+                probe.callback(alive, rtt)
+            except Exception as e:
+                logger.error(f"ICMP探测回调执行失败: {e}")
+        else:
+            probe.event.set()
+
+    def _read_packet(self, fam: _FamilySocket):
+        """读取一个报文，返回 (数据, 源地址, 接收时间ns)"""
+        if fam.use_kernel_timestamp:
+            data, ancdata, _flags, address = fam.sock.recvmsg(2048, socket.CMSG_SPACE(16))
+            recv_ns = None
+            for level, ctype, cdata in ancdata:
+                if level == socket.SOL_SOCKET and ctype == _SO_TIMESTAMPNS and len(cdata) >= 16:
+                    sec, nsec = struct.unpack('@qq', cdata[:16])
+                    recv_ns = sec * 1_000_000_000 + nsec
+            return data, address, recv_ns or time.time_ns()
+        data, address = fam.sock.recvfrom(2048)
+        return data, address, time.time_ns()
+
+    def _handle_readable(self, fam: _FamilySocket):
+        # 一次尽量读空接收缓冲区
+        for _ in range(1024):
+            try:
+                data, address, recv_ns = self._read_packet(fam)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"读取ICMP报文失败: {e}")
+                return
+
+            parsed = parse_echo_reply(data, fam.has_ip_header, fam.version)
+            if parsed is None:
+                continue
+            ident, seq, send_ns = parsed
+            if fam.mode == 'raw' and ident != self.ident:
+                continue
+
+            src_ip = str(ipaddress.ip_address(address[0].split('%', 1)[0]))
+            key = self._make_key(fam, src_ip, ident, seq)
+            rtt = max(recv_ns - send_ns, 0) / 1_000_000
+            self._finish(key, True, round(rtt, 3))
+
+    def _expire_probes(self):
+        """处理已超时的探测"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, key = heapq.heappop(self._deadlines)
+                if key in self._pending:
+                    expired.append(key)
+        for key in expired:
+            self._finish(key, False, None)
+
+    def _next_wait(self) -> float:
+        with self._lock:
+            if not self._deadlines:
+                return 0.1
+            return min(max(self._deadlines[0][0] - time.monotonic(), 0.0), 0.1)
+
+    def _receive_loop(self):
+        while not self._closed:
+            with self._lock:
+                fams = {f.sock.fileno(): f for f in self._sockets.values() if f is not None}
+            try:
+                readable, _, _ = select.select(list(fams) + [self._wake_r.fileno()], [], [], self._next_wait())
+            except (OSError, ValueError):
+                if self._closed:
+                    break
+                time.sleep(0.05)
+                continue
+
+            for fd in readable:
+                if fd == self._wake_r.fileno():
+                    try:
+                        self._wake_r.recv(64)
+                    except OSError:
+                        pass
+                    continue
+                self._handle_readable(fams[fd])
+            self._expire_probes()
+
+    # ------------------------------------------------------------------
+    # 统计与关闭
+    # ------------------------------------------------------------------
+    def in_flight(self) -> int:
+        """当前在途探测数"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """关闭引擎，所有在途探测按超时处理"""
+        self._closed = True
+        self._wake()
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._finish(key, False, None)
+        with self._lock:
+            for fam in self._sockets.values():
+                if fam is not None:
+                    fam.sock.close()
+            self._sockets.clear()
+
+
+_engine: Optional[ICMPEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_icmp_engine() -> ICMPEngine:
+    """获取进程内共享的 ICMP 引擎实例"""
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine._closed:
+            _engine = ICMPEngine()
+        return _engine
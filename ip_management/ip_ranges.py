@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IP 范围解析引擎
+把 CIDR / 地址区间 / 单个地址统一转换为整数区间，合并去重后按需生成地址，
+不展开即可得到精确的地址总数
+"""
+
+import bisect
+import ipaddress
+import logging
+import socket
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 单次扫描允许的 IPv6 地址总数上限（默认相当于一个 /112）
+DEFAULT_MAX_IPV6_ADDRESSES = 65536
+
+_IPV4_STRUCT = struct.Struct('!I')
+
+# 数据库排序键宽度：128位地址的十六进制位数
+IP_KEY_WIDTH = 32
+
+
+class IPRangeError(ValueError):
+    """IP范围格式错误或超出限制"""
+
+
+def parse_ip_range(ip_range: str) -> Tuple[int, int, int]:
+    """
+    解析单个IP范围为整数区间
+
+    Args:
+        ip_range: 支持格式：
+            - 单个IP: "192.168.1.1"
+            - CIDR: "192.168.1.0/24"（与 ip_network.hosts() 一致，不含网络地址和广播地址）
+            - 范围: "192.168.1.1-192.168.1.100"
+            - 简化范围: "192.168.1.1-100"
+
+    Returns:
+        (IP版本, 起始地址整数, 结束地址整数)
+
+    Raises:
+        IPRangeError: 格式错误
+    """
+    text = (ip_range or '').strip()
+    if not text:
+        raise IPRangeError('IP范围不能为空')
+
+    try:
+        if '/' in text:
+            # CIDR格式
+            network = ipaddress.ip_network(text, strict=False)
+            first = int(network.network_address)
+            last = int(network.broadcast_address)
+            max_prefix = network.max_prefixlen
+            # /31、/32（IPv6 为 /127、/128）包含所有地址，其余去掉网络地址；IPv4 同时去掉广播地址
+            if network.prefixlen < max_prefix - 1:
+                first += 1
+                if network.version == 4:
+                    last -= 1
+            return network.version, first, last
+
+        if '-' in text:
+            # 范围格式
+            start_text, end_text = (part.strip() for part in text.split('-', 1))
+            # 处理简化范围格式 (192.168.1.1-100)
+            if '.' not in end_text and ':' not in end_text:
+                start_parts = start_text.split('.')
+                if len(start_parts) == 4:
+                    end_text = '.'.join(start_parts[:3]) + '.' + end_text
+
+            start = ipaddress.ip_address(start_text)
+            end = ipaddress.ip_address(end_text)
+            if start.version != end.version:
+                raise IPRangeError(f"范围两端的IP版本不一致: {text}")
+            if int(start) > int(end):
+                raise IPRangeError(f"起始地址大于结束地址: {text}")
+            return start.version, int(start), int(end)
+
+        # 单个IP
+        address = ipaddress.ip_address(text)
+        return address.version, int(address), int(address)
+
+    except IPRangeError:
+        raise
+    except ValueError as e:
+        raise IPRangeError(f"无效的IP范围 '{text}': {e}")
+
+
+def int_to_ip(value: int, version: int = 4) -> str:
+    """整数转IP字符串（IPv4 走 inet_ntoa 快速路径）"""
+    if version == 4:
+        return socket.inet_ntoa(_IPV4_STRUCT.pack(value))
+    return str(ipaddress.IPv6Address(value))
+
+
+def int_to_key(value: int) -> str:
+    """
+    地址整数转为定宽十六进制排序键
+
+    定宽键的字典序与数值顺序一致，可以直接在数据库索引上做范围扫描
+    （128位的IPv6地址超出数据库整数列的范围，因此不用整数列）
+    """
+    return format(value, f'0{IP_KEY_WIDTH}x')
+
+
+def ip_sort_key(ip) -> Tuple[Optional[int], Optional[str]]:
+    """
+    IP地址的 (IP版本, 排序键)，无效地址返回 (None, None)
+    """
+    try:
+        address = ipaddress.ip_address(str(ip).strip())
+    except ValueError:
+        return None, None
+    return address.version, int_to_key(int(address))
+
+
+class IPRangeSet:
+    """
+    合并去重后的IP区间集合
+
+    地址按 IPv4 在前、IPv6 在后，各自按数值升序生成；
+    len() 返回精确的地址总数，不会展开任何地址
+    """
+
+    def __init__(self, max_ipv6_addresses: int = DEFAULT_MAX_IPV6_ADDRESSES):
+        self.max_ipv6_addresses = max_ipv6_addresses
+        self._intervals = {4: [], 6: []}
+        self._dirty = False
+        # 宽松模式下记录被跳过的范围: [(原始文本, 错误信息)]
+        self.errors: List[Tuple[str, str]] = []
+
+    @classmethod
+    def parse(cls, ip_ranges: Iterable[str], strict: bool = False,
+              max_ipv6_addresses: int = DEFAULT_MAX_IPV6_ADDRESSES) -> 'IPRangeSet':
+        """
+        解析IP范围列表
+
+        Args:
+            ip_ranges: IP范围列表
+            strict: 为True时遇到无效范围直接抛出 IPRangeError，否则记录日志并跳过
+            max_ipv6_addresses: IPv6 地址总数上限
+
+        Raises:
+            IPRangeError: strict 模式下范围无效，或 IPv6 地址总数超过上限
+        """
+        range_set = cls(max_ipv6_addresses=max_ipv6_addresses)
+        for ip_range in ip_ranges:
+            try:
+                range_set.add(ip_range)
+            except IPRangeError as e:
+                if strict:
+                    raise
+                logger.error(f"解析IP范围失败 '{ip_range}': {e}")
+                range_set.errors.append((str(ip_range), str(e)))
+        return range_set
+
+    def add(self, ip_range: str):
+        """添加一个IP范围"""
+        version, start, end = parse_ip_range(ip_range)
+        if version == 6:
+            # 加入前先计算合并后的地址数，超过上限时集合保持不变
+            existing = self.intervals(6)
+            overlap = sum(max(0, min(end, e) - max(start, s) + 1) for _v, s, e in existing)
+            total = sum(e - s + 1 for _v, s, e in existing) + (end - start + 1) - overlap
+            if total > self.max_ipv6_addresses:
+                raise IPRangeError(
+                    f"IPv6 地址数量超过上限 {self.max_ipv6_addresses}，请缩小前缀范围: {ip_range}"
+                )
+        self._intervals[version].append((start, end))
+        self._dirty = True
+
+    def _normalize(self):
+        """排序并合并重叠或相邻的区间"""
+        if not self._dirty:
+            return
+        for version, intervals in self._intervals.items():
+            intervals.sort()
+            merged = []
+            for start, end in intervals:
+                if merged and start <= merged[-1][1] + 1:
+                    if end > merged[-1][1]:
+                        merged[-1] = (merged[-1][0], end)
+                else:
+                    merged.append((start, end))
+            self._intervals[version] = merged
+        self._dirty = False
+
+    def intervals(self, version: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """返回合并后的区间列表 [(IP版本, 起始整数, 结束整数)]"""
+        self._normalize()
+        versions = (version,) if version else (4, 6)
+        return [(v, start, end) for v in versions for start, end in self._intervals[v]]
+
+    @classmethod
+    def from_intervals(cls, intervals: Iterable[Tuple[int, int, int]],
+                       max_ipv6_addresses: int = DEFAULT_MAX_IPV6_ADDRESSES) -> 'IPRangeSet':
+        """由 intervals() 返回的整数区间构造集合"""
+        range_set = cls(max_ipv6_addresses=max_ipv6_addresses)
+        for version, start, end in intervals:
+            range_set._intervals[version].append((start, end))
+            range_set._dirty = True
+        return range_set
+
+    def split(self, max_addresses: int) -> Iterator['IPRangeSet']:
+        """
+        按地址顺序切分为若干分片，每个分片最多 max_addresses 个地址
+
+        只切分整数区间，不展开地址；分片按顺序连接起来与原集合完全一致
+        """
+        if max_addresses < 1:
+            raise ValueError('max_addresses 必须大于0')
+        shard, size = [], 0
+        for version, start, end in self.intervals():
+            while start <= end:
+                take = min(end - start + 1, max_addresses - size)
+                shard.append((version, start, start + take - 1))
+                size += take
+                start += take
+                if size == max_addresses:
+                    yield self.from_intervals(shard, self.max_ipv6_addresses)
+                    shard, size = [], 0
+        if shard:
+            yield self.from_intervals(shard, self.max_ipv6_addresses)
+
+    def count(self, version: Optional[int] = None) -> int:
+        """精确的地址总数"""
+        return sum(end - start + 1 for _v, start, end in self.intervals(version))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __bool__(self) -> bool:
+        return bool(self._intervals[4] or self._intervals[6])
+
+    def __iter__(self) -> Iterator[str]:
+        for version, start, end in self.intervals():
+            for value in range(start, end + 1):
+                yield int_to_ip(value, version)
+
+    def __contains__(self, ip) -> bool:
+        try:
+            address = ipaddress.ip_address(str(ip).strip())
+        except ValueError:
+            return False
+        self._normalize()
+        intervals = self._intervals[address.version]
+        value = int(address)
+        index = bisect.bisect_right(intervals, (value, float('inf'))) - 1
+        return index >= 0 and intervals[index][0] <= value <= intervals[index][1]
+
+    def __repr__(self) -> str:
+        return f"<IPRangeSet intervals={len(self.intervals())} addresses={self.count()}>"
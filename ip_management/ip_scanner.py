@@ -12,22 +12,20 @@ import time
 import logging
 import platform
 import subprocess
-import struct
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Dict, Optional, Tuple, Union
 from dataclasses import dataclass
 from datetime import datetime, timezone
 import json
+import multiprocessing
+import os
+import queue
+
+from .icmp_engine import get_icmp_engine, ICMPUnavailableError
+from .ip_ranges import IPRangeSet
+from .port_scheduler import PortScanScheduler, get_port_scheduler, adaptive_timeout
 
-# 异步库导入
-try:
-    import aiohttp
-    import asyncssh
-    HAS_ASYNC_LIBS = True
-except ImportError:
-    HAS_ASYNC_LIBS = False
-    
 # SNMP库导入  
 try:
     from pysnmp.hlapi import *
@@ -37,6 +35,28 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 默认扫描的常用端口
+DEFAULT_PORTS = [21, 22, 23, 25, 53, 80, 110, 135, 139, 143, 443, 445, 993, 995, 3389, 5432, 3306]
+
+# 常见服务端口映射
+COMMON_SERVICES = {
+    21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP',
+    53: 'DNS', 80: 'HTTP', 110: 'POP3', 143: 'IMAP',
+    443: 'HTTPS', 993: 'IMAPS', 995: 'POP3S',
+    3389: 'RDP', 5432: 'PostgreSQL', 3306: 'MySQL',
+    6379: 'Redis', 27017: 'MongoDB', 9200: 'Elasticsearch'
+}
+
+# banner 抓取时主动发送HTTP请求的端口
+HTTP_PROBE_PORTS = (80, 8080, 8000, 8888)
+
+# 多进程扫描：每个分片的地址数，子进程回传结果的批大小与最长间隔（秒）
+DEFAULT_SHARD_SIZE = 1024
+RESULT_BATCH_SIZE = 64
+RESULT_BATCH_INTERVAL = 0.2
+# 子进程检查跨进程取消事件的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.1
+
 
 @dataclass
 class ScanResult:
@@ -82,19 +102,34 @@ class NetworkScanner:
     def __init__(self, 
                  max_concurrent: int = 100,
                  timeout: float = 3.0,
-                 ping_timeout: float = 1.0):
+                 ping_timeout: float = 1.0,
+                 use_icmp_engine: bool = True,
+                 port_scheduler: Optional[PortScanScheduler] = None,
+                 keep_results: bool = True,
+                 cancel_event: Optional[threading.Event] = None,
+                 resolve_hostnames: bool = True):
         """
         初始化网络扫描器
         
         Args:
-            max_concurrent: 最大并发数
-            timeout: 连接超时时间（秒）
+            max_concurrent: 最大并发数（同时扫描的主机数）
+            timeout: 连接超时时间（秒），也是端口探测超时的上限
             ping_timeout: ping超时时间（秒）
+            use_icmp_engine: 是否使用进程内ICMP引擎（不可用时自动回退到系统ping命令）
+            port_scheduler: 端口扫描调度器，默认使用进程内共享的调度器（全局连接预算）
+            keep_results: 是否在内存中保留全部结果；结果由进度回调流式处理时可设为False，内存占用与范围大小无关
+            cancel_event: 取消事件，置位后停止派发新的探测，见 cancel()
+            resolve_hostnames: 是否对在线主机做反向DNS解析
         """
         self.max_concurrent = max_concurrent
         self.timeout = timeout  
         self.ping_timeout = ping_timeout
         self.is_windows = platform.system().lower() == 'windows'
+        self.icmp_engine = get_icmp_engine() if use_icmp_engine else None
+        self.port_scheduler = port_scheduler
+        self.keep_results = keep_results
+        self._cancel_event = cancel_event or threading.Event()
+        self.resolve_hostnames = resolve_hostnames
         
         # 扫描统计信息
         self.stats = {
@@ -114,6 +149,15 @@ class NetworkScanner:
         """添加进度回调函数"""
         self.scan_callbacks.append(callback)
         
+    def cancel(self):
+        """取消扫描：不再派发新的主机和端口探测，在途探测在各自超时内结束"""
+        self._cancel_event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        """扫描是否已被取消"""
+        return self._cancel_event.is_set()
+    
     def _notify_progress(self, current: int, total: int, result: ScanResult = None):
         """通知进度更新"""
         # 处理stats中的datetime对象，避免序列化问题
@@ -150,72 +194,47 @@ class NetworkScanner:
                 - 范围: "192.168.1.1-192.168.1.100"
                 
         Returns:
-            解析后的IP地址列表
+            解析后的IP地址列表（已去重排序）
         """
-        ips = []
-        
-        for ip_range in ip_ranges:
-            ip_range = ip_range.strip()
-            
-            try:
-                if '/' in ip_range:
-                    # CIDR格式
-                    network = ipaddress.ip_network(ip_range, strict=False)
-                    ips.extend([str(ip) for ip in network.hosts()])
-                    
-                elif '-' in ip_range:
-                    # 范围格式
-                    start_ip, end_ip = ip_range.split('-', 1)
-                    start_ip = start_ip.strip()
-                    end_ip = end_ip.strip()
-                    
-                    # 处理简化范围格式 (192.168.1.1-100)
-                    if '.' not in end_ip:
-                        # 简化格式，取起始IP的前缀
-                        start_parts = start_ip.split('.')
-                        if len(start_parts) == 4:
-                            end_ip = '.'.join(start_parts[:3]) + '.' + end_ip
-                    
-                    start = ipaddress.ip_address(start_ip)
-                    end = ipaddress.ip_address(end_ip)
-                    
-                    # 生成范围内的所有IP
-                    current = int(start)
-                    end_int = int(end)
-                    while current <= end_int:
-                        ips.append(str(ipaddress.ip_address(current)))
-                        current += 1
-                        
-                else:
-                    # 单个IP
-                    ipaddress.ip_address(ip_range)  # 验证格式
-                    ips.append(ip_range)
-                    
-            except Exception as e:
-                logger.error(f"解析IP范围失败 '{ip_range}': {e}")
-                continue
+        return list(self.expand_ip_ranges(ip_ranges))
+    
+    def expand_ip_ranges(self, ip_ranges: Union[List[str], IPRangeSet]) -> IPRangeSet:
+        """
+        解析IP范围为惰性的 IPRangeSet，重叠范围按整数区间合并，不展开地址
         
-        # 去重并排序
-        unique_ips = sorted(list(set(ips)), key=lambda x: ipaddress.ip_address(x))
-        logger.info(f"解析IP范围完成: {len(ip_ranges)} 个范围 -> {len(unique_ips)} 个IP地址")
-        return unique_ips
+        无效范围记录日志后跳过；传入 IPRangeSet 时直接使用
+        """
+        if isinstance(ip_ranges, IPRangeSet):
+            return ip_ranges
+        range_set = IPRangeSet.parse(ip_ranges)
+        logger.info(f"解析IP范围完成: {len(ip_ranges)} 个范围 -> {len(range_set)} 个IP地址")
+        return range_set
     
     def ping_host(self, ip: str) -> Tuple[bool, Optional[float]]:
         """
         Ping单个主机
         
+        优先使用进程内ICMP引擎，原始/非特权ICMP套接字都不可用时回退到系统ping命令
+        
         Args:
             ip: 目标IP地址
             
         Returns:
             (是否在线, 响应时间ms)
         """
+        if self.icmp_engine is not None:
+            try:
+                return self.icmp_engine.ping(ip, self.ping_timeout)
+            except ICMPUnavailableError:
+                pass
+            except Exception as e:
+                logger.debug(f"ICMP引擎 ping {ip} 失败，回退到系统ping: {e}")
+        return self._ping_subprocess(ip)
+    
+    def _ping_subprocess(self, ip: str) -> Tuple[bool, Optional[float]]:
+        """通过系统ping命令探测主机（ICMP引擎不可用时的回退方案）"""
         try:
-            if self.is_windows:
-                cmd = ['ping', '-n', '1', '-w', str(int(self.ping_timeout * 1000)), ip]
-            else:
-                cmd = ['ping', '-c', '1', '-W', str(int(self.ping_timeout)), ip]
-            
+            cmd = self._ping_command(ip)
             start_time = time.time()
             result = subprocess.run(
                 cmd, 
@@ -237,6 +256,12 @@ class NetworkScanner:
             logger.debug(f"Ping {ip} 失败: {e}")
             return False, None
     
+    def _ping_command(self, ip: str) -> List[str]:
+        """构造系统ping命令"""
+        if self.is_windows:
+            return ['ping', '-n', '1', '-w', str(int(self.ping_timeout * 1000)), ip]
+        return ['ping', '-c', '1', '-W', str(max(1, int(self.ping_timeout))), ip]
+    
     def scan_port(self, ip: str, port: int) -> bool:
         """
         扫描单个端口
@@ -248,43 +273,33 @@ class NetworkScanner:
         Returns:
             端口是否开放
         """
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(self.timeout)
-                result = sock.connect_ex((ip, port))
-                return result == 0
-        except Exception:
-            return False
+        return self.scan_ports(ip, [port]).get(port, False)
+    
+    def _get_port_scheduler(self) -> PortScanScheduler:
+        if self.port_scheduler is None:
+            self.port_scheduler = get_port_scheduler()
+        return self.port_scheduler
     
-    def scan_ports(self, ip: str, ports: List[int]) -> Dict[int, bool]:
+    def scan_ports(self, ip: str, ports: List[int], rtt_ms: Optional[float] = None) -> Dict[int, bool]:
         """
         扫描多个端口
         
+        探测交给共享的端口扫描调度器执行，与其他主机共用全局连接预算
+        
         Args:
             ip: 目标IP
             ports: 端口列表
+            rtt_ms: 已测得的ping往返时延，用于推导端口超时
             
         Returns:
             端口扫描结果字典
         """
-        results = {}
-        
-        # 使用线程池并发扫描端口
-        with ThreadPoolExecutor(max_workers=min(50, len(ports))) as executor:
-            future_to_port = {
-                executor.submit(self.scan_port, ip, port): port 
-                for port in ports
-            }
-            
-            for future in as_completed(future_to_port):
-                port = future_to_port[future]
-                try:
-                    results[port] = future.result()
-                except Exception as e:
-                    logger.debug(f"扫描端口 {ip}:{port} 失败: {e}")
-                    results[port] = False
-                    
-        return results
+        timeout = adaptive_timeout(rtt_ms, self.timeout)
+        try:
+            return self._get_port_scheduler().scan(ip, ports, timeout, cancel_event=self._cancel_event)
+        except Exception as e:
+            logger.debug(f"扫描端口 {ip} 失败: {e}")
+            return {port: False for port in ports}
     
     def get_hostname(self, ip: str) -> Optional[str]:
         """
@@ -296,6 +311,8 @@ class NetworkScanner:
         Returns:
             主机名或None
         """
+        if not self.resolve_hostnames:
+            return None
         try:
             hostname = socket.gethostbyaddr(ip)[0]
             return hostname if hostname != ip else None
@@ -313,27 +330,19 @@ class NetworkScanner:
         Returns:
             服务名称或None
         """
-        # 常见服务端口映射
-        common_services = {
-            21: 'FTP', 22: 'SSH', 23: 'Telnet', 25: 'SMTP',
-            53: 'DNS', 80: 'HTTP', 110: 'POP3', 143: 'IMAP',
-            443: 'HTTPS', 993: 'IMAPS', 995: 'POP3S',
-            3389: 'RDP', 5432: 'PostgreSQL', 3306: 'MySQL',
-            6379: 'Redis', 27017: 'MongoDB', 9200: 'Elasticsearch'
-        }
-        
-        service_name = common_services.get(port)
+        service_name = COMMON_SERVICES.get(port)
         if service_name:
             return service_name
             
-        # 尝试banner抓取
+        # 尝试banner抓取（占用一个全局连接预算）
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            with self._get_port_scheduler().connection_slot(), \
+                    socket.socket(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_STREAM) as sock:
                 sock.settimeout(2.0)
                 sock.connect((ip, port))
                 
                 # 发送HTTP请求尝试
-                if port in [80, 8080, 8000, 8888]:
+                if port in HTTP_PROBE_PORTS:
                     sock.send(b'GET / HTTP/1.0\r\n\r\n')
                     banner = sock.recv(1024).decode('utf-8', errors='ignore')
                     if 'HTTP/' in banner:
@@ -366,7 +375,7 @@ class NetworkScanner:
         """
         if ports is None:
             # 默认扫描常用端口
-            ports = [21, 22, 23, 25, 53, 80, 110, 135, 139, 143, 443, 445, 993, 995, 3389, 5432, 3306]
+            ports = DEFAULT_PORTS
         
         result = ScanResult(ip_address=ip)
         
@@ -376,17 +385,23 @@ class NetworkScanner:
             result.status = 'online'
             result.response_time = ping_time
             
+            # 扫描已取消时只保留ping结果
+            if self.cancelled:
+                return result
+            
             # 2. 获取主机名
             result.hostname = self.get_hostname(ip)
             
             # 3. 端口扫描
             if ports:
-                port_results = self.scan_ports(ip, ports)
+                port_results = self.scan_ports(ip, ports, rtt_ms=ping_time)
                 open_ports = [port for port, is_open in port_results.items() if is_open]
                 result.open_ports = open_ports
                 
                 # 4. 服务检测
                 for port in open_ports:
+                    if self.cancelled:
+                        break
                     service = self.detect_service(ip, port)
                     if service:
                         result.services[port] = service
@@ -410,16 +425,58 @@ class NetworkScanner:
         Returns:
             扫描结果列表
         """
-        # 解析IP地址
-        ips = self.parse_ip_ranges(ip_ranges)
-        self.stats['total_ips'] = len(ips)
-        self.stats['start_time'] = datetime.now(timezone.utc)
-        
+        ips = self._prepare_scan(ip_ranges)
         if not ips:
-            logger.warning("没有有效的IP地址需要扫描")
             return []
         
-        logger.info(f"开始扫描 {len(ips)} 个IP地址")
+        scan_func = self._ping_scan_single if ping_only else (lambda ip: self.scan_host_comprehensive(ip, ports))
+        # 在途任务数限制为并发数的两倍，地址按需从 IPRangeSet 中取出
+        window = self.max_concurrent * 2
+        ip_iter = iter(ips)
+        
+        # 使用线程池并发扫描
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            future_to_ip = {}
+            exhausted = False
+            while True:
+                # 补充任务（取消后不再派发）
+                if self.cancelled and not exhausted:
+                    exhausted = True
+                    for future in future_to_ip:
+                        future.cancel()
+                while not exhausted and len(future_to_ip) < window:
+                    ip = next(ip_iter, None)
+                    if ip is None:
+                        exhausted = True
+                        break
+                    future_to_ip[executor.submit(scan_func, ip)] = ip
+                
+                if not future_to_ip:
+                    break
+                
+                # 处理结果
+                done, _ = wait(future_to_ip, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ip = future_to_ip.pop(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"扫描IP {ip} 失败: {e}")
+                        # 创建失败结果
+                        result = ScanResult(ip_address=ip, status='offline')
+                    self._record_result(result)
+        
+        return self._finish_scan()
+    
+    def _prepare_scan(self, ip_ranges: List[str]) -> IPRangeSet:
+        """解析IP范围并重置统计信息，返回待扫描的IP集合（惰性生成地址）"""
+        # 解析IP地址
+        ips = self.expand_ip_ranges(ip_ranges)
+        self.stats['total_ips'] = len(ips)
+        self.stats['start_time'] = datetime.now(timezone.utc)
+        self.stats['end_time'] = None
         
         # 重置结果
         self.results.clear()
@@ -427,54 +484,40 @@ class NetworkScanner:
         self.stats['online'] = 0
         self.stats['offline'] = 0
         
-        # 使用线程池并发扫描
-        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
-            # 提交任务
-            if ping_only:
-                future_to_ip = {
-                    executor.submit(self._ping_scan_single, ip): ip 
-                    for ip in ips
-                }
-            else:
-                future_to_ip = {
-                    executor.submit(self.scan_host_comprehensive, ip, ports): ip 
-                    for ip in ips
-                }
-            
-            # 处理结果
-            for future in as_completed(future_to_ip):
-                ip = future_to_ip[future]
-                try:
-                    result = future.result()
-                    self.results.append(result)
-                    
-                    # 更新统计
-                    self.stats['scanned'] += 1
-                    if result.status == 'online':
-                        self.stats['online'] += 1
-                    else:
-                        self.stats['offline'] += 1
-                    
-                    # 通知进度
-                    self._notify_progress(self.stats['scanned'], self.stats['total_ips'], result)
-                    
-                except Exception as e:
-                    logger.error(f"扫描IP {ip} 失败: {e}")
-                    # 创建失败结果
-                    error_result = ScanResult(ip_address=ip, status='offline')
-                    self.results.append(error_result)
-                    self.stats['scanned'] += 1
-                    self.stats['offline'] += 1
-                    
-                    self._notify_progress(self.stats['scanned'], self.stats['total_ips'], error_result)
+        if not ips:
+            logger.warning("没有有效的IP地址需要扫描")
+        else:
+            logger.info(f"开始扫描 {len(ips)} 个IP地址")
+        return ips
+    
+    def _record_result(self, result: ScanResult):
+        """记录单个扫描结果，更新统计并通知进度"""
+        if self.keep_results:
+            self.results.append(result)
         
+        # 更新统计
+        self.stats['scanned'] += 1
+        if result.status == 'online':
+            self.stats['online'] += 1
+        else:
+            self.stats['offline'] += 1
+        
+        # 通知进度
+        self._notify_progress(self.stats['scanned'], self.stats['total_ips'], result)
+    
+    def _finish_scan(self) -> List[ScanResult]:
+        """结束扫描，记录耗时并排序结果"""
         self.stats['end_time'] = datetime.now(timezone.utc)
         elapsed = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
+        self.stats['cancelled'] = self.cancelled
         
-        logger.info(f"扫描完成: {self.stats['online']} 在线, {self.stats['offline']} 离线, 耗时 {elapsed:.2f} 秒")
+        if self.cancelled:
+            logger.info(f"扫描已取消: 已扫描 {self.stats['scanned']}/{self.stats['total_ips']}, 耗时 {elapsed:.2f} 秒")
+        else:
+            logger.info(f"扫描完成: {self.stats['online']} 在线, {self.stats['offline']} 离线, 耗时 {elapsed:.2f} 秒")
         
         # 按IP地址排序结果
-        self.results.sort(key=lambda x: ipaddress.ip_address(x.ip_address))
+        self.results.sort(key=lambda x: ipaddress.get_mixed_type_key(ipaddress.ip_address(x.ip_address)))
         
         return self.results
     
@@ -486,7 +529,8 @@ class NetworkScanner:
         if is_alive:
             result.status = 'online'
             result.response_time = ping_time
-            result.hostname = self.get_hostname(ip)
+            if not self.cancelled:
+                result.hostname = self.get_hostname(ip)
         else:
             result.status = 'offline'
             
@@ -546,61 +590,518 @@ class NetworkScanner:
             raise ValueError(f"不支持的导出格式: {format}")
 
 
-class AsyncNetworkScanner:
-    """异步网络扫描器（需要安装aiohttp等异步库）"""
+class AsyncNetworkScanner(NetworkScanner):
+    """
+    原生 asyncio 网络扫描器
     
-    def __init__(self, max_concurrent: int = 200, timeout: float = 3.0):
-        if not HAS_ASYNC_LIBS:
-            raise ImportError("异步扫描需要安装: pip install aiohttp asyncssh")
-            
-        self.max_concurrent = max_concurrent
-        self.timeout = timeout
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+    ICMP 探测、TCP 连接检测、banner 抓取和反向DNS都在同一个事件循环中以非阻塞方式执行，
+    所有探测共享一个并发预算（max_concurrent），单个事件循环即可保持数千个探测在途。
+    """
+    
+    def __init__(self,
+                 max_concurrent: int = 1000,
+                 timeout: float = 3.0,
+                 ping_timeout: float = 1.0,
+                 use_icmp_engine: bool = True,
+                 keep_results: bool = True,
+                 cancel_event: Optional[threading.Event] = None,
+                 resolve_hostnames: bool = True):
+        """
+        初始化异步扫描器
         
+        Args:
+            max_concurrent: 并发预算，同时在途的探测（ICMP/TCP/DNS）总数上限
+            timeout: 连接超时时间（秒）
+            ping_timeout: ping超时时间（秒）
+            use_icmp_engine: 是否使用进程内ICMP引擎（不可用时回退到异步子进程ping）
+            keep_results: 是否在内存中保留全部结果
+            cancel_event: 取消事件
+            resolve_hostnames: 是否对在线主机做反向DNS解析
+        """
+        super().__init__(max_concurrent=max_concurrent, timeout=timeout,
+                         ping_timeout=ping_timeout, use_icmp_engine=use_icmp_engine,
+                         keep_results=keep_results, cancel_event=cancel_event,
+                         resolve_hostnames=resolve_hostnames)
+        # 并发预算信号量需在事件循环内创建
+        self._budget: Optional[asyncio.Semaphore] = None
+        # 正在运行的扫描（事件循环及工作协程），用于跨线程取消
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: Optional[asyncio.Future] = None
+    
+    def cancel(self):
+        """取消扫描：直接取消事件循环中的工作协程，在途探测立即结束"""
+        super().cancel()
+        loop, workers = self._loop, self._workers
+        if loop is not None and workers is not None:
+            try:
+                loop.call_soon_threadsafe(workers.cancel)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+    
+    def _get_budget(self) -> asyncio.Semaphore:
+        if self._budget is None:
+            self._budget = asyncio.Semaphore(self.max_concurrent)
+        return self._budget
+    
     async def async_ping(self, ip: str) -> Tuple[bool, Optional[float]]:
         """异步ping"""
-        async with self.semaphore:
-            # 这里可以实现异步ping逻辑
-            # 当前使用同步版本作为占位符
-            loop = asyncio.get_event_loop()
-            scanner = NetworkScanner()
-            return await loop.run_in_executor(None, scanner.ping_host, ip)
-    
-    async def async_scan_network(self, ip_ranges: List[str]) -> List[ScanResult]:
-        """异步扫描网络"""
-        scanner = NetworkScanner()
-        ips = scanner.parse_ip_ranges(ip_ranges)
-        
-        tasks = [self.async_ping(ip) for ip in ips]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        scan_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                scan_results.append(ScanResult(ip_address=ips[i], status='offline'))
-            else:
-                is_alive, response_time = result
-                status = 'online' if is_alive else 'offline'
-                scan_results.append(ScanResult(
-                    ip_address=ips[i], 
-                    status=status, 
-                    response_time=response_time
-                ))
-        
-        return scan_results
+        async with self._get_budget():
+            if self.icmp_engine is not None:
+                try:
+                    return await self.icmp_engine.async_ping(ip, self.ping_timeout)
+                except ICMPUnavailableError:
+                    pass
+                except Exception as e:
+                    logger.debug(f"ICMP引擎 ping {ip} 失败，回退到系统ping: {e}")
+            return await self._async_ping_subprocess(ip)
+    
+    async def _async_ping_subprocess(self, ip: str) -> Tuple[bool, Optional[float]]:
+        """通过异步子进程执行系统ping命令"""
+        try:
+            start_time = time.time()
+            proc = await asyncio.create_subprocess_exec(
+                *self._ping_command(ip),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                returncode = await asyncio.wait_for(proc.wait(), self.ping_timeout + 1)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                return False, None
+            
+            if returncode == 0:
+                return True, (time.time() - start_time) * 1000
+            return False, None
+        except Exception as e:
+            logger.debug(f"Ping {ip} 失败: {e}")
+            return False, None
+    
+    async def async_scan_port(self, ip: str, port: int, timeout: Optional[float] = None) -> bool:
+        """异步TCP连接检测"""
+        async with self._get_budget():
+            try:
+                _reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip, port), timeout or self.timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                return False
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return True
+    
+    async def async_scan_ports(self, ip: str, ports: List[int], rtt_ms: Optional[float] = None) -> Dict[int, bool]:
+        """异步扫描多个端口，超时根据ping往返时延推导"""
+        timeout = adaptive_timeout(rtt_ms, self.timeout)
+        results = await asyncio.gather(*(self.async_scan_port(ip, port, timeout) for port in ports))
+        return dict(zip(ports, results))
+    
+    async def async_get_hostname(self, ip: str) -> Optional[str]:
+        """异步反向DNS解析"""
+        if not self.resolve_hostnames:
+            return None
+        async with self._get_budget():
+            loop = asyncio.get_running_loop()
+            try:
+                hostname, _ = await asyncio.wait_for(
+                    loop.getnameinfo((ip, 0), socket.NI_NAMEREQD), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                return None
+            return hostname if hostname != ip else None
+    
+    async def async_detect_service(self, ip: str, port: int) -> Optional[str]:
+        """异步检测端口服务类型"""
+        service_name = COMMON_SERVICES.get(port)
+        if service_name:
+            return service_name
+        
+        async with self._get_budget():
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), 2.0)
+            except (OSError, asyncio.TimeoutError):
+                return f'Unknown/{port}'
+            
+            try:
+                # 发送HTTP请求尝试
+                if port in HTTP_PROBE_PORTS:
+                    writer.write(b'GET / HTTP/1.0\r\n\r\n')
+                    await writer.drain()
+                    banner = (await asyncio.wait_for(reader.read(1024), 2.0)).decode('utf-8', errors='ignore')
+                    if 'HTTP/' in banner:
+                        return 'HTTP'
+                
+                # 接收banner
+                banner = (await asyncio.wait_for(reader.read(1024), 2.0)).decode('utf-8', errors='ignore')
+                if 'SSH' in banner:
+                    return 'SSH'
+                elif 'FTP' in banner:
+                    return 'FTP'
+                elif 'HTTP' in banner:
+                    return 'HTTP'
+            except (OSError, asyncio.TimeoutError):
+                pass
+            finally:
+                writer.close()
+        
+        return f'Unknown/{port}'
+    
+    async def async_scan_host(self, ip: str, ports: List[int] = None, ping_only: bool = False) -> ScanResult:
+        """异步扫描单个主机"""
+        if ports is None:
+            ports = DEFAULT_PORTS
+        
+        result = ScanResult(ip_address=ip)
+        is_alive, ping_time = await self.async_ping(ip)
+        if not is_alive:
+            result.status = 'offline'
+            return result
+        
+        result.status = 'online'
+        result.response_time = ping_time
+        
+        # 反向DNS与端口扫描并行进行
+        hostname_task = asyncio.ensure_future(self.async_get_hostname(ip))
+        try:
+            if not ping_only and ports:
+                port_results = await self.async_scan_ports(ip, ports, rtt_ms=ping_time)
+                open_ports = [port for port in ports if port_results.get(port)]
+                result.open_ports = open_ports
+                
+                services = await asyncio.gather(*(self.async_detect_service(ip, port) for port in open_ports))
+                for port, service in zip(open_ports, services):
+                    if service:
+                        result.services[port] = service
+        finally:
+            result.hostname = await hostname_task
+        
+        return result
+    
+    async def _scan_hosts(self, ips: IPRangeSet, ports: List[int], ping_only: bool,
+                          on_result: Callable[[ScanResult], None]):
+        """
+        以固定数量的工作协程从 IPRangeSet 中按需取出地址
+        
+        工作协程本身不占用并发预算，只有实际发出的探测才占用，因此预算即在途探测数上限。
+        """
+        ip_iter = iter(ips)
+        
+        async def worker():
+            for ip in ip_iter:
+                if self.cancelled:
+                    break
+                try:
+                    result = await self.async_scan_host(ip, ports, ping_only)
+                except Exception as e:
+                    logger.error(f"扫描IP {ip} 失败: {e}")
+                    result = ScanResult(ip_address=ip, status='offline')
+                on_result(result)
+        
+        self._budget = asyncio.Semaphore(self.max_concurrent)
+        worker_count = max(1, min(self.max_concurrent, len(ips)))
+        self._workers = asyncio.gather(*(worker() for _ in range(worker_count)))
+        self._loop = asyncio.get_running_loop()
+        try:
+            await self._workers
+        except asyncio.CancelledError:
+            # 由 cancel() 发起的取消正常结束扫描，其他取消继续向上传递
+            if not self.cancelled:
+                raise
+        finally:
+            self._budget = None
+            self._loop = None
+            self._workers = None
+    
+    async def async_scan_network(self,
+                                 ip_ranges: List[str],
+                                 ports: List[int] = None,
+                                 ping_only: bool = False) -> List[ScanResult]:
+        """
+        异步扫描网络范围
+        
+        进度回调在事件循环中直接调用；回调中需要访问数据库时请使用 scan_network
+        """
+        ips = self._prepare_scan(ip_ranges)
+        if not ips:
+            return []
+        
+        await self._scan_hosts(ips, ports, ping_only, self._record_result)
+        return self._finish_scan()
+    
+    def scan_network(self,
+                     ip_ranges: List[str],
+                     ports: List[int] = None,
+                     ping_only: bool = False) -> List[ScanResult]:
+        """
+        同步扫描入口，可直接替换 NetworkScanner.scan_network
+        
+        事件循环运行在独立线程中，扫描结果通过队列交回调用线程，
+        进度回调因此始终在调用线程中执行（可以安全地访问Django ORM）。
+        """
+        ips = self._prepare_scan(ip_ranges)
+        if not ips:
+            return []
+        
+        events = queue.Queue()
+        done = object()
+        errors = []
+        
+        def run_loop():
+            try:
+                asyncio.run(self._scan_hosts(ips, ports, ping_only, events.put))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                events.put(done)
+        
+        loop_thread = threading.Thread(target=run_loop, name='async-scanner-loop', daemon=True)
+        loop_thread.start()
+        
+        while True:
+            item = events.get()
+            if item is done:
+                break
+            self._record_result(item)
+        
+        loop_thread.join()
+        if errors:
+            raise errors[0]
+        
+        return self._finish_scan()
+
+
+def _scan_shard_worker(shard_queue, events, cancel_event, options: Dict):
+    """
+    多进程扫描的子进程入口：循环领取分片并扫描，结果分批回传父进程
+    
+    回传消息: ('results', [ScanResult]) / ('shard', 分片统计) / ('error', 错误信息) / ('exit', pid)
+    """
+    pid = os.getpid()
+    options = dict(options)
+    ports = options.pop('ports')
+    ping_only = options.pop('ping_only')
+    scanner = create_scanner(keep_results=False, **options)
+    
+    # 跨进程取消事件由父进程置位，asyncio扫描器需要调用 cancel() 才能立即结束在途探测。
+    # 这里轮询而不是阻塞在 cancel_event.wait() 上：子进程带着等待者退出会使父进程的 set() 永久阻塞
+    stopped = threading.Event()
+    
+    def watch_cancel():
+        while not stopped.wait(CANCEL_POLL_INTERVAL):
+            if cancel_event.is_set():
+                scanner.cancel()
+                return
+    
+    watcher = threading.Thread(target=watch_cancel, name='scan-shard-cancel', daemon=True)
+    watcher.start()
+    
+    batch: List[ScanResult] = []
+    last_flush = [time.monotonic()]
+    
+    def flush():
+        if batch:
+            events.put(('results', list(batch)))
+            batch.clear()
+        last_flush[0] = time.monotonic()
+    
+    def on_progress(data):
+        if data.get('result') is not None:
+            batch.append(data['result'])
+        if len(batch) >= RESULT_BATCH_SIZE or time.monotonic() - last_flush[0] >= RESULT_BATCH_INTERVAL:
+            flush()
+    
+    scanner.add_progress_callback(on_progress)
+    
+    try:
+        while not scanner.cancelled and not cancel_event.is_set():
+            shard = shard_queue.get()
+            if shard is None:
+                break
+            try:
+                scanner.scan_network(shard, ports=ports, ping_only=ping_only)
+            except Exception as e:
+                events.put(('error', f"子进程 {pid} 扫描分片失败: {e}"))
+            # 先回传结果再回传分片统计，父进程据此得到一致的计数
+            flush()
+            stats = scanner.get_stats()
+            events.put(('shard', {
+                'pid': pid,
+                'scanned': stats['scanned'],
+                'online': stats['online'],
+                'offline': stats['offline'],
+                'duration': stats['duration']
+            }))
+    finally:
+        stopped.set()
+        watcher.join()
+        flush()
+        events.put(('exit', pid))
+
+
+class ProcessPoolNetworkScanner(NetworkScanner):
+    """
+    多进程网络扫描器
+    
+    地址空间按 shard_size 切分为分片，由多个子进程依次领取；每个子进程内运行线程池扫描器
+    或 asyncio 扫描器，结果分批回传父进程。进度回调、统计和结果都在父进程中合并，
+    用法与 NetworkScanner 一致，banner 抓取和结果构造因此可以用满多个CPU核。
+    """
+    
+    def __init__(self,
+                 processes: Optional[int] = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE,
+                 async_mode: bool = False,
+                 max_concurrent: int = 100,
+                 timeout: float = 3.0,
+                 ping_timeout: float = 1.0,
+                 use_icmp_engine: bool = True,
+                 keep_results: bool = True,
+                 cancel_event: Optional[threading.Event] = None,
+                 start_method: str = 'spawn'):
+        """
+        初始化多进程扫描器
+        
+        Args:
+            processes: 子进程数，默认为CPU核数（不超过分片数）
+            shard_size: 每个分片的地址数
+            async_mode: 子进程内是否使用 asyncio 扫描器
+            max_concurrent: 总并发数，平均分配给各子进程
+            timeout: 连接超时时间（秒）
+            ping_timeout: ping超时时间（秒）
+            use_icmp_engine: 子进程是否使用进程内ICMP引擎
+            keep_results: 是否在父进程内存中保留全部结果
+            cancel_event: 取消事件
+            start_method: 子进程启动方式，默认 spawn（父进程为多线程的Web服务，fork不安全）
+        """
+        # 父进程只负责合并结果，不发起探测
+        super().__init__(max_concurrent=max_concurrent, timeout=timeout,
+                         ping_timeout=ping_timeout, use_icmp_engine=False,
+                         keep_results=keep_results, cancel_event=cancel_event)
+        self.processes = processes or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.async_mode = async_mode
+        self.use_icmp_engine = use_icmp_engine
+        self.start_method = start_method
+        # 正在运行的扫描的跨进程取消事件
+        self._shard_cancel = None
+    
+    def cancel(self):
+        """取消扫描：通知所有子进程停止领取分片并取消在途探测"""
+        super().cancel()
+        shard_cancel = self._shard_cancel
+        if shard_cancel is not None:
+            shard_cancel.set()
+    
+    def scan_network(self,
+                     ip_ranges: List[str],
+                     ports: List[int] = None,
+                     ping_only: bool = False) -> List[ScanResult]:
+        """
+        扫描网络范围
+        
+        进度回调在调用线程中执行（可以安全地访问Django ORM）
+        """
+        ips = self._prepare_scan(ip_ranges)
+        if not ips:
+            return []
+        
+        shards = list(ips.split(self.shard_size))
+        processes = max(1, min(self.processes, len(shards)))
+        ctx = multiprocessing.get_context(self.start_method)
+        shard_queue = ctx.Queue()
+        events = ctx.Queue()
+        self._shard_cancel = ctx.Event()
+        if self.cancelled:
+            self._shard_cancel.set()
+        
+        for shard in shards:
+            shard_queue.put(shard)
+        for _ in range(processes):
+            shard_queue.put(None)
+        
+        options = {
+            'async_mode': self.async_mode,
+            'max_concurrent': max(1, self.max_concurrent // processes),
+            'timeout': self.timeout,
+            'ping_timeout': self.ping_timeout,
+            'use_icmp_engine': self.use_icmp_engine,
+            'ports': ports,
+            'ping_only': ping_only
+        }
+        workers = [
+            ctx.Process(target=_scan_shard_worker,
+                        args=(shard_queue, events, self._shard_cancel, options),
+                        name=f'scan-shard-{index}', daemon=True)
+            for index in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        logger.info(f"多进程扫描: {len(shards)} 个分片, {processes} 个子进程")
+        
+        process_stats: Dict[int, Dict] = {}
+        running = processes
+        try:
+            while running:
+                try:
+                    kind, payload = events.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        logger.error("扫描子进程异常退出")
+                        break
+                    continue
+                
+                if kind == 'results':
+                    for result in payload:
+                        self._record_result(result)
+                elif kind == 'shard':
+                    entry = process_stats.setdefault(payload['pid'], {
+                        'pid': payload['pid'], 'shards': 0, 'scanned': 0,
+                        'online': 0, 'offline': 0, 'duration': 0.0
+                    })
+                    entry['shards'] += 1
+                    for key in ('scanned', 'online', 'offline', 'duration'):
+                        entry[key] += payload[key]
+                elif kind == 'error':
+                    logger.error(payload)
+                elif kind == 'exit':
+                    running -= 1
+        finally:
+            # 正常结束时子进程均已退出；异常退出时通知其余子进程停止
+            self._shard_cancel.set()
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+            shard_queue.cancel_join_thread()
+            shard_queue.close()
+            events.close()
+            self._shard_cancel = None
+        
+        self.stats['processes'] = processes
+        self.stats['shards'] = len(shards)
+        self.stats['process_stats'] = sorted(process_stats.values(), key=lambda entry: entry['pid'])
+        return self._finish_scan()
 
 
-def create_scanner(async_mode: bool = False, **kwargs) -> Union[NetworkScanner, AsyncNetworkScanner]:
+def create_scanner(async_mode: bool = False, processes: int = 0,
+                   **kwargs) -> Union[NetworkScanner, AsyncNetworkScanner, ProcessPoolNetworkScanner]:
     """
     创建扫描器实例
     
     Args:
-        async_mode: 是否使用异步模式
+        async_mode: 是否使用原生 asyncio 扫描器
+        processes: 大于0时使用多进程扫描器，地址空间分片到该数量的子进程中执行
         **kwargs: 扫描器参数
         
     Returns:
         扫描器实例
     """
+    if processes:
+        return ProcessPoolNetworkScanner(processes=processes, async_mode=async_mode, **kwargs)
     if async_mode:
         return AsyncNetworkScanner(**kwargs)
     else:
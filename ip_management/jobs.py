@@ -0,0 +1,209 @@
+"""
+进程内后台作业
+作业由每个管理器固定数量的工作线程执行（排队中的作业状态为 pending），接口立即返回作业ID；
+每个条目的结果完成即追加到作业中，
+可按偏移量轮询或以NDJSON流式读取（异步生成器，ASGI下逐块发送），批量ping和批量创建监控主机共用
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 已结束的作业在内存中保留的时间（秒）
+JOB_RETENTION = 600
+# 每个作业管理器同时执行的作业数，其余作业排队等待
+DEFAULT_MAX_WORKERS = getattr(settings, 'IP_JOB_MAX_WORKERS', 2)
+
+
+class IncrementalJob(abc.ABC):
+    """
+    结果增量追加的后台作业
+
+    子类实现 run() 和 summary()，run() 开始时调用 _start()；需要按结果计数时覆盖 _count()
+    """
+
+    def __init__(self, total: int):
+        self.id = str(uuid.uuid4())
+        self.total = total
+
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.results: List[Dict] = []
+        self.created_at = timezone.now()
+        self.finished_at: Optional[float] = None
+
+        self._cond = threading.Condition()
+        # 取消事件，运行中的作业据此停止处理新的条目
+        self._cancel_event = threading.Event()
+        # 正在流式读取的 (事件循环, asyncio.Event)，有新结果或作业结束时唤醒
+        self._waiters: List[tuple] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancel_event.is_set()
+
+    def _count(self, result: Dict):
+        """追加结果时更新计数（调用方持有 _cond）"""
+
+    def _append(self, *results: Dict):
+        with self._cond:
+            for result in results:
+                self.results.append(result)
+                self._count(result)
+            self._notify()
+
+    def _start(self) -> bool:
+        """作业开始执行，作业已在排队时被取消则返回False"""
+        with self._cond:
+            if self.finished:
+                return False
+            self.status = 'running'
+            return True
+
+    def _finish(self, status: str, error: Optional[str] = None):
+        with self._cond:
+            if self.finished:
+                return
+            self.status = status
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def _notify(self):
+        """唤醒等待结果的线程和异步流（调用方持有 _cond）"""
+        self._cond.notify_all()
+        for loop, event in self._waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭，对应的流已经结束
+                pass
+
+    @abc.abstractmethod
+    def run(self):
+        """执行作业（在工作线程中调用）"""
+
+    def cancel(self):
+        """停止作业：排队中的作业直接结束，运行中的作业不再处理新的条目，已完成的结果保留"""
+        self._cancel_event.set()
+        with self._cond:
+            if self.status == 'pending':
+                self._finish('cancelled')
+
+    @abc.abstractmethod
+    def summary(self) -> Dict:
+        """作业汇总"""
+
+    def snapshot(self, offset: int = 0) -> Dict:
+        """作业状态及偏移量之后的新结果"""
+        with self._cond:
+            offset = max(0, offset)
+            results = self.results[offset:]
+            return {
+                'jobId': self.id,
+                'status': self.status,
+                'error': self.error,
+                'summary': self.summary(),
+                'results': results,
+                'nextOffset': offset + len(results)
+            }
+
+    async def stream(self, offset: int = 0, heartbeat: float = 15.0) -> AsyncIterator[str]:
+        """
+        以NDJSON逐行产出结果，作业结束时产出一行汇总
+
+        异步生成器：等待新结果时不占用线程，ASGI下每批结果产出后立即发送给客户端；
+        长时间没有新结果时产出空行作为心跳，避免代理断开连接
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._waiters.append(waiter)
+        try:
+            while True:
+                with self._cond:
+                    results = self.results[offset:]
+                    finished = self.finished
+                    # 在锁内清除事件，读取之后追加的结果一定会再次唤醒
+                    waiter[1].clear()
+                offset += len(results)
+                if results:
+                    yield ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+                if finished:
+                    yield json.dumps({'type': 'summary', 'status': self.status, 'error': self.error,
+                                      'summary': self.summary()}, ensure_ascii=False) + '\n'
+                    return
+                if not results:
+                    try:
+                        await asyncio.wait_for(waiter[1].wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        yield '\n'
+        finally:
+            with self._cond:
+                self._waiters.remove(waiter)
+
+
+class JobManager:
+    """
+    后台作业管理器（作业保存在进程内存中）
+
+    Args:
+        name: 名称（工作线程名前缀）
+        max_workers: 同时执行的作业数，超出的作业以 pending 状态排队
+    """
+
+    def __init__(self, name: str, max_workers: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self._jobs: Dict[str, IncrementalJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self, job: IncrementalJob) -> IncrementalJob:
+        """登记作业并提交给工作线程执行，立即返回"""
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._executor.submit(self._run_job, job)
+        return job
+
+    @staticmethod
+    def _run_job(job: IncrementalJob):
+        try:
+            if not job.finished:
+                job.run()
+        except Exception as e:
+            logger.error(f"后台作业 {job.id} 失败: {e}")
+            job._finish('failed', str(e))
+        finally:
+            close_old_connections()
+
+    def get(self, job_id: str) -> Optional[IncrementalJob]:
+        with self._lock:
+            return self._jobs.get(str(job_id))
+
+    def _purge(self):
+        """清理结束超过保留时间的作业"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > JOB_RETENTION]
+        for job_id in expired:
+            del self._jobs[job_id]
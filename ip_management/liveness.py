@@ -0,0 +1,379 @@
+"""
+IP存活监控
+后台事件循环持续探测 monitoring_enabled=True 的 IPRecord：
+- 每个IP按 interval ± jitter 独立调度，首轮在一个周期内均匀散开，探测不会集中爆发
+- 所有探测走进程内ICMP引擎，共享一个并发预算
+- 只有状态迁移（以及在线主机低频刷新的 last_seen）才写库，按批次在一个事务中完成
+- 状态迁移通过 Channels 推送到 ip_liveness 组
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .ip_scanner import AsyncNetworkScanner
+from .models import IPRecord
+
+logger = logging.getLogger(__name__)
+
+# 状态变化事件推送的Channels组
+LIVENESS_GROUP = 'ip_liveness'
+
+# 探测周期（秒）及抖动比例
+DEFAULT_INTERVAL = getattr(settings, 'IP_LIVENESS_INTERVAL', 60.0)
+DEFAULT_JITTER = 0.1
+# 同时在途的探测数
+DEFAULT_MAX_CONCURRENT = getattr(settings, 'IP_LIVENESS_MAX_CONCURRENT', 500)
+
+
+@dataclass
+class _Target:
+    """单个被监控的IP"""
+    record_id: object
+    ip: str
+    status: str
+    next_probe: float = 0.0
+    failures: int = 0
+    last_seen_written: float = 0.0
+
+
+class LivenessMonitor:
+    """
+    IP存活监控服务
+
+    Args:
+        interval: 每个IP的探测周期（秒）
+        jitter: 周期抖动比例，实际周期在 interval * (1 ± jitter) 内均匀分布
+        max_concurrent: 同时在途的探测数
+        ping_timeout: 单次ping超时（秒）
+        failure_threshold: 在线主机连续失败多少次才判为离线
+        retry_delay: 在线主机探测失败后的重试间隔（秒）
+        refresh_interval: 重新加载监控列表的间隔（秒）
+        last_seen_interval: 持续在线的主机刷新 last_seen 的最小间隔（秒）
+        flush_interval: 批量写库和推送事件的间隔（秒）
+        batch_size: 每条 UPDATE 涉及的最大记录数
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, jitter: float = DEFAULT_JITTER,
+                 max_concurrent: int = DEFAULT_MAX_CONCURRENT, ping_timeout: float = 1.0,
+                 failure_threshold: int = 2, retry_delay: float = 5.0,
+                 refresh_interval: float = 30.0, last_seen_interval: float = 300.0,
+                 flush_interval: float = 1.0, batch_size: int = 500):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrent = max_concurrent
+        self.ping_timeout = ping_timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.retry_delay = retry_delay
+        self.refresh_interval = refresh_interval
+        self.last_seen_interval = last_seen_interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._targets: Dict[str, _Target] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._random = random.Random()
+
+        # 等待写库 / 推送的变化
+        self._went_online: Dict[str, object] = {}
+        self._went_offline: Dict[str, object] = {}
+        self._seen: Dict[str, object] = {}
+        self._events: List[Dict] = []
+
+        self.stats = {'probes': 0, 'transitions': 0, 'db_writes': 0, 'events': 0}
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._refresh_requested = True
+        self._scanner: Optional[AsyncNetworkScanner] = None
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+    def start(self):
+        """在后台线程中启动监控（幂等）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ip-liveness', daemon=True)
+            self._thread.start()
+        logger.info(f"IP存活监控已启动: 周期 {self.interval} 秒, 并发 {self.max_concurrent}")
+
+    def stop(self, timeout: float = 5.0):
+        """停止监控，写出尚未落库的变化"""
+        self._stopping = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def request_refresh(self):
+        """监控列表变化（启用/禁用监控）后调用，下一轮循环即重新加载"""
+        self._refresh_requested = True
+        self._wake()
+
+    def get_status(self) -> Dict:
+        """监控状态"""
+        online = sum(1 for target in self._targets.values() if target.status == 'online')
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'monitored': len(self._targets),
+            'online': online,
+            'offline': len(self._targets) - online,
+            'interval': self.interval,
+            **self.stats
+        }
+
+    def _wake(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+    def _next_delay(self) -> float:
+        return self.interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _schedule(self, target: _Target, at: float):
+        target.next_probe = at
+        heapq.heappush(self._heap, (at, target.ip))
+
+    def _sync_targets(self, rows: List[Tuple[object, str, str]], now: float):
+        """
+        按数据库中的监控列表更新目标集合
+
+        新目标的首次探测在一个周期内均匀散开；已有目标保留内存中的状态（监控自身是状态的来源）
+        """
+        current = {}
+        for record_id, ip, ping_status in rows:
+            target = self._targets.get(ip)
+            if target is None:
+                target = _Target(record_id=record_id, ip=ip, status=ping_status or 'offline')
+                self._schedule(target, now + self._random.uniform(0, self.interval))
+            current[ip] = target
+        changed = len(current) != len(self._targets) or any(ip not in self._targets for ip in current)
+        self._targets = current
+        # 已移除目标的堆条目在出堆时丢弃；堆中失效条目过多时重建
+        if len(self._heap) > 2 * len(self._targets) + 1024:
+            self._heap = [(target.next_probe, ip) for ip, target in self._targets.items()]
+            heapq.heapify(self._heap)
+        if changed:
+            logger.info(f"IP存活监控列表已更新: {len(self._targets)} 个IP")
+
+    def _pop_due(self, now: float) -> Optional[_Target]:
+        """取出一个已到期的目标，跳过已移除或已重新调度的堆条目"""
+        while self._heap and self._heap[0][0] <= now:
+            due, ip = heapq.heappop(self._heap)
+            target = self._targets.get(ip)
+            if target is not None and target.next_probe == due:
+                return target
+        return None
+
+    def _apply_result(self, target: _Target, alive: bool, now: float) -> Optional[Dict]:
+        """
+        记录一次探测结果并安排下次探测
+
+        Returns:
+            状态发生迁移时返回变化事件，否则返回None
+        """
+        self.stats['probes'] += 1
+        change = None
+        if alive:
+            target.failures = 0
+            if target.status != 'online':
+                target.status = 'online'
+                self._went_online[target.ip] = target.record_id
+                self._went_offline.pop(target.ip, None)
+                target.last_seen_written = now
+                change = target
+            elif now - target.last_seen_written >= self.last_seen_interval:
+                self._seen[target.ip] = target.record_id
+                target.last_seen_written = now
+            self._schedule(target, now + self._next_delay())
+        else:
+            target.failures += 1
+            if target.status == 'online' and target.failures < self.failure_threshold:
+                # 在线主机单次失败可能是丢包，尽快复查
+                self._schedule(target, now + self.retry_delay)
+                return None
+            if target.status != 'offline':
+                target.status = 'offline'
+                self._went_offline[target.ip] = target.record_id
+                self._went_online.pop(target.ip, None)
+                self._seen.pop(target.ip, None)
+                change = target
+            self._schedule(target, now + self._next_delay())
+
+        if change is None:
+            return None
+        self.stats['transitions'] += 1
+        event = {
+            'ip_id': str(change.record_id),
+            'ip_address': change.ip,
+            'status': change.status,
+            'changed_at': timezone.now().isoformat()
+        }
+        self._events.append(event)
+        return event
+
+    # ------------------------------------------------------------------
+    # 数据库
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _load_targets() -> List[Tuple[object, str, str]]:
+        try:
+            return list(IPRecord.objects.filter(monitoring_enabled=True)
+                        .values_list('id', 'ip_address', 'ping_status'))
+        finally:
+            close_old_connections()
+
+    def _take_pending(self):
+        pending = (list(self._went_online.values()), list(self._went_offline.values()),
+                   list(self._seen.values()), self._events)
+        self._went_online, self._went_offline, self._seen, self._events = {}, {}, {}, []
+        return pending
+
+    def _write_changes(self, went_online: List, went_offline: List, seen: List):
+        """把状态迁移和 last_seen 刷新写入数据库（集合 UPDATE，一个事务）"""
+        if not (went_online or went_offline or seen):
+            return
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                for start in range(0, len(went_online), self.batch_size):
+                    IPRecord.objects.filter(pk__in=went_online[start:start + self.batch_size]).update(
+                        ping_status='online', last_seen=now
+                    )
+                for start in range(0, len(went_offline), self.batch_size):
+                    IPRecord.objects.filter(pk__in=went_offline[start:start + self.batch_size]).update(
+                        ping_status='offline'
+                    )
+                for start in range(0, len(seen), self.batch_size):
+                    IPRecord.objects.filter(pk__in=seen[start:start + self.batch_size]).update(last_seen=now)
+            self.stats['db_writes'] += 1
+        finally:
+            close_old_connections()
+
+    # ------------------------------------------------------------------
+    # 事件循环
+    # ------------------------------------------------------------------
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            logger.error(f"IP存活监控异常退出: {e}")
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._scanner = AsyncNetworkScanner(max_concurrent=self.max_concurrent, ping_timeout=self.ping_timeout,
+                                            keep_results=False, resolve_hostnames=False)
+        budget = asyncio.Semaphore(self.max_concurrent)
+        db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ip-liveness-db')
+        probes = set()
+        flusher = asyncio.ensure_future(self._flush_loop(db))
+        next_refresh = 0.0
+
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                if self._refresh_requested or now >= next_refresh:
+                    self._refresh_requested = False
+                    try:
+                        rows = await self._loop.run_in_executor(db, self._load_targets)
+                        self._sync_targets(rows, time.monotonic())
+                    except Exception as e:
+                        logger.error(f"加载IP监控列表失败: {e}")
+                    next_refresh = time.monotonic() + self.refresh_interval
+
+                # 派发到期的探测，并发预算用尽时等待在途探测完成
+                while not self._stopping:
+                    target = self._pop_due(time.monotonic())
+                    if target is None:
+                        break
+                    await budget.acquire()
+                    task = asyncio.ensure_future(self._probe(target, budget))
+                    probes.add(task)
+                    task.add_done_callback(probes.discard)
+
+                now = time.monotonic()
+                wait = next_refresh - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, min(wait, 1.0)))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            for task in probes:
+                task.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+            await self._flush(db)
+            db.shutdown(wait=True)
+            self._loop = None
+            self._wakeup = None
+            logger.info("IP存活监控已停止")
+
+    async def _probe(self, target: _Target, budget: asyncio.Semaphore):
+        try:
+            alive, _rtt = await self._scanner.async_ping(target.ip)
+        except Exception as e:
+            logger.debug(f"存活探测 {target.ip} 失败: {e}")
+            alive = False
+        finally:
+            budget.release()
+        # 探测期间目标可能已被移除
+        if self._targets.get(target.ip) is target:
+            self._apply_result(target, alive, time.monotonic())
+
+    async def _flush_loop(self, db: ThreadPoolExecutor):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush(db)
+
+    async def _flush(self, db: ThreadPoolExecutor):
+        """批量写库并推送状态变化事件"""
+        went_online, went_offline, seen, events = self._take_pending()
+        try:
+            await asyncio.get_running_loop().run_in_executor(db, self._write_changes, went_online, went_offline, seen)
+        except Exception as e:
+            logger.error(f"写入IP存活状态失败: {e}")
+        if events:
+            await self._publish(events)
+
+    async def _publish(self, events: List[Dict]):
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            await channel_layer.group_send(LIVENESS_GROUP, {'type': 'liveness.change', 'changes': events})
+            self.stats['events'] += len(events)
+        except Exception as e:
+            logger.error(f"推送IP存活状态变化失败: {e}")
+
+
+# 全局存活监控实例
+liveness_monitor = LivenessMonitor()
@@ -0,0 +1 @@
+# Django管理命令模块
\ No newline at end of file
@@ -0,0 +1 @@
+# Django管理命令
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+扫描器基准测试的Django管理命令
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ip_management.scan_benchmark import DEFAULT_OPEN_PORTS, run_benchmark_matrix
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _str_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class Command(BaseCommand):
+    help = '在回环地址上的模拟网络中测量扫描器吞吐、探测时延和资源占用'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=_int_list,
+            default=[256, 1024],
+            help='扫描范围大小（地址数），逗号分隔，默认 256,1024'
+        )
+        
+        parser.add_argument(
+            '--concurrency',
+            type=_int_list,
+            default=[50, 200],
+            help='扫描器并发数（maxConcurrent），逗号分隔，默认 50,200'
+        )
+        
+        parser.add_argument(
+            '--engines',
+            type=_str_list,
+            default=['threaded', 'async'],
+            help='扫描引擎 threaded/async，逗号分隔'
+        )
+        
+        parser.add_argument(
+            '--modes',
+            type=_str_list,
+            default=['ping', 'comprehensive'],
+            help='扫描模式 ping/comprehensive，逗号分隔'
+        )
+        
+        parser.add_argument(
+            '--open-ports',
+            type=_int_list,
+            default=list(DEFAULT_OPEN_PORTS),
+            help='模拟主机监听的端口，逗号分隔'
+        )
+        
+        parser.add_argument('--online-ratio', type=float, default=0.5, help='在线主机比例，默认0.5')
+        parser.add_argument('--open-port-ratio', type=float, default=0.1, help='在线主机中开放端口的比例，默认0.1')
+        parser.add_argument('--latency-ms', type=float, default=1.0, help='模拟时延（毫秒），默认1')
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help='模拟时延抖动（毫秒），默认0')
+        parser.add_argument('--drop-rate', type=float, default=0.0, help='ping丢包率，默认0')
+        parser.add_argument('--timeout', type=float, default=1.0, help='端口探测超时（秒），默认1')
+        parser.add_argument('--ping-timeout', type=float, default=0.2, help='ping超时（秒），默认0.2')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子，默认0')
+        
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='以JSON输出结果，便于和历史结果比对'
+        )
+
+    def handle(self, *args, **options):
+        network_options = {
+            'online_ratio': options['online_ratio'],
+            'open_port_ratio': options['open_port_ratio'],
+            'open_ports': options['open_ports'],
+            'latency_ms': options['latency_ms'],
+            'jitter_ms': options['jitter_ms'],
+            'drop_rate': options['drop_rate'],
+            'seed': options['seed'],
+        }
+        
+        try:
+            results = run_benchmark_matrix(
+                sizes=options['sizes'],
+                concurrencies=options['concurrency'],
+                engines=options['engines'],
+                modes=options['modes'],
+                network_options=network_options,
+                timeout=options['timeout'],
+                ping_timeout=options['ping_timeout'],
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(f'基准测试失败: {e}')
+        
+        if options['json']:
+            self.stdout.write(json.dumps([result.to_dict() for result in results], indent=2, ensure_ascii=False))
+            return
+        
+        header = f"{'engine':<9}{'mode':<14}{'hosts':>7}{'conc':>6}{'secs':>9}{'hosts/s':>10}" \
+                 f"{'online':>8}{'ports':>7}{'p50ms':>9}{'p99ms':>9}{'threads':>9}{'fds':>7}{'rssMB':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for r in results:
+            self.stdout.write(
+                f"{r.engine:<9}{r.mode:<14}{r.hosts:>7}{r.concurrency:>6}{r.duration:>9.3f}{r.hosts_per_sec:>10.1f}"
+                f"{r.online:>8}{r.open_ports:>7}{_fmt(r.p50_ms):>9}{_fmt(r.p99_ms):>9}"
+                f"{r.peak_threads:>9}{_fmt(r.peak_fds):>7}{_fmt(r.peak_rss_mb):>9}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'完成 {len(results)} 个基准场景'))
+
+
+def _fmt(value):
+    return '-' if value is None else str(value)
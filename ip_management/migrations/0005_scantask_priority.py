@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_management', '0004_merge_20250826_1428'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scantask',
+            name='priority',
+            field=models.PositiveSmallIntegerField(default=5, help_text='0-10，数值越大越优先执行', verbose_name='优先级'),
+        ),
+        migrations.AddIndex(
+            model_name='scantask',
+            index=models.Index(fields=['status', '-priority', 'created_at'], name='scan_task_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:25
+
+from django.db import migrations, models
+
+
+def fill_ip_keys(apps, schema_editor):
+    """为已有记录计算 ip_family / ip_key"""
+    from ip_management.ip_ranges import ip_sort_key
+
+    IPRecord = apps.get_model('ip_management', 'IPRecord')
+    batch = []
+    for record in IPRecord.objects.only('id', 'ip_address').iterator(chunk_size=2000):
+        record.ip_family, record.ip_key = ip_sort_key(record.ip_address)
+        batch.append(record)
+        if len(batch) >= 2000:
+            IPRecord.objects.bulk_update(batch, ['ip_family', 'ip_key'])
+            batch = []
+    if batch:
+        IPRecord.objects.bulk_update(batch, ['ip_family', 'ip_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_management', '0005_scantask_priority'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='iprecord',
+            options={'ordering': ['ip_family', 'ip_key'], 'verbose_name': 'IP记录', 'verbose_name_plural': 'IP记录'},
+        ),
+        migrations.AddField(
+            model_name='iprecord',
+            name='ip_family',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='IP版本'),
+        ),
+        migrations.AddField(
+            model_name='iprecord',
+            name='ip_key',
+            field=models.CharField(editable=False, help_text='地址整数的定宽十六进制表示，用于数值排序和范围查询', max_length=32, null=True, verbose_name='IP排序键'),
+        ),
+        migrations.RunPython(fill_ip_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='iprecord',
+            index=models.Index(fields=['ip_family', 'ip_key'], name='ip_record_key_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_management', '0006_iprecord_ip_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scantask',
+            name='claimed_by',
+            field=models.CharField(blank=True, help_text='认领任务的进程标识（主机名:进程号:随机后缀）', max_length=100, null=True, verbose_name='执行者'),
+        ),
+        migrations.AddField(
+            model_name='scantask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='执行者最后一次确认任务仍在运行的时间', null=True, verbose_name='心跳时间'),
+        ),
+    ]
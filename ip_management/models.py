@@ -1,10 +1,132 @@
 from django.db import models
+from django.dispatch import Signal
 from django.contrib.auth import get_user_model
+import contextvars
+import ipaddress
 import uuid
 import json
 
+from .ip_ranges import IPRangeSet, int_to_key, ip_sort_key
+
 User = get_user_model()
 
+# 批量路径（bulk_create / bulk_update / update）改变IP记录的地址或状态时发出，
+# 参数 ips 为受影响的地址列表，None 表示无法确定
+ip_records_changed = Signal()
+
+# 影响网段利用率的字段
+_ALLOCATION_FIELDS = {'ip_address', 'status'}
+
+# bulk_update 执行期间为 True：其内部的 update() 不单独发信号，由 bulk_update 发出带地址的信号
+_in_bulk_update = contextvars.ContextVar('ip_records_in_bulk_update', default=False)
+
+
+def _fill_ip_key(record):
+    """按 ip_address 计算 ip_family / ip_key"""
+    record.ip_family, record.ip_key = ip_sort_key(record.ip_address) if record.ip_address else (None, None)
+
+
+def network_condition(cidr: str) -> models.Q:
+    """
+    网段（包含网络地址和广播地址）对应的 ip_family / ip_key 范围条件
+
+    Raises:
+        ValueError: 网段格式错误
+    """
+    network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+    return models.Q(ip_family=network.version,
+                    ip_key__gte=int_to_key(int(network.network_address)),
+                    ip_key__lte=int_to_key(int(network.broadcast_address)))
+
+
+def ranges_condition(ranges) -> models.Q:
+    """
+    IP范围对应的 ip_family / ip_key 范围条件，每个合并后的区间一个条件
+
+    Args:
+        ranges: IPRangeSet，或交给 IPRangeSet.parse(strict=True) 解析的范围列表
+
+    Raises:
+        IPRangeError: 范围格式错误
+    """
+    if not isinstance(ranges, IPRangeSet):
+        # 查询不展开地址，不需要限制IPv6地址数量
+        ranges = IPRangeSet.parse(ranges, strict=True, max_ipv6_addresses=1 << 128)
+    condition = models.Q()
+    for version, start, end in ranges.intervals():
+        condition |= models.Q(ip_family=version, ip_key__gte=int_to_key(start), ip_key__lte=int_to_key(end))
+    return condition
+
+
+class IPRecordQuerySet(models.QuerySet):
+    """
+    IP记录查询集
+    按地址数值排序和按网段 / 区间查询都走 (ip_family, ip_key) 索引上的范围扫描；
+    批量写入路径同步维护 ip_family / ip_key
+    """
+
+    def order_by_ip(self):
+        """按地址数值排序（IPv4在前）"""
+        return self.order_by('ip_family', 'ip_key')
+
+    def in_network(self, cidr: str):
+        """
+        网段内的全部记录（包含网络地址和广播地址）
+
+        Raises:
+            ValueError: 网段格式错误
+        """
+        return self.filter(network_condition(cidr))
+
+    def in_ranges(self, ranges):
+        """
+        落在IP范围内的记录
+
+        Args:
+            ranges: IPRangeSet，或交给 IPRangeSet.parse(strict=True) 解析的范围列表
+
+        Raises:
+            IPRangeError: 范围格式错误
+        """
+        condition = ranges_condition(ranges)
+        return self.filter(condition) if condition else self.none()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for record in objs:
+            _fill_ip_key(record)
+        created = super().bulk_create(objs, *args, **kwargs)
+        ip_records_changed.send(sender=self.model, ips=[record.ip_address for record in objs])
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'ip_address' in fields:
+            objs = list(objs)
+            for record in objs:
+                _fill_ip_key(record)
+            fields += [name for name in ('ip_family', 'ip_key') if name not in fields]
+        token = _in_bulk_update.set(True)
+        try:
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+        finally:
+            _in_bulk_update.reset(token)
+        if _ALLOCATION_FIELDS & set(fields):
+            # 地址变化时原地址未知，按全部失效处理
+            ips = None if 'ip_address' in fields else [record.ip_address for record in objs]
+            ip_records_changed.send(sender=self.model, ips=ips)
+        return updated
+
+    def update(self, **kwargs):
+        # bulk_update 传入的是表达式，排序键已由 bulk_update 一并更新
+        if isinstance(kwargs.get('ip_address'), str):
+            kwargs['ip_family'], kwargs['ip_key'] = ip_sort_key(kwargs['ip_address'])
+        updated = super().update(**kwargs)
+        if updated and _ALLOCATION_FIELDS & set(kwargs) and not _in_bulk_update.get():
+            ip_records_changed.send(sender=self.model, ips=None)
+        return updated
+
+
 class IPRecord(models.Model):
     """IP记录模型"""
     
@@ -24,6 +146,9 @@ class IPRecord(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     ip_address = models.GenericIPAddressField(verbose_name="IP地址", unique=True)
+    ip_family = models.PositiveSmallIntegerField(verbose_name="IP版本", null=True, editable=False)
+    ip_key = models.CharField(max_length=32, verbose_name="IP排序键", null=True, editable=False,
+                              help_text="地址整数的定宽十六进制表示，用于数值排序和范围查询")
     hostname = models.CharField(max_length=255, verbose_name="主机名", blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available', verbose_name="IP状态")
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='static', verbose_name="IP类型")
@@ -40,15 +165,34 @@ class IPRecord(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="创建者")
 
+    objects = IPRecordQuerySet.as_manager()
+
     class Meta:
         db_table = 'ip_records'
         verbose_name = 'IP记录'
         verbose_name_plural = 'IP记录'
-        ordering = ['ip_address']
+        ordering = ['ip_family', 'ip_key']
+        indexes = [
+            models.Index(fields=['ip_family', 'ip_key'], name='ip_record_key_idx'),
+        ]
 
     def __str__(self):
         return f"{self.ip_address} - {self.hostname or 'No hostname'}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 保存时据此判断地址是否变化
+        instance._loaded_ip_address = instance.__dict__.get('ip_address')
+        return instance
+
+    def save(self, *args, **kwargs):
+        _fill_ip_key(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'ip_address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'ip_family', 'ip_key'}
+        super().save(*args, **kwargs)
+
 
 class ScanTask(models.Model):
     """扫描任务模型"""
@@ -95,8 +239,13 @@ class ScanTask(models.Model):
     # 任务状态和结果
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="任务状态")
     progress = models.IntegerField(default=0, verbose_name="进度百分比")
+    priority = models.PositiveSmallIntegerField(default=5, verbose_name="优先级", help_text="0-10，数值越大越优先执行")
     result_data = models.JSONField(verbose_name="扫描结果数据", blank=True, null=True)
     error_message = models.TextField(verbose_name="错误信息", blank=True, null=True)
+    claimed_by = models.CharField(max_length=100, verbose_name="执行者", blank=True, null=True,
+                                  help_text="认领任务的进程标识（主机名:进程号:随机后缀）")
+    heartbeat_at = models.DateTimeField(verbose_name="心跳时间", blank=True, null=True,
+                                        help_text="执行者最后一次确认任务仍在运行的时间")
     
     # Zabbix相关
     zabbix_drule_id = models.CharField(max_length=50, verbose_name="Zabbix发现规则ID", blank=True, null=True)
@@ -113,6 +262,9 @@ class ScanTask(models.Model):
         verbose_name = '扫描任务'
         verbose_name_plural = '扫描任务'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'created_at'], name='scan_task_queue_idx'),
+        ]
 
     def __str__(self):
         return f"扫描任务 {self.task_name or self.id} - {self.get_status_display()}"
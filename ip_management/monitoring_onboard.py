@@ -0,0 +1,127 @@
+"""
+批量创建Zabbix监控主机作业
+为多个IP记录在后台批量创建Zabbix主机：一次查询检查全部主机是否已存在，其余主机分块调用 host.create，
+块之间在速率限制内并发执行；每块完成即追加各主机的结果并把对应IP记录标记为已监控
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional
+
+from .jobs import IncrementalJob, JobManager
+from .models import IPRecord
+
+logger = logging.getLogger(__name__)
+
+# 单次作业的IP数上限
+MAX_HOSTS = 5000
+
+
+class MonitoringOnboardJob(IncrementalJob):
+    """
+    一次批量创建监控主机作业
+
+    每个主机的结果（created / exists / failed / skipped）按完成顺序追加，读取方按偏移量增量获取
+    """
+
+    def __init__(self, records: List[IPRecord], template_ids: List, group_ids: Optional[List] = None,
+                 chunk_size: Optional[int] = None, max_concurrent: Optional[int] = None,
+                 rate_limit: Optional[float] = None, discovery_factory: Optional[Callable] = None):
+        super().__init__(len(records))
+        self.records = [(record.id, record.ip_address, record.hostname or record.ip_address) for record in records]
+        self.template_ids = list(template_ids)
+        self.group_ids = list(group_ids or [])
+        self.chunk_size = chunk_size
+        self.max_concurrent = max_concurrent
+        self.rate_limit = rate_limit
+        self.discovery_factory = discovery_factory
+        self.counts = {'created': 0, 'exists': 0, 'failed': 0, 'skipped': 0}
+
+    def _count(self, result: Dict):
+        self.counts[result['status']] += 1
+
+    def summary(self) -> Dict:
+        """作业汇总"""
+        with self._cond:
+            done = len(self.results)
+            return {
+                'total': self.total,
+                'done': done,
+                **self.counts,
+                'progress': round(done / self.total * 100, 2) if self.total else 100,
+                'template_count': len(self.template_ids),
+                'created_at': self.created_at.isoformat()
+            }
+
+    def run(self):
+        """执行作业（在工作线程中调用）"""
+        if not self._start():
+            return
+        try:
+            if self.discovery_factory is None:
+                from ops_assets_backend.zabbix_api import zabbix_auto_discovery
+                self.discovery_factory = zabbix_auto_discovery
+            discovery = self.discovery_factory()
+
+            # 同一批中主机名重复的记录只创建第一个
+            by_name: Dict[str, tuple] = {}
+            skipped = []
+            for record_id, ip_address, host_name in self.records:
+                if host_name in by_name:
+                    skipped.append(self._result(record_id, ip_address, host_name, 'skipped', None,
+                                                f'主机名 {host_name} 与本批次中的其他IP重复'))
+                else:
+                    by_name[host_name] = (record_id, ip_address)
+            if skipped:
+                self._append(*skipped)
+
+            for batch in discovery.iter_create_hosts(
+                    [(host_name, ip_address) for host_name, (_, ip_address) in by_name.items()],
+                    self.template_ids, group_ids=self.group_ids or None, chunk_size=self.chunk_size,
+                    max_concurrent=self.max_concurrent, rate_limit=self.rate_limit):
+                results = [self._result(by_name[item['host_name']][0], item['ip_address'], item['host_name'],
+                                        item['status'], item['hostid'], item['message']) for item in batch]
+                monitored = [result['ip_id'] for result in results if result['status'] in ('created', 'exists')]
+                if monitored:
+                    IPRecord.objects.filter(id__in=monitored).update(monitoring_enabled=True)
+                self._append(*results)
+
+            self._finish('completed')
+            logger.info(f"批量创建监控主机作业 {self.id} 结束: {self.counts}")
+        except Exception as e:
+            logger.error(f"批量创建监控主机作业 {self.id} 失败: {e}")
+            self._finish('failed', str(e))
+        finally:
+            if self.counts['created'] or self.counts['exists']:
+                from .liveness import liveness_monitor
+                liveness_monitor.request_refresh()
+
+    @staticmethod
+    def _result(record_id, ip_address, host_name, status, hostid, message) -> Dict:
+        return {
+            'ip_id': str(record_id),
+            'ip_address': ip_address,
+            'host_name': host_name,
+            'status': status,
+            'hostid': hostid,
+            'message': message
+        }
+
+
+class MonitoringOnboardManager(JobManager):
+    """批量创建监控主机作业管理器（作业保存在进程内存中）"""
+
+    def __init__(self):
+        super().__init__('monitoring-onboard')
+
+    def submit(self, records: List[IPRecord], template_ids: List, group_ids: Optional[List] = None,
+               chunk_size: Optional[int] = None, max_concurrent: Optional[int] = None,
+               rate_limit: Optional[float] = None) -> MonitoringOnboardJob:
+        """创建作业并提交执行，立即返回（工作线程都在忙时作业以 pending 状态排队）"""
+        job = self.start(MonitoringOnboardJob(records, template_ids, group_ids, chunk_size=chunk_size,
+                                              max_concurrent=max_concurrent, rate_limit=rate_limit))
+        logger.info(f"批量创建监控主机作业 {job.id} 已提交: {job.total} 个IP, {len(job.template_ids)} 个模板")
+        return job
+
+
+# 全局批量创建监控主机作业管理器
+monitoring_onboard_manager = MonitoringOnboardManager()
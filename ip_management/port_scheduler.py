@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端口扫描调度器
+所有主机的 TCP 连接探测由同一个调度线程以非阻塞 socket + selectors 方式执行，
+进程内只有一个全局连接预算（同时打开的 socket 数上限），探测在主机之间轮转，
+避免单个目标被集中探测，也避免每个主机再开一个线程池
+"""
+
+import collections
+import errno
+import logging
+import selectors
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认全局连接预算（同时打开的探测 socket 数）
+DEFAULT_MAX_SOCKETS = 512
+# 默认单主机同时在途的探测数
+DEFAULT_PER_HOST_LIMIT = 8
+
+# 根据 ping 往返时延推导端口超时：RTT * 倍数 + 余量，并限制在 [下限, 扫描器超时] 之间
+RTT_TIMEOUT_MULTIPLIER = 4
+RTT_TIMEOUT_MARGIN = 0.25
+MIN_PORT_TIMEOUT = 0.3
+
+_CONNECT_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                        getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK)}
+
+
+def adaptive_timeout(rtt_ms: Optional[float], max_timeout: float) -> float:
+    """
+    根据 ping 往返时延计算端口探测超时
+
+    Args:
+        rtt_ms: ping 往返时延（毫秒），未知时返回 max_timeout
+        max_timeout: 超时上限（秒）
+    """
+    if rtt_ms is None:
+        return max_timeout
+    timeout = rtt_ms / 1000.0 * RTT_TIMEOUT_MULTIPLIER + RTT_TIMEOUT_MARGIN
+    return min(max_timeout, max(MIN_PORT_TIMEOUT, timeout))
+
+
+class _HostJob:
+    """单个主机的端口探测任务"""
+
+    def __init__(self, ip: str, ports: Iterable[int], timeout: float,
+                 cancel_event: Optional[threading.Event] = None):
+        self.ip = ip
+        self.cancel_event = cancel_event
+        self.family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+        self.pending = collections.deque(ports)
+        self.timeout = timeout
+        self.in_flight = 0
+        self.results: Dict[int, bool] = {}
+        self.done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return not self.pending and self.in_flight == 0
+
+
+class _Probe:
+    __slots__ = ('job', 'port', 'sock', 'deadline')
+
+    def __init__(self, job: _HostJob, port: int, sock: socket.socket, deadline: float):
+        self.job = job
+        self.port = port
+        self.sock = sock
+        self.deadline = deadline
+
+
+class PortScanScheduler:
+    """
+    全局端口扫描调度器
+
+    - max_sockets: 全局连接预算，端口探测和 banner 抓取共同占用
+    - per_host_limit: 单主机同时在途的探测数上限
+    """
+
+    def __init__(self, max_sockets: int = DEFAULT_MAX_SOCKETS, per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        self.max_sockets = max(1, max_sockets)
+        self.per_host_limit = max(1, per_host_limit)
+
+        self._lock = threading.Condition()
+        self._in_use = 0
+        self._new_jobs: List[_HostJob] = []
+        self._hosts = collections.deque()
+        self._probes: Dict[int, _Probe] = {}
+
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # 连接预算
+    # ------------------------------------------------------------------
+    def _try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_use >= self.max_sockets:
+                return False
+            self._in_use += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+        self._wake()
+
+    @contextmanager
+    def connection_slot(self):
+        """阻塞等待一个连接预算（用于 banner 抓取等同步连接）"""
+        with self._lock:
+            while self._in_use >= self.max_sockets:
+                self._lock.wait()
+            self._in_use += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def in_use(self) -> int:
+        """当前占用的连接数"""
+        with self._lock:
+            return self._in_use
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+    def scan(self, ip: str, ports: List[int], timeout: float,
+             cancel_event: Optional[threading.Event] = None) -> Dict[int, bool]:
+        """
+        扫描单个主机的端口（阻塞直到该主机的所有端口完成）
+
+        Args:
+            ip: 目标IP
+            ports: 端口列表
+            timeout: 单个端口的连接超时（秒）
+            cancel_event: 取消事件，置位后丢弃尚未发起的探测（视为关闭），在途探测在超时内结束
+
+        Returns:
+            {端口: 是否开放}
+        """
+        if not ports:
+            return {}
+        job = _HostJob(ip, ports, timeout, cancel_event)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('端口扫描调度器已关闭')
+            self._new_jobs.append(job)
+        self._ensure_thread()
+        self._wake()
+        job.done.wait()
+        return {port: job.results.get(port, False) for port in ports}
+
+    def close(self):
+        """关闭调度器"""
+        with self._lock:
+            self._closed = True
+        self._wake()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    # ------------------------------------------------------------------
+    # 调度线程
+    # ------------------------------------------------------------------
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='port-scan-scheduler', daemon=True)
+                self._thread.start()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            with self._lock:
+                closed = self._closed
+                if self._new_jobs:
+                    self._hosts.extend(self._new_jobs)
+                    self._new_jobs.clear()
+            if closed:
+                self._abort_all()
+                return
+
+            self._launch_probes()
+            events = self._selector.select(self._next_wait())
+            now = time.monotonic()
+            for key, _mask in events:
+                if key.data is None:
+                    try:
+                        self._wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                self._complete_probe(key.data, self._connect_succeeded(key.data.sock))
+            self._expire_probes(now)
+
+    def _launch_probes(self):
+        """按主机轮转发起探测，直到预算用尽或没有可发起的探测"""
+        while self._hosts:
+            launched = False
+            for _ in range(len(self._hosts)):
+                job = self._hosts[0]
+                self._hosts.rotate(-1)
+                if job.cancel_event is not None and job.cancel_event.is_set() and job.pending:
+                    job.pending.clear()
+                    if job.finished:
+                        job.done.set()
+                    continue
+                if not job.pending or job.in_flight >= self.per_host_limit:
+                    continue
+                if not self._try_acquire():
+                    return
+                port = job.pending.popleft()
+                if self._start_connect(job, port):
+                    launched = True
+            self._reap_finished_jobs()
+            if not launched:
+                return
+
+    def _start_connect(self, job: _HostJob, port: int) -> bool:
+        """发起非阻塞连接，返回是否成功占用预算并进入在途状态"""
+        try:
+            sock = socket.socket(job.family, socket.SOCK_STREAM)
+        except OSError as e:
+            # 文件描述符耗尽等情况：放回队列，下一轮再试
+            logger.debug(f"创建探测socket失败: {e}")
+            job.pending.appendleft(port)
+            self._release()
+            return False
+
+        sock.setblocking(False)
+        job.in_flight += 1
+        try:
+            err = sock.connect_ex((job.ip, port))
+        except OSError as e:
+            err = e.errno
+
+        probe = _Probe(job, port, sock, time.monotonic() + job.timeout)
+        if err == 0:
+            self._complete_probe(probe, True, registered=False)
+        elif err in _CONNECT_IN_PROGRESS:
+            self._probes[sock.fileno()] = probe
+            self._selector.register(sock, selectors.EVENT_WRITE, probe)
+        else:
+            self._complete_probe(probe, False, registered=False)
+        return True
+
+    @staticmethod
+    def _connect_succeeded(sock: socket.socket) -> bool:
+        try:
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+        except OSError:
+            return False
+
+    def _complete_probe(self, probe: _Probe, is_open: bool, registered: bool = True):
+        if registered:
+            self._probes.pop(probe.sock.fileno(), None)
+            try:
+                self._selector.unregister(probe.sock)
+            except (KeyError, ValueError):
+                pass
+        try:
+            probe.sock.close()
+        except OSError:
+            pass
+        with self._lock:
+            self._in_use -= 1
+            self._lock.notify()
+
+        job = probe.job
+        job.in_flight -= 1
+        job.results[probe.port] = is_open
+        if job.finished:
+            job.done.set()
+
+    def _expire_probes(self, now: float):
+        expired = [probe for probe in self._probes.values() if probe.deadline <= now]
+        for probe in expired:
+            self._complete_probe(probe, False)
+        if expired:
+            self._reap_finished_jobs()
+
+    def _reap_finished_jobs(self):
+        if any(job.finished for job in self._hosts):
+            self._hosts = collections.deque(job for job in self._hosts if not job.finished)
+
+    def _next_wait(self) -> Optional[float]:
+        if not self._probes:
+            return None if not self._hosts else 0.05
+        nearest = min(probe.deadline for probe in self._probes.values())
+        return max(0.0, min(nearest - time.monotonic(), 0.05))
+
+    def _abort_all(self):
+        for probe in list(self._probes.values()):
+            self._complete_probe(probe, False)
+        for job in list(self._hosts) + self._new_jobs:
+            job.done.set()
+        self._hosts.clear()
+        self._new_jobs.clear()
+
+
+_scheduler: Optional[PortScanScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_port_scheduler() -> PortScanScheduler:
+    """获取进程内共享的端口扫描调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PortScanScheduler()
+        return _scheduler
@@ -0,0 +1,139 @@
+"""
+扫描任务进度上报
+合并扫描过程中的进度更新：数据库写入按频率限制且只在百分比变化时发生，
+实时计数（已扫描、在线、速率、预计剩余时间）写入缓存，查询状态时无需访问数据库
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ScanTask
+
+logger = logging.getLogger(__name__)
+
+# 实时进度缓存键
+LIVE_PROGRESS_CACHE_KEY = 'scan_task_progress_{task_id}'
+# 实时进度缓存有效期（秒）
+LIVE_PROGRESS_TIMEOUT = 3600
+
+
+def get_live_progress(task_id) -> Optional[Dict]:
+    """读取任务的实时进度（不访问数据库），不存在时返回None"""
+    return cache.get(LIVE_PROGRESS_CACHE_KEY.format(task_id=task_id))
+
+
+class ProgressReporter:
+    """
+    扫描任务进度上报器
+
+    Args:
+        task_id: 扫描任务ID
+        base: 扫描开始时的进度值
+        span: 扫描过程占用的进度区间，进度 = base + 扫描百分比 * span / 100
+        cap: 扫描过程中写入的最大进度值（完成状态由任务本身写入）
+        max_writes_per_second: 每秒最多写数据库次数
+        cache_interval: 实时计数写缓存的最小间隔（秒）
+    """
+
+    def __init__(self, task_id, base: int = 5, span: int = 85, cap: int = 90,
+                 max_writes_per_second: float = 1.0, cache_interval: float = 0.5):
+        self.task_id = str(task_id)
+        self.base = base
+        self.span = span
+        self.cap = cap
+        self.min_write_interval = 1.0 / max_writes_per_second if max_writes_per_second > 0 else 0
+        self.cache_interval = cache_interval
+
+        self.cache_key = LIVE_PROGRESS_CACHE_KEY.format(task_id=self.task_id)
+        self.started_at = time.monotonic()
+        self.db_writes = 0
+
+        self._lock = threading.Lock()
+        self._progress = base
+        self._written_progress = None
+        self._last_write = 0.0
+        self._last_cache = 0.0
+        self._counters = {
+            'scanned': 0,
+            'total': 0,
+            'online': 0,
+            'offline': 0,
+        }
+
+    def update(self, scanned: int, total: int, online: int = 0):
+        """记录一次进度（每个主机完成时调用）"""
+        with self._lock:
+            self._counters.update({
+                'scanned': scanned,
+                'total': total,
+                'online': online,
+                'offline': scanned - online,
+            })
+            percentage = scanned * 100 // total if total > 0 else 0
+            self._progress = min(self.base + percentage * self.span // 100, self.cap)
+
+            now = time.monotonic()
+            if now - self._last_cache >= self.cache_interval or scanned >= total:
+                self._write_cache(now, state='running')
+            if self._progress != self._written_progress and now - self._last_write >= self.min_write_interval:
+                self._write_db(now)
+
+    def flush(self):
+        """把尚未写入的进度写入数据库（不受频率限制）"""
+        with self._lock:
+            if self._progress != self._written_progress:
+                self._write_db(time.monotonic())
+
+    def finish(self, state: str = 'completed', progress: Optional[int] = None):
+        """
+        写入最终状态
+
+        Args:
+            state: 最终状态（completed / failed / cancelled）
+            progress: 调用方已经持久化的最终进度；为None时把尚未写入的进度写入数据库
+        """
+        if progress is None:
+            self.flush()
+        with self._lock:
+            if progress is not None:
+                self._progress = self._written_progress = progress
+            self._write_cache(time.monotonic(), state=state)
+
+    def snapshot(self, state: str = 'running') -> Dict:
+        """当前实时计数"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        scanned = self._counters['scanned']
+        total = self._counters['total']
+        rate = scanned / elapsed
+        remaining = max(total - scanned, 0)
+        return {
+            **self._counters,
+            'state': state,
+            'progress': self._progress,
+            'percentage': round(scanned * 100 / total, 2) if total > 0 else 0,
+            'rate': round(rate, 2),
+            'eta_seconds': round(remaining / rate, 1) if rate > 0 and remaining else 0,
+            'elapsed': round(elapsed, 2),
+            'updated_at': timezone.now().isoformat(),
+        }
+
+    def _write_cache(self, now: float, state: str):
+        self._last_cache = now
+        try:
+            cache.set(self.cache_key, self.snapshot(state), timeout=LIVE_PROGRESS_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"写入任务 {self.task_id} 实时进度失败: {e}")
+
+    def _write_db(self, now: float):
+        self._last_write = now
+        self._written_progress = self._progress
+        self.db_writes += 1
+        try:
+            ScanTask.objects.filter(pk=self.task_id).update(progress=self._progress)
+        except Exception as e:
+            logger.error(f"更新任务 {self.task_id} 进度失败: {e}")
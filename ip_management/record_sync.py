@@ -0,0 +1,240 @@
+"""
+IP记录批量同步
+按地址一次性加载已有的 IPRecord，在同一个事务内拆分为 bulk_create / bulk_update，
+只刷新在线状态的记录用一条集合 UPDATE 完成，避免逐条 get_or_create + save；
+ScanResultWriter 在扫描进行中按微批次把结果写入 ScanResult / IPRecord
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Set, Union
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import IPRecord, ScanResult
+
+logger = logging.getLogger(__name__)
+
+# 构造新记录的字段：build(item) -> {字段: 值}
+RecordBuilder = Callable[[object], Dict]
+# 合并到已有记录：merge(record, item) -> 被修改的字段名集合
+RecordMerger = Callable[[IPRecord, object], Set[str]]
+
+
+@dataclass
+class UpsertStats:
+    """批量同步统计"""
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    dry_run: bool = False
+    created_ips: List[str] = field(default_factory=list)
+    updated_ips: List[str] = field(default_factory=list)
+
+    def merge(self, other: 'UpsertStats'):
+        """累加另一批的计数（不累加地址列表，保证内存有界）"""
+        self.created += other.created
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+    @property
+    def total(self) -> int:
+        return self.created + self.updated + self.unchanged
+
+    def to_dict(self) -> Dict:
+        """转换为字典格式"""
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'total': self.total,
+            'dry_run': self.dry_run,
+        }
+
+
+class IPRecordUpserter:
+    """
+    IPRecord 批量 upsert
+
+    Args:
+        build: 为新地址构造字段的函数
+        merge: 把条目合并到已有记录的函数，返回被修改的字段名
+        touch: 每条命中记录都要刷新的字段（如在线状态、最后在线时间），可以是返回字典的函数；
+               仅刷新这些字段的记录计为 unchanged，并用集合 UPDATE 一次完成
+        batch_size: 每批加载 / 写入的记录数
+        dry_run: 只统计不写库
+    """
+
+    def __init__(self,
+                 build: RecordBuilder,
+                 merge: RecordMerger,
+                 touch: Union[Dict, Callable[[], Dict], None] = None,
+                 batch_size: int = 500,
+                 dry_run: bool = False):
+        self.build = build
+        self.merge = merge
+        self.touch = touch or {}
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def upsert(self, items: Iterable, key: Callable[[object], str]) -> UpsertStats:
+        """
+        同步一批条目到 IPRecord
+
+        Args:
+            items: 条目列表（扫描结果、Zabbix主机等）
+            key: 从条目中取出IP地址的函数；同一地址出现多次时以最后一条为准
+
+        Returns:
+            UpsertStats
+        """
+        by_ip = {}
+        for item in items:
+            ip = key(item)
+            if ip:
+                by_ip[str(ip)] = item
+
+        stats = UpsertStats(dry_run=self.dry_run)
+        if not by_ip:
+            return stats
+
+        ips = list(by_ip)
+        if self.dry_run:
+            for start in range(0, len(ips), self.batch_size):
+                self._process_chunk(ips[start:start + self.batch_size], by_ip, stats)
+            return stats
+
+        with transaction.atomic():
+            for start in range(0, len(ips), self.batch_size):
+                self._process_chunk(ips[start:start + self.batch_size], by_ip, stats)
+
+        logger.info(f"IP记录同步完成: 新增 {stats.created}, 更新 {stats.updated}, 未变化 {stats.unchanged}")
+        return stats
+
+    def _process_chunk(self, ips: List[str], by_ip: Dict, stats: UpsertStats):
+        existing = {record.ip_address: record for record in IPRecord.objects.filter(ip_address__in=ips)}
+        now = timezone.now()
+        touch = self.touch() if callable(self.touch) else self.touch
+
+        to_create = []
+        to_update = []
+        update_fields: Set[str] = set()
+        touch_only_ids = []
+
+        for ip in ips:
+            item = by_ip[ip]
+            record = existing.get(ip)
+            if record is None:
+                values = {**self.build(item), **touch}
+                to_create.append(IPRecord(ip_address=ip, **values))
+                stats.created_ips.append(ip)
+                continue
+
+            changed = set(self.merge(record, item))
+            if changed:
+                for name, value in touch.items():
+                    setattr(record, name, value)
+                record.updated_at = now
+                update_fields |= changed | set(touch) | {'updated_at'}
+                to_update.append(record)
+                stats.updated_ips.append(ip)
+            else:
+                touch_only_ids.append(record.pk)
+
+        stats.created += len(to_create)
+        stats.updated += len(to_update)
+        stats.unchanged += len(touch_only_ids)
+
+        if self.dry_run:
+            return
+
+        if to_create:
+            IPRecord.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            IPRecord.objects.bulk_update(to_update, sorted(update_fields), batch_size=self.batch_size)
+        if touch_only_ids and touch:
+            IPRecord.objects.filter(pk__in=touch_only_ids).update(**touch)
+
+
+class ScanResultWriter:
+    """
+    扫描结果增量写入器
+
+    扫描进度回调每完成一个主机调用一次 add()，缓冲区达到 batch_size 条或距上次写入超过
+    flush_interval 秒时，在一个事务内批量写入 ScanResult 并同步在线主机的 IPRecord。
+    内存中最多只保留一个批次的结果。
+
+    Args:
+        task: 扫描任务
+        upserter: 在线主机的 IPRecord 同步规则
+        batch_size: 批次大小
+        flush_interval: 最长写入间隔（秒）
+    """
+
+    def __init__(self, task, upserter: IPRecordUpserter, batch_size: int = 200, flush_interval: float = 2.0):
+        self.task = task
+        self.upserter = upserter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.record_stats = UpsertStats()
+        self.written = 0
+        self.online_written = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def reset(self):
+        """清理任务的旧扫描结果（重新执行任务时使用）"""
+        ScanResult.objects.filter(scan_task=self.task).delete()
+
+    def add(self, result):
+        """缓冲一个扫描器结果，满足批次条件时写入数据库"""
+        self._buffer.append(result)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """写入缓冲区中的结果"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        batch, self._buffer = self._buffer, []
+        online = [result for result in batch if result.status == 'online']
+        with transaction.atomic():
+            ScanResult.objects.bulk_create(
+                [self._build_scan_result(result) for result in batch],
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+            stats = self.upserter.upsert(online, key=lambda result: result.ip_address)
+
+        self.record_stats.merge(stats)
+        self.written += len(batch)
+        self.online_written += len(online)
+
+    def close(self):
+        """写入剩余结果"""
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _build_scan_result(self, result) -> ScanResult:
+        """扫描器结果转换为 ScanResult 模型实例"""
+        return ScanResult(
+            scan_task=self.task,
+            ip_address=result.ip_address,
+            hostname=result.hostname,
+            mac_address=result.mac_address,
+            status=result.status,
+            response_time=result.response_time,
+            service_info={
+                'open_ports': result.open_ports,
+                'services': result.services,
+                'os_info': result.os_info
+            }
+        )
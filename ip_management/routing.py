@@ -0,0 +1,13 @@
+"""
+WebSocket路由配置
+"""
+
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    # IP存活状态变化推送
+    path('liveness/', consumers.IPLivenessConsumer.as_asgi()),
+    # Zabbix发现作业结束事件推送
+    path('discovery/', consumers.ZabbixDiscoveryConsumer.as_asgi()),
+]
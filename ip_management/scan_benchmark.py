@@ -0,0 +1,406 @@
+"""
+扫描器基准测试
+在回环地址段上搭建模拟网络：在线主机按比例在指定端口上监听并返回 banner，
+ping 由模拟网络按配置的时延和丢包率应答，可重复地测量 NetworkScanner / AsyncNetworkScanner
+在不同范围大小和并发数下的吞吐、单主机探测时延以及线程、文件描述符和内存峰值
+"""
+
+import asyncio
+import ipaddress
+import logging
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .ip_scanner import HTTP_PROBE_PORTS, NetworkScanner, create_scanner
+
+logger = logging.getLogger(__name__)
+
+# 模拟网络使用的回环地址段（Linux 上整个 127.0.0.0/8 都路由到 lo，无需配置别名）
+DEFAULT_NETWORK = '127.77.0.0/16'
+# 模拟服务监听的端口（非特权端口；8080 会收到HTTP探测）
+DEFAULT_OPEN_PORTS = (8022, 8080)
+# 综合扫描时额外探测的关闭端口
+DEFAULT_CLOSED_PORTS = (1,)
+# 资源采样间隔（秒）
+SAMPLE_INTERVAL = 0.02
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩百分位数，空列表返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def _count_fds() -> Optional[int]:
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _read_rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ResourceSampler:
+    """后台线程周期采样当前进程的线程数、文件描述符数和RSS，记录峰值"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_fds: Optional[int] = None
+        self.peak_rss_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self):
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+        fds = _count_fds()
+        if fds is not None:
+            self.peak_fds = max(self.peak_fds or 0, fds)
+        rss = _read_rss_mb()
+        if rss is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self) -> 'ResourceSampler':
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='bench-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+class FakeNetwork:
+    """
+    回环地址上的模拟网络
+
+    Args:
+        hosts: 地址数（从网络段第一个主机地址开始连续分配）
+        online_ratio: 在线主机比例
+        open_port_ratio: 在线主机中开放端口的比例（每个开放端口占用一个监听套接字）
+        open_ports: 开放主机监听的端口
+        latency_ms: ping 应答和 banner 返回的时延
+        jitter_ms: 时延抖动（按主机固定，均匀分布）
+        drop_rate: ping 丢包率（按主机固定），丢包的探测在 ping_timeout 后判为离线
+        network: 使用的回环地址段
+        seed: 随机种子，保证同样的配置得到同样的网络
+    """
+
+    def __init__(self, hosts: int, online_ratio: float = 0.5, open_port_ratio: float = 0.1,
+                 open_ports: Iterable[int] = DEFAULT_OPEN_PORTS, latency_ms: float = 1.0,
+                 jitter_ms: float = 0.0, drop_rate: float = 0.0,
+                 network: str = DEFAULT_NETWORK, seed: int = 0):
+        subnet = ipaddress.ip_network(network)
+        if subnet.version != 4 or not subnet.is_loopback:
+            raise ValueError(f"模拟网络必须位于IPv4回环地址段: {network}")
+        if hosts > subnet.num_addresses - 2:
+            raise ValueError(f"地址段 {network} 容纳不下 {hosts} 个主机")
+
+        self.open_ports = tuple(open_ports)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.seed = seed
+        rng = random.Random(seed)
+
+        first = int(subnet.network_address) + 1
+        self.addresses = [str(ipaddress.IPv4Address(first + i)) for i in range(hosts)]
+        online = [ip for ip in self.addresses if rng.random() < online_ratio]
+        self.online: Set[str] = set(online)
+        self.listening: List[str] = [ip for ip in online if rng.random() < open_port_ratio]
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._servers = []
+
+    @property
+    def ip_range(self) -> str:
+        """整个模拟网络的地址范围"""
+        return f"{self.addresses[0]}-{self.addresses[-1]}"
+
+    def _host_random(self, ip: str, purpose: str) -> float:
+        """按地址确定的随机数，每个场景中同一主机的时延和丢包都相同，结果可重复"""
+        return random.Random(f"{self.seed}:{purpose}:{ip}").random()
+
+    def _delay(self, ip: str) -> float:
+        jitter = (self._host_random(ip, 'jitter') * 2 - 1) * self.jitter_ms if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _dropped(self, ip: str) -> bool:
+        return bool(self.drop_rate) and self._host_random(ip, 'drop') < self.drop_rate
+
+    # ------------------------------------------------------------------
+    # 模拟服务
+    # ------------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        ip, port = writer.get_extra_info('sockname')[:2]
+        try:
+            await asyncio.sleep(self._delay(ip))
+            if port in HTTP_PROBE_PORTS:
+                writer.write(b'HTTP/1.0 200 OK\r\nServer: fakenet\r\n\r\n')
+            else:
+                writer.write(b'SSH-2.0-FakeNet\r\n')
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start_servers(self):
+        for ip in self.listening:
+            for port in self.open_ports:
+                self._servers.append(await asyncio.start_server(self._handle, ip, port, backlog=128))
+
+    def start(self):
+        """在后台事件循环中启动所有监听"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self._start_servers())
+            except Exception as e:
+                errors.append(e)
+                for server in self._servers:
+                    server.close()
+                self._servers.clear()
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='fakenet-loop', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            self.stop()
+            raise errors[0]
+        logger.info(f"模拟网络已启动: {len(self.addresses)} 个地址, {len(self.online)} 个在线, "
+                    f"{len(self.listening) * len(self.open_ports)} 个监听端口")
+
+    def stop(self):
+        """关闭所有监听并停止事件循环"""
+        loop = self._loop
+        if loop is None:
+            return
+
+        async def shutdown():
+            for server in self._servers:
+                server.close()
+                await server.wait_closed()
+            self._servers.clear()
+
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+        self._loop = None
+
+    def __enter__(self) -> 'FakeNetwork':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 模拟ping
+    # ------------------------------------------------------------------
+    def ping(self, ip: str, timeout: float) -> Tuple[bool, Optional[float]]:
+        """阻塞版模拟ping"""
+        if ip not in self.online or self._dropped(ip):
+            time.sleep(timeout)
+            return False, None
+        delay = self._delay(ip)
+        time.sleep(delay)
+        return True, delay * 1000
+
+    async def async_ping(self, ip: str, timeout: float) -> Tuple[bool, Optional[float]]:
+        """异步版模拟ping"""
+        if ip not in self.online or self._dropped(ip):
+            await asyncio.sleep(timeout)
+            return False, None
+        delay = self._delay(ip)
+        await asyncio.sleep(delay)
+        return True, delay * 1000
+
+    def hostname(self, ip: str) -> Optional[str]:
+        """模拟反向DNS（不经过系统解析器，避免解析超时干扰测量）"""
+        return f"host-{ip.replace('.', '-')}.fakenet" if ip in self.online else None
+
+    def attach(self, scanner: NetworkScanner, latencies: List[float]):
+        """
+        让扫描器的ping和反向DNS由模拟网络应答，并记录每个主机的探测时延（毫秒）
+
+        TCP 端口探测和 banner 抓取仍走真实套接字
+        """
+        network = self
+
+        def timed(func):
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            return wrapper
+
+        def async_timed(func):
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    latencies.append((time.perf_counter() - started) * 1000)
+            return wrapper
+
+        scanner.ping_host = lambda ip: network.ping(ip, scanner.ping_timeout)
+        scanner.get_hostname = network.hostname
+        scanner.scan_host_comprehensive = timed(scanner.scan_host_comprehensive)
+        scanner._ping_scan_single = timed(scanner._ping_scan_single)
+
+        if hasattr(scanner, 'async_scan_host'):
+            async def fake_async_ping(ip):
+                async with scanner._get_budget():
+                    return await network.async_ping(ip, scanner.ping_timeout)
+
+            async def fake_async_get_hostname(ip):
+                return network.hostname(ip)
+
+            scanner.async_ping = fake_async_ping
+            scanner.async_get_hostname = fake_async_get_hostname
+            scanner.async_scan_host = async_timed(scanner.async_scan_host)
+
+
+@dataclass
+class BenchmarkResult:
+    """单个基准场景的测量结果"""
+    engine: str
+    mode: str
+    hosts: int
+    concurrency: int
+    duration: float
+    hosts_per_sec: float
+    online: int
+    open_ports: int
+    p50_ms: Optional[float]
+    p99_ms: Optional[float]
+    peak_threads: int
+    peak_fds: Optional[int]
+    peak_rss_mb: Optional[float]
+
+    def to_dict(self) -> Dict:
+        """转换为字典格式"""
+        return asdict(self)
+
+
+def run_scan_benchmark(network: FakeNetwork, engine: str = 'threaded', mode: str = 'ping',
+                       concurrency: int = 100, timeout: float = 1.0,
+                       ping_timeout: float = 0.2) -> BenchmarkResult:
+    """
+    在模拟网络上执行一次扫描并测量
+
+    Args:
+        network: 已启动的模拟网络
+        engine: threaded（NetworkScanner）或 async（AsyncNetworkScanner）
+        mode: ping（ping_only）或 comprehensive（端口扫描 + 服务检测）
+        concurrency: 扫描器的 max_concurrent
+        timeout: 端口探测超时上限（秒）
+        ping_timeout: ping超时（秒），离线和丢包的主机按此时长计
+    """
+    if engine not in ('threaded', 'async'):
+        raise ValueError(f"不支持的扫描引擎: {engine}")
+    if mode not in ('ping', 'comprehensive'):
+        raise ValueError(f"不支持的扫描模式: {mode}")
+
+    scanner = create_scanner(async_mode=engine == 'async', max_concurrent=concurrency,
+                             timeout=timeout, ping_timeout=ping_timeout,
+                             use_icmp_engine=False, keep_results=False)
+    latencies: List[float] = []
+    network.attach(scanner, latencies)
+
+    counts = {'open_ports': 0}
+
+    def on_progress(data):
+        result = data.get('result')
+        if result is not None:
+            counts['open_ports'] += len(result.open_ports)
+
+    scanner.add_progress_callback(on_progress)
+    ports = list(network.open_ports) + list(DEFAULT_CLOSED_PORTS)
+
+    with ResourceSampler() as sampler:
+        started = time.perf_counter()
+        scanner.scan_network([network.ip_range], ports=ports, ping_only=mode == 'ping')
+        duration = time.perf_counter() - started
+
+    stats = scanner.get_stats()
+    return BenchmarkResult(
+        engine=engine,
+        mode=mode,
+        hosts=stats['scanned'],
+        concurrency=concurrency,
+        duration=round(duration, 3),
+        hosts_per_sec=round(stats['scanned'] / duration, 1) if duration > 0 else 0.0,
+        online=stats['online'],
+        open_ports=counts['open_ports'],
+        p50_ms=_round(percentile(latencies, 50)),
+        p99_ms=_round(percentile(latencies, 99)),
+        peak_threads=sampler.peak_threads,
+        peak_fds=sampler.peak_fds,
+        peak_rss_mb=_round(sampler.peak_rss_mb),
+    )
+
+
+def run_benchmark_matrix(sizes: Iterable[int], concurrencies: Iterable[int],
+                         engines: Iterable[str] = ('threaded', 'async'),
+                         modes: Iterable[str] = ('ping', 'comprehensive'),
+                         network_options: Optional[Dict] = None,
+                         timeout: float = 1.0, ping_timeout: float = 0.2) -> List[BenchmarkResult]:
+    """
+    按 范围大小 x 扫描模式 x 扫描引擎 x 并发数 依次运行所有场景
+
+    每个范围大小搭建一次模拟网络，同一大小的场景扫描的是同一个网络
+    """
+    results = []
+    for size in sizes:
+        with FakeNetwork(size, **(network_options or {})) as network:
+            for mode in modes:
+                for engine in engines:
+                    for concurrency in concurrencies:
+                        result = run_scan_benchmark(network, engine=engine, mode=mode,
+                                                    concurrency=concurrency, timeout=timeout,
+                                                    ping_timeout=ping_timeout)
+                        logger.info(f"基准测试 {engine}/{mode} hosts={size} concurrency={concurrency}: "
+                                    f"{result.hosts_per_sec} hosts/s")
+                        results.append(result)
+    return results
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
@@ -0,0 +1,32 @@
+"""
+IP记录变化信号处理
+IPRecord 的地址或状态变化后使网段利用率汇总缓存失效
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import IPRecord, ip_records_changed
+from .subnets import schedule_invalidation
+
+
+@receiver(post_save, sender=IPRecord)
+def invalidate_on_save(sender, instance, created=False, update_fields=None, **kwargs):
+    """单条记录保存后失效新旧地址所在的网段"""
+    if update_fields is not None and not {'ip_address', 'status'} & set(update_fields):
+        return
+    ips = [instance.ip_address]
+    loaded = getattr(instance, '_loaded_ip_address', None)
+    if loaded and loaded != instance.ip_address:
+        ips.append(loaded)
+    schedule_invalidation(ips)
+
+
+@receiver(post_delete, sender=IPRecord)
+def invalidate_on_delete(sender, instance, **kwargs):
+    schedule_invalidation([instance.ip_address])
+
+
+@receiver(ip_records_changed, sender=IPRecord)
+def invalidate_on_bulk_change(sender, ips=None, **kwargs):
+    schedule_invalidation(ips)
@@ -0,0 +1,291 @@
+"""
+网段利用率与空闲地址分配
+按整数区间计算网段内已用 / 预留 / 空闲地址数和最长的空闲地址段，记录只通过
+(ip_family, ip_key) 索引按网段范围读取，不展开地址；
+网段汇总缓存在 Django 缓存中，缓存键带有网段的代数（generation），IPRecord 的地址或状态变化时
+递增包含这些地址的各网段的代数，旧的汇总不再被读取，由缓存过期自然清除
+"""
+
+import heapq
+import ipaddress
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .ip_ranges import int_to_ip, parse_ip_range
+from .models import IPRecord
+
+logger = logging.getLogger(__name__)
+
+# 计为已用 / 预留的IP状态，其余状态（available）和没有记录的地址计为空闲
+USED_STATUSES = ('active', 'conflict')
+RESERVED_STATUSES = ('reserved',)
+
+# 网段汇总缓存键（含全局代数和网段代数）、有效期（秒）
+SUBNET_SUMMARY_CACHE_KEY = 'ip_subnet_summary_{network}_{generation}'
+SUBNET_SUMMARY_TIMEOUT = 3600
+# 网段代数的缓存键；全局代数在无法确定变化地址时递增，使全部网段汇总失效
+SUBNET_GENERATION_CACHE_KEY = 'ip_subnet_generation_{network}'
+SUBNET_GLOBAL_GENERATION_KEY = 'ip_subnet_generation'
+# 一次失效涉及的网段数超过该值时改为递增全局代数
+MAX_TARGETED_NETWORKS = 4096
+# 全局统计缓存键和有效期（秒），在线数随存活监控变化，因此只缓存很短时间
+STATISTICS_CACHE_KEY = 'ip_record_statistics'
+STATISTICS_TIMEOUT = 30
+
+# 汇总中返回的最长空闲地址段个数
+DEFAULT_FREE_RUNS = 5
+# 单次分配的地址数上限
+MAX_ALLOCATION = 1024
+
+_allocation_lock = threading.Lock()
+
+
+class SubnetError(ValueError):
+    """网段格式错误或可用地址不足"""
+
+
+def _parse_network(cidr: str) -> ipaddress._BaseNetwork:
+    try:
+        return ipaddress.ip_network(str(cidr).strip(), strict=False)
+    except ValueError as e:
+        raise SubnetError(f"无效的网段 '{cidr}': {e}")
+
+
+def _occupied(network) -> Tuple[Dict[int, str], Dict[int, object]]:
+    """
+    网段内已占用的地址和可复用的 available 记录
+
+    Returns:
+        ({地址整数: 状态}, {地址整数: 记录ID})
+    """
+    occupied, available = {}, {}
+    rows = IPRecord.objects.in_network(str(network)).values_list('ip_key', 'status', 'id')
+    for ip_key, ip_status, record_id in rows.iterator(chunk_size=2000):
+        value = int(ip_key, 16)
+        if ip_status in USED_STATUSES or ip_status in RESERVED_STATUSES:
+            occupied[value] = ip_status
+        else:
+            available[value] = record_id
+    return occupied, available
+
+
+def _free_runs(first: int, last: int, occupied: Iterable[int]):
+    """按顺序产出 [first, last] 内的空闲区间 (起始, 结束)"""
+    cursor = first
+    for value in sorted(occupied):
+        if value < cursor:
+            continue
+        if value > last:
+            break
+        if value > cursor:
+            yield cursor, value - 1
+        cursor = value + 1
+    if cursor <= last:
+        yield cursor, last
+
+
+def compute_subnet_summary(cidr: str, free_runs: int = DEFAULT_FREE_RUNS) -> Dict:
+    """
+    计算网段利用率（不读缓存）
+
+    可分配范围与扫描的 CIDR 语义一致：IPv4 不含网络地址和广播地址
+
+    Raises:
+        SubnetError: 网段格式错误
+    """
+    network = _parse_network(cidr)
+    version, first, last = parse_ip_range(str(network))
+    occupied, available = _occupied(network)
+    in_range = {value: ip_status for value, ip_status in occupied.items() if first <= value <= last}
+
+    size = last - first + 1
+    used = sum(1 for ip_status in in_range.values() if ip_status in USED_STATUSES)
+    reserved = len(in_range) - used
+    runs = heapq.nlargest(free_runs, _free_runs(first, last, in_range), key=lambda run: run[1] - run[0])
+
+    return {
+        'network': str(network),
+        'version': version,
+        'size': size,
+        'used': used,
+        'reserved': reserved,
+        'free': size - used - reserved,
+        'records': len(occupied) + len(available),
+        'utilization': round((used + reserved) / size * 100, 2) if size else 0,
+        'free_runs': [
+            {'start': int_to_ip(start, version), 'end': int_to_ip(end, version), 'size': end - start + 1}
+            for start, end in runs
+        ],
+        'computed_at': timezone.now().isoformat()
+    }
+
+
+def _initial_generation() -> int:
+    # 代数从当前时间（微秒）开始，代数键被清除后重新创建时不会与之前的值重复
+    return time.time_ns() // 1000
+
+
+def _generation(network: str) -> str:
+    """网段当前的代数（全局代数.网段代数），代数不存在时创建"""
+    keys = [SUBNET_GLOBAL_GENERATION_KEY, SUBNET_GENERATION_CACHE_KEY.format(network=network)]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial_generation(), None)
+        values.update(cache.get_many(missing))
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+def _bump_generations(keys: Iterable[str]):
+    """递增已存在的代数（不存在的代数在下次读取时重新创建）"""
+    for key in cache.get_many(list(keys)):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def _containing_networks(ips: Iterable[str]) -> Optional[set]:
+    """包含这些地址的全部网段（各前缀长度），网段数超过上限时返回None"""
+    networks = set()
+    for ip in ips:
+        try:
+            address = ipaddress.ip_address(str(ip))
+        except ValueError:
+            continue
+        for prefix in range(address.max_prefixlen + 1):
+            networks.add(str(ipaddress.ip_network((address, prefix), strict=False)))
+        if len(networks) > MAX_TARGETED_NETWORKS:
+            return None
+    return networks
+
+
+def get_subnet_summary(cidr: str) -> Dict:
+    """
+    网段利用率汇总（优先读缓存）
+
+    代数在计算之前读取：计算期间有写入提交时代数已递增，写入缓存的旧结果不会再被读取
+
+    Raises:
+        SubnetError: 网段格式错误
+    """
+    network = str(_parse_network(cidr))
+    cache_key = SUBNET_SUMMARY_CACHE_KEY.format(network=network, generation=_generation(network))
+    summary = cache.get(cache_key)
+    if summary is None:
+        summary = compute_subnet_summary(network)
+        cache.set(cache_key, summary, SUBNET_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_subnet_summaries(ips: Optional[Iterable[str]] = None):
+    """
+    使网段汇总缓存失效
+
+    Args:
+        ips: 发生变化的地址，只失效包含这些地址的网段；None 表示全部失效
+    """
+    cache.delete(STATISTICS_CACHE_KEY)
+    networks = None if ips is None else _containing_networks(ips)
+    if networks is None:
+        _bump_generations([SUBNET_GLOBAL_GENERATION_KEY])
+    elif networks:
+        _bump_generations(SUBNET_GENERATION_CACHE_KEY.format(network=network) for network in networks)
+
+
+def schedule_invalidation(ips: Optional[Iterable[str]] = None):
+    """在当前事务提交后使网段汇总失效（不在事务中时立即执行）"""
+    ips = None if ips is None else list(ips)
+    transaction.on_commit(lambda: invalidate_subnet_summaries(ips))
+
+
+def get_ip_statistics() -> Dict:
+    """
+    IP仪表盘统计：全部记录的状态计数，以及 subnet 字段为合法网段的各网段汇总
+    """
+    statistics = cache.get(STATISTICS_CACHE_KEY)
+    if statistics is not None:
+        return statistics
+
+    counts = IPRecord.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        available=Count('id', filter=Q(status='available')),
+        reserved=Count('id', filter=Q(status='reserved')),
+        conflict=Count('id', filter=Q(status='conflict')),
+        online=Count('id', filter=Q(ping_status='online')),
+        monitored=Count('id', filter=Q(monitoring_enabled=True))
+    )
+
+    subnets = []
+    for subnet in IPRecord.objects.exclude(subnet__isnull=True).exclude(subnet='') \
+            .order_by().values_list('subnet', flat=True).distinct():
+        try:
+            subnets.append(get_subnet_summary(subnet))
+        except SubnetError:
+            continue  # subnet 是自由文本，忽略不是网段的值
+    subnets.sort(key=lambda summary: (summary['version'], ipaddress.ip_network(summary['network'])))
+
+    statistics = {**counts, 'subnets': subnets}
+    cache.set(STATISTICS_CACHE_KEY, statistics, STATISTICS_TIMEOUT)
+    return statistics
+
+
+def allocate_addresses(cidr: str, count: int = 1, status: str = 'reserved', created_by=None,
+                       description: Optional[str] = None, retries: int = 3) -> List[IPRecord]:
+    """
+    原子地分配网段内最靠前的 count 个空闲地址
+
+    没有记录的地址新建记录，状态为 available 的记录直接改为目标状态；
+    并发分配同一地址时由唯一约束 / 条件更新检测冲突并重试
+
+    Raises:
+        SubnetError: 网段格式错误、数量或状态无效、可用地址不足，或重试后仍冲突
+    """
+    network = _parse_network(cidr)
+    if count < 1 or count > MAX_ALLOCATION:
+        raise SubnetError(f"分配数量必须在 1-{MAX_ALLOCATION} 之间")
+    if status not in USED_STATUSES and status not in RESERVED_STATUSES:
+        raise SubnetError(f"分配后的状态必须是 {', '.join(USED_STATUSES + RESERVED_STATUSES)} 之一")
+
+    version, first, last = parse_ip_range(str(network))
+    for attempt in range(retries):
+        try:
+            with _allocation_lock, transaction.atomic():
+                occupied, available = _occupied(network)
+                chosen = []
+                for start, end in _free_runs(first, last, occupied):
+                    chosen.extend(range(start, min(end, start + count - len(chosen) - 1) + 1))
+                    if len(chosen) >= count:
+                        break
+                if len(chosen) < count:
+                    raise SubnetError(f"网段 {network} 可用地址不足: 需要 {count} 个，剩余 {len(chosen)} 个")
+
+                now = timezone.now()
+                reuse_ids = [available[value] for value in chosen if value in available]
+                if reuse_ids:
+                    updated = IPRecord.objects.filter(pk__in=reuse_ids, status='available').update(
+                        status=status, updated_at=now
+                    )
+                    if updated != len(reuse_ids):
+                        raise IntegrityError('空闲记录已被其他请求占用')
+                IPRecord.objects.bulk_create([
+                    IPRecord(ip_address=int_to_ip(value, version), status=status, subnet=str(network),
+                             description=description, created_by=created_by)
+                    for value in chosen if value not in available
+                ])
+
+            ips = [int_to_ip(value, version) for value in chosen]
+            logger.info(f"网段 {network} 分配 {len(ips)} 个地址: {ips[0]} ~ {ips[-1]}")
+            return list(IPRecord.objects.filter(ip_address__in=ips).order_by_ip())
+        except IntegrityError as e:
+            logger.warning(f"网段 {network} 地址分配冲突，第 {attempt + 1} 次重试: {e}")
+    raise SubnetError(f"网段 {network} 地址分配冲突，请稍后重试")
@@ -1,82 +1,263 @@
+import os
+import socket
 import time
 import threading
 import logging
+import uuid
+from datetime import timedelta
+from django.db import close_old_connections, models, transaction
 from django.utils import timezone
 from django.conf import settings
 from .models import ScanTask, IPRecord, ScanResult
-from .ip_scanner import NetworkScanner, ScanResult as ScannerResult
+from .progress import ProgressReporter
+from .record_sync import IPRecordUpserter, ScanResultWriter, UpsertStats
+from .ip_scanner import create_scanner, ScanResult as ScannerResult
 import json
 
 logger = logging.getLogger(__name__)
 
+# 同时执行的扫描任务数（工作槽位数）
+DEFAULT_MAX_WORKERS = getattr(settings, 'IP_SCAN_MAX_WORKERS', 2)
+# 空闲工作线程检查等待队列的间隔（秒），用于发现其他进程写入的任务
+QUEUE_POLL_INTERVAL = 5.0
+# 每次选取任务时考察的等待任务数
+QUEUE_CANDIDATES = 50
+# 运行中任务的心跳间隔（秒）
+HEARTBEAT_INTERVAL = 10.0
+# 心跳超过多久未更新视为执行者已退出（秒）
+STALE_AFTER = getattr(settings, 'IP_SCAN_STALE_AFTER', 60)
+
+
 class PythonScanTaskManager:
-    """纯Python扫描任务管理器 - 替代Zabbix自动发现"""
+    """
+    纯Python扫描任务管理器 - 替代Zabbix自动发现
+    
+    等待队列就是 status='pending' 的Python扫描任务，由固定数量的工作线程消费：
+    - 选取顺序：当前运行任务最少的用户优先（公平），其次优先级高者、创建早者优先
+    - 通过带状态条件的 UPDATE 认领任务，避免重复执行；认领时记录执行者（claimed_by）和心跳时间
+    - 运行中的任务由心跳线程定期刷新 heartbeat_at；心跳超时的 running 任务（执行进程已退出）
+      被放回队列，其他进程仍在执行的任务不受影响
+    """
     
-    def __init__(self):
+    def __init__(self, max_workers=None):
         self.running_tasks = {}  # 存储正在运行的任务
         self.max_concurrent = 100  # 默认并发数
         self.timeout = 3.0  # 默认超时时间
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        
+        self._lock = threading.Condition()
+        self._workers = []
+        self._started = False
+        # 本进程的执行者标识，多进程部署时区分任务归属
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+    
+    @staticmethod
+    def _queue_queryset():
+        """Python扫描引擎的任务（排除Zabbix自动发现任务）"""
+        return ScanTask.objects.filter(result_data__scan_config__scan_engine='python')
+    
+    def start(self):
+        """启动工作线程（幂等），并恢复上次中断的任务"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        
+        try:
+            self._recover_interrupted_tasks()
+        except Exception as e:
+            logger.error(f"恢复中断的扫描任务失败: {e}")
         
+        for index in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f'scan-worker-{index}',
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+        threading.Thread(target=self._heartbeat_loop, name='scan-heartbeat', daemon=True).start()
+        logger.info(f"Python扫描任务调度器已启动: {self.max_workers} 个工作槽位")
+    
+    def _recover_interrupted_tasks(self):
+        """把心跳超时（执行进程已退出）的 running 任务放回等待队列"""
+        stale_before = timezone.now() - timedelta(seconds=STALE_AFTER)
+        with self._lock:
+            running_ids = list(self.running_tasks)
+        recovered = (
+            self._queue_queryset().filter(status='running')
+            .filter(models.Q(heartbeat_at__lt=stale_before) | models.Q(heartbeat_at__isnull=True))
+            .exclude(id__in=running_ids)
+            .update(status='pending', progress=0, started_at=None, claimed_by=None, heartbeat_at=None)
+        )
+        if recovered:
+            logger.info(f"已将 {recovered} 个中断的扫描任务放回等待队列")
+        return recovered
+    
+    def _send_heartbeat(self):
+        """刷新本进程运行中任务的心跳时间"""
+        with self._lock:
+            running_ids = list(self.running_tasks)
+        if not running_ids:
+            return 0
+        return ScanTask.objects.filter(id__in=running_ids, status='running', claimed_by=self.worker_id).update(
+            heartbeat_at=timezone.now()
+        )
+    
+    def _heartbeat_loop(self):
+        """心跳线程：定期刷新心跳，并回收其他进程遗留的中断任务"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._send_heartbeat()
+                if self._recover_interrupted_tasks():
+                    with self._lock:
+                        self._lock.notify_all()
+            except Exception as e:
+                logger.error(f"扫描任务心跳失败: {e}")
+            finally:
+                close_old_connections()
+    
     def add_task(self, task_id, scan_config=None):
-        """添加任务到处理队列"""
+        """
+        添加任务到处理队列
+        
+        任务本身保存在数据库中（status='pending'），这里只补全扫描配置并唤醒工作线程
+        """
+        task_id = str(task_id)
         if task_id in self.running_tasks:
             logger.warning(f"任务 {task_id} 已在处理队列中")
             return
-            
-        logger.info(f"添加Python扫描任务 {task_id} 到处理队列")
         
-        # 启动异步线程处理任务
-        thread = threading.Thread(
-            target=self._process_scan_task,
-            args=(task_id, scan_config or {}),
-            daemon=True
-        )
+        logger.info(f"添加Python扫描任务 {task_id} 到处理队列")
         
-        self.running_tasks[task_id] = {
-            'thread': thread,
-            'start_time': timezone.now(),
-            'scanner': None
-        }
+        try:
+            task = ScanTask.objects.get(id=task_id)
+            result_data = task.result_data or {}
+            config = {**(scan_config or {}), **result_data.get('scan_config', {}), 'scan_engine': 'python'}
+            if result_data.get('scan_config') != config:
+                result_data['scan_config'] = config
+                ScanTask.objects.filter(id=task_id).update(result_data=result_data)
+        except ScanTask.DoesNotExist:
+            logger.error(f"任务 {task_id} 不存在")
+            return
         
-        thread.start()
+        self.start()
+        with self._lock:
+            self._lock.notify()
+    
+    def _worker_loop(self):
+        """工作线程：循环认领并执行等待中的任务"""
+        while True:
+            try:
+                claimed = self._claim_next_task()
+            except Exception as e:
+                logger.error(f"认领扫描任务失败: {e}")
+                claimed = None
+            
+            if claimed is None:
+                with self._lock:
+                    self._lock.wait(timeout=QUEUE_POLL_INTERVAL)
+                continue
+            
+            task_id, scan_config = claimed
+            try:
+                self._process_scan_task(task_id, scan_config)
+            finally:
+                close_old_connections()
+    
+    def _claim_next_task(self):
+        """
+        按公平性和优先级选取下一个等待中的任务并认领
         
+        Returns:
+            (任务ID, 扫描配置)，没有可执行的任务时返回None
+        """
+        with self._lock:
+            candidates = list(
+                self._queue_queryset().filter(status='pending')
+                .order_by('-priority', 'created_at')
+                .values_list('id', 'created_by_id', 'priority', 'created_at')[:QUEUE_CANDIDATES]
+            )
+            if not candidates:
+                return None
+            
+            running_per_user = {}
+            for info in self.running_tasks.values():
+                running_per_user[info['user_id']] = running_per_user.get(info['user_id'], 0) + 1
+            
+            candidates.sort(key=lambda c: (running_per_user.get(c[1], 0), -c[2], c[3]))
+            for task_pk, user_id, _priority, _created_at in candidates:
+                now = timezone.now()
+                claimed = ScanTask.objects.filter(id=task_pk, status='pending').update(
+                    status='running', started_at=now, progress=5,
+                    completed_at=None, error_message=None,
+                    claimed_by=self.worker_id, heartbeat_at=now
+                )
+                if not claimed:
+                    continue  # 已被其他进程认领或取消
+                
+                task_id = str(task_pk)
+                self.running_tasks[task_id] = {
+                    'thread': threading.current_thread(),
+                    'start_time': timezone.now(),
+                    'user_id': user_id,
+                    'cancel_event': threading.Event(),
+                    'scanner': None,
+                    'writer': None,
+                    'reporter': None
+                }
+                result_data = ScanTask.objects.filter(id=task_pk).values_list('result_data', flat=True).first()
+                return task_id, (result_data or {}).get('scan_config', {})
+        return None
+    
     def _process_scan_task(self, task_id, scan_config):
         """处理单个扫描任务"""
+        reporter = None
         try:
+            # 任务在认领时已置为运行中
             task = ScanTask.objects.get(id=task_id)
-            
-            # 更新任务状态为运行中
-            task.status = 'running'
-            task.started_at = timezone.now()
-            task.progress = 5
-            task.save()
+            cancel_event = self.running_tasks[task_id]['cancel_event']
             
             logger.info(f"开始Python扫描任务 {task_id}")
             
-            # 创建扫描器
-            scanner = NetworkScanner(
+            # 创建扫描器（async_mode 为真时使用原生 asyncio 扫描器，processes 大于0时分片到多个子进程）
+            scanner = create_scanner(
+                async_mode=scan_config.get('async_mode', False),
+                processes=scan_config.get('processes', 0),
                 max_concurrent=scan_config.get('max_concurrent', self.max_concurrent),
                 timeout=scan_config.get('timeout', self.timeout),
-                ping_timeout=scan_config.get('ping_timeout', 1.0)
+                ping_timeout=scan_config.get('ping_timeout', 1.0),
+                keep_results=False,
+                cancel_event=cancel_event
             )
             
+            # 扫描结果按微批次增量写入数据库，扫描过程中即可查询到部分结果
+            writer = ScanResultWriter(task, self._build_record_upserter(task))
+            writer.reset()
+            
+            # 进度合并上报：数据库每秒最多写一次，实时计数写入缓存
+            reporter = ProgressReporter(task_id)
+            
             # 保存扫描器实例用于可能的取消操作
             self.running_tasks[task_id]['scanner'] = scanner
+            self.running_tasks[task_id]['writer'] = writer
+            self.running_tasks[task_id]['reporter'] = reporter
             
             # 添加进度回调
             def progress_callback(data):
-                if task_id not in self.running_tasks:
+                if cancel_event.is_set():
                     return  # 任务已被停止
                     
                 try:
                     # 更新进度 (5% 起始 + 85% 扫描进度)
-                    progress = 5 + int(data['percentage'] * 0.85)
-                    task.progress = min(progress, 90)
-                    task.save(update_fields=['progress'])
+                    reporter.update(data['current'], data['total'], data['stats'].get('online', 0))
                     
-                    # 记录发现的在线主机
-                    if data.get('result') and data['result'].status == 'online':
-                        logger.info(f"任务 {task_id} 发现在线主机: {data['result'].ip_address}")
+                    if data.get('result'):
+                        writer.add(data['result'])
+                        # 记录发现的在线主机
+                        if data['result'].status == 'online':
+                            logger.info(f"任务 {task_id} 发现在线主机: {data['result'].ip_address}")
                 except Exception as e:
                     logger.error(f"任务 {task_id} 进度回调失败: {e}")
             
@@ -94,30 +275,29 @@ class PythonScanTaskManager:
             logger.info(f"任务 {task_id} 扫描参数: IP范围={ip_ranges}, 模式={scan_mode}, 端口={ports}")
             
             # 执行扫描
-            if scan_mode == 'ping_only':
-                results = scanner.scan_network(ip_ranges, ping_only=True)
-            else:
-                results = scanner.scan_network(ip_ranges, ports=ports)
+            try:
+                if scan_mode == 'ping_only':
+                    scanner.scan_network(ip_ranges, ping_only=True)
+                else:
+                    scanner.scan_network(ip_ranges, ports=ports)
+            finally:
+                # 无论扫描是否异常结束，已完成的结果和进度都写入数据库
+                writer.close()
+                reporter.flush()
             
             # 检查任务是否被停止
-            if task_id not in self.running_tasks:
+            if cancel_event.is_set():
                 logger.info(f"任务 {task_id} 已被停止，终止处理")
+                reporter.finish('cancelled')
                 return
             
-            # 保存扫描结果到数据库
-            task.progress = 90
-            task.save(update_fields=['progress'])
-            
-            saved_count = self._save_scan_results(task, results)
-            
-            # 任务完成
-            task.status = 'completed'
-            task.progress = 100
-            task.completed_at = timezone.now()
+            record_stats = writer.record_stats
+            saved_count = record_stats.total
             
             # 生成结果统计
             stats = scanner.get_stats()
-            online_count = len([r for r in results if r.status == 'online'])
+            total_scanned = stats['scanned']
+            online_count = stats['online']
             
             # 处理stats中的datetime对象，转换为可JSON序列化的格式
             serializable_stats = {}
@@ -128,34 +308,45 @@ class PythonScanTaskManager:
                 else:
                     serializable_stats[key] = value
             
-            task.result_data = {
-                'total_scanned': len(results),
+            result_data = {
+                'scan_config': scan_config,
+                'total_scanned': total_scanned,
                 'online_hosts': online_count,
-                'offline_hosts': len(results) - online_count,
+                'offline_hosts': total_scanned - online_count,
                 'saved_to_db': saved_count,
+                'ip_records': record_stats.to_dict(),
                 'duration': stats.get('duration', 0),
                 'scan_stats': serializable_stats
             }
-            task.save()
+            # 任务完成（仅当任务仍处于运行中，避免覆盖并发的取消）
+            ScanTask.objects.filter(id=task_id, status='running').update(
+                status='completed',
+                progress=100,
+                completed_at=timezone.now(),
+                result_data=result_data
+            )
+            reporter.finish('completed', progress=100)
             
-            logger.info(f"任务 {task_id} 完成: 扫描 {len(results)} 个IP, 发现 {online_count} 个在线, 保存 {saved_count} 条记录")
+            logger.info(f"任务 {task_id} 完成: 扫描 {total_scanned} 个IP, 发现 {online_count} 个在线, 保存 {saved_count} 条记录")
             
         except ScanTask.DoesNotExist:
             logger.error(f"任务 {task_id} 不存在")
         except Exception as e:
             logger.error(f"任务 {task_id} 处理失败: {str(e)}")
             try:
-                task = ScanTask.objects.get(id=task_id)
-                task.status = 'failed'
-                task.error_message = str(e)
-                task.completed_at = timezone.now()
-                task.save()
+                ScanTask.objects.filter(id=task_id, status='running').update(
+                    status='failed',
+                    error_message=str(e),
+                    completed_at=timezone.now()
+                )
             except Exception:
                 pass
+            if reporter:
+                reporter.finish('failed')
         finally:
-            # 清理任务
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
+            # 清理任务，释放工作槽位
+            with self._lock:
+                self.running_tasks.pop(task_id, None)
     
     def _get_scan_mode(self, check_type):
         """根据检查类型确定扫描模式"""
@@ -208,94 +399,86 @@ class PythonScanTaskManager:
         return ports
     
     def _save_scan_results(self, task, scan_results):
-        """保存扫描结果到数据库"""
-        saved_count = 0
+        """
+        一次性保存扫描结果到数据库（扫描过程中的增量写入见 ScanResultWriter）
+        
+        扫描结果和在线主机的IP记录在同一个事务内批量写入
+        
+        Returns:
+            IP记录同步统计（UpsertStats）
+        """
+        writer = ScanResultWriter(task, self._build_record_upserter(task), batch_size=500)
         
         try:
-            # 清理旧的扫描结果
-            ScanResult.objects.filter(scan_task=task).delete()
-            
-            # 批量创建新结果
-            scan_result_objects = []
-            ip_record_objects = []
-            
-            for result in scan_results:
-                # 创建扫描结果记录
-                scan_result_obj = ScanResult(
-                    scan_task=task,
-                    ip_address=result.ip_address,
-                    hostname=result.hostname,
-                    mac_address=result.mac_address,
-                    status=result.status,
-                    response_time=result.response_time,
-                    service_info={
-                        'open_ports': result.open_ports,
-                        'services': result.services,
-                        'os_info': result.os_info
-                    }
-                )
-                scan_result_objects.append(scan_result_obj)
-                
-                # 只为在线主机创建或更新IP记录
-                if result.status == 'online':
-                    try:
-                        # 检查IP是否已存在
-                        ip_record, created = IPRecord.objects.get_or_create(
-                            ip_address=result.ip_address,
-                            defaults={
-                                'hostname': result.hostname,
-                                'status': 'active',
-                                'type': 'static',
-                                'ping_status': 'online',
-                                'last_seen': timezone.now(),
-                                'description': f'Python扫描发现 - 任务ID: {task.id}',
-                                'created_by': task.created_by
-                            }
-                        )
-                        
-                        if not created:
-                            # 更新现有记录
-                            ip_record.ping_status = 'online'
-                            ip_record.last_seen = timezone.now()
-                            if result.hostname and not ip_record.hostname:
-                                ip_record.hostname = result.hostname
-                            if not ip_record.description or 'Python扫描' not in ip_record.description:
-                                ip_record.description = f'Python扫描发现 - 任务ID: {task.id}'
-                            ip_record.save()
-                        
-                        saved_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"保存IP记录失败 {result.ip_address}: {e}")
-            
-            # 批量保存扫描结果
-            ScanResult.objects.bulk_create(scan_result_objects)
-            
+            with transaction.atomic():
+                writer.reset()
+                for result in scan_results:
+                    writer.add(result)
+                writer.close()
         except Exception as e:
             logger.error(f"保存扫描结果失败: {e}")
+            return UpsertStats()
+        
+        return writer.record_stats
+    
+    @staticmethod
+    def _build_record_upserter(task):
+        """构造扫描发现主机的IP记录同步规则"""
+        description = f'Python扫描发现 - 任务ID: {task.id}'
+        
+        def build(result):
+            return {
+                'hostname': result.hostname,
+                'status': 'active',
+                'type': 'static',
+                'description': description,
+                'created_by': task.created_by
+            }
+        
+        def merge(record, result):
+            changed = set()
+            if result.hostname and not record.hostname:
+                record.hostname = result.hostname
+                changed.add('hostname')
+            if not record.description or 'Python扫描' not in record.description:
+                record.description = description
+                changed.add('description')
+            return changed
         
-        return saved_count
+        return IPRecordUpserter(
+            build=build,
+            merge=merge,
+            touch=lambda: {'ping_status': 'online', 'last_seen': timezone.now()}
+        )
     
     def stop_task(self, task_id):
-        """停止正在运行的任务"""
-        if task_id not in self.running_tasks:
-            return False
+        """
+        停止任务
         
+        等待中的任务直接置为已取消；运行中的任务通知扫描器取消，
+        扫描器不再派发新的探测，工作线程随即释放槽位
+        """
+        task_id = str(task_id)
         logger.info(f"正在停止任务 {task_id}")
         
         try:
-            # 更新任务状态
-            task = ScanTask.objects.get(id=task_id)
-            task.status = 'cancelled'
-            task.completed_at = timezone.now()
-            task.save()
+            with self._lock:
+                task_info = self.running_tasks.get(task_id)
+                if task_info:
+                    task_info['cancel_event'].set()
+                    if task_info.get('scanner'):
+                        task_info['scanner'].cancel()
             
-            # 从运行队列中移除
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
+            # 更新任务状态
+            updated = ScanTask.objects.filter(id=task_id, status__in=['pending', 'running']).update(
+                status='cancelled',
+                completed_at=timezone.now()
+            )
             
-            logger.info(f"任务 {task_id} 已停止")
-            return True
+            if task_info or updated:
+                logger.info(f"任务 {task_id} 已停止")
+                return True
+            return False
             
         except Exception as e:
             logger.error(f"停止任务 {task_id} 失败: {e}")
@@ -303,18 +486,34 @@ class PythonScanTaskManager:
     
     def get_task_status(self, task_id):
         """获取任务状态"""
-        if task_id in self.running_tasks:
-            task_info = self.running_tasks[task_id]
-            return {
-                'status': 'running',
+        task_info = self.running_tasks.get(str(task_id))
+        if task_info:
+            status = {
+                'status': 'cancelling' if task_info['cancel_event'].is_set() else 'running',
                 'start_time': task_info['start_time'],
                 'duration': (timezone.now() - task_info['start_time']).total_seconds()
             }
+            writer = task_info.get('writer')
+            if writer:
+                status.update({
+                    'saved_results': writer.written,
+                    'saved_online': writer.online_written,
+                    'pending_results': writer.pending
+                })
+            return status
         return None
     
     def get_running_tasks(self):
         """获取所有运行中的任务"""
         return list(self.running_tasks.keys())
+    
+    def get_queue_status(self):
+        """获取调度器状态：工作槽位、运行中和等待中的任务数"""
+        return {
+            'max_workers': self.max_workers,
+            'running': len(self.running_tasks),
+            'pending': self._queue_queryset().filter(status='pending').count()
+        }
 
 
 # 全局任务管理器实例
@@ -1,3 +1,1280 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .icmp_engine import (
+    ICMPEngine, icmp_checksum, build_echo_request, parse_echo_reply,
+    ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY,
+)
+from .ip_ranges import IPRangeSet, IPRangeError
+from .port_scheduler import PortScanScheduler, adaptive_timeout
+from .ip_scanner import (
+    NetworkScanner, AsyncNetworkScanner, ProcessPoolNetworkScanner, create_scanner, ScanResult as ScannerResult,
+)
+from .models import IPRecord, ScanTask, ScanResult, ip_records_changed
+from .progress import ProgressReporter, get_live_progress
+from .record_sync import IPRecordUpserter, ScanResultWriter
+from .batch_ping import BatchPingJob, batch_ping_manager
+from .discovery_jobs import DiscoveryJob, DiscoveryJobManager
+from .liveness import LivenessMonitor
+from .jobs import IncrementalJob, JobManager
+from .monitoring_onboard import MonitoringOnboardJob, monitoring_onboard_manager
+from .subnets import (
+    SubnetError, allocate_addresses, get_ip_statistics, get_subnet_summary, invalidate_subnet_summaries
+)
+from .scan_benchmark import FakeNetwork, percentile, run_scan_benchmark
+from .tasks import STALE_AFTER, PythonScanTaskManager
+from ops_assets_backend.zabbix_api import zabbix_auto_discovery
+from ops_assets_backend.zabbix_catalog import ZabbixCatalog
+from ops_assets_backend.zabbix_client import ZabbixAPIError, ZabbixClient, ZabbixConnectionError
+from ops_assets_backend.zabbix_fake import FakeZabbixServer
+
+
+class ICMPPacketTests(TestCase):
+    """ICMP报文构造与解析"""
+
+    def test_checksum_of_packet_is_zero(self):
+        packet = build_echo_request(0x1234, 7, 123456789)
+        self.assertEqual(icmp_checksum(packet), 0)
+
+    def test_parse_reply_roundtrip(self):
+        packet = bytearray(build_echo_request(0x1234, 7, 123456789))
+        packet[0] = ICMP_ECHO_REPLY
+        self.assertEqual(parse_echo_reply(bytes(packet), has_ip_header=False), (0x1234, 7, 123456789))
+
+        # 原始套接字收到的报文带IPv4头
+        ip_header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(packet), 0, 0, 64, 1, 0,
+                                b'\x7f\x00\x00\x01', b'\x7f\x00\x00\x01')
+        self.assertEqual(parse_echo_reply(ip_header + bytes(packet), has_ip_header=True), (0x1234, 7, 123456789))
+
+    def test_parse_ignores_requests_and_foreign_payloads(self):
+        packet = build_echo_request(1, 1, 1)
+        self.assertEqual(packet[0], ICMP_ECHO_REQUEST)
+        self.assertIsNone(parse_echo_reply(packet, has_ip_header=False))
+        self.assertIsNone(parse_echo_reply(b'\x00\x00\x00\x00\x00\x01\x00\x01garbage', has_ip_header=False))
+
+
+class ICMPEngineTests(TestCase):
+    """ICMP引擎回环探测（环境不允许ICMP套接字时跳过）"""
+
+    def setUp(self):
+        self.engine = ICMPEngine()
+        if not self.engine.is_available(4):
+            self.engine.close()
+            raise unittest.SkipTest('当前环境无法创建ICMP套接字')
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_ping_loopback(self):
+        alive, rtt = self.engine.ping('127.0.0.1', timeout=1.0)
+        self.assertTrue(alive)
+        self.assertIsNotNone(rtt)
+        self.assertEqual(self.engine.in_flight(), 0)
+
+    def test_scanner_uses_engine(self):
+        scanner = NetworkScanner(ping_timeout=1.0)
+        scanner.icmp_engine = self.engine
+        alive, rtt = scanner.ping_host('127.0.0.1')
+        self.assertTrue(alive)
+
+
+class AsyncNetworkScannerTests(TestCase):
+    """原生asyncio扫描器"""
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.open_port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_scan_network_reports_open_ports(self):
+        scanner = create_scanner(async_mode=True, max_concurrent=4, timeout=1.0, ping_timeout=1.0)
+        self.assertIsInstance(scanner, AsyncNetworkScanner)
+        progress = []
+        scanner.add_progress_callback(lambda data: progress.append(data['current']))
+
+        results = scanner.scan_network(['127.0.0.1'], ports=[self.open_port, 1])
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].status, 'online')
+        self.assertEqual(results[0].open_ports, [self.open_port])
+        self.assertEqual(progress, [1])
+        self.assertEqual(scanner.get_stats()['online'], 1)
+
+    def test_budget_limits_in_flight_probes(self):
+        scanner = AsyncNetworkScanner(max_concurrent=3, timeout=1.0)
+        peak = {'current': 0, 'max': 0}
+
+        async def fake_ping(ip):
+            async with scanner._get_budget():
+                peak['current'] += 1
+                peak['max'] = max(peak['max'], peak['current'])
+                await asyncio.sleep(0.01)
+                peak['current'] -= 1
+            return False, None
+
+        scanner.async_ping = fake_ping
+        results = asyncio.run(scanner.async_scan_network(['10.0.0.1-20'], ping_only=True))
+        self.assertEqual(len(results), 20)
+        self.assertEqual(peak['max'], 3)
+
+
+class IPRangeSetTests(TestCase):
+    """IP范围解析引擎"""
+
+    def test_matches_hosts_semantics(self):
+        self.assertEqual(list(IPRangeSet.parse(['192.168.1.0/30'])), ['192.168.1.1', '192.168.1.2'])
+        self.assertEqual(list(IPRangeSet.parse(['10.0.0.0/31'])), ['10.0.0.0', '10.0.0.1'])
+        self.assertEqual(list(IPRangeSet.parse(['10.0.0.5/32'])), ['10.0.0.5'])
+        self.assertEqual(list(IPRangeSet.parse(['10.0.0.1-3'])), ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+
+    def test_merges_overlapping_ranges(self):
+        range_set = IPRangeSet.parse(['10.0.0.0/24', '10.0.0.100-10.0.1.10', '10.0.0.5', '10.0.1.11'])
+        self.assertEqual(range_set.intervals(), [(4, 167772161, 167772427)])
+        self.assertEqual(len(range_set), 267)
+        self.assertEqual(len(list(range_set)), 267)
+        self.assertIn('10.0.1.11', range_set)
+        self.assertNotIn('10.0.0.0', range_set)
+
+    def test_count_without_expansion(self):
+        self.assertEqual(len(IPRangeSet.parse(['10.0.0.0/8'])), 2 ** 24 - 2)
+
+    def test_ipv6_cap(self):
+        self.assertEqual(len(IPRangeSet.parse(['2001:db8::/120'])), 255)
+        with self.assertRaises(IPRangeError):
+            IPRangeSet.parse(['2001:db8::/64'], strict=True)
+
+        # 宽松模式下只跳过超出上限的范围，之前的范围保留
+        for first in ('2001:db8:ffff::/120', '2001:db8::/120'):
+            range_set = IPRangeSet.parse([first, '2001:db8::/100', '2001:db8:1::1'])
+            self.assertEqual(len(range_set), 256)
+            self.assertEqual(range_set.errors[0][0], '2001:db8::/100')
+            self.assertEqual(len(range_set.errors), 1)
+
+    def test_invalid_ranges(self):
+        with self.assertRaises(IPRangeError):
+            IPRangeSet.parse(['10.0.0.9-10.0.0.1'], strict=True)
+        range_set = IPRangeSet.parse(['bogus', '10.0.0.1'])
+        self.assertEqual(list(range_set), ['10.0.0.1'])
+        self.assertEqual(len(range_set.errors), 1)
+
+    def test_split_into_shards(self):
+        range_set = IPRangeSet.parse(['10.0.0.1-10', '10.0.1.1-3', '2001:db8::1-2001:db8::4'])
+        shards = list(range_set.split(4))
+        self.assertEqual([len(shard) for shard in shards], [4, 4, 4, 4, 1])
+        self.assertEqual([ip for shard in shards for ip in shard], list(range_set))
+
+
+class PortScanSchedulerTests(TestCase):
+    """端口扫描调度器"""
+
+    def setUp(self):
+        self.listeners = []
+        for _ in range(3):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(16)
+            self.listeners.append(listener)
+        self.open_ports = [listener.getsockname()[1] for listener in self.listeners]
+
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.close()
+
+    def test_scan_reports_open_and_closed_ports(self):
+        scheduler = PortScanScheduler(max_sockets=2, per_host_limit=1)
+        try:
+            ports = self.open_ports + [1]
+            results = scheduler.scan('127.0.0.1', ports, timeout=1.0)
+            self.assertEqual(results, {**{port: True for port in self.open_ports}, 1: False})
+            self.assertEqual(scheduler.in_use(), 0)
+        finally:
+            scheduler.close()
+
+    def test_scanner_shares_scheduler_across_hosts(self):
+        scheduler = PortScanScheduler(max_sockets=4)
+        try:
+            scanner = NetworkScanner(max_concurrent=4, timeout=1.0, port_scheduler=scheduler)
+            results = [scanner.scan_ports('127.0.0.1', self.open_ports) for _ in range(4)]
+            for result in results:
+                self.assertTrue(all(result.values()))
+            with scheduler.connection_slot():
+                self.assertEqual(scheduler.in_use(), 1)
+            self.assertEqual(scheduler.in_use(), 0)
+        finally:
+            scheduler.close()
+
+    def test_adaptive_timeout(self):
+        self.assertEqual(adaptive_timeout(None, 3.0), 3.0)
+        self.assertEqual(adaptive_timeout(0.1, 3.0), 0.3)
+        self.assertAlmostEqual(adaptive_timeout(100, 3.0), 0.65)
+        self.assertEqual(adaptive_timeout(5000, 3.0), 3.0)
+
+
+class ScanResultPersistenceTests(TestCase):
+    """扫描结果批量入库"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='scanner', password='x')
+        self.task = ScanTask.objects.create(task_name='t', ip_ranges=['10.0.0.0/29'], check_type=12, created_by=self.user)
+        IPRecord.objects.create(ip_address='10.0.0.1', hostname='keep', description='Python扫描发现 - 旧任务')
+        IPRecord.objects.create(ip_address='10.0.0.2', ping_status='offline')
+
+    def test_save_scan_results_splits_create_update_unchanged(self):
+        results = [
+            ScannerResult(ip_address='10.0.0.1', status='online', hostname='new-name'),
+            ScannerResult(ip_address='10.0.0.2', status='online', hostname='host2'),
+            ScannerResult(ip_address='10.0.0.3', status='online'),
+            ScannerResult(ip_address='10.0.0.4', status='offline'),
+        ]
+        with self.assertNumQueries(12):
+            stats = PythonScanTaskManager()._save_scan_results(self.task, results)
+
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (1, 1, 1))
+        self.assertEqual(ScanResult.objects.filter(scan_task=self.task).count(), 4)
+        self.assertEqual(IPRecord.objects.get(ip_address='10.0.0.1').hostname, 'keep')
+        record = IPRecord.objects.get(ip_address='10.0.0.2')
+        self.assertEqual((record.hostname, record.ping_status), ('host2', 'online'))
+        self.assertEqual(IPRecord.objects.get(ip_address='10.0.0.3').created_by, self.user)
+        self.assertFalse(IPRecord.objects.filter(ip_address='10.0.0.4').exists())
+        self.assertEqual(IPRecord.objects.filter(ping_status='online').count(), 3)
+
+    def test_writer_flushes_micro_batches(self):
+        upserter = PythonScanTaskManager._build_record_upserter(self.task)
+        writer = ScanResultWriter(self.task, upserter, batch_size=2, flush_interval=60)
+        for last_octet in range(5, 10):
+            writer.add(ScannerResult(ip_address=f'10.0.0.{last_octet}', status='online'))
+            # 达到批次大小前结果留在缓冲区，达到后立即可查询
+            self.assertEqual(ScanResult.objects.filter(scan_task=self.task).count(), writer.written)
+        self.assertEqual((writer.written, writer.pending), (4, 1))
+
+        writer.close()
+        self.assertEqual(ScanResult.objects.filter(scan_task=self.task).count(), 5)
+        self.assertEqual(writer.record_stats.created, 5)
+        self.assertEqual(IPRecord.objects.filter(ip_address__startswith='10.0.0.').count(), 7)
+
+    def test_dry_run_does_not_write(self):
+        upserter = IPRecordUpserter(build=lambda ip: {}, merge=lambda record, ip: set(), dry_run=True)
+        stats = upserter.upsert(['10.0.0.1', '10.0.0.9'], key=str)
+        self.assertEqual((stats.created, stats.unchanged), (1, 1))
+        self.assertFalse(IPRecord.objects.filter(ip_address='10.0.0.9').exists())
+
+
+class ProgressReporterTests(TestCase):
+    """扫描进度合并上报"""
+
+    def setUp(self):
+        self.task = ScanTask.objects.create(task_name='t', ip_ranges=['10.0.0.0/24'], check_type=12)
+
+    def test_coalesces_database_writes(self):
+        reporter = ProgressReporter(self.task.id, max_writes_per_second=1.0, cache_interval=0)
+        with self.assertNumQueries(1):
+            for scanned in range(1, 255):
+                reporter.update(scanned, 254, online=scanned // 2)
+
+        live = get_live_progress(self.task.id)
+        self.assertEqual((live['scanned'], live['online'], live['state']), (254, 127, 'running'))
+        self.assertEqual(live['progress'], 90)
+
+        with self.assertNumQueries(1):
+            reporter.finish('failed')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.progress, 90)
+        self.assertEqual(get_live_progress(self.task.id)['state'], 'failed')
+
+    def test_skips_unchanged_progress(self):
+        reporter = ProgressReporter(self.task.id, max_writes_per_second=0)
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                reporter.update(1, 10000)
+            reporter.flush()
+        with self.assertNumQueries(0):
+            reporter.finish('completed', progress=100)
+        self.assertEqual(get_live_progress(self.task.id)['progress'], 100)
+
+
+class ScanTaskQueueTests(TestCase):
+    """扫描任务队列与调度"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.manager = PythonScanTaskManager(max_workers=1)
+
+    def _create_task(self, user, priority=5, status='pending'):
+        return ScanTask.objects.create(
+            task_name='t', ip_ranges=['10.0.0.1'], check_type=12, priority=priority,
+            status=status, created_by=user,
+            result_data={'scan_config': {'scan_engine': 'python', 'ping_timeout': 0.5}}
+        )
+
+    def test_claim_prefers_priority_then_user_fairness(self):
+        first = self._create_task(self.alice)
+        self._create_task(self.alice)
+        urgent = self._create_task(self.alice, priority=9)
+        bob_task = self._create_task(self.bob)
+        # Zabbix自动发现任务不进入Python扫描队列
+        ScanTask.objects.create(task_name='z', ip_ranges=['10.0.0.1'], check_type=12, priority=10)
+
+        task_id, config = self.manager._claim_next_task()
+        self.assertEqual(task_id, str(urgent.id))
+        self.assertEqual(config['ping_timeout'], 0.5)
+        self.assertEqual(ScanTask.objects.get(id=urgent.id).status, 'running')
+
+        # alice 已有运行中的任务，bob 的任务先执行
+        task_id, _ = self.manager._claim_next_task()
+        self.assertEqual(task_id, str(bob_task.id))
+        task_id, _ = self.manager._claim_next_task()
+        self.assertEqual(task_id, str(first.id))
+
+    def test_stop_pending_and_recover_interrupted(self):
+        pending = self._create_task(self.alice)
+        interrupted = self._create_task(self.bob, status='running')
+
+        self.assertTrue(self.manager.stop_task(str(pending.id)))
+        self.assertEqual(ScanTask.objects.get(id=pending.id).status, 'cancelled')
+
+        self.manager._recover_interrupted_tasks()
+        self.assertEqual(ScanTask.objects.get(id=interrupted.id).status, 'pending')
+        self.assertEqual(self.manager._claim_next_task()[0], str(interrupted.id))
+
+    def test_recover_only_tasks_with_stale_heartbeat(self):
+        now = timezone.now()
+        alive = self._create_task(self.alice, status='running')
+        crashed = self._create_task(self.bob, status='running')
+        ScanTask.objects.filter(id=alive.id).update(claimed_by='other:1:a', heartbeat_at=now)
+        ScanTask.objects.filter(id=crashed.id).update(claimed_by='other:2:b', heartbeat_at=now - timedelta(minutes=5))
+
+        # 其他进程仍在执行的任务不会被重复放回队列
+        self.assertEqual(self.manager._recover_interrupted_tasks(), 1)
+        self.assertEqual(ScanTask.objects.get(id=alive.id).status, 'running')
+        self.assertEqual(ScanTask.objects.get(id=crashed.id).status, 'pending')
+
+        task_id, _ = self.manager._claim_next_task()
+        claimed = ScanTask.objects.get(id=task_id)
+        self.assertEqual(claimed.claimed_by, self.manager.worker_id)
+        ScanTask.objects.filter(id=task_id).update(heartbeat_at=now - timedelta(minutes=5))
+        self.assertEqual(self.manager._send_heartbeat(), 1)
+        self.assertGreater(ScanTask.objects.get(id=task_id).heartbeat_at, now - timedelta(seconds=STALE_AFTER))
+        self.assertEqual(self.manager._recover_interrupted_tasks(), 0)
+
+    def test_scan_api_parses_async_mode_flag(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        with mock.patch('ip_management.tasks.task_manager.add_task'):
+            for value, expected in (('false', False), ('true', True), (True, True), ('0', False)):
+                response = client.post('/api/ip-management/scan/', {'ipRanges': ['10.0.0.1'], 'asyncMode': value},
+                                       format='json')
+                task = ScanTask.objects.get(id=response.data['data']['taskId'])
+                self.assertIs(task.result_data['scan_config']['async_mode'], expected)
+
+    def test_stop_running_task_cancels_scanner(self):
+        task = self._create_task(self.alice)
+        task_id, _ = self.manager._claim_next_task()
+        scanner = NetworkScanner(cancel_event=self.manager.running_tasks[task_id]['cancel_event'])
+
+        self.assertTrue(self.manager.stop_task(task_id))
+        self.assertTrue(scanner.cancelled)
+        self.assertEqual(self.manager.get_task_status(task_id)['status'], 'cancelling')
+        self.assertEqual(ScanTask.objects.get(id=task.id).status, 'cancelled')
+
+
+class ScannerCancellationTests(TestCase):
+    """扫描取消"""
+
+    def test_threaded_scanner_stops_dispatching(self):
+        scanner = NetworkScanner(max_concurrent=2)
+        scanner.ping_host = lambda ip: (time.sleep(0.01), (False, None))[1]
+        scanner.add_progress_callback(lambda data: data['current'] >= 3 and scanner.cancel())
+
+        scanner.scan_network(['10.0.0.0/24'], ping_only=True)
+        stats = scanner.get_stats()
+        self.assertTrue(stats['cancelled'])
+        self.assertLess(stats['scanned'], 20)
+
+    def test_async_scanner_cancels_in_flight_probes(self):
+        scanner = AsyncNetworkScanner(max_concurrent=50)
+
+        async def slow_ping(ip):
+            await asyncio.sleep(30)
+            return False, None
+
+        scanner.async_ping = slow_ping
+        threading.Timer(0.2, scanner.cancel).start()
+        started = time.monotonic()
+        scanner.scan_network(['10.0.0.0/24'], ping_only=True)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(scanner.get_stats()['cancelled'])
+
+
+class ProcessPoolScannerTests(TestCase):
+    """多进程扫描"""
+
+    def test_shards_results_and_merges_stats(self):
+        scanner = create_scanner(processes=2, shard_size=8, max_concurrent=8, ping_timeout=0.2)
+        self.assertIsInstance(scanner, ProcessPoolNetworkScanner)
+        progress = []
+        scanner.add_progress_callback(lambda data: progress.append(data['current']))
+
+        results = scanner.scan_network(['127.0.0.1-127.0.0.30'], ping_only=True)
+        stats = scanner.get_stats()
+
+        self.assertEqual([r.ip_address for r in results], [f'127.0.0.{i}' for i in range(1, 31)])
+        self.assertEqual(progress, list(range(1, 31)))
+        self.assertEqual(stats['scanned'], 30)
+        self.assertEqual(stats['online'] + stats['offline'], 30)
+        self.assertEqual(stats['shards'], 4)
+        self.assertEqual(stats['processes'], 2)
+        self.assertEqual(sum(entry['scanned'] for entry in stats['process_stats']), 30)
+        self.assertEqual(sum(entry['online'] for entry in stats['process_stats']), stats['online'])
+        self.assertEqual(sum(entry['shards'] for entry in stats['process_stats']), 4)
+
+
+class ScanBenchmarkTests(TestCase):
+    """扫描器基准测试"""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_benchmark_on_fake_network(self):
+        with FakeNetwork(24, online_ratio=0.5, open_port_ratio=1.0, drop_rate=0.2) as network:
+            online = [ip for ip in network.online if not network._dropped(ip)]
+            for engine in ('threaded', 'async'):
+                result = run_scan_benchmark(network, engine=engine, mode='comprehensive',
+                                            concurrency=8, ping_timeout=0.05)
+                self.assertEqual(result.hosts, 24)
+                self.assertEqual(result.online, len(online))
+                self.assertEqual(result.open_ports, len(online) * len(network.open_ports))
+                self.assertGreater(result.hosts_per_sec, 0)
+                self.assertLessEqual(result.p50_ms, result.p99_ms)
+                self.assertGreater(result.peak_threads, 1)
+
+
+class BatchPingJobTests(TestCase):
+    """批量ping作业"""
+
+    def setUp(self):
+        self.online = IPRecord.objects.create(ip_address='10.9.0.1', hostname='web')
+        self.offline = IPRecord.objects.create(ip_address='10.9.0.2', ping_status='online')
+
+    async def _fake_ping(self, ip):
+        return (True, 1.5) if ip == '10.9.0.1' else (False, None)
+
+    def test_run_streams_results_and_writes_statuses(self):
+        job = BatchPingJob([self.online, self.offline], timeout=1, max_concurrent=4)
+        with mock.patch.object(AsyncNetworkScanner, 'async_ping', lambda scanner, ip: self._fake_ping(ip)):
+            job.run()
+
+        snapshot = job.snapshot()
+        self.assertEqual(snapshot['status'], 'completed')
+        self.assertEqual(snapshot['summary']['online'], 1)
+        self.assertEqual(snapshot['nextOffset'], 2)
+        by_ip = {result['ip_address']: result for result in snapshot['results']}
+        self.assertEqual(by_ip['10.9.0.1']['ip_id'], str(self.online.id))
+        self.assertEqual(by_ip['10.9.0.1']['hostname'], 'web')
+        self.assertEqual(job.snapshot(2)['results'], [])
+
+        self.online.refresh_from_db()
+        self.offline.refresh_from_db()
+        self.assertEqual(self.online.ping_status, 'online')
+        self.assertIsNotNone(self.online.last_seen)
+        self.assertEqual(self.offline.ping_status, 'offline')
+
+        lines = async_to_sync(_collect)(job.stream())
+        self.assertIn('"type": "summary"', lines[-1])
+        self.assertEqual(''.join(lines[:-1]).count('\n'), 2)
+
+    def test_cancel_before_scanner_is_created(self):
+        # 排队中取消：作业直接结束
+        queued = BatchPingJob([self.online], timeout=1, max_concurrent=4)
+        queued.cancel()
+        self.assertEqual(queued.status, 'cancelled')
+        queued.run()
+        self.assertEqual((queued.status, queued.results), ('cancelled', []))
+
+        # 已开始但还没有创建扫描器时取消：扫描器共用取消事件，不派发任何ping
+        job = BatchPingJob([self.online, self.offline], timeout=1, max_concurrent=4)
+        job._start()
+        job.cancel()
+        with mock.patch.object(AsyncNetworkScanner, 'async_ping') as ping:
+            job.run()
+        ping.assert_not_called()
+        self.assertEqual((job.status, job.results), ('cancelled', []))
+        self.assertEqual(IPRecord.objects.get(pk=self.offline.pk).ping_status, 'online')
+
+    def test_cancel_endpoint_reports_real_status(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(
+            username='pinger', email='pinger@example.com', password='x'))
+        url = '/api/ip-management/records/batch-ping/{}/cancel/'
+
+        queued = BatchPingJob([self.online], timeout=1, max_concurrent=4)
+        running = BatchPingJob([self.online], timeout=1, max_concurrent=4)
+        running._start()
+        for job in (queued, running):
+            batch_ping_manager._jobs[job.id] = job
+        try:
+            response = client.post(url.format(queued.id))
+            self.assertEqual((response.data['data']['status'], response.data['message']),
+                             ('cancelled', '批量ping作业已停止'))
+            response = client.post(url.format(running.id))
+            self.assertEqual(response.data['data']['status'], 'running')
+            self.assertTrue(response.data['message'].startswith('正在停止'))
+            self.assertTrue(running.cancelled)
+        finally:
+            for job in (queued, running):
+                batch_ping_manager._jobs.pop(job.id, None)
+
+
+async def _collect(iterator):
+    return [chunk async for chunk in iterator]
+
+
+class _ManualJob(IncrementalJob):
+    """由测试手动追加结果的作业，run() 阻塞到 release 置位"""
+
+    def __init__(self, total):
+        super().__init__(total)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def run(self):
+        if not self._start():
+            return
+        self.started.set()
+        self.release.wait(5)
+        self._finish('cancelled' if self.cancelled else 'completed')
+
+    def summary(self):
+        return {'done': len(self.results)}
+
+
+class JobManagerTests(TestCase):
+    """作业管理器：固定数量的工作线程，排队中的作业可取消"""
+
+    def test_jobs_queue_behind_bounded_workers(self):
+        manager = JobManager('test-jobs', max_workers=1)
+        first, second, third = _ManualJob(1), _ManualJob(1), _ManualJob(1)
+        for job in (first, second, third):
+            manager.start(job)
+        self.assertTrue(first.started.wait(5))
+        self.assertEqual((first.status, second.status, third.status), ('running', 'pending', 'pending'))
+
+        second.cancel()
+        self.assertEqual(second.status, 'cancelled')
+        first.release.set()
+        self.assertTrue(third.started.wait(5))
+        third.release.set()
+        manager._executor.shutdown(wait=True)
+        self.assertEqual((first.status, second.status, third.status), ('completed', 'cancelled', 'completed'))
+        self.assertFalse(second.started.is_set())
+
+    def test_job_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            IncrementalJob(1)
+
+
+class JobStreamASGITests(TestCase):
+    """ASGI下NDJSON流在作业结束前逐块发送"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='streamer', email='streamer@example.com', password='x')
+        self.token = Token.objects.create(user=user)
+        # 与测试客户端一样，避免请求信号关闭测试事务所在的数据库连接
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+
+    def tearDown(self):
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+
+    async def _request(self, path):
+        """通过 ASGIHandler 发起GET请求，返回 (发送的消息队列, 请求任务)"""
+        messages = asyncio.Queue()
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token.key}'.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        task = asyncio.ensure_future(ASGIHandler()(scope, receive, messages.put))
+        return messages, task
+
+    def _assert_streams_before_finish(self, manager, path_template):
+        job = _ManualJob(2)
+        job.status = 'running'
+        job._append({'ip_address': '10.9.0.1'})
+        manager._jobs[job.id] = job
+
+        async def scenario():
+            messages, task = await self._request(path_template.format(job.id))
+            try:
+                start = await asyncio.wait_for(messages.get(), timeout=5)
+                self.assertEqual(start['status'], 200)
+                first = await asyncio.wait_for(messages.get(), timeout=5)
+                # 第一块在作业结束前到达
+                self.assertIn(b'10.9.0.1', first['body'])
+                self.assertTrue(first.get('more_body'))
+                self.assertFalse(job.finished)
+
+                job._append({'ip_address': '10.9.0.2'})
+                second = await asyncio.wait_for(messages.get(), timeout=5)
+                self.assertIn(b'10.9.0.2', second['body'])
+
+                job._finish('completed')
+                body = b''
+                while True:
+                    message = await asyncio.wait_for(messages.get(), timeout=5)
+                    body += message.get('body', b'')
+                    if not message.get('more_body'):
+                        break
+                self.assertIn(b'"type": "summary"', body)
+                await asyncio.wait_for(task, timeout=5)
+            finally:
+                task.cancel()
+
+        async_to_sync(scenario)()
+
+    def test_batch_ping_stream(self):
+        self._assert_streams_before_finish(batch_ping_manager, '/api/ip-management/records/batch-ping/{}/stream/')
+
+    def test_batch_create_monitoring_stream(self):
+        self._assert_streams_before_finish(monitoring_onboard_manager,
+                                           '/api/ip-management/records/batch-create-monitoring/{}/stream/')
+
+
+class LivenessMonitorTests(TestCase):
+    """IP存活监控"""
+
+    def setUp(self):
+        self.up = IPRecord.objects.create(ip_address='10.8.0.1', monitoring_enabled=True)
+        self.down = IPRecord.objects.create(ip_address='10.8.0.2', monitoring_enabled=True, ping_status='online')
+        IPRecord.objects.create(ip_address='10.8.0.3', monitoring_enabled=False)
+        self.monitor = LivenessMonitor(interval=60, jitter=0.1, failure_threshold=2, retry_delay=5)
+        self.monitor._sync_targets(self.monitor._load_targets(), now=0.0)
+
+    def test_initial_probes_spread_over_interval(self):
+        self.assertEqual(set(self.monitor._targets), {'10.8.0.1', '10.8.0.2'})
+        for target in self.monitor._targets.values():
+            self.assertTrue(0 <= target.next_probe <= 60)
+        self.assertIsNone(self.monitor._pop_due(-1))
+
+    def test_only_transitions_are_written(self):
+        up = self.monitor._targets['10.8.0.1']
+        down = self.monitor._targets['10.8.0.2']
+
+        self.assertIsNotNone(self.monitor._apply_result(up, True, now=1.0))
+        self.assertIsNone(self.monitor._apply_result(up, True, now=60.0))
+        # 在线主机第一次失败只安排重试，连续失败才判为离线
+        self.assertIsNone(self.monitor._apply_result(down, False, now=1.0))
+        self.assertEqual(down.next_probe, 6.0)
+        self.assertEqual(self.monitor._apply_result(down, False, now=6.0)['status'], 'offline')
+        self.assertTrue(54 <= up.next_probe - 60 <= 66)
+
+        went_online, went_offline, seen, events = self.monitor._take_pending()
+        self.assertEqual(len(events), 2)
+        with self.assertNumQueries(4):
+            self.monitor._write_changes(went_online, went_offline, seen)
+
+        self.up.refresh_from_db()
+        self.down.refresh_from_db()
+        self.assertEqual(self.up.ping_status, 'online')
+        self.assertIsNotNone(self.up.last_seen)
+        self.assertEqual(self.down.ping_status, 'offline')
+        self.assertEqual(self.monitor._take_pending()[3], [])
+
+    def test_disabled_records_leave_the_schedule(self):
+        IPRecord.objects.filter(pk=self.down.pk).update(monitoring_enabled=False)
+        self.monitor._sync_targets(self.monitor._load_targets(), now=0.0)
+        self.assertEqual(set(self.monitor._targets), {'10.8.0.1'})
+        due = [self.monitor._pop_due(1000.0), self.monitor._pop_due(1000.0)]
+        self.assertEqual(due[0].ip, '10.8.0.1')
+        self.assertIsNone(due[1])
+
+
+class IPRecordKeyTests(TestCase):
+    """IP记录的数值排序键和范围查询"""
+
+    def setUp(self):
+        for ip in ('10.0.0.10', '10.0.0.9', '10.0.1.1', '2001:db8::1'):
+            IPRecord.objects.create(ip_address=ip, hostname=f'host-{ip}')
+
+    def ips(self, queryset):
+        return [record.ip_address for record in queryset]
+
+    def test_numeric_order_and_range_queries(self):
+        self.assertEqual(self.ips(IPRecord.objects.all()), ['10.0.0.9', '10.0.0.10', '10.0.1.1', '2001:db8::1'])
+        self.assertEqual(self.ips(IPRecord.objects.in_network('10.0.0.0/24')), ['10.0.0.9', '10.0.0.10'])
+        self.assertEqual(self.ips(IPRecord.objects.in_ranges(['10.0.0.10-10.0.1.1', '2001:db8::/64'])),
+                         ['10.0.0.10', '10.0.1.1', '2001:db8::1'])
+
+    def test_bulk_paths_keep_keys_in_sync(self):
+        IPRecord.objects.bulk_create([IPRecord(ip_address='10.0.0.2')])
+        record = IPRecord.objects.get(ip_address='10.0.0.9')
+        record.ip_address = '10.0.2.1'
+        IPRecord.objects.bulk_update([record], ['ip_address'])
+        self.assertEqual(self.ips(IPRecord.objects.in_network('10.0.0.0/24')), ['10.0.0.2', '10.0.0.10'])
+        self.assertEqual(self.ips(IPRecord.objects.in_network('10.0.2.0/24')), ['10.0.2.1'])
+
+    def test_bulk_update_sends_only_targeted_signal(self):
+        received = []
+
+        def receiver(sender, ips, **kwargs):
+            received.append(ips)
+
+        ip_records_changed.connect(receiver, sender=IPRecord)
+        try:
+            record = IPRecord.objects.get(ip_address='10.0.0.9')
+            record.status = 'active'
+            IPRecord.objects.bulk_update([record], ['status'])
+            IPRecord.objects.filter(ip_address='10.0.0.10').update(status='reserved')
+        finally:
+            ip_records_changed.disconnect(receiver, sender=IPRecord)
+        self.assertEqual(received, [['10.0.0.9'], None])
+
+    def test_list_filters_by_cidr_and_search(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .views import IPRecordViewSet
+
+        def listed(**params):
+            view = IPRecordViewSet()
+            view.request = Request(APIRequestFactory().get('/', params))
+            return self.ips(view.get_queryset())
+
+        self.assertEqual(listed(cidr='10.0.0.0/24'), ['10.0.0.9', '10.0.0.10'])
+        self.assertEqual(listed(range='10.0.0.10-10.0.1.1'), ['10.0.0.10', '10.0.1.1'])
+        self.assertEqual(listed(search='10.0.0.9'), ['10.0.0.9'])
+        self.assertEqual(listed(search='10.0.0.0/24'), ['10.0.0.9', '10.0.0.10'])
+        self.assertEqual(listed(search='db8'), ['2001:db8::1'])
+
+
+class SubnetTests(TestCase):
+    """网段利用率与空闲地址分配"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        IPRecord.objects.create(ip_address='192.168.5.1', status='active', subnet='192.168.5.0/29')
+        IPRecord.objects.create(ip_address='192.168.5.2', status='available')
+        IPRecord.objects.create(ip_address='192.168.5.4', status='reserved')
+
+    def test_summary_counts_and_free_runs(self):
+        summary = get_subnet_summary('192.168.5.0/29')
+        self.assertEqual((summary['size'], summary['used'], summary['reserved'], summary['free']), (6, 1, 1, 4))
+        self.assertEqual(summary['records'], 3)
+        self.assertEqual([(run['start'], run['size']) for run in summary['free_runs']],
+                         [('192.168.5.2', 2), ('192.168.5.5', 2)])
+        with self.assertRaises(SubnetError):
+            get_subnet_summary('not-a-subnet')
+
+    def test_summary_cache_invalidated_on_writes(self):
+        with self.assertNumQueries(1):
+            get_subnet_summary('192.168.5.0/29')
+        with self.assertNumQueries(0):
+            get_subnet_summary('192.168.5.0/29')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IPRecord.objects.create(ip_address='10.1.1.1', status='active')
+        with self.assertNumQueries(0):
+            get_subnet_summary('192.168.5.0/29')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IPRecord.objects.filter(ip_address='192.168.5.2').update(status='active')
+        self.assertEqual(get_subnet_summary('192.168.5.0/29')['used'], 2)
+
+    def test_summary_computed_during_a_write_is_not_served(self):
+        from . import subnets
+
+        compute = subnets.compute_subnet_summary
+
+        def compute_then_write(network):
+            summary = compute(network)
+            # 计算完成、写入缓存之前另一个请求提交了变化并执行了失效
+            IPRecord.objects.filter(ip_address='192.168.5.2').update(status='active')
+            invalidate_subnet_summaries(['192.168.5.2'])
+            return summary
+
+        with mock.patch.object(subnets, 'compute_subnet_summary', side_effect=compute_then_write):
+            self.assertEqual(get_subnet_summary('192.168.5.0/29')['used'], 1)
+        get_subnet_summary('192.168.5.0/24')
+        self.assertEqual(get_subnet_summary('192.168.5.0/29')['used'], 2)
+
+        # 其他网段的缓存不受影响；无法确定地址时全部失效
+        invalidate_subnet_summaries(['10.0.0.1'])
+        with self.assertNumQueries(0):
+            get_subnet_summary('192.168.5.0/24')
+        invalidate_subnet_summaries()
+        with self.assertNumQueries(1):
+            get_subnet_summary('192.168.5.0/24')
+
+    def test_allocate_next_free_addresses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            records = allocate_addresses('192.168.5.0/29', count=3)
+        self.assertEqual([record.ip_address for record in records], ['192.168.5.2', '192.168.5.3', '192.168.5.5'])
+        self.assertTrue(all(record.status == 'reserved' for record in records))
+        self.assertEqual(get_subnet_summary('192.168.5.0/29')['free'], 1)
+        with self.assertRaises(SubnetError):
+            allocate_addresses('192.168.5.0/29', count=2)
+
+    def test_statistics_include_subnet_summaries(self):
+        statistics = get_ip_statistics()
+        self.assertEqual((statistics['total'], statistics['active'], statistics['reserved']), (3, 1, 1))
+        self.assertEqual([summary['network'] for summary in statistics['subnets']], ['192.168.5.0/29'])
+
+
+class ZabbixClientTests(TestCase):
+    """Zabbix JSON-RPC 客户端（本地模拟服务器）"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.add('hostgroup', name='Linux servers')
+
+    def make_client(self, **kwargs):
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix', backoff=0.01, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_lazy_login_and_connection_reuse(self):
+        client = self.make_client()
+        self.assertEqual(self.server.http_requests, 0)
+        for _ in range(5):
+            self.assertEqual(client.hostgroup.get(output=['name'])[0]['name'], 'Linux servers')
+        self.assertEqual(self.server.count('user.login'), 1)
+        self.assertEqual(self.server.count('apiinfo.version'), 1)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_relogin_on_expired_session_and_retry_on_5xx(self):
+        client = self.make_client()
+        client.hostgroup.get({'output': 'extend'})
+        self.server.expire_sessions()
+        self.server.fail_next = 2
+        self.assertEqual(len(client.hostgroup.get({'output': 'extend'})), 1)
+        self.assertEqual(self.server.count('user.login'), 2)
+        self.assertEqual(client.stats['retries'], 2)
+
+    def test_writes_are_not_replayed_after_sending(self):
+        client = self.make_client()
+        client.hostgroup.get({'output': 'extend'})
+        self.server.fail_next = 1
+        with self.assertRaises(ZabbixConnectionError):
+            client.hostgroup.create({'name': 'Web'})
+        self.server.fail_next = 1
+        with self.assertRaises(ZabbixConnectionError):
+            client.batch([('hostgroup.get', {}), ('hostgroup.create', {'name': 'Web'})])
+        self.assertEqual((self.server.count('hostgroup.create'), client.stats['retries']), (0, 0))
+
+        # 建立连接失败时写请求同样重试
+        self.server.stop()
+        unreachable = ZabbixClient('http://127.0.0.1:9/zabbix', api_token='t', max_retries=2, backoff=0.01,
+                                   timeout=1)
+        unreachable._version = '6.0.0'
+        with self.assertRaises(ZabbixConnectionError):
+            unreachable.hostgroup.create({'name': 'Web'})
+        self.assertEqual(unreachable.stats['retries'], 2)
+
+    def test_concurrent_login_reuses_token(self):
+        client = self.make_client()
+        client._version = '6.0.0'
+        tokens = []
+        with client._auth_lock:
+            thread = threading.Thread(target=lambda: tokens.append(client.login()))
+            thread.start()
+            time.sleep(0.05)
+            client._auth = 'from-other-thread'
+        thread.join(5)
+        self.assertEqual(tokens, ['from-other-thread'])
+        self.assertEqual(self.server.count('user.login'), 0)
+
+    def test_batch_requests(self):
+        client = self.make_client()
+        groups, created, error = client.batch([
+            ('hostgroup.get', {'output': 'extend'}),
+            ('hostgroup.create', {'name': 'Web'}),
+            ('nothing.get', {}),
+        ], raise_errors=False)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(created['groupids']), 1)
+        self.assertIsInstance(error, ZabbixAPIError)
+
+        self.server.supports_batch = False
+        self.assertEqual(len(client.batch([('hostgroup.get', {}), ('hostgroup.get', {})])), 2)
+
+    def test_unreachable_server_reports_disconnected_without_raising(self):
+        self.server.stop()
+        client = ZabbixClient('http://127.0.0.1:9/zabbix', user='Admin', password='zabbix',
+                              max_retries=0, timeout=1)
+        discovery = zabbix_auto_discovery(client)
+        self.assertFalse(discovery.connection_status['connected'])
+        self.assertIsNotNone(discovery.get_connection_status()['error'])
+
+
+class ZabbixDiscoveredHostsTests(TestCase):
+    """发现主机的分页读取"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix')
+        self.addCleanup(client.close)
+        self.discovery = zabbix_auto_discovery(client)
+
+    def add_host(self, druleid, ip, status='0'):
+        host = self.server.add('dhost', druleid=druleid, status=status, lastup='0', lastdown='0')
+        self.server.add('dservice', dhostid=host['dhostid'], druleid=druleid, ip=ip, port='22', type='0', dns='')
+        return host
+
+    def test_pages_instead_of_one_call_per_host(self):
+        for index in range(1200):
+            self.add_host('1', f'10.20.{index // 250}.{index % 250 + 1}')
+        self.add_host('2', '10.30.0.1')
+
+        result = self.discovery.get_discovered_hosts(druleid='1')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['count'], 1200)
+        self.assertEqual(result['data'][0]['ip_addresses'], ['10.20.0.1'])
+        self.assertEqual(result['data'][0]['interfaces'][0]['port'], '22')
+        # 1 次取ID + 3 页
+        self.assertEqual(self.server.count('dhost.get'), 4)
+        self.assertEqual(self.server.count('dservice.get'), 0)
+
+    def test_falls_back_to_services_when_dhost_get_is_empty(self):
+        self.server.add('dservice', dhostid='77', druleid='3', ip='10.40.0.1', port='80', type='4')
+        self.server.add('dservice', dhostid='77', druleid='3', ip='10.40.0.1', port='443', type='14')
+        hosts = list(self.discovery.iter_discovered_hosts(druleid='3'))
+        self.assertEqual([host['ip_addresses'] for host in hosts], [['10.40.0.1']])
+        self.assertEqual(self.server.count('dservice.get'), 1)
+
+
+class ZabbixDiscoverySyncTests(TestCase):
+    """Zabbix发现结果批量同步到IPRecord"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix')
+        self.addCleanup(client.close)
+        self.discovery = zabbix_auto_discovery(client)
+        for ip, dns in (('10.50.0.1', 'web01'), ('10.50.0.2', ''), ('10.50.0.3', '')):
+            host = self.server.add('dhost', druleid='9', status='0')
+            self.server.add('dservice', dhostid=host['dhostid'], druleid='9', ip=ip, port='22', type='0', dns=dns)
+        IPRecord.objects.create(ip_address='10.50.0.2', status='available')
+        IPRecord.objects.create(ip_address='10.50.0.3', status='active', is_auto_discovered=True,
+                                zabbix_drule_id='9', description='Zabbix自动发现 - 规则ID: 9')
+        self.task = ScanTask.objects.create(task_name='zbx', ip_ranges=['10.50.0.0/24'], check_type=12,
+                                            zabbix_drule_id='9', status='running')
+
+    def test_dry_run_reports_diff_without_writing(self):
+        result = self.discovery.save_discovered_ips_to_database(druleid='9', task_id=str(self.task.id), dry_run=True)
+        self.assertEqual((result['saved_count'], result['updated_count'], result['skipped_count']), (1, 1, 1))
+        self.assertEqual(result['created_ips'], ['10.50.0.1'])
+        self.assertFalse(IPRecord.objects.filter(ip_address='10.50.0.1').exists())
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'running')
+
+    def test_sync_uses_bulk_writes(self):
+        # 查询数与IP数无关：加载记录、bulk_create、bulk_update、集合UPDATE、扫描结果、任务状态
+        with self.assertNumQueries(11):
+            result = self.discovery.save_discovered_ips_to_database(druleid='9', task_id=str(self.task.id))
+        self.assertEqual((result['saved_count'], result['updated_count'], result['skipped_count']), (1, 1, 1))
+
+        created = IPRecord.objects.get(ip_address='10.50.0.1')
+        self.assertEqual((created.hostname, created.status, created.ping_status), ('web01', 'active', 'online'))
+        self.assertTrue(created.is_auto_discovered)
+        updated = IPRecord.objects.get(ip_address='10.50.0.2')
+        self.assertEqual((updated.status, updated.zabbix_drule_id, updated.ping_status), ('active', '9', 'online'))
+        self.assertEqual(ScanResult.objects.filter(scan_task=self.task).count(), 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'completed')
+
+
+class ZabbixCatalogTests(TestCase):
+    """Zabbix模板 / 主机组目录缓存"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix')
+        self.addCleanup(client.close)
+        self.discovery = zabbix_auto_discovery(client)
+        self.server.add('template', name='Linux by Zabbix agent', description='linux', items='12')
+        self.server.add('template', name='MySQL by Zabbix agent', description='mysql', items='40')
+        self.server.add('template', name='Nginx by HTTP', description='nginx')
+        self.server.add('hostgroup', name='Templates', hosts='0')
+        self.server.add('hostgroup', name='Linux servers', hosts='3')
+
+    def catalog(self):
+        return ZabbixCatalog(self.discovery, refresh_interval=3600, max_age=3600)
+
+    def zabbix_calls(self):
+        return len([name for name in self.server.calls if name not in ('apiinfo.version', 'user.login')])
+
+    def test_reads_are_served_from_memory(self):
+        catalog = self.catalog()
+        catalog.refresh()
+        calls = self.zabbix_calls()
+
+        templates = catalog.templates()
+        self.assertEqual([t['name'] for t in templates],
+                         ['Linux by Zabbix agent', 'MySQL by Zabbix agent', 'Nginx by HTTP'])
+        self.assertEqual((templates[1]['items_count'], templates[1]['icon'], templates[1]['category']),
+                         (40, 'database', '🗄 数据库'))
+        self.assertEqual([t['name'] for t in catalog.templates('zabbix AGENT mysql')], ['MySQL by Zabbix agent'])
+        self.assertEqual([t['name'] for t in catalog.templates(category='🌐 Web服务器')], ['Nginx by HTTP'])
+        self.assertEqual(catalog.default_group_ids(), [self.server.objects['hostgroup'][1]['groupid']])
+        self.assertEqual(self.zabbix_calls(), calls)
+
+    def test_persists_templates_and_cold_start_uses_database(self):
+        from assets.models import ZabbixTemplate
+
+        ZabbixTemplate.objects.create(templateid='1', name='Removed template')
+        self.catalog().refresh()
+        self.assertEqual(ZabbixTemplate.objects.count(), 3)
+        ZabbixTemplate.objects.filter(name='Nginx by HTTP').update(description='Nginx 监控')
+
+        calls = self.zabbix_calls()
+        templates = self.catalog().templates('nginx')
+        self.assertEqual(self.zabbix_calls(), calls)
+        self.assertEqual(templates[0]['description'], 'Nginx 监控')
+
+    def test_refresh_checks_fingerprint_before_refetching(self):
+        from assets.models import ZabbixTemplate
+
+        catalog = self.catalog()
+        catalog.refresh()
+        http_requests = self.server.http_requests
+        self.assertFalse(catalog.refresh()['changed'])
+        self.assertEqual(self.server.http_requests, http_requests + 1)
+        self.assertEqual(self.server.count('template.get'), 3 + 2)
+
+        ZabbixTemplate.objects.filter(name='Nginx by HTTP').update(description='Nginx 监控')
+        self.server.add('template', name='Redis by Zabbix agent 2')
+        result = catalog.refresh()
+        self.assertTrue(result['changed'])
+        self.assertEqual((result['created'], result['templates']), (1, 4))
+        self.assertEqual(len(catalog.templates('redis')), 1)
+        # 已有模板保留表中（翻译后）的描述
+        self.assertEqual(catalog.templates('nginx')[0]['description'], 'Nginx 监控')
+
+    def test_unreachable_zabbix_returns_empty_catalog(self):
+        self.server.stop()
+        catalog = self.catalog()
+        self.assertEqual(catalog.templates(), [])
+        self.assertEqual(catalog.stats['errors'], 1)
+
+
+class DiscoveryJobTests(TestCase):
+    """Zabbix发现作业：触发、退避轮询、同步"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix')
+        self.addCleanup(client.close)
+        discovery = zabbix_auto_discovery(client)
+        self.rule = self.server.add('drule', name='office', status='0', delay='1h')
+        self.hosts = []
+        for ip in ('10.60.0.1', '10.60.0.2'):
+            host = self.server.add('dhost', druleid=self.rule['druleid'], status='0', lastup='0', lastdown='0')
+            self.server.add('dservice', dhostid=host['dhostid'], druleid=self.rule['druleid'], ip=ip, port='22',
+                            type='0', dns='')
+            self.hosts.append(host)
+        self.task = ScanTask.objects.create(task_name='zbx', ip_ranges=['10.60.0.0/24'], check_type=12,
+                                            zabbix_drule_id=self.rule['druleid'], status='running')
+
+        self.delays = []
+        self.manager = DiscoveryJobManager(lambda: discovery, poll_initial=1, poll_factor=2, poll_max=3,
+                                           settle_polls=2, quiet_period=3600, max_wait=3600)
+        self.manager._schedule = lambda job, delay: self.delays.append(delay)
+
+    def job(self, **kwargs):
+        job = DiscoveryJob(self.rule['druleid'], task_id=str(self.task.id), **kwargs)
+        self.manager._jobs[job.id] = job
+        return job
+
+    def test_polls_with_backoff_until_discovery_settles(self):
+        job = self.job()
+        with mock.patch('time.sleep'):
+            self.manager._step(job)
+        self.assertEqual((job.status, self.delays), ('polling', [1]))
+        self.assertEqual(self.server.count('drule.update'), 2)
+
+        self.hosts[0]['lastup'] = str(int(time.time()) + 5)
+        for _ in range(2):
+            requests = self.server.http_requests
+            self.manager._step(job)
+            # 每次轮询只有一个批量请求
+            self.assertEqual(self.server.http_requests - requests, 1)
+        self.manager._step(job)
+        # 活动变化后间隔重置，之后按倍数退避，稳定两次后同步
+        self.assertEqual(self.delays, [1, 1, 2])
+        self.assertEqual((job.status, job.polls, job.timed_out), ('completed', 3, False))
+        self.assertEqual(job.result['saved_count'], 2)
+        self.assertEqual(IPRecord.objects.filter(ip_address__startswith='10.60.0.').count(), 2)
+
+    def test_waits_for_new_activity_then_times_out(self):
+        job = self.job()
+        with mock.patch('time.sleep'):
+            self.manager._step(job)
+        for _ in range(3):
+            self.manager._step(job)
+        # 发现结果稳定但触发后没有新的活动，继续等待
+        self.assertEqual((job.status, self.delays), ('polling', [1, 1, 2, 3]))
+
+        self.manager.max_wait = 0
+        job.deadline = 0
+        self.manager._step(job)
+        self.assertEqual((job.status, job.timed_out), ('completed', True))
+
+    def test_sync_only_job_skips_polling(self):
+        job = self.job(rediscover=False, dry_run=True)
+        self.manager._step(job)
+        self.assertEqual((job.status, job.polls, self.delays), ('completed', 0, []))
+        self.assertEqual(job.result['created_ips'], ['10.60.0.1', '10.60.0.2'])
+        self.assertEqual(self.server.count('drule.update'), 0)
+
+    def test_missing_rule_fails_job(self):
+        job = DiscoveryJob('999')
+        self.manager._step(job)
+        self.assertEqual(job.status, 'failed')
+
+    def test_cancel_during_running_step_finishes_once(self):
+        started, release = threading.Event(), threading.Event()
+        discovery = mock.Mock()
+
+        def trigger(druleid):
+            started.set()
+            release.wait(5)
+            return {'success': True}
+
+        discovery.force_discovery_rule_execution.side_effect = trigger
+        manager = DiscoveryJobManager(lambda: discovery, poll_initial=3600, max_wait=3600)
+        with mock.patch.object(DiscoveryJobManager, '_publish') as publish:
+            job = manager.submit(self.rule['druleid'])
+            self.assertTrue(started.wait(5))
+            self.assertTrue(manager.cancel(job.id))
+            # 步骤仍在执行，取消不会再安排一次步骤
+            with manager._cond:
+                self.assertEqual(manager._heap, [])
+            release.set()
+
+            self.assertEqual(manager.wait(job.id, timeout=5).status, 'cancelled')
+            # 事件在释放锁之后推送
+            deadline = time.monotonic() + 5
+            while not publish.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            manager._finish(job, 'failed', 'late')
+        self.assertEqual((job.status, job.error), ('cancelled', None))
+        self.assertFalse(manager.cancel(job.id))
+        publish.assert_called_once_with(job)
+        discovery.force_discovery_rule_execution.assert_called_once()
+
+
+class MonitoringOnboardTests(TestCase):
+    """批量创建Zabbix监控主机"""
+
+    def setUp(self):
+        self.server = FakeZabbixServer().start()
+        self.addCleanup(self.server.stop)
+        client = ZabbixClient(self.server.url, user='Admin', password='zabbix')
+        self.addCleanup(client.close)
+        self.discovery = zabbix_auto_discovery(client)
+        self.group = self.server.add('hostgroup', name='Linux servers')
+        self.server.add('host', host='10.70.0.2')
+        self.records = [IPRecord.objects.create(ip_address=f'10.70.0.{i}') for i in range(1, 6)]
+
+    def run_job(self, records, **kwargs):
+        job = MonitoringOnboardJob(records, ['10001'], discovery_factory=lambda: self.discovery,
+                                   rate_limit=1000, **kwargs)
+        job.run()
+        return job
+
+    def test_checks_existence_once_and_creates_in_chunks(self):
+        IPRecord.objects.filter(pk=self.records[4].pk).update(hostname='10.70.0.4')
+        records = list(IPRecord.objects.filter(pk__in=[r.pk for r in self.records]))
+        job = self.run_job(records, chunk_size=2, max_concurrent=2)
+
+        summary = job.snapshot()['summary']
+        self.assertEqual((job.status, summary['created'], summary['exists'], summary['skipped']),
+                         ('completed', 3, 1, 1))
+        self.assertEqual(self.server.count('host.get'), 1)
+        self.assertEqual(self.server.count('hostgroup.get'), 1)
+        self.assertEqual(self.server.count('host.create'), 2)
+        created = [host for host in self.server.objects['host'] if host['host'] != '10.70.0.2']
+        self.assertEqual(created[0]['groups'], [{'groupid': self.group['groupid']}])
+        self.assertEqual(IPRecord.objects.filter(monitoring_enabled=True).count(), 4)
+
+    def test_failed_chunk_falls_back_to_single_creates(self):
+        IPRecord.objects.filter(pk=self.records[0].pk).update(hostname='web/01')
+        records = list(IPRecord.objects.filter(pk__in=[r.pk for r in self.records]))
+        job = self.run_job(records, chunk_size=10, group_ids=[self.group['groupid']])
+
+        by_ip = {result['ip_address']: result for result in job.results}
+        self.assertEqual(by_ip['10.70.0.1']['status'], 'failed')
+        self.assertEqual([by_ip[f'10.70.0.{i}']['status'] for i in (3, 4, 5)], ['created'] * 3)
+        self.assertEqual(self.server.count('hostgroup.get'), 0)
+        self.assertEqual(self.server.count('host.create'), 1 + 4)
+        self.assertFalse(IPRecord.objects.get(ip_address='10.70.0.1').monitoring_enabled)
+
+        # 检查之后被其他人创建的主机（already exists），以及已提交但响应丢失的块，都按 exists 报告
+        client = self.discovery.zapi
+        call = client.call
+        dropped = []
+
+        def racing_call(method, params=None):
+            if method == 'host.create' and isinstance(params, list) and len(params) == 2 and not dropped:
+                self.server.add('host', host='10.71.0.2')
+            result = call(method, params)
+            if method == 'host.create' and params[0]['host'] == '10.71.0.3' and not dropped:
+                dropped.append(result)
+                raise ZabbixConnectionError('Zabbix写请求发出后失败，未重试: timed out')
+            return result
+
+        raced = [IPRecord.objects.create(ip_address=f'10.71.0.{i}') for i in (1, 2)]
+        committed = [IPRecord.objects.create(ip_address=f'10.71.0.{i}') for i in (3, 4)]
+        with mock.patch.object(client, 'call', side_effect=racing_call):
+            raced_job = self.run_job(raced, chunk_size=10, group_ids=[self.group['groupid']])
+            committed_job = self.run_job(committed, chunk_size=10, group_ids=[self.group['groupid']])
+
+        by_ip = {result['ip_address']: result for job in (raced_job, committed_job) for result in job.results}
+        self.assertEqual([by_ip[f'10.71.0.{i}']['status'] for i in (1, 2, 3, 4)],
+                         ['created', 'exists', 'exists', 'exists'])
+        self.assertEqual([by_ip[f'10.71.0.{i}']['hostid'] for i in (3, 4)], dropped[0]['hostids'])
+        self.assertEqual(IPRecord.objects.filter(ip_address__startswith='10.71.', monitoring_enabled=True).count(), 4)
 
-# Create your tests here.
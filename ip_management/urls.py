@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import IPRecordViewSet, ScanTaskViewSet, ScanAPIView, ZabbixManagementAPIView
+from .views import IPRecordViewSet, ScanTaskViewSet, ScanAPIView, ZabbixManagementAPIView, ZabbixDiscoveryJobAPIView
 
 # 创建路由器
 router = DefaultRouter()
@@ -49,4 +49,9 @@ urlpatterns = [
     path('zabbix/management/', 
          ZabbixManagementAPIView.as_view(), 
          name='zabbix-management'),
+    
+    # Zabbix发现作业状态 / 取消
+    path('zabbix/discovery-jobs/<uuid:job_id>/', 
+         ZabbixDiscoveryJobAPIView.as_view(), 
+         name='zabbix-discovery-job'),
 ]
\ No newline at end of file
@@ -3,21 +3,26 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import uuid
 import logging
-import subprocess
-import time
-import platform
 import ipaddress
-from concurrent.futures import ThreadPoolExecutor, as_completed
 # 导入Zabbix自动发现模块
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ops_assets_backend'))
 from ops_assets_backend.zabbix_api import zabbix_auto_discovery
 
-from .models import IPRecord, ScanTask, ScanResult
+from .models import IPRecord, ScanTask, ScanResult, network_condition, ranges_condition
+from .ip_ranges import IPRangeSet, IPRangeError
+from .progress import get_live_progress
+from .liveness import liveness_monitor
+from .subnets import SubnetError, allocate_addresses, get_ip_statistics, get_subnet_summary
+from .discovery_jobs import discovery_job_manager
+from .monitoring_onboard import MAX_HOSTS as MAX_ONBOARD_HOSTS, monitoring_onboard_manager
+from .batch_ping import batch_ping_manager, ping_ip, DEFAULT_MAX_CONCURRENT as DEFAULT_PING_CONCURRENCY
 from .serializers import (
     IPRecordSerializer, ScanTaskCreateSerializer, ScanTaskSerializer,
     ScanResultSerializer
@@ -26,6 +31,11 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _flag(value):
+    """请求参数中的布尔开关"""
+    return str(value or '').lower() in ('1', 'true', 'yes')
+
+
 class IPRecordPagination(PageNumberPagination):
     """
     自定义分页类，支持动态page_size参数
@@ -70,16 +80,38 @@ class IPRecordViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """获取查询集，支持筛选"""
-        queryset = IPRecord.objects.all().order_by('ip_address')
+        queryset = IPRecord.objects.order_by_ip()
+        
+        # 网段 / 区间筛选，走 (ip_family, ip_key) 索引范围扫描
+        cidr = self.request.query_params.get('cidr')
+        if cidr:
+            try:
+                queryset = queryset.in_network(cidr)
+            except ValueError:
+                queryset = queryset.none()
+        
+        ip_range = self.request.query_params.get('range')
+        if ip_range:
+            try:
+                queryset = queryset.in_ranges([part for part in ip_range.split(',') if part.strip()])
+            except IPRangeError:
+                queryset = queryset.none()
         
         # 搜索筛选（IP地址或主机名）
-        search = self.request.query_params.get('search')
+        search = (self.request.query_params.get('search') or '').strip()
         if search:
             from django.db.models import Q
-            queryset = queryset.filter(
-                Q(ip_address__icontains=search) | 
-                Q(hostname__icontains=search)
-            )
+            try:
+                # 完整的IP / 网段 / 区间走索引范围查询，其余输入才对IP列做模糊匹配
+                if '/' in search:
+                    ip_condition = network_condition(search)
+                elif '-' in search:
+                    ip_condition = ranges_condition([search])
+                else:
+                    ip_condition = Q(ip_address=ipaddress.ip_address(search).compressed)
+            except ValueError:
+                ip_condition = Q(ip_address__icontains=search)
+            queryset = queryset.filter(ip_condition | Q(hostname__icontains=search))
         
         # 状态筛选
         status_filter = self.request.query_params.get('status')
@@ -398,74 +430,6 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }
     
-    def _ping_single_ip(self, ip_address, timeout=3):
-        """执行单个IP的ping测试"""
-        try:
-            # 验证IP地址格式
-            ipaddress.ip_address(ip_address)
-            
-            # 根据操作系统选择ping命令
-            system = platform.system().lower()
-            if system == "windows":
-                # Windows ping命令
-                cmd = ["ping", "-n", "1", "-w", str(timeout * 1000), ip_address]
-            else:
-                # Linux/Unix ping命令
-                cmd = ["ping", "-c", "1", "-W", str(timeout), ip_address]
-            
-            start_time = time.time()
-            
-            # 执行ping命令
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout + 2  # 给子进程额外的超时时间
-            )
-            
-            end_time = time.time()
-            response_time = int((end_time - start_time) * 1000)  # 转换为毫秒
-            
-            # 判断ping是否成功
-            is_online = result.returncode == 0
-            
-            return {
-                'ip_address': ip_address,
-                'is_online': is_online,
-                'response_time': response_time if is_online else None,
-                'status': 'online' if is_online else 'offline',
-                'message': 'Ping成功' if is_online else 'Ping失败',
-                'raw_output': result.stdout if result.stdout else result.stderr
-            }
-            
-        except ipaddress.AddressValueError:
-            return {
-                'ip_address': ip_address,
-                'is_online': False,
-                'response_time': None,
-                'status': 'offline',
-                'message': '无效的IP地址格式',
-                'raw_output': ''
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                'ip_address': ip_address,
-                'is_online': False,
-                'response_time': None,
-                'status': 'offline',
-                'message': f'Ping超时（{timeout}秒）',
-                'raw_output': ''
-            }
-        except Exception as e:
-            return {
-                'ip_address': ip_address,
-                'is_online': False,
-                'response_time': None,
-                'status': 'offline',
-                'message': f'Ping执行失败: {str(e)}',
-                'raw_output': ''
-            }
-    
     @action(detail=True, methods=['post'], url_path='ping')
     def ping(self, request, pk=None):
         """对单个IP记录执行ping测试"""
@@ -479,14 +443,16 @@ class IPRecordViewSet(viewsets.ModelViewSet):
             
             logger.info(f"开始ping测试 IP: {ip_address}, 超时: {timeout}秒")
             
-            # 执行ping测试
-            ping_result = self._ping_single_ip(ip_address, timeout)
+            # 执行ping测试（与扫描器共用ICMP引擎）
+            ping_result = ping_ip(ip_address, timeout)
             
             # 更新IP记录的ping状态
             ip_record.ping_status = ping_result['status']
+            update_fields = ['ping_status', 'updated_at']
             if ping_result['is_online']:
                 ip_record.last_seen = timezone.now()
-            ip_record.save()
+                update_fields.append('last_seen')
+            ip_record.save(update_fields=update_fields)
             
             logger.info(f"IP {ip_address} ping测试完成: {ping_result['message']}")
             
@@ -515,14 +481,19 @@ class IPRecordViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='batch-ping')
     def batch_ping(self, request):
-        """批量ping测试"""
+        """
+        批量ping测试
+        
+        在后台作业中通过扫描引擎执行，立即返回作业ID；
+        结果通过 batch-ping/{jobId}/ 按偏移量轮询，或通过 batch-ping/{jobId}/stream/ 以NDJSON流式获取
+        """
         try:
             # 获取IP ID列表
             ip_ids = request.data.get('ipIds', [])
             timeout = int(request.data.get('timeout', 3))
             timeout = max(1, min(timeout, 10))  # 限制在1-10秒之间
-            max_workers = int(request.data.get('maxWorkers', 10))  # 最大并发数
-            max_workers = max(1, min(max_workers, 20))  # 限制在1-20之间
+            max_concurrent = int(request.data.get('maxConcurrent', DEFAULT_PING_CONCURRENCY))  # 同时在途的ping数
+            max_concurrent = max(1, min(max_concurrent, 1000))  # 限制在1-1000之间
             
             if not ip_ids:
                 return Response({
@@ -532,89 +503,20 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # 获取IP记录
-            ip_records = IPRecord.objects.filter(id__in=ip_ids)
-            if not ip_records.exists():
+            ip_records = list(IPRecord.objects.filter(id__in=ip_ids).only('id', 'ip_address', 'hostname'))
+            if not ip_records:
                 return Response({
                     'code': 400,
                     'message': '未找到指定的IP记录',
                     'data': None
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            logger.info(f"开始批量ping测试，IP数量: {len(ip_records)}, 超时: {timeout}秒, 并发数: {max_workers}")
-            
-            # 使用线程池并发执行ping测试
-            ping_results = []
-            updated_records = []
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有ping任务
-                future_to_record = {
-                    executor.submit(self._ping_single_ip, record.ip_address, timeout): record 
-                    for record in ip_records
-                }
-                
-                # 收集结果
-                for future in as_completed(future_to_record):
-                    record = future_to_record[future]
-                    try:
-                        ping_result = future.result()
-                        
-                        # 更新数据库记录
-                        record.ping_status = ping_result['status']
-                        if ping_result['is_online']:
-                            record.last_seen = timezone.now()
-                        updated_records.append(record)
-                        
-                        # 添加到结果列表
-                        ping_results.append({
-                            'ip_id': record.id,
-                            'ip_address': record.ip_address,
-                            'hostname': record.hostname,
-                            'is_online': ping_result['is_online'],
-                            'response_time': ping_result['response_time'],
-                            'status': ping_result['status'],
-                            'message': ping_result['message']
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"处理IP {record.ip_address} ping结果时出错: {str(e)}")
-                        ping_results.append({
-                            'ip_id': record.id,
-                            'ip_address': record.ip_address,
-                            'hostname': record.hostname,
-                            'is_online': False,
-                            'response_time': None,
-                            'status': 'offline',
-                            'message': f'处理结果时出错: {str(e)}'
-                        })
-            
-            # 批量更新数据库
-            if updated_records:
-                IPRecord.objects.bulk_update(
-                    updated_records, 
-                    ['ping_status', 'last_seen'], 
-                    batch_size=100
-                )
-            
-            # 统计结果
-            online_count = sum(1 for result in ping_results if result['is_online'])
-            offline_count = len(ping_results) - online_count
-            
-            logger.info(f"批量ping测试完成，在线: {online_count}, 离线: {offline_count}")
+            job = batch_ping_manager.submit(ip_records, timeout=timeout, max_concurrent=max_concurrent)
             
             return Response({
                 'code': 200,
-                'message': f'批量ping测试完成，共测试 {len(ping_results)} 个IP',
-                'data': {
-                    'results': ping_results,
-                    'summary': {
-                        'total': len(ping_results),
-                        'online': online_count,
-                        'offline': offline_count,
-                        'timeout': timeout,
-                        'test_time': timezone.now().isoformat()
-                    }
-                }
+                'message': f'批量ping测试已提交，共 {job.total} 个IP',
+                'data': job.snapshot()
             })
             
         except Exception as e:
@@ -625,6 +527,72 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 'data': None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def _get_batch_ping_job(self, job_id):
+        job = batch_ping_manager.get(job_id)
+        if job is None:
+            return None, Response({
+                'code': 404,
+                'message': '批量ping作业不存在或已过期',
+                'data': None
+            }, status=status.HTTP_404_NOT_FOUND)
+        return job, None
+    
+    @action(detail=False, methods=['get'], url_path=r'batch-ping/(?P<job_id>[^/.]+)')
+    def batch_ping_status(self, request, job_id=None):
+        """获取批量ping作业状态，offset 之后的新结果随状态一起返回"""
+        job, error_response = self._get_batch_ping_job(job_id)
+        if error_response:
+            return error_response
+        
+        try:
+            offset = int(request.query_params.get('offset', 0))
+        except (TypeError, ValueError):
+            offset = 0
+        
+        return Response({
+            'code': 200,
+            'message': '获取批量ping作业状态成功',
+            'data': job.snapshot(offset)
+        })
+    
+    @action(detail=False, methods=['get'], url_path=r'batch-ping/(?P<job_id>[^/.]+)/stream')
+    def batch_ping_stream(self, request, job_id=None):
+        """以NDJSON流式返回批量ping结果，每完成一个IP输出一行，最后一行为汇总"""
+        job, error_response = self._get_batch_ping_job(job_id)
+        if error_response:
+            return error_response
+        
+        try:
+            offset = int(request.query_params.get('offset', 0))
+        except (TypeError, ValueError):
+            offset = 0
+        
+        # job.stream 是异步生成器，ASGI下每有新结果即发送一块
+        response = StreamingHttpResponse(job.stream(offset), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @action(detail=False, methods=['post'], url_path=r'batch-ping/(?P<job_id>[^/.]+)/cancel')
+    def batch_ping_cancel(self, request, job_id=None):
+        """停止批量ping作业，已完成的结果保留"""
+        job, error_response = self._get_batch_ping_job(job_id)
+        if error_response:
+            return error_response
+        
+        job.cancel()
+        data = job.snapshot(len(job.results))
+        messages = {
+            'cancelled': '批量ping作业已停止',
+            'completed': '批量ping作业已完成，无需停止',
+            'failed': '批量ping作业已失败，无需停止'
+        }
+        return Response({
+            'code': 200,
+            'message': messages.get(data['status'], '正在停止批量ping作业，在途的ping结束后停止'),
+            'data': data
+        })
+    
     @action(detail=False, methods=['delete'], url_path='batch')
     def batch_delete(self, request):
         """批量删除IP记录"""
@@ -724,6 +692,7 @@ class IPRecordViewSet(viewsets.ModelViewSet):
             # 更新监控状态
             ip_record.monitoring_enabled = enabled
             ip_record.save()
+            liveness_monitor.request_refresh()
             
             action_text = '启用' if enabled else '禁用'
             logger.info(f"IP {ip_record.ip_address} 监控状态已{action_text}")
@@ -748,43 +717,22 @@ class IPRecordViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'], url_path='zabbix-templates')
     def get_zabbix_templates(self, request, pk=None):
-        """获取Zabbix监控模板列表"""
+        """获取Zabbix监控模板列表（读取本地目录缓存，支持 search / category 过滤）"""
         try:
-            search_name = request.query_params.get('search', '')
+            from ops_assets_backend.zabbix_catalog import zabbix_catalog
             
-            # 直接从数据库获取模板数据
-            from assets.models import ZabbixTemplate
-            
-            # 构建查询
-            if search_name:
-                templates = ZabbixTemplate.objects.filter(name__icontains=search_name)
-            else:
-                templates = ZabbixTemplate.objects.all()
-            
-            # 转换为字典列表
-            template_data = []
-            for template in templates:
-                template_data.append({
-                    'templateid': template.templateid,
-                    'name': template.name,
-                    'description': template.description or '',
-                    'items_count': template.items_count,
-                    'triggers_count': template.triggers_count,
-                    'macros_count': template.macros_count,
-                    'icon': template.icon or 'setting',
-                    'category': template.category or '📝 其他',
-                    'groups': template.groups
-                })
-            
-            # 按名称排序
-            template_data.sort(key=lambda x: x['name'])
+            search_name = request.query_params.get('search', '')
+            category = request.query_params.get('category') or None
+            template_data = zabbix_catalog.templates(search_name, category)
             
             return Response({
                 'code': 200,
                 'message': '获取模板列表成功',
                 'data': {
                     'templates': template_data,
-                    'count': len(template_data)
+                    'count': len(template_data),
+                    'categories': zabbix_catalog.categories(),
+                    'refreshed_at': zabbix_catalog.status()['refreshed_at']
                 }
             })
             
@@ -796,6 +744,30 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 'data': None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['get'], url_path='zabbix-host-groups')
+    def get_zabbix_host_groups(self, request):
+        """获取Zabbix主机组列表（读取本地目录缓存，支持 search 过滤）"""
+        try:
+            from ops_assets_backend.zabbix_catalog import zabbix_catalog
+            
+            groups = zabbix_catalog.host_groups(request.query_params.get('search', ''))
+            return Response({
+                'code': 200,
+                'message': '获取主机组列表成功',
+                'data': {
+                    'groups': groups,
+                    'count': len(groups)
+                }
+            })
+            
+        except Exception as e:
+            logger.error(f"获取Zabbix主机组列表失败: {str(e)}")
+            return Response({
+                'code': 500,
+                'message': f'获取主机组列表失败: {str(e)}',
+                'data': None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
     @action(detail=True, methods=['post'], url_path='create-monitoring')
     def create_monitoring(self, request, pk=None):
         """为IP创建Zabbix监控主机"""
@@ -871,6 +843,113 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 'data': None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['post'], url_path='batch-create-monitoring')
+    def batch_create_monitoring(self, request):
+        """
+        批量为IP创建Zabbix监控主机
+        
+        在后台作业中执行，立即返回作业ID；一次查询检查主机是否已存在，其余主机分块并发创建，
+        结果通过 batch-create-monitoring/{jobId}/ 按偏移量轮询，或通过 .../stream/ 以NDJSON流式获取
+        """
+        try:
+            ip_ids = request.data.get('ipIds', [])
+            template_ids = request.data.get('template_ids', [])
+            group_ids = request.data.get('group_ids', [])
+            chunk_size = max(1, min(int(request.data.get('chunkSize', 50)), 500))  # 每次 host.create 的主机数
+            max_concurrent = max(1, min(int(request.data.get('maxConcurrent', 4)), 16))  # 同时在途的请求数
+            
+            if not ip_ids:
+                return Response({
+                    'code': 400,
+                    'message': '请提供IP ID列表',
+                    'data': None
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if not template_ids:
+                return Response({
+                    'code': 400,
+                    'message': '请选择至少一个监控模板',
+                    'data': None
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if len(ip_ids) > MAX_ONBOARD_HOSTS:
+                return Response({
+                    'code': 400,
+                    'message': f'单次最多为 {MAX_ONBOARD_HOSTS} 个IP创建监控',
+                    'data': None
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            ip_records = list(IPRecord.objects.filter(id__in=ip_ids).only('id', 'ip_address', 'hostname'))
+            if not ip_records:
+                return Response({
+                    'code': 404,
+                    'message': '未找到指定的IP记录',
+                    'data': None
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            job = monitoring_onboard_manager.submit(
+                ip_records, template_ids, group_ids or None,
+                chunk_size=chunk_size, max_concurrent=max_concurrent
+            )
+            
+            return Response({
+                'code': 200,
+                'message': f'批量创建监控主机已提交，共 {job.total} 个IP',
+                'data': job.snapshot()
+            })
+            
+        except Exception as e:
+            logger.error(f"批量创建Zabbix监控主机失败: {str(e)}")
+            return Response({
+                'code': 500,
+                'message': f'批量创建Zabbix监控主机失败: {str(e)}',
+                'data': None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def _get_onboard_job(self, job_id):
+        job = monitoring_onboard_manager.get(job_id)
+        if job is None:
+            return None, Response({
+                'code': 404,
+                'message': '批量创建监控主机作业不存在或已过期',
+                'data': None
+            }, status=status.HTTP_404_NOT_FOUND)
+        return job, None
+    
+    @action(detail=False, methods=['get'], url_path=r'batch-create-monitoring/(?P<job_id>[^/.]+)')
+    def batch_create_monitoring_status(self, request, job_id=None):
+        """获取批量创建监控主机作业状态，offset 之后的新结果随状态一起返回"""
+        job, error_response = self._get_onboard_job(job_id)
+        if error_response:
+            return error_response
+        
+        try:
+            offset = int(request.query_params.get('offset', 0))
+        except (TypeError, ValueError):
+            offset = 0
+        
+        return Response({
+            'code': 200,
+            'message': '获取批量创建监控主机作业状态成功',
+            'data': job.snapshot(offset)
+        })
+    
+    @action(detail=False, methods=['get'], url_path=r'batch-create-monitoring/(?P<job_id>[^/.]+)/stream')
+    def batch_create_monitoring_stream(self, request, job_id=None):
+        """以NDJSON流式返回批量创建结果，每完成一个主机输出一行，最后一行为汇总"""
+        job, error_response = self._get_onboard_job(job_id)
+        if error_response:
+            return error_response
+        
+        try:
+            offset = int(request.query_params.get('offset', 0))
+        except (TypeError, ValueError):
+            offset = 0
+        
+        # job.stream 是异步生成器，ASGI下每有新结果即发送一块
+        response = StreamingHttpResponse(job.stream(offset), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @action(detail=False, methods=['patch'], url_path='batch-monitoring')
     def batch_toggle_monitoring(self, request):
         """批量切换监控状态"""
@@ -897,6 +976,7 @@ class IPRecordViewSet(viewsets.ModelViewSet):
             
             # 批量更新监控状态
             updated_count = ip_records.update(monitoring_enabled=enabled)
+            liveness_monitor.request_refresh()
             
             action_text = '启用' if enabled else '禁用'
             logger.info(f"批量{action_text}监控成功，影响 {updated_count} 个IP")
@@ -918,6 +998,91 @@ class IPRecordViewSet(viewsets.ModelViewSet):
                 'message': f'批量切换监控状态失败: {str(e)}',
                 'data': None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['get'], url_path='liveness-status')
+    def liveness_status(self, request):
+        """获取IP存活监控状态"""
+        return Response({
+            'code': 200,
+            'message': '获取存活监控状态成功',
+            'data': liveness_monitor.get_status()
+        })
+    
+    @action(detail=False, methods=['get'], url_path='statistics')
+    def statistics(self, request):
+        """IP仪表盘统计（状态计数及各网段利用率）"""
+        try:
+            return Response({
+                'code': 200,
+                'message': '获取IP统计成功',
+                'data': get_ip_statistics()
+            })
+        except Exception as e:
+            logger.error(f"获取IP统计失败: {str(e)}")
+            return Response({
+                'code': 500,
+                'message': f'获取IP统计失败: {str(e)}',
+                'data': None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=False, methods=['get'], url_path='subnet-summary')
+    def subnet_summary(self, request):
+        """网段利用率：已用 / 预留 / 空闲地址数及最长空闲地址段"""
+        cidr = request.query_params.get('cidr')
+        if not cidr:
+            return Response({
+                'code': 400,
+                'message': '请提供网段（cidr）',
+                'data': None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response({
+                'code': 200,
+                'message': '获取网段利用率成功',
+                'data': get_subnet_summary(cidr)
+            })
+        except SubnetError as e:
+            return Response({
+                'code': 400,
+                'message': str(e),
+                'data': None
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], url_path='allocate')
+    def allocate(self, request):
+        """分配网段内最靠前的空闲地址"""
+        cidr = request.data.get('cidr')
+        if not cidr:
+            return Response({
+                'code': 400,
+                'message': '请提供网段（cidr）',
+                'data': None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            count = int(request.data.get('count', 1))
+            records = allocate_addresses(
+                cidr,
+                count=count,
+                status=request.data.get('status', 'reserved'),
+                created_by=request.user if request.user.is_authenticated else None,
+                description=request.data.get('description')
+            )
+        except (SubnetError, TypeError, ValueError) as e:
+            return Response({
+                'code': 400,
+                'message': f'分配地址失败: {str(e)}',
+                'data': None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'code': 200,
+            'message': f'成功分配 {len(records)} 个地址',
+            'data': {
+                'cidr': cidr,
+                'ip_addresses': [record.ip_address for record in records],
+                'ip_ids': [str(record.id) for record in records]
+            }
+        })
 
 
 class ScanTaskViewSet(viewsets.ModelViewSet):
@@ -1047,10 +1212,31 @@ class ScanTaskViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def results(self, request, pk=None):
-        """获取任务扫描结果"""
+        """
+        获取任务扫描结果
+        
+        扫描进行中返回已写入的部分结果；支持 status 过滤和 since（ISO时间）增量查询
+        """
         try:
             task = self.get_object()
-            results = task.results.all().order_by('ip_address')
+            results = task.results.all()
+            
+            result_status = request.query_params.get('status')
+            if result_status:
+                results = results.filter(status=result_status)
+            
+            since = request.query_params.get('since')
+            if since:
+                since_time = parse_datetime(since)
+                if since_time is None:
+                    return Response({
+                        'code': 400,
+                        'message': 'since 参数格式错误，应为ISO时间',
+                        'data': None
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                results = results.filter(created_at__gt=since_time)
+            
+            results = results.order_by('ip_address')
             serializer = ScanResultSerializer(results, many=True)
             return Response({
                 'code': 200,
@@ -1080,6 +1266,10 @@ class ScanTaskViewSet(viewsets.ModelViewSet):
             task.completed_at = timezone.now()
             task.save()
             
+            # 通知Python扫描调度器停止正在执行的探测
+            from .tasks import task_manager
+            task_manager.stop_task(str(task.id))
+            
             return Response({
                 'code': 200,
                 'message': '任务已成功取消',
@@ -1218,50 +1408,23 @@ class ScanTaskViewSet(viewsets.ModelViewSet):
                     }
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            logger.info(f"开始同步任务 {task.id} 的Zabbix发现IP，规则ID: {task.zabbix_drule_id}")
-            
-            # ... existing code ...
+            # 同步在后台作业中执行，rediscover 为真时先触发发现规则并等待发现完成
+            dry_run = _flag(request.data.get('dry_run', request.query_params.get('dry_run')))
+            rediscover = _flag(request.data.get('rediscover', request.query_params.get('rediscover')))
+            job = discovery_job_manager.submit(
+                task.zabbix_drule_id,
+                task_id=str(task.id),
+                created_by=request.user,
+                rediscover=rediscover,
+                dry_run=dry_run
+            )
+            logger.info(f"任务 {task.id} 的Zabbix IP同步作业已提交: {job.id}，规则ID: {task.zabbix_drule_id}")
             
-            # 初始化Zabbix发现实例
-            try:
-                zabbix_discovery = zabbix_auto_discovery()
-                
-                # 执行同步操作
-                sync_result = zabbix_discovery.save_discovered_ips_to_database(
-                    druleid=task.zabbix_drule_id,
-                    task_id=str(task.id),
-                    created_by=request.user
-                )
-                
-                logger.info(f"任务 {task.id} Zabbix IP同步结果: {sync_result}")
-                
-                if sync_result.get('success'):
-                    return Response({
-                        'code': 200,
-                        'message': sync_result.get('message', 'IP同步成功'),
-                        'data': {
-                            'task_id': str(task.id),
-                            'saved_count': sync_result.get('saved_count', 0),
-                            'updated_count': sync_result.get('updated_count', 0),
-                            'skipped_count': sync_result.get('skipped_count', 0),
-                            'total_hosts': sync_result.get('total_hosts', 0),
-                            'errors': sync_result.get('errors', [])
-                        }
-                    })
-                else:
-                    return Response({
-                        'code': 500,
-                        'message': sync_result.get('message', 'Zabbix IP同步失败'),
-                        'data': None
-                    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                    
-            except Exception as zabbix_error:
-                logger.error(f"任务 {task.id} Zabbix IP同步失败: {str(zabbix_error)}")
-                return Response({
-                    'code': 500,
-                    'message': f'Zabbix IP同步失败: {str(zabbix_error)}',
-                    'data': None
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                'code': 200,
+                'message': 'Zabbix IP同步作业已启动',
+                'data': job.snapshot()
+            }, status=status.HTTP_202_ACCEPTED)
                 
         except Exception as e:
             logger.error(f"任务IP同步失败: {str(e)}")
@@ -1281,11 +1444,18 @@ class ScanTaskViewSet(viewsets.ModelViewSet):
             from .tasks import task_manager
             runtime_status = task_manager.get_task_status(str(task.id))
             
+            # 实时进度计数来自缓存，数据库中的进度按频率限制写入
+            live_progress = get_live_progress(task.id)
+            progress = task.progress
+            if live_progress and task.status == 'running':
+                progress = max(progress, live_progress.get('progress', 0))
+            
             # 构建响应数据，处理runtime_status为None的情况
             response_data = {
                 'task_id': str(task.id),
                 'status': task.status,
-                'progress': task.progress,
+                'progress': progress,
+                'live_progress': live_progress,
                 'scan_engine': 'python',
                 'error_message': task.error_message,
                 'result_data': task.result_data or {}
@@ -1297,14 +1467,20 @@ class ScanTaskViewSet(viewsets.ModelViewSet):
                     'is_running': True,
                     'runtime_status': runtime_status.get('status', 'unknown'),
                     'start_time': runtime_status.get('start_time').isoformat() if runtime_status.get('start_time') else None,
-                    'duration': runtime_status.get('duration', 0)
+                    'duration': runtime_status.get('duration', 0),
+                    'saved_results': runtime_status.get('saved_results', 0),
+                    'saved_online': runtime_status.get('saved_online', 0),
+                    'pending_results': runtime_status.get('pending_results', 0)
                 })
             else:
                 response_data.update({
                     'is_running': False,
                     'runtime_status': 'not_in_queue',
                     'start_time': None,
-                    'duration': 0
+                    'duration': 0,
+                    'saved_results': task.results.count(),
+                    'saved_online': task.results.filter(status='online').count(),
+                    'pending_results': 0
                 })
             
             return Response({
@@ -1376,6 +1552,15 @@ class ScanAPIView(APIView):
             max_concurrent = request.data.get('maxConcurrent', 100)  # 最大并发数
             timeout = request.data.get('timeout', 3.0)  # 超时时间
             ping_timeout = request.data.get('pingTimeout', 1.0)  # Ping超时时间
+            async_mode = _flag(request.data.get('asyncMode'))  # 是否使用asyncio扫描器
+            try:
+                priority = min(max(int(request.data.get('priority', 5)), 0), 10)  # 优先级 0-10
+            except (TypeError, ValueError):
+                priority = 5
+            try:
+                processes = min(max(int(request.data.get('processes', 0)), 0), os.cpu_count() or 1)  # 多进程扫描的子进程数，0表示单进程
+            except (TypeError, ValueError):
+                processes = 0
             
             # 验证IP范围参数
             if not ip_ranges:
@@ -1390,6 +1575,16 @@ class ScanAPIView(APIView):
                 # 前端可能发送字符串格式，按换行分割
                 ip_ranges = [line.strip() for line in ip_ranges.split('\n') if line.strip()]
             
+            # 校验IP范围并统计地址总数（不展开地址）
+            try:
+                total_ips = len(IPRangeSet.parse(ip_ranges, strict=True))
+            except IPRangeError as e:
+                return Response({
+                    'code': 400,
+                    'message': str(e),
+                    'data': None
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
             logger.info(f"接收到Python扫描任务请求: IP范围={ip_ranges}, 检查类型={check_type}, 端口={ports}")
             
             # 生成任务名称
@@ -1409,6 +1604,7 @@ class ScanAPIView(APIView):
                 ports=ports,
                 key=key,
                 status='pending',
+                priority=priority,
                 created_by=request.user,
                 # 保存扫描配置
                 result_data={
@@ -1416,6 +1612,8 @@ class ScanAPIView(APIView):
                         'max_concurrent': max_concurrent,
                         'timeout': timeout,
                         'ping_timeout': ping_timeout,
+                        'async_mode': async_mode,
+                        'processes': processes,
                         'scan_engine': 'python'
                     }
                 }
@@ -1428,7 +1626,9 @@ class ScanAPIView(APIView):
             scan_config = {
                 'max_concurrent': max_concurrent,
                 'timeout': timeout,
-                'ping_timeout': ping_timeout
+                'ping_timeout': ping_timeout,
+                'async_mode': async_mode,
+                'processes': processes
             }
             task_manager.add_task(str(task.id), scan_config)
             
@@ -1440,7 +1640,10 @@ class ScanAPIView(APIView):
                 'taskName': task_name,
                 'status': 'pending',
                 'scanEngine': 'python',
-                'message': 'Python扫描任务创建成功并开始执行',
+                'message': 'Python扫描任务创建成功，已加入扫描队列',
+                'totalIps': total_ips,
+                'priority': priority,
+                'queue': task_manager.get_queue_status(),
                 'config': {
                     'ip_ranges': ip_ranges,
                     'check_type': check_type,
@@ -1824,7 +2027,25 @@ class ZabbixManagementAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
-        """强制启用所有禁用的Zabbix发现规则"""
+        """
+        强制启用所有禁用的Zabbix发现规则；
+        指定 druleid 时改为在后台触发该规则执行，等待发现完成后同步IP，立即返回作业ID
+        """
+        druleid = request.data.get('druleid')
+        if druleid:
+            job = discovery_job_manager.submit(
+                druleid,
+                task_id=request.data.get('task_id'),
+                created_by=request.user,
+                rediscover=True,
+                dry_run=_flag(request.data.get('dry_run'))
+            )
+            return Response({
+                'code': 200,
+                'message': f'已开始执行发现规则 {druleid}',
+                'data': job.snapshot()
+            }, status=status.HTTP_202_ACCEPTED)
+        
         try:
             # 初始化Zabbix发现实例
             zabbix_discovery = zabbix_auto_discovery()
@@ -1928,3 +2149,37 @@ class ZabbixManagementAPIView(APIView):
                 'message': f'获取Zabbix规则状态失败: {str(e)}',
                 'data': None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ZabbixDiscoveryJobAPIView(APIView):
+    """Zabbix发现作业状态查询与取消"""
+    
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, job_id):
+        job = discovery_job_manager.get(job_id)
+        if job is None:
+            return Response({
+                'code': 404,
+                'message': '发现作业不存在或已过期',
+                'data': None
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'code': 200,
+            'message': '获取发现作业状态成功',
+            'data': job.snapshot()
+        })
+    
+    def delete(self, request, job_id):
+        if not discovery_job_manager.cancel(job_id):
+            return Response({
+                'code': 400,
+                'message': '发现作业不存在或已结束',
+                'data': None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'code': 200,
+            'message': '发现作业已取消',
+            'data': {'jobId': str(job_id)}
+        })
+
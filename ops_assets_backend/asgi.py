@@ -20,8 +20,33 @@ django_asgi_app = get_asgi_application()
 
 # 导入WebSocket路由和认证中间件
 from users import routing as users_routing
+from ip_management import routing as ip_management_routing
 from users.websocket_auth import WebSocketAuthMiddlewareStack
 
+# 启动Python扫描任务调度器，继续执行服务重启前未完成的扫描任务
+from ip_management.tasks import task_manager
+task_manager.start()
+
+# 启动IP存活监控
+from django.conf import settings
+if getattr(settings, 'IP_LIVENESS_ENABLED', False):
+    from ip_management.liveness import liveness_monitor
+    liveness_monitor.start()
+
+# 后台刷新Zabbix模板 / 主机组目录
+if getattr(settings, 'ZABBIX_CATALOG_REFRESH_INTERVAL', 0):
+    from ops_assets_backend.zabbix_catalog import zabbix_catalog
+    zabbix_catalog.start()
+
+# 在线状态登记表：后台批量写回WebSocket通道变化
+from users.presence import presence_registry
+presence_registry.start()
+
+# 后台定期清理用户会话
+if getattr(settings, 'SESSION_CLEANUP_INTERVAL', 0):
+    from users.session_scheduler import session_scheduler
+    session_scheduler.start()
+
 application = ProtocolTypeRouter({
     # Django的HTTP处理程序
     "http": django_asgi_app,
@@ -32,6 +57,8 @@ application = ProtocolTypeRouter({
             URLRouter([
                 # 用户相关的WebSocket路由
                 path("ws/users/", URLRouter(users_routing.websocket_urlpatterns)),
+                # IP管理相关的WebSocket路由
+                path("ws/ip-management/", URLRouter(ip_management_routing.websocket_urlpatterns)),
             ])
         )
     ),
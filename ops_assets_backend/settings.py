@@ -59,7 +59,6 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "users.middleware.SessionCleanupMiddleware",  # 用户会话自动清理
 ]
 
 ROOT_URLCONF = "ops_assets_backend.urls"
@@ -198,7 +197,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',  # 默认需要认证
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # Token认证
+        'users.authentication.HeartbeatTokenAuthentication',  # Token认证（同时记录会话心跳）
         'rest_framework.authentication.SessionAuthentication',  # Session认证
     ],
     'DEFAULT_RENDERER_CLASSES': [
@@ -227,6 +226,38 @@ CHANNEL_LAYERS = {
 #     },
 # }
 
+# Python扫描任务调度：同时执行的扫描任务数，其余任务在队列中等待
+IP_SCAN_MAX_WORKERS = 2
+# 批量ping / 批量创建监控主机：每类作业同时执行的作业数，其余作业以 pending 状态排队
+IP_JOB_MAX_WORKERS = 2
+
+# Zabbix API：客户端在第一次调用时才连接并登录；配置 ZABBIX_API_TOKEN 时使用令牌认证
+ZABBIX_URL = "http://192.168.10.128/zabbix"
+ZABBIX_USER = "Admin"
+ZABBIX_PASSWORD = "zabbix"
+ZABBIX_API_TOKEN = None
+ZABBIX_TIMEOUT = 10
+# Zabbix模板 / 主机组目录缓存：指纹检查间隔和完整列表最长有效期（秒），间隔为0时不启动后台刷新线程
+ZABBIX_CATALOG_REFRESH_INTERVAL = 300
+ZABBIX_CATALOG_MAX_AGE = 3600
+# Zabbix发现作业等待发现完成的最长时间（秒），超时后同步已发现的结果
+ZABBIX_DISCOVERY_MAX_WAIT = 900
+
+# IP存活监控：对启用监控的IP持续探测，状态变化写库并通过WebSocket推送
+IP_LIVENESS_ENABLED = True
+IP_LIVENESS_INTERVAL = 60
+IP_LIVENESS_MAX_CONCURRENT = 500
+
+# 用户会话清理调度：过期会话清理间隔、旧的非活跃会话记录清理间隔（秒）和保留天数，清理间隔为0时不启动调度线程；
+# 多进程部署时通过缓存锁选出一个进程执行，需要各进程共享的缓存（如Redis），也可以只用 run_session_scheduler 命令单独运行
+SESSION_CLEANUP_INTERVAL = 60
+SESSION_PURGE_INTERVAL = 86400
+SESSION_RETENTION_DAYS = 30
+# Token认证缓存有效期（秒），HTTP和WebSocket认证共用；登出、踢出、重置密码、禁用用户时立即失效
+AUTH_TOKEN_CACHE_TTL = 60
+# 在线状态登记表：会话心跳和WebSocket通道变化写回数据库的间隔（秒）
+PRESENCE_FLUSH_INTERVAL = 5
+
 # 日志配置 - 优化版本，减少冗余输出
 LOGGING = {
     'version': 1,
@@ -335,6 +366,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Zabbix API日志，排查问题时可调为DEBUG
+        'ops_assets_backend': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         # WebSocket应用日志
         'websocket': {
             'handlers': ['console', 'file'],
@@ -1,67 +1,196 @@
 #调用zabbix api
-try:
-    from pyzabbix import ZabbixAPI
-except ImportError:
-    try:
-        from zabbix_api import ZabbixAPI
-    except ImportError:
-        # 如果都没有安装，创建一个模拟类
-        class ZabbixAPI:
-            def __init__(self, url):
-                self.url = url
-                print(f"警告: 未找到Zabbix API库，使用模拟模式。URL: {url}")
-            
-            def login(self, user, password):
-                print(f"模拟登录: {user}")
-                return True
+import ipaddress
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from ops_assets_backend.zabbix_client import ZabbixClient, ZabbixConnectionError, get_zabbix_client
+
+# 进程内共享的Zabbix客户端：导入时不访问网络，第一次调用API时才查询版本并登录，
+# Zabbix不可达时不会拖慢Django进程和管理命令的启动
+zapi = get_zabbix_client()
+
+logger = logging.getLogger(__name__)
+
+# 模板名称关键字 -> 图标（按顺序匹配第一个）
+TEMPLATE_ICON_KEYWORDS = {
+    # 操作系统
+    'linux': 'desktop',
+    'windows': 'windows',
+    'ubuntu': 'desktop', 
+    'centos': 'desktop',
+    'debian': 'desktop',
+    'unix': 'desktop',
+    'macos': 'laptop',
+    
+    # 数据库
+    'mysql': 'database',
+    'postgresql': 'database',
+    'mongodb': 'database',
+    'redis': 'database',
+    'oracle': 'database',
+    'mariadb': 'database',
+    'elasticsearch': 'search',
+    
+    # Web服务器
+    'nginx': 'global',
+    'apache': 'global',
+    'tomcat': 'fire',
+    'iis': 'windows',
+    'lighttpd': 'global',
+    
+    # 容器和编排
+    'docker': 'container',
+    'kubernetes': 'cluster',
+    'openshift': 'cluster',
+    'k8s': 'cluster',
+    
+    # 网络设备
+    'cisco': 'router',
+    'huawei': 'router',
+    'juniper': 'router',
+    'switch': 'partition',
+    'router': 'router',
+    'firewall': 'safety',
+    'network': 'wifi',
+    
+    # 虚拟化
+    'vmware': 'cloud',
+    'hyper-v': 'cloud',
+    'kvm': 'cloud',
+    'xen': 'cloud',
+    'virtualbox': 'cloud',
+    
+    # 监控协议
+    'snmp': 'api',
+    'icmp': 'thunderbolt',
+    'tcp': 'link',
+    'udp': 'link',
+    'ssh': 'key',
+    'telnet': 'console-sql',
+    
+    # 应用服务
+    'java': 'coffee',
+    'python': 'code',
+    'node': 'node-index',
+    'php': 'file-text',
+    'dotnet': 'dot-chart',
+    
+    # 存储
+    'storage': 'inbox',
+    'disk': 'hdd',
+    'nas': 'folder',
+    'san': 'cloud-server',
+    
+    # 消息队列
+    'rabbitmq': 'message',
+    'kafka': 'deployment-unit',
+    'activemq': 'message',
+    
+    # 缓存
+    'memcached': 'dashboard',
+    'varnish': 'dashboard'
+}
+
+# 模板名称关键字 -> 分类（按顺序匹配第一组）
+TEMPLATE_CATEGORY_KEYWORDS = {
+    # 操作系统
+    ('linux', 'windows', 'unix', 'centos', 'ubuntu', 'debian', 'rhel', 'suse', 'macos', 'freebsd'): '💻 操作系统',
+    
+    # 数据库
+    ('mysql', 'postgresql', 'mongodb', 'redis', 'oracle', 'mariadb', 'sqlite', 'cassandra', 'elasticsearch', 'influxdb'): '🗄 数据库',
+    
+    # Web服务器
+    ('nginx', 'apache', 'tomcat', 'iis', 'lighttpd', 'caddy', 'haproxy'): '🌐 Web服务器',
+    
+    # 容器和编排
+    ('docker', 'kubernetes', 'openshift', 'k8s', 'containerd', 'podman'): '📦 容器平台',
+    
+    # 网络设备
+    ('cisco', 'huawei', 'juniper', 'switch', 'router', 'firewall', 'f5', 'netscaler', 'palo alto'): '🌐 网络设备',
+    
+    # 虚拟化
+    ('vmware', 'hyper-v', 'kvm', 'xen', 'virtualbox', 'esxi', 'vcenter'): '☁️ 虚拟化',
+    
+    # 网络监控
+    ('snmp', 'icmp', 'tcp', 'udp', 'ping', 'ssh', 'telnet', 'ftp'): '📊 网络监控',
+    
+    # 云服务
+    ('aws', 'azure', 'gcp', 'alibaba cloud', 'tencent cloud', 's3', 'ec2', 'rds'): '☁️ 云服务',
+    
+    # 应用服务
+    ('java', 'python', 'node', 'php', 'dotnet', '.net', 'golang', 'jvm'): '🚀 应用服务',
+    
+    # 消息队列
+    ('rabbitmq', 'kafka', 'activemq', 'rocketmq', 'pulsar', 'mqtt'): '📬 消息队列',
+    
+    # 缓存系统
+    ('memcached', 'varnish', 'squid', 'cloudflare'): '⚡ 缓存系统',
+    
+    # 存储系统
+    ('storage', 'disk', 'nas', 'san', 'ceph', 'glusterfs', 'nfs'): '💾 存储系统',
+    
+    # 安全监控
+    ('security', 'ids', 'ips', 'antivirus', 'malware', 'vulnerability'): '🔒 安全监控',
+    
+    # IoT设备
+    ('iot', 'sensor', 'mqtt', 'zigbee', 'lora'): '🌡️ IoT设备'
+}
+
+
+@lru_cache(maxsize=4096)
+def classify_template(template_name):
+    """
+    根据模板名称确定 (图标, 分类)
+
+    结果按名称缓存，模板目录刷新时不会对同名模板重复做关键字匹配
+    """
+    name = (template_name or '').lower()
+    icon = next((icon for keyword, icon in TEMPLATE_ICON_KEYWORDS.items() if keyword in name), 'setting')
+    category = next((category for keywords, category in TEMPLATE_CATEGORY_KEYWORDS.items()
+                     if any(keyword in name for keyword in keywords)), '📝 其他')
+    return icon, category
+
+
+class _RateLimiter:
+    """按固定间隔放行请求（每秒最多 rate 个），多线程共享"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
 
-# 初始化Zabbix API连接
-try:
-    zapi = ZabbixAPI("http://192.168.10.128/zabbix")
-    zapi.login("Admin", "zabbix")
-    print("✓ Zabbix API连接成功")
-except ImportError as ie:
-    print(f"警告: Zabbix API库未安装: {str(ie)}")
-    print("建议安装: pip install pyzabbix")
-    zapi = None
-except Exception as e:
-    print(f"警告: Zabbix API连接失败: {str(e)}")
-    print("原因可能包括:")
-    print("1. Zabbix服务器不可达 (http://192.168.0.134/zabbix)")
-    print("2. 用户名或密码错误 (Admin/zabbix)")
-    print("3. Zabbix服务器未启动或配置错误")
-    print("系统将在无Zabbix连接的情况下运行，相关功能将被跳过")
-    zapi = None
 
 #zabbix自动发现模块
 class zabbix_auto_discovery():
     def __init__(self, zapi_instance=None):
-        """初始化Zabbix自动发现类"""
+        """初始化Zabbix自动发现类（不访问网络）"""
         self.zapi = zapi_instance or zapi
-        self.connection_status = {
-            'connected': False,
-            'version': None,
-            'error': None
-        }
-        
-        # 检查API连接是否有效
+
+    @property
+    def connection_status(self):
+        """
+        连接状态（延迟检查）
+
+        共享客户端登录成功后直接返回已连接；连接失败后在冷却时间内直接返回上次的错误
+        """
         if self.zapi is None:
-            print("⚠️ 警告: Zabbix API连接不可用")
-            self.connection_status['error'] = 'API实例为空'
-        else:
-            try:
-                # 尝试进行一个简单的API调用来检验连接
-                if hasattr(self.zapi, 'apiinfo'):
-                    version_info = self.zapi.apiinfo.version()
-                    self.connection_status['connected'] = True
-                    self.connection_status['version'] = version_info
-                    print(f"✓ Zabbix API连接正常，版本: {version_info}")
-                else:
-                    print("⚠️ 警告: Zabbix API实例无效（缺少apiinfo属性）")
-                    self.connection_status['error'] = 'API实例无apiinfo属性'
-            except Exception as e:
-                print(f"⚠️ 警告: Zabbix API连接测试失败: {str(e)}")
-                self.connection_status['error'] = str(e)
+            return {'connected': False, 'version': None, 'error': 'API实例为空'}
+        if isinstance(self.zapi, ZabbixClient):
+            return self.zapi.check_connection()
+        try:
+            return {'connected': True, 'version': self.zapi.apiinfo.version(), 'error': None}
+        except Exception as e:
+            return {'connected': False, 'version': None, 'error': str(e)}
     
     def _convert_ip_range_format(self, ip_ranges):
         """
@@ -130,7 +259,7 @@ class zabbix_auto_discovery():
 
     def get_connection_status(self):
         """获取连接状态信息"""
-        return self.connection_status.copy()
+        return dict(self.connection_status)
     
     def diagnose_connection(self):
         """
@@ -139,6 +268,7 @@ class zabbix_auto_discovery():
         返回:
         dict: 详细的诊断信息
         """
+        zabbix_url = getattr(self.zapi, 'url', None)
         diagnosis = {
             'success': False,
             'connected': False,
@@ -146,8 +276,8 @@ class zabbix_auto_discovery():
             'error': None,
             'suggestions': [],
             'config_info': {
-                'url': 'http://192.168.0.134/zabbix',
-                'username': 'Admin',
+                'url': zabbix_url,
+                'username': getattr(self.zapi, 'user', None),
                 'password': '隐藏'
             }
         }
@@ -157,10 +287,9 @@ class zabbix_auto_discovery():
             diagnosis['error'] = 'Zabbix API实例为空'
             diagnosis['suggestions'] = [
                 '检查Zabbix服务器是否正常运行',
-                '验证Zabbix服务器URL是否可访问: http://192.168.0.134/zabbix',
+                f'验证Zabbix服务器URL是否可访问: {zabbix_url}',
                 '检查网络连接和防火墙设置',
-                '验证用户名和密码是否正确',
-                '检查pyzabbix库是否正确安装'
+                '验证用户名和密码是否正确'
             ]
             return diagnosis
         
@@ -184,13 +313,13 @@ class zabbix_auto_discovery():
             
             if 'connection' in error_msg or 'timeout' in error_msg:
                 diagnosis['suggestions'] = [
-                    '检查Zabbix服务器是否运行在 http://192.168.0.134/zabbix',
+                    f'检查Zabbix服务器是否运行在 {zabbix_url}',
                     '验证网络连接和防火墙设置',
                     '检查Zabbix Web界面是否可访问'
                 ]
             elif 'login' in error_msg or 'auth' in error_msg:
                 diagnosis['suggestions'] = [
-                    '检查用户名和密码是否正确 (Admin/zabbix)',
+                    '检查 settings 中的 ZABBIX_USER / ZABBIX_PASSWORD 是否正确',
                     '确认用户账号未被禁用',
                     '检查Zabbix用户权限设置'
                 ]
@@ -1102,6 +1231,117 @@ class zabbix_auto_discovery():
                 'message': f'强制启用发现规则失败: {str(e)}'
             }
 
+    # 单次 dhost.get / dservice.get 取回的主机数
+    DISCOVERY_PAGE_SIZE = 500
+    # 发现服务中需要的字段
+    DSERVICE_OUTPUT = ['dserviceid', 'dhostid', 'ip', 'port', 'type', 'dns', 'status']
+
+    def iter_discovered_hosts(self, druleid=None, page_size=None):
+        """
+        逐页产出规范化的发现主机记录
+
+        先用一次只取ID的 dhost.get 确定主机列表，再按页用 dhostids 取主机及其服务
+        （selectDServices），同一页中没有带回服务的主机用一次 dservice.get 补齐；
+        API调用次数与页数成正比，与主机数无关
+
+        参数:
+        druleid (string): 发现规则ID (可选，服务端过滤)
+        page_size (int): 每页主机数
+
+        产出:
+        dict: {dhostid, druleid, status, status_name, lastup, lastdown, ip_addresses, interfaces}
+        """
+        page_size = page_size or self.DISCOVERY_PAGE_SIZE
+        id_params = {'output': ['dhostid'], 'sortfield': 'dhostid'}
+        if druleid:
+            id_params['druleids'] = [druleid]
+        dhostids = [host['dhostid'] for host in self.zapi.dhost.get(id_params)]
+        logger.debug(f"发现规则 {druleid or '全部'} 共 {len(dhostids)} 个发现主机，每页 {page_size} 个")
+
+        if not dhostids:
+            # 部分版本的 dhost.get 不返回结果，改为从服务聚合主机
+            yield from self._hosts_from_services(druleid)
+            return
+
+        for start in range(0, len(dhostids), page_size):
+            page_ids = dhostids[start:start + page_size]
+            hosts = self.zapi.dhost.get({
+                'output': ['dhostid', 'druleid', 'status', 'lastup', 'lastdown'],
+                'dhostids': page_ids,
+                'selectDServices': self.DSERVICE_OUTPUT
+            })
+
+            missing = [host['dhostid'] for host in hosts if not host.get('dservices')]
+            if missing:
+                services_by_host = {}
+                for service in self.zapi.dservice.get({'output': self.DSERVICE_OUTPUT, 'dhostids': missing}):
+                    services_by_host.setdefault(service.get('dhostid'), []).append(service)
+                for host in hosts:
+                    if not host.get('dservices'):
+                        host['dservices'] = services_by_host.get(host['dhostid'], [])
+
+            for host in hosts:
+                if druleid and str(host.get('druleid', druleid)) != str(druleid):
+                    continue
+                yield self._normalize_discovered_host(host, host.get('dservices') or [])
+
+    def _hosts_from_services(self, druleid=None):
+        """从 dservice.get 的结果聚合发现主机"""
+        params = {'output': self.DSERVICE_OUTPUT + ['druleid'], 'selectDHosts': ['dhostid', 'druleid', 'status', 'lastup', 'lastdown']}
+        if druleid:
+            params['druleids'] = [druleid]
+
+        hosts = {}
+        for service in self.zapi.dservice.get(params):
+            if druleid and service.get('druleid') is not None and str(service.get('druleid')) != str(druleid):
+                continue
+            dhostid = service.get('dhostid')
+            if not dhostid:
+                continue
+            if dhostid not in hosts:
+                dhost = (service.get('dhosts') or [{}])[0]
+                hosts[dhostid] = ({'dhostid': dhostid, 'druleid': service.get('druleid', dhost.get('druleid')),
+                                   'status': dhost.get('status', 0), 'lastup': dhost.get('lastup', ''),
+                                   'lastdown': dhost.get('lastdown', '')}, [])
+            hosts[dhostid][1].append(service)
+        logger.debug(f"从 dservice.get 聚合到 {len(hosts)} 个发现主机")
+
+        for host, services in hosts.values():
+            yield self._normalize_discovered_host(host, services)
+
+    @staticmethod
+    def _normalize_discovered_host(host, services):
+        """把 dhost 及其服务整理为统一的主机记录"""
+        ip_addresses = []
+        interfaces = []
+        for service in services:
+            ip = service.get('ip')
+            if not ip or ip in ip_addresses:
+                continue
+            try:
+                ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            ip_addresses.append(ip)
+            interfaces.append({
+                'ip': ip,
+                'port': service.get('port'),
+                'dns': service.get('dns', ''),
+                'type': service.get('type')
+            })
+
+        status = int(host.get('status', 0) or 0)
+        return {
+            'dhostid': host.get('dhostid'),
+            'druleid': host.get('druleid'),
+            'status': status,
+            'status_name': '在线' if status == 0 else '离线',
+            'lastup': host.get('lastup', ''),
+            'lastdown': host.get('lastdown', ''),
+            'ip_addresses': ip_addresses,
+            'interfaces': interfaces
+        }
+
     def get_discovered_hosts(self, druleid=None, rule_name=None):
         """
         获取Zabbix自动发现的主机
@@ -1121,118 +1361,15 @@ class zabbix_auto_discovery():
             }
         
         try:
-            # 构建查询参数
-            params = {
-                'output': 'extend',
-                'selectInterfaces': 'extend',
-                'selectDRules': 'extend',
-                'selectDServices': 'extend'  # 添加服务信息
-            }
-            
-            print(f"[DEBUG] Zabbix API查询参数: {params}")
-            
-            # 根据提供的条件过滤
-            if druleid:
-                params['druleids'] = [druleid]
-            
-            # 获取发现的主机
-            print(f"[DEBUG] 调用 Zabbix API dhost.get，参数: {params}")
-            discovered_hosts = self.zapi.dhost.get(params)
-            print(f"[DEBUG] Zabbix API 返回了 {len(discovered_hosts) if discovered_hosts else 0} 个主机")
-            
-            # 如果指定了druleid，严格过滤只属于该规则的主机
-            if druleid and discovered_hosts:
-                print(f"[DEBUG] 过滤前主机数量: {len(discovered_hosts)}")
-                filtered_hosts = []
-                for host in discovered_hosts:
-                    host_druleid = host.get('druleid')
-                    print(f"[DEBUG] 主机 dhostid={host.get('dhostid')} 的druleid={host_druleid}, 期望druleid={druleid}")
-                    if str(host_druleid) == str(druleid):
-                        filtered_hosts.append(host)
-                        print(f"[DEBUG] 主机 dhostid={host.get('dhostid')} 匹配规则ID {druleid}，保留")
-                    else:
-                        print(f"[DEBUG] 主机 dhostid={host.get('dhostid')} 不匹配规则ID {druleid}，过滤掉")
-                
-                discovered_hosts = filtered_hosts
-                print(f"[DEBUG] 过滤后主机数量: {len(discovered_hosts)}")
-            
-            # 如果获取到主机，打印原始数据结构用于调试
-            if discovered_hosts:
-                for idx, host in enumerate(discovered_hosts):
-                    print(f"[DEBUG] 原始主机 {idx+1} 数据结构: {host}")
-                    print(f"[DEBUG] 主机 {idx+1} 的所有字段: {list(host.keys())}")
-                    print(f"[DEBUG] 主机 {idx+1} 的druleid: {host.get('druleid')}")
-                    
-                    # 专门通过dhostid查询这个主机的完整信息
-                    dhostid = host.get('dhostid')
-                    if dhostid:
-                        try:
-                            print(f"[DEBUG] 专门查询dhostid={dhostid}的详细信息")
-                            detailed_host_params = {
-                                'output': 'extend',
-                                'dhostids': [dhostid],
-                                'selectInterfaces': 'extend',
-                                'selectDServices': 'extend'
-                            }
-                            detailed_hosts = self.zapi.dhost.get(detailed_host_params)
-                            if detailed_hosts:
-                                print(f"[DEBUG] dhostid={dhostid} 详细信息: {detailed_hosts[0]}")
-                            else:
-                                print(f"[DEBUG] dhostid={dhostid} 查询详细信息失败")
-                        except Exception as detail_error:
-                            print(f"[WARNING] 查询dhostid={dhostid}详细信息失败: {detail_error}")
-            
-            if not discovered_hosts:
-                print(f"[DEBUG] dhost.get 没有返回结果，尝试使用 dservice.get")
-                # 尝试使用 dservice.get 获取发现的服务
-                service_params = {
-                    'output': 'extend',
-                    'selectDHosts': 'extend'
-                }
-                if druleid:
-                    service_params['druleids'] = [druleid]
-                
-                discovered_services = self.zapi.dservice.get(service_params)
-                print(f"[DEBUG] dservice.get 返回了 {len(discovered_services) if discovered_services else 0} 个服务")
-                
-                # 从服务中提取主机信息
-                host_map = {}
-                for service in discovered_services:
-                    dhostid = service.get('dhostid')
-                    ip = service.get('ip')
-                    service_druleid = service.get('druleid')
-                    
-                    print(f"[DEBUG] 服务信息: dhostid={dhostid}, druleid={service_druleid}, ip={ip}")
-                    
-                    # 如果指定了druleid，严格过滤只属于该规则的服务
-                    if druleid and str(service_druleid) != str(druleid):
-                        print(f"[DEBUG] 服务 dhostid={dhostid} druleid={service_druleid} 不匹配期望的 {druleid}，跳过")
-                        continue
-                    
-                    if dhostid and ip:
-                        if dhostid not in host_map:
-                            host_map[dhostid] = {
-                                'dhostid': dhostid,
-                                'druleid': service_druleid,
-                                'status': 0,  # 服务可用认为主机在线
-                                'ip_addresses': [],
-                                'interfaces': []
-                            }
-                        
-                        # 添加IP地址
-                        if ip not in host_map[dhostid]['ip_addresses']:
-                            host_map[dhostid]['ip_addresses'].append(ip)
-                            host_map[dhostid]['interfaces'].append({
-                                'ip': ip,
-                                'port': service.get('port'),
-                                'type': service.get('type'),
-                                'dns': service.get('dns', '')
-                            })
-                
-                discovered_hosts = list(host_map.values())
-                print(f"[DEBUG] 从服务中提取到 {len(discovered_hosts)} 个主机")
+            if not druleid and rule_name:
+                rules = self.zapi.drule.get({'output': ['druleid'], 'search': {'name': rule_name}})
+                if not rules:
+                    return {'success': True, 'data': [], 'message': '未找到发现的主机', 'count': 0}
+                processed_hosts = [host for rule in rules for host in self.iter_discovered_hosts(rule['druleid'])]
+            else:
+                processed_hosts = list(self.iter_discovered_hosts(druleid))
             
-            if not discovered_hosts:
+            if not processed_hosts:
                 return {
                     'success': True,
                     'data': [],
@@ -1240,181 +1377,7 @@ class zabbix_auto_discovery():
                     'count': 0
                 }
             
-            # 处理发现的主机数据
-            processed_hosts = []
-            
-            for host in discovered_hosts:
-                # 获取主机接口信息
-                interfaces = host.get('interfaces', [])
-                ip_addresses = []
-                
-                print(f"[DEBUG] 处理主机: dhostid={host.get('dhostid')}, 接口数量={len(interfaces)}")
-                print(f"[DEBUG] 主机完整信息: {host}")
-                
-                # 首先尝试从主机对象的直接字段获取IP（最可能的情况）
-                direct_ip_fields = ['ip', 'ip_address', 'addr', 'host', 'dns', 'value']
-                for field in direct_ip_fields:
-                    field_value = host.get(field)
-                    if field_value and field_value not in ip_addresses:
-                        # 验证是否是有效的IP地址格式
-                        import re
-                        ip_pattern = r'^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$'
-                        if re.match(ip_pattern, str(field_value)):
-                            ip_addresses.append(field_value)
-                            print(f"[DEBUG] 从主机{field}字段提取到IP: {field_value}")
-                            break
-                
-                # 方法1: 从接口信息提取IP
-                for interface in interfaces:
-                    print(f"[DEBUG] 接口信息: {interface}")
-                    # 尝试多种可能的IP字段名
-                    ip_value = interface.get('ip') or interface.get('ip_address') or interface.get('addr') or interface.get('host')
-                    if ip_value and ip_value not in ip_addresses:
-                        ip_addresses.append(ip_value)
-                        print(f"[DEBUG] 从接口提取到IP: {ip_value}")
-                
-                # 方法1.5: 从主机的dservices信息提取IP
-                dservices = host.get('dservices', []) or host.get('services', [])
-                for service in dservices:
-                    print(f"[DEBUG] 服务信息: {service}")
-                    service_ip = service.get('ip') or service.get('ip_address')
-                    if service_ip and service_ip not in ip_addresses:
-                        ip_addresses.append(service_ip)
-                        print(f"[DEBUG] 从主机服务提取到IP: {service_ip}")
-                        
-                        # 更新接口信息
-                        interfaces.append({
-                            'ip': service_ip,
-                            'port': service.get('port'),
-                            'dns': service.get('dns', ''),
-                            'type': service.get('type')
-                        })
-                
-                # 方法2: 直接从主机信息获取IP
-                if not ip_addresses:
-                    host_ip = host.get('ip') or host.get('ip_address') or host.get('host')
-                    if host_ip and host_ip not in ip_addresses:
-                        ip_addresses.append(host_ip)
-                        print(f"[DEBUG] 从主机信息提取到IP: {host_ip}")
-                
-                # 方法3: 如果还是没有IP，通过dhostid查询dservice获取IP
-                if not ip_addresses and host.get('dhostid'):
-                    print(f"[DEBUG] 尝试通过dhostid={host.get('dhostid')}查询dservice获取IP")
-                    try:
-                        dhostid = host.get('dhostid')
-                        # 使用更完整的参数查询服务
-                        service_params = {
-                            'output': 'extend',  # 获取所有字段
-                            'dhostids': [dhostid],
-                            'selectDRules': 'extend'  # 同时获取发现规则信息
-                        }
-                        services = self.zapi.dservice.get(service_params)
-                        print(f"[DEBUG] 为dhostid={dhostid}查询到{len(services) if services else 0}个服务")
-                        
-                        if services:
-                            for svc_idx, service in enumerate(services):
-                                print(f"[DEBUG] 服务 {svc_idx+1} 完整信息: {service}")
-                                print(f"[DEBUG] 服务 {svc_idx+1} 所有字段: {list(service.keys())}")
-                                
-                                # 尝试多种字段名提取IP
-                                service_ip_fields = ['ip', 'ip_address', 'addr', 'host', 'dns', 'value']
-                                for field in service_ip_fields:
-                                    service_ip = service.get(field)
-                                    if service_ip and service_ip not in ip_addresses:
-                                        # 验证IP格式
-                                        import re
-                                        ip_pattern = r'^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$'
-                                        if re.match(ip_pattern, str(service_ip)):
-                                            ip_addresses.append(service_ip)
-                                            print(f"[DEBUG] 从服务{field}字段获取到IP: {service_ip}")
-                                            
-                                            # 同时更新接口信息
-                                            interfaces.append({
-                                                'ip': service_ip,
-                                                'port': service.get('port'),
-                                                'dns': service.get('dns', ''),
-                                                'type': service.get('type'),
-                                                'service_type': service.get('type')
-                                            })
-                                            break
-                        else:
-                            print(f"[DEBUG] dhostid={dhostid}没有对应的服务")
-                            
-                    except Exception as service_error:
-                        print(f"[WARNING] 查询dservice失败: {service_error}")
-                
-                # 方法4: 如果仍然没有IP，尝试从发现规则信息推断
-                if not ip_addresses:
-                    print(f"[DEBUG] 尝试从发现规则信息推断IP")
-                    druleid = host.get('druleid')
-                    if druleid:
-                        try:
-                            rule_params = {
-                                'output': ['iprange'],
-                                'druleids': [druleid]
-                            }
-                            rules = self.zapi.drule.get(rule_params)
-                            if rules and rules[0].get('iprange'):
-                                iprange = rules[0]['iprange']
-                                print(f"[DEBUG] 发现规则IP范围: {iprange}")
-                                # 这里可以进一步解析IP范围，但通常不应该走到这一步
-                        except Exception as rule_error:
-                            print(f"[WARNING] 查询发现规则失败: {rule_error}")
-                
-                # 方法5: 最后的尝试 - 直接查询同一规则下的所有服务
-                if not ip_addresses:
-                    print(f"[DEBUG] 最后尝试：查询同一规则下的所有服务")
-                    try:
-                        dhostid = host.get('dhostid')
-                        druleid = host.get('druleid')
-                        
-                        # 查询同一规则下的所有服务
-                        if druleid:
-                            rule_services_params = {
-                                'output': 'extend',
-                                'druleids': [druleid]
-                            }
-                            rule_services = self.zapi.dservice.get(rule_services_params)
-                            print(f"[DEBUG] 规则{druleid}下查询到{len(rule_services) if rule_services else 0}个服务")
-                            
-                            # 在规则服务中查找匹配的dhostid
-                            for service in rule_services:
-                                service_dhostid = service.get('dhostid')
-                                service_druleid = service.get('druleid')
-                                print(f"[DEBUG] 检查服务: dhostid={service_dhostid}, druleid={service_druleid}, 目标dhostid={dhostid}, 目标druleid={druleid}")
-                                
-                                # 严格检查dhostid和druleid都匹配
-                                if (service_dhostid == dhostid and str(service_druleid) == str(druleid)):
-                                    print(f"[DEBUG] 在规则服务中找到匹配的服务: {service}")
-                                    service_ip = service.get('ip')
-                                    if service_ip and service_ip not in ip_addresses:
-                                        import re
-                                        ip_pattern = r'^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$'
-                                        if re.match(ip_pattern, str(service_ip)):
-                                            ip_addresses.append(service_ip)
-                                            print(f"[DEBUG] 从规则服务获取到IP: {service_ip}")
-                                            break
-                                else:
-                                    print(f"[DEBUG] 服务不匹配: dhostid {service_dhostid}!={dhostid} 或 druleid {service_druleid}!={druleid}")
-                                            
-                    except Exception as global_error:
-                        print(f"[WARNING] 查询规则服务失败: {global_error}")
-
-                print(f"[DEBUG] 主机 {host.get('dhostid')} 最终IP列表: {ip_addresses}")
-                
-                processed_host = {
-                    'dhostid': host.get('dhostid'),
-                    'druleid': host.get('druleid'),
-                    'status': int(host.get('status', 0)),
-                    'status_name': '在线' if int(host.get('status', 0)) == 0 else '离线',
-                    'lastup': host.get('lastup', ''),
-                    'lastdown': host.get('lastdown', ''),
-                    'ip_addresses': ip_addresses,
-                    'interfaces': interfaces
-                }
-                
-                processed_hosts.append(processed_host)
-            
+            logger.info(f"获取发现主机完成: 规则 {druleid or rule_name or '全部'}, {len(processed_hosts)} 个主机")
             return {
                 'success': True,
                 'data': processed_hosts,
@@ -1423,200 +1386,154 @@ class zabbix_auto_discovery():
             }
             
         except Exception as e:
+            logger.error(f"获取发现主机失败: {e}")
             return {
                 'success': False,
                 'error': str(e),
                 'message': f'获取发现主机失败: {str(e)}'
             }
     
-    def save_discovered_ips_to_database(self, druleid=None, task_id=None, created_by=None):
+    def save_discovered_ips_to_database(self, druleid=None, task_id=None, created_by=None, dry_run=False):
         """
         将Zabbix发现的IP地址保存到IP数据库
         
+        发现结果与已有记录一次性按地址比对，在一个事务内分批 bulk_create / bulk_update；
+        只需刷新在线状态的记录用集合 UPDATE 完成，计为跳过
+        
         参数:
         druleid (string): 发现规则ID (可选)
         task_id (string): 扫描任务ID (可选)
         created_by (User): 创建者 (可选)
+        dry_run (bool): 只返回差异统计，不写数据库
         
         返回:
         dict: 保存结果
         """
         try:
-            # 动态导入模型，避免循环导入
-            import sys
-            import os
-            sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-            
-            from ip_management.models import IPRecord, ScanTask
+            from django.db import transaction
             from django.utils import timezone
+            from ip_management.models import ScanResult, ScanTask
+            from ip_management.record_sync import IPRecordUpserter
+            
+            # 按地址汇总发现结果，同一地址以最后出现的主机为准
+            discovered = {}
+            invalid_ips = []
+            total_hosts = 0
+            for host in self.iter_discovered_hosts(druleid=druleid):
+                total_hosts += 1
+                for ip_address in host.get('ip_addresses', []):
+                    ip_address = (ip_address or '').strip()
+                    try:
+                        ipaddress.ip_address(ip_address)
+                    except ValueError:
+                        invalid_ips.append(ip_address)
+                        continue
+                    hostname = next((interface.get('dns') for interface in host.get('interfaces', [])
+                                     if interface.get('ip') == ip_address and interface.get('dns')), None)
+                    discovered[ip_address] = (ip_address, host, hostname)
             
-            # 获取发现的主机
-            hosts_result = self.get_discovered_hosts(druleid=druleid)
-            
-            print(f"[DEBUG] 获取发现主机结果: {hosts_result}")
-            
-            if not hosts_result.get('success'):
-                print(f"[ERROR] 获取发现主机失败: {hosts_result.get('message')}")
-                return hosts_result
-            
-            discovered_hosts = hosts_result.get('data', [])
-            
-            print(f"[DEBUG] 发现了 {len(discovered_hosts)} 个主机")
-            
-            if not discovered_hosts:
-                print(f"[INFO] 没有发现的主机需要保存")
+            if not discovered:
+                logger.info(f"发现规则 {druleid} 没有需要保存的IP")
                 return {
                     'success': True,
                     'message': '没有发现的主机需要保存',
                     'saved_count': 0,
                     'updated_count': 0,
-                    'skipped_count': 0
+                    'skipped_count': len(invalid_ips),
+                    'total_hosts': total_hosts,
+                    'dry_run': dry_run,
+                    'errors': [f'无效的IP地址: {ip}' for ip in invalid_ips[:5]]
                 }
             
-            saved_count = 0
-            updated_count = 0
-            skipped_count = 0
-            save_errors = []
+            description = f'Zabbix自动发现 - 规则ID: {druleid}'
             
-            # 获取相关的扫描任务（如果有）
-            scan_task = None
-            if task_id:
-                try:
-                    scan_task = ScanTask.objects.get(id=task_id)
-                except ScanTask.DoesNotExist:
-                    pass
-            
-            # 遍历发现的主机
-            for host_idx, host in enumerate(discovered_hosts):
-                ip_addresses = host.get('ip_addresses', [])
-                print(f"[DEBUG] 处理主机 {host_idx + 1}/{len(discovered_hosts)}: dhostid={host.get('dhostid')}, IP地址={ip_addresses}")
+            def build(item):
+                _ip, _host, hostname = item
+                return {
+                    'hostname': hostname,
+                    'status': 'active',  # 发现的IP设为在用
+                    'type': 'static',
+                    'is_auto_discovered': True,
+                    'zabbix_drule_id': druleid,
+                    'description': description,
+                    'created_by': created_by
+                }
+            
+            def merge(record, item):
+                _ip, _host, hostname = item
+                changed = set()
+                if not record.is_auto_discovered:
+                    record.is_auto_discovered = True
+                    record.zabbix_drule_id = druleid
+                    changed |= {'is_auto_discovered', 'zabbix_drule_id'}
+                if record.status != 'active':
+                    record.status = 'active'
+                    changed.add('status')
+                if not record.hostname and hostname:
+                    record.hostname = hostname
+                    changed.add('hostname')
+                if not record.description:
+                    record.description = description
+                    changed.add('description')
+                elif 'Zabbix自动发现' not in record.description:
+                    record.description += f' | {description}'
+                    changed.add('description')
+                return changed
+            
+            upserter = IPRecordUpserter(
+                build=build,
+                merge=merge,
+                touch=lambda: {'ping_status': 'online', 'last_seen': timezone.now()},
+                dry_run=dry_run
+            )
+            
+            scan_task = ScanTask.objects.filter(id=task_id).first() if task_id else None
+            
+            with transaction.atomic():
+                stats = upserter.upsert(discovered.values(), key=lambda item: item[0])
                 
-                for ip_address in ip_addresses:
-                    if not ip_address or ip_address.strip() == '':
-                        print(f"[SKIP] 空的IP地址，跳过")
-                        continue
-                    
-                    # 清理IP地址格式
-                    ip_address = ip_address.strip()
-                    print(f"[DEBUG] 处理IP地址: '{ip_address}'")
-                    
-                    try:
-                        print(f"[DEBUG] 开始处理IP {ip_address}")
-                        
-                        # 检查IP是否已存在
-                        existing_ip = IPRecord.objects.filter(ip_address=ip_address).first()
-                        print(f"[DEBUG] IP {ip_address} 查询结果: {'exists' if existing_ip else 'not exists'}")
-                        
-                        if existing_ip:
-                            print(f"[UPDATE] IP {ip_address} 已存在，更新记录")
-                            # 更新现有记录，但不修改自动发现标记和关键字段
-                            if not hasattr(existing_ip, 'is_auto_discovered') or not existing_ip.is_auto_discovered:
-                                existing_ip.is_auto_discovered = True
-                                existing_ip.zabbix_drule_id = druleid
-                            
-                            existing_ip.ping_status = 'online'
-                            existing_ip.last_seen = timezone.now()
-                            existing_ip.status = 'active'  # 发现的IP设为在用
-                            
-                            # 如果没有主机名，尝试从接口信息获取
-                            if not existing_ip.hostname:
-                                interfaces = host.get('interfaces', [])
-                                for interface in interfaces:
-                                    if interface.get('ip') == ip_address and interface.get('dns'):
-                                        existing_ip.hostname = interface['dns']
-                                        print(f"[UPDATE] 为IP {ip_address} 设置主机名: {interface['dns']}")
-                                        break
-                            
-                            # 设置发现来源
-                            if not existing_ip.description:
-                                existing_ip.description = f'Zabbix自动发现 - 规则ID: {druleid}'
-                            elif 'Zabbix自动发现' not in existing_ip.description:
-                                existing_ip.description += f' | Zabbix自动发现 - 规则ID: {druleid}'
-                            
-                            existing_ip.updated_at = timezone.now()
-                            existing_ip.save()
-                            updated_count += 1
-                            print(f"[SUCCESS] IP {ip_address} 更新成功")
-                            
-                        else:
-                            print(f"[CREATE] IP {ip_address} 不存在，创建新记录")
-                            # 创建新记录
-                            hostname = None
-                            interfaces = host.get('interfaces', [])
-                            for interface in interfaces:
-                                if interface.get('ip') == ip_address and interface.get('dns'):
-                                    hostname = interface['dns']
-                                    print(f"[CREATE] 为IP {ip_address} 找到主机名: {hostname}")
-                                    break
-                            
-                            try:
-                                new_ip = IPRecord.objects.create(
-                                    ip_address=ip_address,
-                                    hostname=hostname,
-                                    status='active',  # 发现的IP设为在用
-                                    type='static',  # 默认为静态IP
-                                    ping_status='online',
-                                    last_seen=timezone.now(),
-                                    is_auto_discovered=True,  # 标记为自动发现
-                                    zabbix_drule_id=druleid,  # 记录发现规则ID
-                                    description=f'Zabbix自动发现 - 规则ID: {druleid}',
-                                    created_by=created_by
-                                )
-                                saved_count += 1
-                                print(f"[SUCCESS] IP {ip_address} 创建成功，ID: {new_ip.id}")
-                            except Exception as create_error:
-                                error_msg = f'IP {ip_address} 创建失败: {str(create_error)}'
-                                save_errors.append(error_msg)
-                                skipped_count += 1
-                                print(f"[ERROR] {error_msg}")
-                                continue
-                            
-                            # 如果有扫描任务，创建扫描结果记录
-                            if scan_task:
-                                from ip_management.models import ScanResult
-                                ScanResult.objects.get_or_create(
-                                    scan_task=scan_task,
-                                    ip_address=ip_address,
-                                    defaults={
-                                        'hostname': hostname,
-                                        'status': 'online',
-                                        'service_info': {
-                                            'zabbix_dhostid': host.get('dhostid'),
-                                            'discovery_status': host.get('status_name', 'unknown')
-                                        }
-                                    }
-                                )
-                            
-                    except Exception as e:
-                        error_msg = f'IP {ip_address} 保存失败: {str(e)}'
-                        save_errors.append(error_msg)
-                        skipped_count += 1
-                        print(f"错误: {error_msg}")
-            
-            # 更新扫描任务状态（如果有）
-            if scan_task:
-                scan_task.status = 'completed'
-                scan_task.completed_at = timezone.now()
-                scan_task.progress = 100
-                if save_errors:
-                    scan_task.error_message = '; '.join(save_errors[:5])  # 只保存前5个错误
-                scan_task.save()
-            
-            print(f"[SUMMARY] IP处理总结 - 主机数: {len(discovered_hosts)}, 新增: {saved_count}, 更新: {updated_count}, 跳过: {skipped_count}, 错误: {len(save_errors)}")
-            if save_errors:
-                print(f"[ERRORS] 错误列表: {save_errors}")
+                # 新增的IP同时记录为扫描结果
+                if scan_task and not dry_run and stats.created_ips:
+                    ScanResult.objects.bulk_create([
+                        ScanResult(
+                            scan_task=scan_task,
+                            ip_address=ip,
+                            hostname=discovered[ip][2],
+                            status='online',
+                            service_info={
+                                'zabbix_dhostid': discovered[ip][1].get('dhostid'),
+                                'discovery_status': discovered[ip][1].get('status_name', 'unknown')
+                            }
+                        )
+                        for ip in stats.created_ips
+                    ], batch_size=500, ignore_conflicts=True)
+                
+                # 更新扫描任务状态（如果有）
+                if scan_task and not dry_run:
+                    scan_task.status = 'completed'
+                    scan_task.completed_at = timezone.now()
+                    scan_task.progress = 100
+                    scan_task.save(update_fields=['status', 'completed_at', 'progress'])
+            
+            skipped_count = stats.unchanged + len(invalid_ips)
+            logger.info(f"发现规则 {druleid} IP同步{'（预演）' if dry_run else ''}: 主机 {total_hosts}, "
+                        f"新增 {stats.created}, 更新 {stats.updated}, 跳过 {skipped_count}")
             
             return {
                 'success': True,
-                'message': f'成功处理Zabbix发现的IP地址',
-                'saved_count': saved_count,
-                'updated_count': updated_count,
+                'message': '已计算Zabbix发现IP的同步差异' if dry_run else '成功处理Zabbix发现的IP地址',
+                'saved_count': stats.created,
+                'updated_count': stats.updated,
                 'skipped_count': skipped_count,
-                'total_hosts': len(discovered_hosts),
-                'errors': save_errors
+                'total_hosts': total_hosts,
+                'dry_run': dry_run,
+                'created_ips': stats.created_ips if dry_run else [],
+                'updated_ips': stats.updated_ips if dry_run else [],
+                'errors': [f'无效的IP地址: {ip}' for ip in invalid_ips[:5]]
             }
             
         except Exception as e:
+            logger.error(f"保存发现IP到数据库失败: {e}")
             return {
                 'success': False,
                 'error': str(e),
@@ -1794,14 +1711,7 @@ class zabbix_auto_discovery():
                     'message': 'Zabbix API连接不可用，无法获取模板列表'
                 }
             
-            params = {
-                'output': ['templateid', 'name', 'description'],
-                'selectGroups': ['groupid', 'name'],
-                'selectMacros': 'count',
-                'selectItems': 'count',
-                'selectTriggers': 'count'
-            }
-            
+            params = dict(self.TEMPLATE_QUERY)
             if search_name:
                 params['search'] = {'name': search_name}
                 params['searchWildcardsEnabled'] = True
@@ -1809,22 +1719,7 @@ class zabbix_auto_discovery():
             templates = self.zapi.template.get(params)
             
             # 处理模板数据，添加额外信息
-            processed_templates = []
-            for template in templates:
-                processed_template = {
-                    'templateid': template['templateid'],
-                    'name': template['name'],
-                    'description': template.get('description', ''),
-                    'groups': template.get('groups', []),
-                    'items_count': template.get('items', 0) if isinstance(template.get('items'), int) else len(template.get('items', [])),
-                    'triggers_count': template.get('triggers', 0) if isinstance(template.get('triggers'), int) else len(template.get('triggers', [])),
-                    'macros_count': template.get('macros', 0) if isinstance(template.get('macros'), int) else len(template.get('macros', [])),
-                    'icon': self._get_template_icon(template['name']),  # 根据模板名称确定图标
-                    'category': self._get_template_category(template['name'])  # 根据模板名称确定分类
-                }
-                # 移除了未定义的logger和category变量的使用
-                # logger.info(category)
-                processed_templates.append(processed_template)
+            processed_templates = [self._normalize_template(template) for template in templates]
             
             # 按名称排序
             processed_templates.sort(key=lambda x: x['name'])
@@ -1842,148 +1737,189 @@ class zabbix_auto_discovery():
                 'message': f'获取模板列表失败: {str(e)}'
             }
     
+    # 模板列表查询参数：名称、描述、主机组以及监控项 / 触发器 / 宏的数量
+    TEMPLATE_QUERY = {
+        'output': ['templateid', 'name', 'description'],
+        'selectGroups': ['groupid', 'name'],
+        'selectMacros': 'count',
+        'selectItems': 'count',
+        'selectTriggers': 'count'
+    }
+    # 主机组列表查询参数
+    HOSTGROUP_QUERY = {'output': ['groupid', 'name'], 'selectHosts': 'count'}
+    
+    @staticmethod
+    def _count(value):
+        """selectXxx: 'count' 返回数字字符串，旧版本可能返回列表"""
+        if isinstance(value, list):
+            return len(value)
+        try:
+            return int(value or 0)
+        except (TypeError, ValueError):
+            return 0
+    
+    def _normalize_template(self, template):
+        """把 template.get 的结果整理为模板列表使用的字典"""
+        icon, category = classify_template(template['name'])
+        return {
+            'templateid': template['templateid'],
+            'name': template['name'],
+            'description': template.get('description', ''),
+            'groups': template.get('groups', []),
+            'items_count': self._count(template.get('items')),
+            'triggers_count': self._count(template.get('triggers')),
+            'macros_count': self._count(template.get('macros')),
+            'icon': icon,  # 根据模板名称确定图标
+            'category': category  # 根据模板名称确定分类
+        }
+    
     def _get_template_icon(self, template_name):
         """根据模板名称确定图标"""
-        template_name_lower = template_name.lower()
-        
-        icon_mapping = {
-            # 操作系统
-            'linux': 'desktop',
-            'windows': 'windows',
-            'ubuntu': 'desktop', 
-            'centos': 'desktop',
-            'debian': 'desktop',
-            'unix': 'desktop',
-            'macos': 'laptop',
-            
-            # 数据库
-            'mysql': 'database',
-            'postgresql': 'database',
-            'mongodb': 'database',
-            'redis': 'database',
-            'oracle': 'database',
-            'mariadb': 'database',
-            'elasticsearch': 'search',
-            
-            # Web服务器
-            'nginx': 'global',
-            'apache': 'global',
-            'tomcat': 'fire',
-            'iis': 'windows',
-            'lighttpd': 'global',
-            
-            # 容器和编排
-            'docker': 'container',
-            'kubernetes': 'cluster',
-            'openshift': 'cluster',
-            'k8s': 'cluster',
-            
-            # 网络设备
-            'cisco': 'router',
-            'huawei': 'router',
-            'juniper': 'router',
-            'switch': 'partition',
-            'router': 'router',
-            'firewall': 'safety',
-            'network': 'wifi',
-            
-            # 虚拟化
-            'vmware': 'cloud',
-            'hyper-v': 'cloud',
-            'kvm': 'cloud',
-            'xen': 'cloud',
-            'virtualbox': 'cloud',
-            
-            # 监控协议
-            'snmp': 'api',
-            'icmp': 'thunderbolt',
-            'tcp': 'link',
-            'udp': 'link',
-            'ssh': 'key',
-            'telnet': 'console-sql',
-            
-            # 应用服务
-            'java': 'coffee',
-            'python': 'code',
-            'node': 'node-index',
-            'php': 'file-text',
-            'dotnet': 'dot-chart',
-            
-            # 存储
-            'storage': 'inbox',
-            'disk': 'hdd',
-            'nas': 'folder',
-            'san': 'cloud-server',
-            
-            # 消息队列
-            'rabbitmq': 'message',
-            'kafka': 'deployment-unit',
-            'activemq': 'message',
-            
-            # 缓存
-            'memcached': 'dashboard',
-            'varnish': 'dashboard'
-        }
-        
-        for keyword, icon in icon_mapping.items():
-            if keyword in template_name_lower:
-                return icon
-        
-        return 'setting'  # 默认图标
+        return classify_template(template_name)[0]
     
     def _get_template_category(self, template_name):
         """根据模板名称确定分类"""
-        template_name_lower = template_name.lower()
+        return classify_template(template_name)[1]
+    
+    # 默认主机组名称（按顺序使用第一个存在的），都不存在时创建 DEFAULT_GROUP_FALLBACK
+    DEFAULT_GROUP_NAMES = ('Linux servers', 'Templates')
+    DEFAULT_GROUP_FALLBACK = 'Auto Monitoring'
+    # 批量创建主机：每次 host.create 的主机数、同时在途的请求数、每秒最多请求数
+    HOST_CREATE_CHUNK_SIZE = 50
+    HOST_CREATE_MAX_CONCURRENT = 4
+    HOST_CREATE_RATE_LIMIT = 10.0
+    
+    def resolve_default_group_ids(self):
+        """
+        未指定主机组时使用的默认主机组ID列表
         
-        category_mapping = {
-            # 操作系统
-            ('linux', 'windows', 'unix', 'centos', 'ubuntu', 'debian', 'rhel', 'suse', 'macos', 'freebsd'): '💻 操作系统',
-            
-            # 数据库
-            ('mysql', 'postgresql', 'mongodb', 'redis', 'oracle', 'mariadb', 'sqlite', 'cassandra', 'elasticsearch', 'influxdb'): '🗄 数据库',
-            
-            # Web服务器
-            ('nginx', 'apache', 'tomcat', 'iis', 'lighttpd', 'caddy', 'haproxy'): '🌐 Web服务器',
-            
-            # 容器和编排
-            ('docker', 'kubernetes', 'openshift', 'k8s', 'containerd', 'podman'): '📦 容器平台',
-            
-            # 网络设备
-            ('cisco', 'huawei', 'juniper', 'switch', 'router', 'firewall', 'f5', 'netscaler', 'palo alto'): '🌐 网络设备',
-            
-            # 虚拟化
-            ('vmware', 'hyper-v', 'kvm', 'xen', 'virtualbox', 'esxi', 'vcenter'): '☁️ 虚拟化',
-            
-            # 网络监控
-            ('snmp', 'icmp', 'tcp', 'udp', 'ping', 'ssh', 'telnet', 'ftp'): '📊 网络监控',
-            
-            # 云服务
-            ('aws', 'azure', 'gcp', 'alibaba cloud', 'tencent cloud', 's3', 'ec2', 'rds'): '☁️ 云服务',
-            
-            # 应用服务
-            ('java', 'python', 'node', 'php', 'dotnet', '.net', 'golang', 'jvm'): '🚀 应用服务',
-            
-            # 消息队列
-            ('rabbitmq', 'kafka', 'activemq', 'rocketmq', 'pulsar', 'mqtt'): '📬 消息队列',
-            
-            # 缓存系统
-            ('memcached', 'varnish', 'squid', 'cloudflare'): '⚡ 缓存系统',
-            
-            # 存储系统
-            ('storage', 'disk', 'nas', 'san', 'ceph', 'glusterfs', 'nfs'): '💾 存储系统',
-            
-            # 安全监控
-            ('security', 'ids', 'ips', 'antivirus', 'malware', 'vulnerability'): '🔒 安全监控',
+        共享客户端优先读取目录缓存中的主机组，否则查询一次 hostgroup.get，都没有时创建默认组
+        """
+        try:
+            if self.zapi is zapi:
+                from ops_assets_backend.zabbix_catalog import zabbix_catalog
+                group_ids = zabbix_catalog.default_group_ids(load=False)
+                if group_ids:
+                    return group_ids
             
-            # IoT设备
-            ('iot', 'sensor', 'mqtt', 'zigbee', 'lora'): '🌡️ IoT设备'
+            groups = self.zapi.hostgroup.get({
+                'output': ['groupid', 'name'],
+                'filter': {'name': list(self.DEFAULT_GROUP_NAMES)}
+            })
+            by_name = {group['name']: group['groupid'] for group in groups}
+            for name in self.DEFAULT_GROUP_NAMES:
+                if name in by_name:
+                    return [by_name[name]]
+            
+            # 如果找不到默认组，创建一个
+            new_group = self.zapi.hostgroup.create({'name': self.DEFAULT_GROUP_FALLBACK})
+            return [new_group['groupids'][0]]
+        except Exception as e:
+            logger.warning(f"获取或创建主机组失败: {e}，使用默认组ID 1")
+            return ['1']  # 使用默认组ID
+    
+    @staticmethod
+    def _host_params(host_name, ip_address, template_ids, group_ids):
+        """host.create 的参数：Agent接口 + 主机组 + 模板"""
+        return {
+            'host': host_name,
+            'name': host_name,  # 可见名称
+            'interfaces': [{
+                'type': 1,  # Agent接口
+                'main': 1,
+                'useip': 1,
+                'ip': ip_address,
+                'dns': '',
+                'port': '10050'
+            }],
+            'groups': [{'groupid': group_id} for group_id in group_ids],
+            'templates': [{'templateid': template_id} for template_id in template_ids]
         }
+    
+    def iter_create_hosts(self, hosts, template_ids, group_ids=None, chunk_size=None,
+                          max_concurrent=None, rate_limit=None):
+        """
+        批量创建主机并关联模板，按块完成顺序产出每个主机的结果
         
-        for keywords, category in category_mapping.items():
-            if any(keyword in template_name_lower for keyword in keywords):
-                return category
+        一次 host.get 检查全部主机名是否已存在，其余主机按 chunk_size 分块调用 host.create，
+        块之间并发执行且总请求速率不超过 rate_limit；某块失败时（例如其中一个主机名冲突）
+        对该块逐个创建，只有出错的主机失败。请求发出后连接失败（服务器可能已经创建）或主机名已存在时，
+        先按主机名重新查询，已存在的主机按 exists 返回
         
-        return '📝 其他'  # 默认分类
+        参数:
+        hosts (list): [(主机名, IP地址), ...]
+        template_ids (list): 模板ID列表
+        group_ids (list): 主机组ID列表 (可选，默认使用"Linux servers"组)
+        
+        产出:
+        list: 一批结果 [{'host_name', 'ip_address', 'status': created/exists/failed, 'hostid', 'message'}, ...]
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        chunk_size = max(1, chunk_size or self.HOST_CREATE_CHUNK_SIZE)
+        max_concurrent = max(1, max_concurrent or self.HOST_CREATE_MAX_CONCURRENT)
+        limiter = _RateLimiter(rate_limit or self.HOST_CREATE_RATE_LIMIT)
+        group_ids = group_ids or self.resolve_default_group_ids()
+        hosts = list(hosts)
+        
+        existing = {}
+        names = [host_name for host_name, _ in hosts]
+        for start in range(0, len(names), 1000):
+            limiter.acquire()
+            for host in self.zapi.host.get({'output': ['hostid', 'host'], 'filter': {'host': names[start:start + 1000]}}):
+                existing[host['host']] = host['hostid']
+        
+        exists = [{'host_name': host_name, 'ip_address': ip_address, 'status': 'exists',
+                   'hostid': existing[host_name], 'message': f'主机 {host_name} 已存在'}
+                  for host_name, ip_address in hosts if host_name in existing]
+        if exists:
+            yield exists
+        
+        pending = [(host_name, ip_address) for host_name, ip_address in hosts if host_name not in existing]
+        chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+        
+        def exists_result(host_name, ip_address, hostid):
+            return {'host_name': host_name, 'ip_address': ip_address, 'status': 'exists', 'hostid': hostid,
+                    'message': f'主机 {host_name} 已存在'}
+        
+        def recheck(chunk, error):
+            """按主机名重新查询，返回 {主机名: hostid}，查询失败时返回空字典"""
+            if not (isinstance(error, ZabbixConnectionError) or 'already exists' in str(error)):
+                return {}
+            limiter.acquire()
+            try:
+                return {host['host']: host['hostid'] for host in self.zapi.host.get(
+                    {'output': ['hostid', 'host'], 'filter': {'host': [host_name for host_name, _ in chunk]}})}
+            except Exception as lookup_error:
+                logger.warning(f"重新查询 {len(chunk)} 个主机失败: {lookup_error}")
+                return {}
+        
+        def create(chunk):
+            limiter.acquire()
+            try:
+                result = self.zapi.host.create([self._host_params(host_name, ip_address, template_ids, group_ids)
+                                                for host_name, ip_address in chunk])
+                return [{'host_name': host_name, 'ip_address': ip_address, 'status': 'created', 'hostid': hostid,
+                         'message': f'主机 {host_name} 创建成功'}
+                        for (host_name, ip_address), hostid in zip(chunk, result['hostids'])]
+            except Exception as e:
+                found = recheck(chunk, e)
+                results = [exists_result(host_name, ip_address, found[host_name])
+                           for host_name, ip_address in chunk if host_name in found]
+                remaining = [(host_name, ip_address) for host_name, ip_address in chunk if host_name not in found]
+                if not remaining:
+                    return results
+                if len(chunk) == 1:
+                    host_name, ip_address = chunk[0]
+                    return [{'host_name': host_name, 'ip_address': ip_address, 'status': 'failed', 'hostid': None,
+                             'message': f'创建主机失败: {e}'}]
+                logger.warning(f"批量创建 {len(chunk)} 个主机失败，改为逐个创建 {len(remaining)} 个: {e}")
+                return results + [result for host in remaining for result in create([host])]
+        
+        with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='zabbix-host-create') as executor:
+            futures = [executor.submit(create, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                yield future.result()
     
     def create_host_with_template(self, host_name, ip_address, template_ids, group_ids=None):
         """
@@ -2008,25 +1944,7 @@ class zabbix_auto_discovery():
             
             # 如果没有指定主机组，使用默认的"Linux servers"组
             if not group_ids:
-                try:
-                    # 查找默认主机组
-                    groups = self.zapi.hostgroup.get({
-                        'output': ['groupid', 'name'],
-                        'filter': {'name': ['Linux servers', 'Templates']}
-                    })
-                    
-                    if groups:
-                        group_ids = [groups[0]['groupid']]
-                    else:
-                        # 如果找不到默认组，创建一个
-                        new_group = self.zapi.hostgroup.create({
-                            'name': 'Auto Monitoring'
-                        })
-                        group_ids = [new_group['groupids'][0]]
-                        
-                except Exception as e:
-                    print(f"获取或创建主机组失败: {e}，使用默认组ID 1")
-                    group_ids = ['1']  # 使用默认组ID
+                group_ids = self.resolve_default_group_ids()
             
             # 检查主机是否已存在
             existing_hosts = self.zapi.host.get({
@@ -2042,31 +1960,8 @@ class zabbix_auto_discovery():
                     'hostid': existing_hosts[0]['hostid']
                 }
             
-            # 准备模板列表
-            templates = []
-            for template_id in template_ids:
-                templates.append({'templateid': template_id})
-            
-            # 准备主机组列表
-            groups = []
-            for group_id in group_ids:
-                groups.append({'groupid': group_id})
-            
             # 创建主机
-            host_params = {
-                'host': host_name,
-                'name': host_name,  # 可见名称
-                'interfaces': [{
-                    'type': 1,  # Agent接口
-                    'main': 1,
-                    'useip': 1,
-                    'ip': ip_address,
-                    'dns': '',
-                    'port': '10050'
-                }],
-                'groups': groups,
-                'templates': templates
-            }
+            host_params = self._host_params(host_name, ip_address, template_ids, group_ids)
             
             result = self.zapi.host.create(host_params)
             
@@ -2109,10 +2004,7 @@ class zabbix_auto_discovery():
                     'message': 'Zabbix API连接不可用，无法获取主机组列表'
                 }
             
-            groups = self.zapi.hostgroup.get({
-                'output': ['groupid', 'name'],
-                'selectHosts': 'count'
-            })
+            groups = self.zapi.hostgroup.get(dict(self.HOSTGROUP_QUERY))
             
             return {
                 'success': True,
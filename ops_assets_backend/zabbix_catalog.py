@@ -0,0 +1,323 @@
+"""
+Zabbix 模板 / 主机组目录缓存
+模板和主机组保存在进程内存中（模板同时持久化到 assets.ZabbixTemplate 表），读请求只在内存中
+搜索和按分类过滤，不访问 Zabbix；后台定期用一个批量请求取模板和主机组的数量与最大ID作为指纹，
+指纹变化或超过最长有效期时才重新拉取完整列表，图标和分类在拉取时计算一次
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ops_assets_backend.zabbix_api import classify_template, zabbix_auto_discovery
+
+logger = logging.getLogger(__name__)
+
+# 两次指纹检查的间隔和完整列表的最长有效期（秒）
+DEFAULT_REFRESH_INTERVAL = 300
+DEFAULT_MAX_AGE = 3600
+# 持久化到 ZabbixTemplate 表时比较的字段（description 可能已被翻译，不覆盖）
+TEMPLATE_FIELDS = ('name', 'items_count', 'triggers_count', 'macros_count', 'icon', 'category', 'groups')
+
+
+def _fingerprint_calls():
+    """模板 / 主机组的数量和最大ID，用于判断目录是否变化"""
+    calls = []
+    for method, id_field in (('template.get', 'templateid'), ('hostgroup.get', 'groupid')):
+        calls.append((method, {'countOutput': True}))
+        calls.append((method, {'output': [id_field], 'sortfield': id_field, 'sortorder': 'DESC', 'limit': 1}))
+    return calls
+
+
+def _fingerprint(results) -> tuple:
+    template_count, template_top, group_count, group_top = results
+    return (
+        str(template_count), template_top[0]['templateid'] if template_top else None,
+        str(group_count), group_top[0]['groupid'] if group_top else None,
+    )
+
+
+class ZabbixCatalog:
+    """
+    Zabbix 模板 / 主机组目录
+
+    Args:
+        discovery: 访问 Zabbix 使用的 zabbix_auto_discovery 实例
+        refresh_interval: 指纹检查间隔（秒），读取时发现过期会在后台检查
+        max_age: 指纹未变化时完整列表的最长有效期（秒），用于发现改名等不影响指纹的变化
+    """
+
+    def __init__(self, discovery: Optional[zabbix_auto_discovery] = None,
+                 refresh_interval: Optional[float] = None, max_age: Optional[float] = None):
+        self.discovery = discovery or zabbix_auto_discovery()
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            getattr(settings, 'ZABBIX_CATALOG_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+        self.max_age = max_age if max_age is not None else \
+            getattr(settings, 'ZABBIX_CATALOG_MAX_AGE', DEFAULT_MAX_AGE)
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._templates: Optional[List[Dict]] = None
+        self._search_keys: List[str] = []
+        self._by_category: Dict[str, List[int]] = {}
+        self._groups: Optional[List[Dict]] = None
+        self._fingerprint: Optional[tuple] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self.refreshed_at = None
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._background: Optional[threading.Thread] = None
+        self.stats = {'checks': 0, 'full_refreshes': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------
+    # 查询（只读内存）
+    # ------------------------------------------------------------------
+    def templates(self, search: str = '', category: Optional[str] = None) -> List[Dict]:
+        """
+        按名称搜索模板（空格分隔的多个关键字需全部匹配，不区分大小写），可按分类过滤
+        """
+        self._ensure_templates()
+        with self._lock:
+            templates, keys = self._templates or [], self._search_keys
+            indexes = self._by_category.get(category, []) if category else range(len(templates))
+        terms = (search or '').lower().split()
+        return [dict(templates[i]) for i in indexes if all(term in keys[i] for term in terms)]
+
+    def categories(self) -> List[Dict]:
+        """各分类的模板数量，按分类名称排序"""
+        self._ensure_templates()
+        with self._lock:
+            return [{'category': category, 'count': len(indexes)}
+                    for category, indexes in sorted(self._by_category.items())]
+
+    def host_groups(self, search: str = '') -> List[Dict]:
+        """按名称搜索主机组"""
+        self._ensure_groups()
+        term = (search or '').lower()
+        with self._lock:
+            groups = self._groups or []
+        return [dict(group) for group in groups if term in group['name'].lower()]
+
+    def default_group_ids(self, load: bool = True) -> Optional[List[str]]:
+        """
+        默认主机组ID（按 zabbix_auto_discovery.DEFAULT_GROUP_NAMES 顺序），都不存在时返回None
+
+        Args:
+            load: 为False时不为此加载目录，主机组尚未加载时直接返回None
+        """
+        if not load and self._groups is None:
+            return None
+        by_name = {group['name']: group['groupid'] for group in self.host_groups()}
+        for name in self.discovery.DEFAULT_GROUP_NAMES:
+            if name in by_name:
+                return [by_name[name]]
+        return None
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'templates': len(self._templates or []),
+                'groups': len(self._groups or []),
+                'refreshed_at': self.refreshed_at.isoformat() if self.refreshed_at else None,
+                'stale': self._is_stale(),
+                **self.stats
+            }
+
+    # ------------------------------------------------------------------
+    # 加载与刷新
+    # ------------------------------------------------------------------
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.refresh_interval
+
+    def _ensure_templates(self):
+        if self._templates is None:
+            rows = self._load_from_database()
+            with self._lock:
+                if self._templates is None and rows:
+                    # 数据库中的模板视为新鲜，后台刷新线程或下一次过期检查再与 Zabbix 核对
+                    self._set_templates(rows)
+                    self._checked_at = time.monotonic()
+        if self._templates is None:
+            self._safe_refresh(force=True)
+        elif self._is_stale():
+            self._refresh_in_background()
+
+    def _ensure_groups(self):
+        if self._groups is None:
+            self._safe_refresh(force=True)
+        elif self._is_stale():
+            self._refresh_in_background()
+
+    def invalidate(self):
+        """下一次读取时在后台重新检查（例如创建了新的主机组）"""
+        self._checked_at = 0.0
+
+    def refresh(self, force: bool = False) -> Dict:
+        """
+        检查目录指纹，变化时重新拉取模板和主机组
+
+        Args:
+            force: 不检查指纹，直接重新拉取
+
+        Raises:
+            ZabbixAPIError: Zabbix 调用失败
+        """
+        with self._refresh_lock:
+            zapi = self.discovery.zapi
+            fingerprint = None
+            now = time.monotonic()
+            loaded = self._templates is not None and self._groups is not None
+            if not force and loaded and self._fingerprint is not None and now - self._loaded_at < self.max_age:
+                fingerprint = _fingerprint(zapi.batch(_fingerprint_calls()))
+                self.stats['checks'] += 1
+                if fingerprint == self._fingerprint:
+                    self._checked_at = time.monotonic()
+                    return {'changed': False, 'templates': len(self._templates), 'groups': len(self._groups)}
+
+            results = zapi.batch(_fingerprint_calls() + [
+                ('template.get', dict(self.discovery.TEMPLATE_QUERY)),
+                ('hostgroup.get', dict(self.discovery.HOSTGROUP_QUERY)),
+            ])
+            fingerprint = _fingerprint(results[:4])
+            templates = [self.discovery._normalize_template(template) for template in results[4]]
+            groups = sorted(({'groupid': group['groupid'], 'name': group['name'],
+                              'hosts': self.discovery._count(group.get('hosts'))} for group in results[5]),
+                            key=lambda group: group['name'])
+            changes = self._persist(templates)
+            self.stats['full_refreshes'] += 1
+
+            with self._lock:
+                self._set_templates(templates)
+                self._groups = groups
+                self._fingerprint = fingerprint
+                self._loaded_at = self._checked_at = time.monotonic()
+                self.refreshed_at = timezone.now()
+            logger.info(f"Zabbix目录已刷新: {len(templates)} 个模板, {len(groups)} 个主机组, "
+                        f"新增 {changes['created']} 更新 {changes['updated']} 删除 {changes['deleted']}")
+            return {'changed': True, 'templates': len(templates), 'groups': len(groups), **changes}
+
+    def _safe_refresh(self, force: bool = False):
+        try:
+            self.refresh(force=force)
+        except Exception as e:
+            self.stats['errors'] += 1
+            # 失败后等一个检查间隔再重试，避免每次读取都访问不可达的 Zabbix
+            self._checked_at = time.monotonic()
+            logger.warning(f"刷新Zabbix目录失败: {e}")
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(target=self._background_refresh, name='zabbix-catalog-refresh',
+                                                 daemon=True)
+            self._background.start()
+
+    def _background_refresh(self):
+        try:
+            self._safe_refresh()
+        finally:
+            close_old_connections()
+
+    def _set_templates(self, templates: List[Dict]):
+        """替换模板列表并重建搜索键和分类索引（调用方持有 _lock）"""
+        templates = sorted(templates, key=lambda template: template['name'])
+        by_category: Dict[str, List[int]] = {}
+        for index, template in enumerate(templates):
+            by_category.setdefault(template['category'], []).append(index)
+        self._templates = templates
+        self._search_keys = [template['name'].lower() for template in templates]
+        self._by_category = by_category
+
+    # ------------------------------------------------------------------
+    # 数据库
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _load_from_database() -> List[Dict]:
+        from assets.models import ZabbixTemplate
+
+        rows = []
+        for template in ZabbixTemplate.objects.all():
+            icon, category = classify_template(template.name)
+            rows.append({
+                'templateid': template.templateid,
+                'name': template.name,
+                'description': template.description or '',
+                'groups': template.groups,
+                'items_count': template.items_count,
+                'triggers_count': template.triggers_count,
+                'macros_count': template.macros_count,
+                'icon': template.icon or icon,
+                'category': template.category or category
+            })
+        return rows
+
+    @staticmethod
+    def _persist(templates: List[Dict]) -> Dict[str, int]:
+        """
+        把模板列表同步到 ZabbixTemplate 表：新增、更新有变化的字段、删除 Zabbix 中已不存在的模板
+
+        已有模板保留表中的描述（启动脚本会写入翻译后的描述），并回填到 templates 中
+        """
+        from assets.models import ZabbixTemplate
+
+        with transaction.atomic():
+            existing = {template.templateid: template for template in ZabbixTemplate.objects.all()}
+            created, changed = [], []
+            for data in templates:
+                record = existing.pop(data['templateid'], None)
+                if record is None:
+                    created.append(ZabbixTemplate(templateid=data['templateid'], description=data['description'],
+                                                  **{field: data[field] for field in TEMPLATE_FIELDS}))
+                    continue
+                data['description'] = record.description or ''
+                if any(getattr(record, field) != data[field] for field in TEMPLATE_FIELDS):
+                    for field in TEMPLATE_FIELDS:
+                        setattr(record, field, data[field])
+                    changed.append(record)
+
+            ZabbixTemplate.objects.bulk_create(created, batch_size=500)
+            if changed:
+                now = timezone.now()
+                for record in changed:
+                    record.updated_at = now
+                ZabbixTemplate.objects.bulk_update(changed, TEMPLATE_FIELDS + ('updated_at',), batch_size=500)
+            if existing:
+                ZabbixTemplate.objects.filter(pk__in=[record.pk for record in existing.values()]).delete()
+        return {'created': len(created), 'updated': len(changed), 'deleted': len(existing)}
+
+    # ------------------------------------------------------------------
+    # 后台刷新线程
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动后台刷新线程：立即检查一次，之后每 refresh_interval 秒检查一次"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='zabbix-catalog', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._safe_refresh()
+            finally:
+                close_old_connections()
+            self._stop_event.wait(self.refresh_interval)
+
+
+# 进程内共享的目录实例
+zabbix_catalog = ZabbixCatalog()
@@ -0,0 +1,400 @@
+"""
+Zabbix JSON-RPC 客户端
+- 延迟连接：导入和实例化时不访问网络，第一次调用时才查询版本并登录
+- 线程安全，HTTP 长连接放在连接池中复用
+- 会话过期时自动重新登录并重放请求
+- 支持 JSON-RPC 批量请求；建立连接失败按指数退避重试，请求发出后的失败（超时、5xx）只重试只读方法
+- 调用方式与 pyzabbix 相同：client.host.get({...}) 或 client.host.get(output='extend')
+"""
+
+import http.client
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 不需要认证的方法
+UNAUTHENTICATED_METHODS = {'apiinfo.version', 'user.login', 'user.checkAuthentication'}
+# 只读方法（*.get 之外），请求发出后失败可以安全重放
+READ_ONLY_METHODS = {'apiinfo.version', 'user.checkAuthentication'}
+# 写请求只复用空闲不超过该时间（秒）的连接，避免在已被服务器关闭的连接上发出而无法重放
+WRITE_REUSE_IDLE = 1.0
+# 会话失效时Zabbix返回的错误信息片段
+SESSION_EXPIRED_MARKERS = ('re-login', 'not authorised', 'not authorized', 'session terminated')
+
+
+class ZabbixAPIError(Exception):
+    """Zabbix API 返回的错误"""
+
+    def __init__(self, message: str, code: Optional[int] = None, data: Optional[str] = None):
+        super().__init__(f"{message} {data}".strip() if data else message)
+        self.code = code
+        self.data = data
+
+    @property
+    def session_expired(self) -> bool:
+        text = str(self).lower()
+        return any(marker in text for marker in SESSION_EXPIRED_MARKERS)
+
+
+class ZabbixConnectionError(ZabbixAPIError):
+    """重试后仍无法访问 Zabbix 服务器"""
+
+
+def is_read_only(method: str) -> bool:
+    """方法是否只读（重复执行没有副作用）"""
+    return method in READ_ONLY_METHODS or method.endswith('.get')
+
+
+def _version_tuple(version: Optional[str]) -> Tuple[int, ...]:
+    try:
+        return tuple(int(part) for part in str(version).split('.')[:2])
+    except ValueError:
+        return (0, 0)
+
+
+class _ZabbixObject:
+    """API对象代理：client.host.get(...) -> client.call('host.get', ...)"""
+
+    def __init__(self, client: 'ZabbixClient', name: str):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, method: str):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            if args and kwargs:
+                raise TypeError('参数只能是位置参数或关键字参数之一')
+            params = (args[0] if len(args) == 1 else list(args)) if args else kwargs
+            return self._client.call(f"{self._name}.{method}", params)
+
+        call.__name__ = method
+        return call
+
+
+class ZabbixClient:
+    """
+    Zabbix JSON-RPC 客户端
+
+    Args:
+        url: Zabbix前端地址（如 http://host/zabbix）或 api_jsonrpc.php 的完整地址
+        user / password: 登录账号
+        api_token: API令牌，提供时不再用账号登录
+        timeout: 单次HTTP请求超时（秒）
+        max_retries: 最大重试次数（建立连接失败；只读方法还包括请求发出后的网络错误和5xx）
+        backoff: 首次重试前的等待时间（秒），之后每次翻倍
+        pool_size: 连接池中保留的最大空闲连接数
+        failure_cooldown: 连接失败后多少秒内 check_connection() 直接返回上次的失败结果
+    """
+
+    def __init__(self, url: str, user: Optional[str] = None, password: Optional[str] = None,
+                 api_token: Optional[str] = None, timeout: float = 10, max_retries: int = 3,
+                 backoff: float = 0.5, pool_size: int = 8, failure_cooldown: float = 30):
+        parts = urlsplit(url if '://' in url else f'http://{url}')
+        path = parts.path.rstrip('/')
+        if not path.endswith('.php'):
+            path = f"{path}/api_jsonrpc.php"
+        self.url = f"{parts.scheme}://{parts.netloc}{path}"
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._path = path
+
+        self.user = user
+        self.password = password
+        self.api_token = api_token
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.failure_cooldown = failure_cooldown
+
+        # (连接, 放回时间)
+        self._pool: 'queue.LifoQueue[Tuple[http.client.HTTPConnection, float]]' = queue.LifoQueue(maxsize=pool_size)
+        self._ids = itertools.count(1)
+        self._auth_lock = threading.Lock()
+        self._auth: Optional[str] = api_token
+        self._version: Optional[str] = None
+        self._last_failure: Optional[Tuple[float, str]] = None
+
+        self.stats = {'requests': 0, 'connections': 0, 'retries': 0, 'logins': 0}
+
+    def __getattr__(self, name: str) -> _ZabbixObject:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _ZabbixObject(self, name)
+
+    def __repr__(self) -> str:
+        return f"<ZabbixClient {self.url}>"
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+    def _connect(self) -> http.client.HTTPConnection:
+        self.stats['connections'] += 1
+        if self._scheme == 'https':
+            return http.client.HTTPSConnection(self._netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    def _acquire(self, max_idle: Optional[float] = None) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        取一个连接，返回 (连接, 是否为复用的连接)
+
+        Args:
+            max_idle: 只复用空闲时间不超过该值（秒）的连接，更早的连接直接关闭
+        """
+        try:
+            conn, released_at = self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect(), False
+        if max_idle is not None and time.monotonic() - released_at > max_idle:
+            conn.close()
+            return self._connect(), False
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    def _post(self, payload: Any, headers: Dict[str, str], read_only: bool = True) -> Any:
+        """
+        发送一次JSON-RPC请求
+
+        建立连接失败时按指数退避重试；请求发出后的失败（读取超时、连接中断、5xx）只对只读调用重试，
+        写操作可能已在服务器上执行，直接抛出 ZabbixConnectionError
+
+        Args:
+            read_only: 请求中的方法是否全部只读
+        """
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json-rpc', **headers}
+        attempt = 0
+        while True:
+            conn, reused = self._acquire(None if read_only else WRITE_REUSE_IDLE)
+            sent = False
+            try:
+                self.stats['requests'] += 1
+                if conn.sock is None:
+                    conn.connect()
+                sent = True
+                conn.request('POST', self._path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.status >= 500:
+                    raise http.client.HTTPException(f"HTTP {response.status}")
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if response.status != 200:
+                    raise ZabbixAPIError(f"HTTP {response.status}: {data[:200]!r}")
+                return json.loads(data)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if sent and not read_only:
+                    raise ZabbixConnectionError(f"Zabbix写请求发出后失败，未重试 {self.url}: {e}")
+                # 复用的空闲连接可能已被服务器关闭，换新连接立即重试一次，不计入重试次数
+                if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                    continue
+                if attempt >= self.max_retries:
+                    raise ZabbixConnectionError(f"无法访问Zabbix服务器 {self.url}: {e}")
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                self.stats['retries'] += 1
+                logger.warning(f"Zabbix请求失败，{delay:.1f} 秒后第 {attempt} 次重试: {e}")
+                time.sleep(delay)
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
+            try:
+                self._pool.get_nowait()[0].close()
+            except queue.Empty:
+                return
+
+    # ------------------------------------------------------------------
+    # 认证
+    # ------------------------------------------------------------------
+    @property
+    def api_version(self) -> str:
+        """Zabbix API版本（第一次访问时查询）"""
+        if self._version is None:
+            self._version = self._request('apiinfo.version', {}, auth=None)
+        return self._version
+
+    def _use_header_auth(self) -> bool:
+        # 6.4 起支持 Authorization 头，7.2 起不再接受请求体中的 auth
+        return _version_tuple(self.api_version) >= (6, 4)
+
+    def login(self) -> str:
+        """登录并返回会话令牌（提供了 api_token 时直接使用令牌，已登录时返回当前令牌）"""
+        with self._auth_lock:
+            if self.api_token:
+                self._auth = self.api_token
+                return self._auth
+            # 等待锁期间其他线程已经登录
+            if self._auth is not None:
+                return self._auth
+            user_key = 'username' if _version_tuple(self.api_version) >= (5, 4) else 'user'
+            self._auth = self._request('user.login', {user_key: self.user, 'password': self.password}, auth=None)
+            self.stats['logins'] += 1
+            logger.info(f"Zabbix登录成功: {self.url} (API {self.api_version})")
+            return self._auth
+
+    def _ensure_auth(self) -> str:
+        auth = self._auth
+        return auth if auth is not None else self.login()
+
+    def _invalidate_auth(self, stale: Optional[str]):
+        with self._auth_lock:
+            if self._auth == stale and not self.api_token:
+                self._auth = None
+
+    def check_connection(self) -> Dict:
+        """
+        检查连接（查询版本并登录），不抛出异常
+
+        连接失败后 failure_cooldown 秒内直接返回上次的失败结果，避免每个请求都等待超时
+        """
+        failure = self._last_failure
+        if failure is not None and time.monotonic() - failure[0] < self.failure_cooldown:
+            return {'connected': False, 'version': self._version, 'error': failure[1]}
+        try:
+            self._ensure_auth()
+            self._last_failure = None
+            return {'connected': True, 'version': self.api_version, 'error': None}
+        except Exception as e:
+            self._last_failure = (time.monotonic(), str(e))
+            return {'connected': False, 'version': self._version, 'error': str(e)}
+
+    # ------------------------------------------------------------------
+    # 调用
+    # ------------------------------------------------------------------
+    def _envelope(self, method: str, params: Any, auth: Optional[str]) -> Tuple[Dict, Dict[str, str]]:
+        payload = {'jsonrpc': '2.0', 'method': method, 'params': params if params is not None else {},
+                   'id': next(self._ids)}
+        headers = {}
+        if auth is not None:
+            if self._use_header_auth():
+                headers['Authorization'] = f"Bearer {auth}"
+            else:
+                payload['auth'] = auth
+        return payload, headers
+
+    @staticmethod
+    def _unwrap(response: Dict) -> Any:
+        if 'error' in response:
+            error = response['error'] or {}
+            raise ZabbixAPIError(error.get('message', 'Zabbix API错误'), error.get('code'), error.get('data'))
+        return response.get('result')
+
+    def _request(self, method: str, params: Any, auth: Optional[str]) -> Any:
+        payload, headers = self._envelope(method, params, auth)
+        return self._unwrap(self._post(payload, headers, read_only=is_read_only(method)))
+
+    def call(self, method: str, params: Any = None) -> Any:
+        """
+        调用一个API方法，会话过期时重新登录并重试一次
+
+        Raises:
+            ZabbixAPIError: API返回错误
+            ZabbixConnectionError: 重试后仍无法访问服务器
+        """
+        if method in UNAUTHENTICATED_METHODS:
+            return self._request(method, params, auth=None)
+        auth = self._ensure_auth()
+        try:
+            return self._request(method, params, auth)
+        except ZabbixAPIError as e:
+            if isinstance(e, ZabbixConnectionError) or not e.session_expired:
+                raise
+            logger.info("Zabbix会话已过期，重新登录")
+            self._invalidate_auth(auth)
+            return self._request(method, params, self._ensure_auth())
+
+    def batch(self, calls: Iterable[Tuple[str, Any]], raise_errors: bool = True) -> List[Any]:
+        """
+        用一个JSON-RPC批量请求执行多个调用，结果按调用顺序返回
+
+        Args:
+            calls: [(方法名, 参数), ...]
+            raise_errors: 为False时出错的调用在结果中返回 ZabbixAPIError 实例，而不是抛出
+
+        服务器不支持批量请求时退化为逐个调用
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+
+        for attempt in range(2):
+            auth = self._ensure_auth()
+            payloads, headers = [], {}
+            for method, params in calls:
+                payload, headers = self._envelope(method, params, None if method in UNAUTHENTICATED_METHODS else auth)
+                payloads.append(payload)
+            response = self._post(payloads, headers, read_only=all(is_read_only(method) for method, _ in calls))
+
+            if not isinstance(response, list):
+                # 不支持批量请求的服务器返回单个错误对象
+                logger.info("Zabbix服务器不支持批量请求，改为逐个调用")
+                return self._sequential(calls, raise_errors)
+
+            by_id = {item.get('id'): item for item in response}
+            results = []
+            for payload in payloads:
+                item = by_id.get(payload['id'], {'error': {'message': '批量响应中缺少结果'}})
+                try:
+                    results.append(self._unwrap(item))
+                except ZabbixAPIError as e:
+                    results.append(e)
+
+            if attempt == 0 and any(isinstance(r, ZabbixAPIError) and r.session_expired for r in results):
+                self._invalidate_auth(auth)
+                continue
+            break
+
+        if raise_errors:
+            for result in results:
+                if isinstance(result, ZabbixAPIError):
+                    raise result
+        return results
+
+    def _sequential(self, calls: List[Tuple[str, Any]], raise_errors: bool) -> List[Any]:
+        results = []
+        for method, params in calls:
+            try:
+                results.append(self.call(method, params))
+            except ZabbixAPIError as e:
+                if raise_errors or isinstance(e, ZabbixConnectionError):
+                    raise
+                results.append(e)
+        return results
+
+
+_client: Optional[ZabbixClient] = None
+_client_lock = threading.Lock()
+
+
+def get_zabbix_client() -> ZabbixClient:
+    """进程内共享的Zabbix客户端（按 settings 中的 ZABBIX_* 配置创建，不访问网络）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from django.conf import settings
+                _client = ZabbixClient(
+                    getattr(settings, 'ZABBIX_URL', 'http://127.0.0.1/zabbix'),
+                    user=getattr(settings, 'ZABBIX_USER', None),
+                    password=getattr(settings, 'ZABBIX_PASSWORD', None),
+                    api_token=getattr(settings, 'ZABBIX_API_TOKEN', None),
+                    timeout=getattr(settings, 'ZABBIX_TIMEOUT', 10)
+                )
+    return _client
@@ -0,0 +1,254 @@
+"""
+本地模拟的 Zabbix JSON-RPC 服务器（测试和性能对比用）
+在内存中保存 host / hostgroup / template / drule / dhost / dservice 对象，
+实现 get / create / update / delete 的常用参数，支持批量请求、会话过期和故障注入
+"""
+
+import itertools
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 各对象类型的ID字段
+ID_FIELDS = {
+    'host': 'hostid',
+    'hostgroup': 'groupid',
+    'template': 'templateid',
+    'drule': 'druleid',
+    'dhost': 'dhostid',
+    'dservice': 'dserviceid',
+}
+
+
+class FakeZabbixError(Exception):
+    def __init__(self, message: str, data: str = '', code: int = -32602):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class FakeZabbixServer:
+    """
+    模拟的 Zabbix 服务器
+
+    Args:
+        version: apiinfo.version 返回的版本
+        user / password: 允许登录的账号
+        supports_batch: 为False时对批量请求返回错误（模拟不支持批量的服务器）
+    """
+
+    def __init__(self, version: str = '6.0.0', user: str = 'Admin', password: str = 'zabbix',
+                 supports_batch: bool = True):
+        self.version = version
+        self.user = user
+        self.password = password
+        self.supports_batch = supports_batch
+
+        self.objects: Dict[str, List[Dict]] = {name: [] for name in ID_FIELDS}
+        self.sessions = set()
+        self.calls: List[str] = []
+        self.http_requests = 0
+        self.connections = 0
+        self.fail_next = 0
+        self.latency = 0.0
+
+        self._ids = itertools.count(10001)
+        self._lock = threading.RLock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/zabbix"
+
+    def start(self) -> 'FakeZabbixServer':
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                status, payload = fake.handle(body, self.headers.get('Authorization'))
+                data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 数据
+    # ------------------------------------------------------------------
+    def add(self, kind: str, **fields) -> Dict:
+        """直接插入一个对象，返回该对象"""
+        with self._lock:
+            obj = {ID_FIELDS[kind]: str(next(self._ids)), **fields}
+            self.objects[kind].append(obj)
+            return obj
+
+    def expire_sessions(self):
+        """使所有会话失效（模拟会话超时）"""
+        with self._lock:
+            self.sessions.clear()
+
+    def count(self, method: str) -> int:
+        """某个方法被调用的次数"""
+        return sum(1 for name in self.calls if name == method)
+
+    # ------------------------------------------------------------------
+    # 请求处理
+    # ------------------------------------------------------------------
+    def handle(self, body: bytes, authorization: Optional[str]):
+        with self._lock:
+            self.http_requests += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 503, None
+        if self.latency:
+            threading.Event().wait(self.latency)
+
+        request = json.loads(body)
+        header_auth = authorization[7:] if authorization and authorization.startswith('Bearer ') else None
+        if isinstance(request, list):
+            if not self.supports_batch:
+                return 200, {'jsonrpc': '2.0', 'error': {'code': -32600, 'message': 'Invalid request.',
+                                                         'data': 'Batch requests are not supported.'}, 'id': None}
+            return 200, [self._dispatch(item, header_auth) for item in request]
+        return 200, self._dispatch(request, header_auth)
+
+    def _dispatch(self, request: Dict, header_auth: Optional[str]) -> Dict:
+        method = request.get('method', '')
+        with self._lock:
+            self.calls.append(method)
+        try:
+            if method not in ('apiinfo.version', 'user.login'):
+                auth = header_auth or request.get('auth')
+                if auth not in self.sessions:
+                    raise FakeZabbixError('Session terminated, re-login, please.', code=-32602)
+            result = self._call(method, request.get('params') or {})
+            return {'jsonrpc': '2.0', 'result': result, 'id': request.get('id')}
+        except FakeZabbixError as e:
+            return {'jsonrpc': '2.0', 'error': {'code': e.code, 'message': str(e), 'data': e.data},
+                    'id': request.get('id')}
+
+    def _call(self, method: str, params: Any) -> Any:
+        if method == 'apiinfo.version':
+            return self.version
+        if method == 'user.login':
+            if params.get('username', params.get('user')) != self.user or params.get('password') != self.password:
+                raise FakeZabbixError('Login name or password is incorrect.')
+            token = uuid.uuid4().hex
+            with self._lock:
+                self.sessions.add(token)
+            return token
+
+        kind, _, action = method.partition('.')
+        if kind not in ID_FIELDS:
+            raise FakeZabbixError('Incorrect API', f'No such API "{kind}".', code=-32601)
+        handler = getattr(self, f'_{action}', None)
+        if handler is None:
+            raise FakeZabbixError('Incorrect method', f'No such method "{method}".', code=-32601)
+        with self._lock:
+            return handler(kind, params)
+
+    def _get(self, kind: str, params: Dict) -> Any:
+        items = list(self.objects[kind])
+        for key, field in (('hostids', 'hostid'), ('groupids', 'groupid'), ('templateids', 'templateid'),
+                           ('druleids', 'druleid'), ('dhostids', 'dhostid'), ('dserviceids', 'dserviceid')):
+            if key in params:
+                wanted = params[key] if isinstance(params[key], list) else [params[key]]
+                wanted = {str(value) for value in wanted}
+                items = [item for item in items if str(item.get(field)) in wanted]
+        for field, value in (params.get('filter') or {}).items():
+            values = {str(v) for v in (value if isinstance(value, list) else [value])}
+            items = [item for item in items if str(item.get(field)) in values]
+        for field, value in (params.get('search') or {}).items():
+            items = [item for item in items if str(value).lower() in str(item.get(field, '')).lower()]
+
+        id_field = ID_FIELDS[kind]
+        items.sort(key=lambda item: int(item[id_field]))
+        if 'sortfield' in params and params.get('sortorder') == 'DESC':
+            items.reverse()
+        if params.get('countOutput'):
+            return str(len(items))
+        if 'limit' in params:
+            items = items[:int(params['limit'])]
+
+        output = params.get('output', 'extend')
+        if output != 'extend' and isinstance(output, list):
+            # selectXxx: 'count' 返回对象上预置的同名字段（如 items='12'）
+            counted = [key[6:].lower() for key, value in params.items() if key.startswith('select') and value == 'count']
+            items = [{field: item[field] for field in output + counted + [id_field] if field in item} for item in items]
+        else:
+            items = [dict(item) for item in items]
+        if kind == 'dhost' and params.get('selectDServices'):
+            for item in items:
+                item['dservices'] = [dict(service) for service in self.objects['dservice']
+                                     if service.get('dhostid') == item['dhostid']]
+        return items
+
+    def _create(self, kind: str, params: Any) -> Dict:
+        id_field = ID_FIELDS[kind]
+        items = params if isinstance(params, list) else [params]
+        if kind == 'host':
+            # 与 Zabbix 一样整批校验，任何一个主机无效时整批都不创建
+            names = {item.get('host') for item in self.objects['host']}
+            for fields in items:
+                name = fields.get('host') or ''
+                if not re.fullmatch(r'[0-9A-Za-z_. -]+', name):
+                    raise FakeZabbixError('Invalid params.', f'Incorrect characters used for host name "{name}".')
+                if name in names:
+                    raise FakeZabbixError('Invalid params.', f'Host with the same name "{name}" already exists.')
+                names.add(name)
+        return {f'{id_field}s': [self.add(kind, **fields)[id_field] for fields in items]}
+
+    def _update(self, kind: str, params: Any) -> Dict:
+        id_field = ID_FIELDS[kind]
+        updated = []
+        for fields in (params if isinstance(params, list) else [params]):
+            for item in self.objects[kind]:
+                if item[id_field] == str(fields.get(id_field)):
+                    item.update(fields)
+                    updated.append(item[id_field])
+        return {f'{id_field}s': updated}
+
+    def _delete(self, kind: str, params: Any) -> Dict:
+        id_field = ID_FIELDS[kind]
+        ids = {str(value) for value in (params if isinstance(params, list) else [params])}
+        self.objects[kind] = [item for item in self.objects[kind] if item[id_field] not in ids]
+        return {f'{id_field}s': sorted(ids)}
@@ -0,0 +1,64 @@
+"""
+Token认证缓存
+HTTP（DRF）和WebSocket认证共用：按 token 缓存 Token 对象（连同用户和用户资料），有效期很短；
+登出、踢出、重置密码以及用户或用户资料变更时通过信号立即失效（见 users.signals）
+"""
+
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+logger = logging.getLogger(__name__)
+
+# 缓存有效期（秒）
+DEFAULT_TTL = 60
+# 不存在的 token 也缓存一小段时间，避免无效 token 反复查库
+MISSING_TTL = 10
+TOKEN_KEY = 'auth_token:{}'
+USER_TOKENS_KEY = 'auth_user_tokens:{}'
+# 缓存中表示 token 不存在
+MISSING = 'missing'
+
+
+def get_token(key: str) -> Optional[Token]:
+    """
+    根据 token 获取 Token 对象（已关联 user 和 user.profile），token 不存在时返回None
+    """
+    if not key:
+        return None
+    cache_key = TOKEN_KEY.format(key)
+    cached = cache.get(cache_key)
+    if cached == MISSING:
+        return None
+    if cached is not None:
+        return cached
+
+    token = Token.objects.select_related('user', 'user__profile').filter(key=key).first()
+    if token is None:
+        cache.set(cache_key, MISSING, timeout=MISSING_TTL)
+        return None
+
+    ttl = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', DEFAULT_TTL)
+    cache.set(cache_key, token, timeout=ttl)
+    # 记录用户的 token，用户变更时据此失效
+    user_key = USER_TOKENS_KEY.format(token.user_id)
+    keys = [k for k in cache.get(user_key) or [] if k != key]
+    cache.set(user_key, keys + [key], timeout=ttl)
+    return token
+
+
+def invalidate_token(key: str):
+    """使一个 token 的缓存失效"""
+    cache.delete(TOKEN_KEY.format(key))
+
+
+def invalidate_user(user_id):
+    """使用户所有 token 的缓存失效"""
+    user_key = USER_TOKENS_KEY.format(user_id)
+    keys = cache.get(user_key) or []
+    cache.delete_many([TOKEN_KEY.format(key) for key in keys] + [user_key])
+    if keys:
+        logger.debug(f"用户 {user_id} 的 {len(keys)} 个认证缓存已失效")
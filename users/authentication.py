@@ -0,0 +1,29 @@
+"""
+DRF认证类
+"""
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .auth_cache import get_token
+from .presence import presence_registry
+
+
+class HeartbeatTokenAuthentication(TokenAuthentication):
+    """
+    Token认证，从认证缓存（与WebSocket认证共用）读取 token，认证成功时记录会话心跳
+    心跳只写入内存中的在线状态登记表，由后台线程批量写回 UserSession.last_activity
+    """
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # 登录时以 token 前40位作为会话密钥
+        presence_registry.touch_key(key[:40])
+        return token.user, token
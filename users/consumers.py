@@ -10,6 +10,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from .models import UserSession
+from .presence import presence_registry
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -147,6 +148,8 @@ class UserSessionConsumer(AsyncWebsocketConsumer):
             
             if message_type == 'ping':
                 # 心跳消息
+                if self.user_session:
+                    await self.touch_session(self.user_session)
                 await self.send(text_data=json.dumps({
                     'type': 'pong',
                     'timestamp': data.get('timestamp')
@@ -229,14 +232,16 @@ class UserSessionConsumer(AsyncWebsocketConsumer):
             import traceback
             logger.error(f"详细错误信息: {traceback.format_exc()}")
     
+    @database_sync_to_async
+    def touch_session(self, session):
+        """记录会话心跳（首次使用时在线状态登记表需要从数据库加载）"""
+        presence_registry.touch(session)
+    
     @database_sync_to_async
     def check_user_online_status(self, user):
         """检查用户在线状态"""
         try:
-            return UserSession.objects.filter(
-                user=user,
-                is_active=True
-            ).exists()
+            return presence_registry.is_user_online(user.id)
         except Exception:
             return False
 
@@ -5,6 +5,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from users.models import UserSession
+from users.session_expiry import sweep_expired_sessions
 
 
 class Command(BaseCommand):
@@ -44,20 +45,16 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('*** 模拟运行模式 - 不会实际删除数据 ***'))
         
         # 1. 清理过期会话
-        timeout_threshold = timezone.now() - timezone.timedelta(minutes=timeout_minutes)
-        expired_sessions = UserSession.objects.filter(
-            is_active=True,
-            last_activity__lte=timeout_threshold
-        )
+        expired_sessions = UserSession.expired_queryset(timeout_minutes)
         
         expired_count = expired_sessions.count()
         self.stdout.write(f'找到 {expired_count} 个过期会话')
         
         if not dry_run and expired_count > 0:
-            for session in expired_sessions:
-                session.mark_offline('timeout')
+            result = sweep_expired_sessions(timeout_minutes)
             self.stdout.write(
-                self.style.SUCCESS(f'成功标记 {expired_count} 个过期会话为离线')
+                self.style.SUCCESS(f'成功标记 {result["expired"]} 个过期会话为离线，'
+                                   f'通知 {result["notified"]} 个用户')
             )
         
         # 2. 清理旧的非活跃会话记录
@@ -0,0 +1,40 @@
+"""
+单独运行用户会话清理调度器的Django管理命令
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from users.session_scheduler import SessionScheduler
+
+
+class Command(BaseCommand):
+    help = '按配置的间隔持续执行用户会话清理作业（多个实例同时运行时只有一个实例执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='立即执行一次所有作业后退出'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = SessionScheduler()
+
+        if options['once']:
+            for name in scheduler.jobs:
+                job = scheduler.run_job(name)
+                self.stdout.write(f'{name}: 处理 {job["last_result"].get("rows", 0)} 行, '
+                                  f'耗时 {job["last_duration"]}s' + (f', 失败: {job["last_error"]}' if job['last_error'] else ''))
+            self.stdout.write(json.dumps(scheduler.metrics(), ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS('会话清理调度器已启动，按 Ctrl+C 停止'))
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.release()
+            self.stdout.write('会话清理调度器已停止')
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_delete_dictionary"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usersession",
+            name="last_activity",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="最后活动时间"
+            ),
+        ),
+    ]
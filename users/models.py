@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.sessions.models import Session
 import json
@@ -114,7 +114,8 @@ class UserSession(models.Model):
     user_agent = models.TextField('用户代理', blank=True)
     device_info = models.CharField('设备信息', max_length=200, blank=True)
     login_time = models.DateTimeField('登录时间', auto_now_add=True)
-    last_activity = models.DateTimeField('最后活动时间', auto_now=True)
+    # 心跳先记录在内存中（users.presence），由后台线程批量写回，保存会话时不自动更新
+    last_activity = models.DateTimeField('最后活动时间', default=timezone.now)
     is_active = models.BooleanField('是否活跃', default=True)
     logout_reason = models.CharField('登出原因', max_length=50, blank=True,
                                    choices=[
@@ -144,6 +145,15 @@ class UserSession(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.ip_address} - {self.login_time}"
     
+    @property
+    def current_activity(self):
+        """最后活动时间，内存中有尚未写回数据库的心跳时取较新的值"""
+        from .presence import presence_registry
+        last_seen = presence_registry.last_seen(self.id)
+        if last_seen is None or last_seen <= self.last_activity:
+            return self.last_activity
+        return last_seen
+    
     @property
     def is_online(self):
         """判断用户是否在线（5分钟内有活动且会话激活）"""
@@ -152,7 +162,7 @@ class UserSession(models.Model):
         
         # 检查会话是否过期（5分钟无活动认为离线）
         timeout_threshold = timezone.now() - timezone.timedelta(minutes=5)
-        return self.last_activity > timeout_threshold
+        return self.current_activity > timeout_threshold
     
     def mark_offline(self, reason='normal'):
         """标记会话为离线"""
@@ -170,20 +180,14 @@ class UserSession(models.Model):
             pass
     
     def add_websocket_channel(self, channel_name):
-        """添加WebSocket通道"""
-        if not self.websocket_channels:
-            self.websocket_channels = []
-        if channel_name not in self.websocket_channels:
-            self.websocket_channels.append(channel_name)
-            self.has_websocket = True
-            self.save(update_fields=['websocket_channels', 'has_websocket'])
+        """添加WebSocket通道（登记在内存中，由后台线程批量写回数据库）"""
+        from .presence import presence_registry
+        presence_registry.connect(self, channel_name)
     
     def remove_websocket_channel(self, channel_name):
         """移除WebSocket通道"""
-        if self.websocket_channels and channel_name in self.websocket_channels:
-            self.websocket_channels.remove(channel_name)
-            self.has_websocket = len(self.websocket_channels) > 0
-            self.save(update_fields=['websocket_channels', 'has_websocket'])
+        from .presence import presence_registry
+        presence_registry.disconnect(self, channel_name)
     
     def get_websocket_channels(self):
         """获取所有WebSocket通道"""
@@ -191,42 +195,51 @@ class UserSession(models.Model):
     
     @classmethod
     def get_online_users_count(cls):
-        """获取在线用户数量"""
-        timeout_threshold = timezone.now() - timezone.timedelta(minutes=5)
-        return cls.objects.filter(
-            is_active=True,
-            last_activity__gt=timeout_threshold
-        ).values('user').distinct().count()
+        """获取在线用户数量（从内存中的在线状态登记表读取）"""
+        from .presence import presence_registry
+        return presence_registry.online_count()
     
     @classmethod
-    def cleanup_expired_sessions(cls, timeout_minutes=5):
-        """清理过期的会话记录"""
-        timeout_threshold = timezone.now() - timezone.timedelta(minutes=timeout_minutes)
-        expired_sessions = cls.objects.filter(
-            is_active=True,
-            last_activity__lte=timeout_threshold
-        )
+    def bulk_mark_offline(cls, queryset, reason='normal', chunk_size=500):
+        """
+        集合式标记会话为离线：按块一条 UPDATE 更新会话记录、一条 DELETE 删除对应的Django session
         
+        Returns:
+            (下线的会话数, 涉及的用户ID集合)
+        """
+        rows = list(queryset.filter(is_active=True).order_by().values_list('id', 'user_id', 'session_key'))
         count = 0
-        for session in expired_sessions:
-            session.mark_offline('timeout')
-            count += 1
-        
+        with transaction.atomic():
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                count += cls.objects.filter(id__in=[row[0] for row in chunk], is_active=True).update(
+                    is_active=False,
+                    logout_reason=reason,
+                    websocket_channels=[],  # 清空WebSocket通道
+                    has_websocket=False
+                )
+                Session.objects.filter(session_key__in=[row[2] for row in chunk]).delete()
+        if rows:
+            from .presence import presence_registry
+            transaction.on_commit(lambda: presence_registry.discard_sessions([row[0] for row in rows]))
+        return count, {row[1] for row in rows}
+    
+    @classmethod
+    def expired_queryset(cls, timeout_minutes=5):
+        """超过 timeout_minutes 无活动的活跃会话"""
+        timeout_threshold = timezone.now() - timezone.timedelta(minutes=timeout_minutes)
+        return cls.objects.filter(is_active=True, last_activity__lte=timeout_threshold)
+    
+    @classmethod
+    def cleanup_expired_sessions(cls, timeout_minutes=5):
+        """清理过期的会话记录"""
+        count, _ = cls.bulk_mark_offline(cls.expired_queryset(timeout_minutes), 'timeout')
         return count
     
     @classmethod
     def cleanup_duplicate_sessions(cls, user, session_key):
         """清理用户的重复会话，避免唯一性约束冲突"""
-        existing_sessions = cls.objects.filter(
-            user=user,
-            session_key=session_key
-        )
-        
-        count = 0
-        for session in existing_sessions:
-            session.mark_offline('replaced')
-            count += 1
-            
+        count, _ = cls.bulk_mark_offline(cls.objects.filter(user=user, session_key=session_key), 'replaced')
         return count
     
     @classmethod
@@ -244,23 +257,27 @@ class UserSession(models.Model):
     
     @classmethod
     def safe_create_session(cls, user, session_key, ip_address, user_agent, device_info=''):
-        """安全创建会话，自动处理重复和过期会话"""
-        # 1. 清理过期会话
-        expired_count = cls.cleanup_expired_sessions()
+        """
+        安全创建会话，自动处理重复会话和超出数量限制的旧会话
+        
+        过期会话由后台清理任务集合式下线（见 users.session_expiry），登录请求中不再扫描
+        """
+        from .presence import presence_registry
         
-        # 2. 清理重复会话
+        # 1. 清理重复会话（session_key 唯一，未下线的同名会话会导致创建失败）
         duplicate_count = cls.cleanup_duplicate_sessions(user, session_key)
+        expired_count = 0
         
-        # 3. 限制最大活跃会话数
-        active_sessions = cls.objects.filter(user=user, is_active=True)
+        # 2. 限制最大活跃会话数
         max_sessions = 5
-        if active_sessions.count() >= max_sessions:
+        active_ids = list(cls.objects.filter(user=user, is_active=True).order_by('last_activity')
+                          .values_list('id', flat=True))
+        if len(active_ids) >= max_sessions:
             # 清理最旧的会话
-            oldest_sessions = active_sessions.order_by('last_activity')[:active_sessions.count() - max_sessions + 1]
-            for session in oldest_sessions:
-                session.mark_offline('limit_exceeded')
+            cls.bulk_mark_offline(cls.objects.filter(id__in=active_ids[:len(active_ids) - max_sessions + 1]),
+                                  'limit_exceeded')
         
-        # 4. 创建新会话
+        # 3. 创建新会话
         try:
             session = cls.objects.create(
                 user=user,
@@ -269,6 +286,7 @@ class UserSession(models.Model):
                 user_agent=user_agent,
                 device_info=device_info
             )
+            presence_registry.touch(session)
             return session, {'expired': expired_count, 'duplicates': duplicate_count}
         except Exception as e:
             # 如果仍然有重复，再次清理
@@ -280,4 +298,5 @@ class UserSession(models.Model):
                 user_agent=user_agent,
                 device_info=device_info
             )
+            presence_registry.touch(session)
             return session, {'expired': expired_count, 'duplicates': duplicate_count, 'retry': True}
\ No newline at end of file
@@ -0,0 +1,302 @@
+"""
+用户在线状态登记
+每个活跃会话的最后心跳时间和WebSocket通道保存在进程内存中，在线用户数和用户的WebSocket状态直接从内存读取；
+用户按最后心跳时间排序，统计在线数时只需从最旧的一端淘汰超过有效期的用户；
+心跳和通道变化只标记会话，由后台线程定期把合并后的 last_activity / websocket_channels / has_websocket
+用一条 bulk_update 批量写回 UserSession
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# 心跳有效期（秒），与会话超时时间一致
+PRESENCE_TTL = 300
+# 写回心跳和通道变化的间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 5
+# 每条 bulk_update 语句更新的会话数
+FLUSH_BATCH_SIZE = 500
+
+
+class PresenceRegistry:
+    """
+    在线状态登记表
+
+    Args:
+        ttl: 心跳有效期（秒），超过有效期没有心跳的会话视为离线
+        flush_interval: 后台写回心跳和通道变化的间隔（秒）
+    """
+
+    def __init__(self, ttl: float = PRESENCE_TTL, flush_interval: Optional[float] = None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            getattr(settings, 'PRESENCE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        # 会话ID -> {'user_id', 'session_key', 'last_seen', 'channels', 'ip_address', 'login_time'}
+        self._sessions: Dict[int, Dict] = {}
+        # 会话密钥 -> 会话ID
+        self._keys: Dict[str, int] = {}
+        # 用户ID -> 会话ID集合
+        self._users: Dict[int, Set[int]] = {}
+        # 用户ID -> 最后心跳时间，按心跳时间从旧到新排序
+        self._online: 'OrderedDict[int, float]' = OrderedDict()
+        # 心跳或通道有变化、尚未写回数据库的会话
+        self._dirty: Set[int] = set()
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'flushes': 0, 'flushed_sessions': 0, 'errors': 0}
+
+    # ------------------------------------------------------------------
+    # 加载
+    # ------------------------------------------------------------------
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import UserSession
+
+        cutoff = time.time() - self.ttl
+        rows = UserSession.objects.filter(is_active=True).order_by('last_activity').values_list(
+            'id', 'user_id', 'session_key', 'last_activity', 'ip_address', 'login_time')
+        with self._lock:
+            if self._loaded:
+                return
+            for session_id, user_id, session_key, last_activity, ip_address, login_time in rows:
+                if session_id in self._sessions:
+                    continue
+                self._add_session(session_id, user_id, session_key, last_activity.timestamp(), ip_address, login_time)
+                if last_activity.timestamp() > cutoff:
+                    self._touch_user(user_id, last_activity.timestamp())
+            self._loaded = True
+            logger.info(f"在线状态已加载: {len(self._sessions)} 个活跃会话")
+
+    def reset(self):
+        """清空内存中的状态，下一次读取时重新从数据库加载（测试使用）"""
+        with self._lock:
+            self._sessions.clear()
+            self._keys.clear()
+            self._users.clear()
+            self._online.clear()
+            self._dirty.clear()
+            self._loaded = False
+
+    # ------------------------------------------------------------------
+    # 更新（调用方持有 _lock）
+    # ------------------------------------------------------------------
+    def _add_session(self, session_id, user_id, session_key, last_seen, ip_address=None, login_time=None) -> Dict:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            entry = self._sessions[session_id] = {
+                'user_id': user_id, 'session_key': session_key, 'last_seen': last_seen,
+                'channels': set(), 'ip_address': ip_address, 'login_time': login_time
+            }
+            self._keys[session_key] = session_id
+            self._users.setdefault(user_id, set()).add(session_id)
+        return entry
+
+    def _beat(self, session_id, at: float):
+        entry = self._sessions[session_id]
+        if at > entry['last_seen']:
+            entry['last_seen'] = at
+            self._dirty.add(session_id)
+        self._touch_user(entry['user_id'], at)
+
+    def _touch_user(self, user_id, at: float):
+        if self._online.get(user_id, 0) < at:
+            self._online[user_id] = at
+            self._online.move_to_end(user_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        while self._online:
+            user_id, last_seen = next(iter(self._online.items()))
+            if last_seen > cutoff:
+                break
+            self._online.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 心跳与通道
+    # ------------------------------------------------------------------
+    def touch(self, session, at: Optional[float] = None):
+        """记录会话的一次心跳（登录、WebSocket连接或心跳消息）"""
+        self._ensure_loaded()
+        at = at or time.time()
+        with self._lock:
+            self._add_session(session.id, session.user_id, session.session_key, session.last_activity.timestamp(),
+                              session.ip_address, session.login_time)
+            self._beat(session.id, at)
+
+    def touch_key(self, session_key: str, at: Optional[float] = None) -> bool:
+        """
+        按会话密钥记录一次心跳（已认证的API请求），不访问数据库
+
+        Returns:
+            会话是否在登记表中（未登记或已下线的会话忽略）
+        """
+        self._ensure_loaded()
+        with self._lock:
+            session_id = self._keys.get(session_key)
+            if session_id is None:
+                return False
+            self._beat(session_id, at or time.time())
+            return True
+
+    def connect(self, session, channel_name: str):
+        """会话建立了一个WebSocket连接"""
+        self.touch(session)
+        with self._lock:
+            entry = self._sessions[session.id]
+            if channel_name not in entry['channels']:
+                entry['channels'].add(channel_name)
+                self._dirty.add(session.id)
+
+    def disconnect(self, session, channel_name: str):
+        """会话的一个WebSocket连接已断开"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._sessions.get(session.id)
+            if entry is not None and channel_name in entry['channels']:
+                entry['channels'].discard(channel_name)
+                self._dirty.add(session.id)
+
+    def discard_sessions(self, session_ids: Iterable[int]):
+        """会话已下线（登出、踢出、过期），从登记表中移除"""
+        with self._lock:
+            for session_id in session_ids:
+                entry = self._sessions.pop(session_id, None)
+                self._dirty.discard(session_id)
+                if entry is None:
+                    continue
+                self._keys.pop(entry['session_key'], None)
+                user_id = entry['user_id']
+                remaining = self._users.get(user_id, set())
+                remaining.discard(session_id)
+                if not remaining:
+                    self._users.pop(user_id, None)
+                    self._online.pop(user_id, None)
+                elif user_id in self._online:
+                    # 最后心跳取剩余会话的最大值（位置不变，过期前最多多保留一个有效期）
+                    self._online[user_id] = max(self._sessions[sid]['last_seen'] for sid in remaining)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def online_count(self) -> int:
+        """在线用户数（有效期内有心跳的用户）"""
+        self._ensure_loaded()
+        with self._lock:
+            self._prune()
+            return len(self._online)
+
+    def is_user_online(self, user_id) -> bool:
+        self._ensure_loaded()
+        with self._lock:
+            return self._online.get(user_id, 0) > time.time() - self.ttl
+
+    def last_seen(self, session_id) -> Optional[datetime]:
+        """会话在内存中的最后心跳时间，会话未登记时返回None"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return _to_datetime(entry['last_seen']) if entry else None
+
+    def user_status(self, user_id) -> Dict:
+        """用户的WebSocket连接状态（格式与 WebSocketManager.get_user_websocket_status 一致）"""
+        self._ensure_loaded()
+        with self._lock:
+            sessions = [(session_id, self._sessions[session_id]) for session_id in self._users.get(user_id, ())]
+            session_data = [{
+                'session_id': session_id,
+                'ip_address': entry['ip_address'],
+                'login_time': entry['login_time'].isoformat() if entry['login_time'] else None,
+                'last_activity': _isoformat(entry['last_seen']),
+                'channels_count': len(entry['channels'])
+            } for session_id, entry in sorted(sessions) if entry['channels']]
+        total_channels = sum(session['channels_count'] for session in session_data)
+        return {
+            'user_id': user_id,
+            'has_websocket': total_channels > 0,
+            'total_channels': total_channels,
+            'active_sessions': len(session_data),
+            'sessions': session_data
+        }
+
+    # ------------------------------------------------------------------
+    # 写回数据库
+    # ------------------------------------------------------------------
+    def flush(self) -> int:
+        """把心跳或通道有变化的会话批量写回数据库（每个会话只写最后的值），返回写回的会话数"""
+        from .models import UserSession
+
+        with self._lock:
+            pending = {session_id: self._sessions[session_id] for session_id in self._dirty
+                       if session_id in self._sessions}
+            dirty = [UserSession(id=session_id, last_activity=_to_datetime(entry['last_seen']),
+                                 websocket_channels=sorted(entry['channels']), has_websocket=bool(entry['channels']))
+                     for session_id, entry in pending.items()]
+            self._dirty.clear()
+        if not dirty:
+            return 0
+        try:
+            # 只写回仍然活跃的会话，不覆盖同时被下线的会话
+            UserSession.objects.filter(is_active=True).bulk_update(
+                dirty, ['last_activity', 'websocket_channels', 'has_websocket'], batch_size=FLUSH_BATCH_SIZE)
+        except Exception:
+            with self._lock:
+                # 写回失败的会话留到下一次
+                self._dirty.update(session_id for session_id in pending if session_id in self._sessions)
+            raise
+        self.stats['flushes'] += 1
+        self.stats['flushed_sessions'] += len(dirty)
+        return len(dirty)
+
+    def start(self):
+        """启动后台写回线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"写回在线状态失败: {str(e)}")
+            finally:
+                close_old_connections()
+        # 退出前写回剩余的变化
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def _isoformat(timestamp: float) -> str:
+    return _to_datetime(timestamp).isoformat()
+
+
+# 全局在线状态登记表
+presence_registry = PresenceRegistry()
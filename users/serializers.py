@@ -89,7 +89,7 @@ class UserSerializer(serializers.ModelSerializer):
             'ip_address': session.ip_address,
             'device_info': session.device_info,
             'login_time': session.login_time,
-            'last_activity': session.last_activity
+            'last_activity': session.current_activity
         } for session in online_sessions]
     
     def update(self, instance, validated_data):
@@ -256,6 +256,7 @@ class UserSessionSerializer(serializers.ModelSerializer):
     """用户会话序列化器"""
     username = serializers.CharField(source='user.username', read_only=True)
     is_online = serializers.ReadOnlyField()
+    last_activity = serializers.DateTimeField(source='current_activity', read_only=True)
     
     class Meta:
         model = UserSession
@@ -0,0 +1,53 @@
+"""
+用户会话过期清理
+集合式下线超时会话：一条 UPDATE 更新会话记录、一条 DELETE 删除对应的Django session，
+清理后不再有任何活跃会话的用户通过WebSocket批量推送强制登出消息；
+由 users.session_scheduler 在后台定期执行
+"""
+
+import logging
+import time
+from typing import Dict
+
+from .models import UserSession
+
+logger = logging.getLogger(__name__)
+
+# 会话超时时间（分钟）
+SESSION_TIMEOUT_MINUTES = 5
+# 非活跃会话记录的保留天数
+INACTIVE_RETENTION_DAYS = 30
+
+
+def sweep_expired_sessions(timeout_minutes: int = SESSION_TIMEOUT_MINUTES, notify: bool = True) -> Dict:
+    """
+    下线超时会话并通知受影响的用户
+
+    Args:
+        timeout_minutes: 超过多少分钟无活动视为过期
+        notify: 是否向已没有活跃会话的用户推送强制登出消息
+
+    Returns:
+        {'expired': 下线的会话数, 'users': 涉及的用户数, 'notified': 推送成功的用户数, 'duration': 耗时（秒）}
+    """
+    started = time.monotonic()
+    # 先写回内存中的心跳，按数据库中的 last_activity 判断过期时与 is_online 看到的一致
+    from .presence import presence_registry
+    presence_registry.flush()
+    expired, user_ids = UserSession.bulk_mark_offline(UserSession.expired_queryset(timeout_minutes), 'timeout')
+
+    notified = 0
+    if notify and user_ids:
+        # 用户仍有其他活跃会话（例如另一台设备）时不推送
+        still_active = set(UserSession.objects.filter(user_id__in=user_ids, is_active=True)
+                           .values_list('user_id', flat=True).distinct())
+        offline = sorted(user_ids - still_active)
+        if offline:
+            from .websocket_utils import websocket_manager
+            notified = websocket_manager.force_logout_users(offline, reason='会话过期')
+
+    result = {'expired': expired, 'users': len(user_ids), 'notified': notified,
+              'duration': round(time.monotonic() - started, 3)}
+    if expired:
+        logger.info(f"过期会话清理完成: {result}")
+    return result
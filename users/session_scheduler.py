@@ -0,0 +1,169 @@
+"""
+用户会话清理调度器
+在后台线程中按固定间隔执行会话清理作业（下线过期会话、删除旧的非活跃会话记录），请求处理路径上没有任何开销；
+多个进程同时启动时通过缓存锁选出一个主进程执行，其余进程只续约检查；
+每个作业的执行次数、耗时和处理行数保存在缓存中，任一进程都能读取
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import UserSession
+from .session_expiry import INACTIVE_RETENTION_DAYS, SESSION_TIMEOUT_MINUTES, sweep_expired_sessions
+
+logger = logging.getLogger(__name__)
+
+# 主进程锁和作业指标的缓存键
+LEADER_KEY = 'session_scheduler_leader'
+METRICS_KEY = 'session_scheduler_metrics'
+# 过期会话清理间隔、旧记录清理间隔（秒）
+DEFAULT_CLEANUP_INTERVAL = 60
+DEFAULT_PURGE_INTERVAL = 86400
+# 主进程锁有效期（秒），主进程退出后其他进程最多等待这么久接管
+LEADER_LEASE = 120
+# 调度循环检查间隔（秒）
+TICK = 5
+
+
+def _expire_sessions() -> Dict:
+    result = sweep_expired_sessions(SESSION_TIMEOUT_MINUTES)
+    return {'rows': result['expired'], 'users': result['users'], 'notified': result['notified']}
+
+
+def _purge_inactive_sessions() -> Dict:
+    days = getattr(settings, 'SESSION_RETENTION_DAYS', INACTIVE_RETENTION_DAYS)
+    return {'rows': UserSession.cleanup_old_inactive_sessions(days=days)}
+
+
+class SessionScheduler:
+    """
+    会话清理调度器
+
+    Args:
+        cleanup_interval: 过期会话清理间隔（秒）
+        purge_interval: 旧的非活跃会话记录清理间隔（秒）
+        lease: 主进程锁有效期（秒）
+        tick: 调度循环检查间隔（秒）
+    """
+
+    def __init__(self, cleanup_interval: Optional[float] = None, purge_interval: Optional[float] = None,
+                 lease: float = LEADER_LEASE, tick: float = TICK):
+        cleanup_interval = cleanup_interval if cleanup_interval is not None else \
+            getattr(settings, 'SESSION_CLEANUP_INTERVAL', DEFAULT_CLEANUP_INTERVAL)
+        purge_interval = purge_interval if purge_interval is not None else \
+            getattr(settings, 'SESSION_PURGE_INTERVAL', DEFAULT_PURGE_INTERVAL)
+        self.jobs: Dict[str, tuple] = {
+            'expire_sessions': (cleanup_interval, _expire_sessions),
+            'purge_inactive_sessions': (purge_interval, _purge_inactive_sessions),
+        }
+        self.lease = lease
+        self.tick = tick
+        self.instance_id = uuid.uuid4().hex
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # 主进程选举
+    # ------------------------------------------------------------------
+    def is_leader(self) -> bool:
+        """持有主进程锁时续约，锁空闲时尝试获取"""
+        if cache.get(LEADER_KEY) == self.instance_id:
+            cache.touch(LEADER_KEY, self.lease)
+            return True
+        return cache.add(LEADER_KEY, self.instance_id, timeout=self.lease)
+
+    def release(self):
+        if cache.get(LEADER_KEY) == self.instance_id:
+            cache.delete(LEADER_KEY)
+
+    # ------------------------------------------------------------------
+    # 作业
+    # ------------------------------------------------------------------
+    def metrics(self) -> Dict[str, Dict]:
+        """各作业的执行指标"""
+        return cache.get(METRICS_KEY) or {}
+
+    def run_pending(self) -> List[str]:
+        """主进程执行所有到期的作业，返回执行了的作业名"""
+        if not self.is_leader():
+            return []
+        now = time.time()
+        metrics = self.metrics()
+        due = [name for name, (interval, _) in self.jobs.items()
+               if interval and now - metrics.get(name, {}).get('last_run', 0) >= interval]
+        for name in due:
+            self.run_job(name)
+        return due
+
+    def run_job(self, name: str) -> Dict:
+        """执行一个作业并记录耗时和处理行数"""
+        _, func = self.jobs[name]
+        started = time.monotonic()
+        result, error = {}, None
+        try:
+            result = func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"会话清理作业 {name} 失败: {error}")
+        duration = round(time.monotonic() - started, 3)
+
+        metrics = self.metrics()
+        job = metrics.setdefault(name, {'runs': 0, 'errors': 0, 'rows': 0, 'duration': 0.0})
+        job['runs'] += 1
+        job['errors'] += 1 if error else 0
+        job['rows'] += result.get('rows', 0)
+        job['duration'] = round(job['duration'] + duration, 3)
+        job.update({
+            'last_run': time.time(),
+            'last_run_at': timezone.now().isoformat(),
+            'last_duration': duration,
+            'last_result': result,
+            'last_error': error,
+        })
+        cache.set(METRICS_KEY, metrics, timeout=None)
+
+        if result.get('rows') or error:
+            logger.info(f"会话清理作业 {name} 完成: {result}, 耗时 {duration}s")
+        return job
+
+    # ------------------------------------------------------------------
+    # 后台线程
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动后台调度线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='session-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.release()
+
+    def run_forever(self):
+        """调度循环（后台线程或 run_session_scheduler 命令中执行）"""
+        while not self._stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"会话清理调度失败: {str(e)}")
+            finally:
+                close_old_connections()
+            self._stop_event.wait(self.tick)
+
+
+# 全局会话清理调度器
+session_scheduler = SessionScheduler()
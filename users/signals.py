@@ -0,0 +1,28 @@
+"""
+用户相关信号处理器
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .auth_cache import invalidate_token, invalidate_user
+from .models import User, UserProfile
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    """token 创建或删除（登录、登出、踢出、修改密码）时使认证缓存失效"""
+    invalidate_token(instance.key)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    """用户变更（禁用、重置密码、删除）时使该用户的认证缓存失效"""
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_auth_cache(sender, instance, **kwargs):
+    """用户资料变更（禁用、角色变化）时使该用户的认证缓存失效"""
+    invalidate_user(instance.user_id)
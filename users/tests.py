@@ -0,0 +1,261 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .auth_cache import get_token
+from .models import User, UserProfile, UserSession
+from .presence import presence_registry
+from .session_expiry import sweep_expired_sessions
+from .session_scheduler import LEADER_KEY, METRICS_KEY, SessionScheduler
+from .websocket_auth import WebSocketTokenAuthMiddleware
+from .websocket_utils import websocket_manager
+
+
+def create_session(user, key, minutes_idle=0):
+    Session.objects.create(session_key=key, session_data='', expire_date=timezone.now() + timezone.timedelta(days=1))
+    session = UserSession.objects.create(user=user, session_key=key, ip_address='10.0.0.1', user_agent='test')
+    if minutes_idle:
+        UserSession.objects.filter(pk=session.pk).update(
+            last_activity=timezone.now() - timezone.timedelta(minutes=minutes_idle))
+    return session
+
+
+class SessionExpiryTests(TestCase):
+    """集合式过期会话清理"""
+
+    def setUp(self):
+        presence_registry.reset()
+        self.users = [User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='x')
+                      for i in range(3)]
+
+    def test_sweep_uses_constant_queries(self):
+        for i in range(40):
+            create_session(self.users[i % 2], f'expired-{i}', minutes_idle=10)
+        fresh = create_session(self.users[2], 'fresh')
+
+        with mock.patch('users.websocket_utils.websocket_manager.force_logout_users', return_value=2) as notify, \
+                CaptureQueriesContext(connection) as queries:
+            result = sweep_expired_sessions(timeout_minutes=5)
+
+        self.assertEqual(result['expired'], 40)
+        self.assertEqual(result['users'], 2)
+        self.assertLessEqual(len(queries), 8)
+        notify.assert_called_once_with([self.users[0].id, self.users[1].id], reason='会话过期')
+
+        self.assertEqual(UserSession.objects.filter(is_active=True).count(), 1)
+        self.assertEqual(set(UserSession.objects.filter(is_active=False).values_list('logout_reason', flat=True)),
+                         {'timeout'})
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [fresh.session_key])
+
+    def test_users_with_remaining_sessions_are_not_notified(self):
+        create_session(self.users[0], 'old', minutes_idle=10)
+        create_session(self.users[0], 'new')
+        create_session(self.users[1], 'gone', minutes_idle=10)
+
+        with mock.patch('users.websocket_utils.websocket_manager.force_logout_users', return_value=1) as notify:
+            result = sweep_expired_sessions(timeout_minutes=5)
+
+        self.assertEqual(result['expired'], 2)
+        notify.assert_called_once_with([self.users[1].id], reason='会话过期')
+
+    def test_safe_create_session_enforces_limit_without_sweeping(self):
+        create_session(self.users[0], 'stale', minutes_idle=10)
+        for i in range(4):
+            create_session(self.users[0], f'active-{i}')
+
+        session, info = UserSession.safe_create_session(self.users[0], 'login', '10.0.0.2', 'test')
+
+        self.assertEqual(info['expired'], 0)
+        self.assertEqual(UserSession.objects.filter(user=self.users[0], is_active=True).count(), 5)
+        self.assertEqual(UserSession.objects.get(session_key='stale').logout_reason, 'limit_exceeded')
+        self.assertTrue(session.is_active)
+
+
+class SessionSchedulerTests(TestCase):
+    """会话清理调度器"""
+
+    def setUp(self):
+        presence_registry.reset()
+        cache.delete(LEADER_KEY)
+        cache.delete(METRICS_KEY)
+        self.user = User.objects.create_user(username='sched', email='sched@example.com', password='x')
+
+    def tearDown(self):
+        cache.delete(LEADER_KEY)
+        cache.delete(METRICS_KEY)
+
+    def test_only_leader_runs_due_jobs_and_records_metrics(self):
+        for i in range(3):
+            create_session(self.user, f'expired-{i}', minutes_idle=10)
+        leader = SessionScheduler(cleanup_interval=60, purge_interval=86400)
+        follower = SessionScheduler(cleanup_interval=60, purge_interval=86400)
+
+        with mock.patch('users.websocket_utils.websocket_manager.force_logout_users', return_value=1):
+            self.assertEqual(leader.run_pending(), ['expire_sessions', 'purge_inactive_sessions'])
+        self.assertEqual(follower.run_pending(), [])
+        # 间隔未到时不重复执行
+        self.assertEqual(leader.run_pending(), [])
+
+        metrics = follower.metrics()
+        self.assertEqual(metrics['expire_sessions']['runs'], 1)
+        self.assertEqual(metrics['expire_sessions']['rows'], 3)
+        self.assertEqual(metrics['expire_sessions']['last_result']['notified'], 1)
+        self.assertIsNone(metrics['expire_sessions']['last_error'])
+        self.assertIn('last_duration', metrics['purge_inactive_sessions'])
+
+        leader.release()
+        self.assertTrue(follower.is_leader())
+
+    def test_failed_job_is_counted(self):
+        scheduler = SessionScheduler()
+        with mock.patch('users.session_scheduler.sweep_expired_sessions', side_effect=RuntimeError('db down')):
+            job = scheduler.run_job('expire_sessions')
+        self.assertEqual(job['errors'], 1)
+        self.assertEqual(job['last_error'], 'db down')
+
+
+class PresenceRegistryTests(TestCase):
+    """在线状态登记表"""
+
+    def setUp(self):
+        presence_registry.reset()
+        self.users = [User.objects.create_user(username=f'online{i}', email=f'online{i}@example.com', password='x')
+                      for i in range(2)]
+
+    def tearDown(self):
+        presence_registry.reset()
+
+    def test_online_count_is_served_from_memory(self):
+        create_session(self.users[0], 'loaded')
+        create_session(self.users[1], 'idle', minutes_idle=10)
+        # 首次读取从数据库加载，之后不再查询
+        self.assertEqual(UserSession.get_online_users_count(), 1)
+        session, _ = UserSession.safe_create_session(self.users[1], 'login', '10.0.0.2', 'test')
+        with self.assertNumQueries(0):
+            self.assertEqual(UserSession.get_online_users_count(), 2)
+            self.assertTrue(presence_registry.is_user_online(self.users[1].id))
+
+        # 超过有效期没有心跳的用户被淘汰
+        with mock.patch.object(presence_registry, 'ttl', 0):
+            self.assertEqual(presence_registry.online_count(), 0)
+            self.assertFalse(presence_registry.is_user_online(self.users[1].id))
+
+    def test_channels_are_flushed_in_batch(self):
+        first = create_session(self.users[0], 'first')
+        second = create_session(self.users[1], 'second')
+        with self.assertNumQueries(1):
+            first.add_websocket_channel('chan-a')
+        with self.assertNumQueries(0):
+            first.add_websocket_channel('chan-b')
+            second.add_websocket_channel('chan-c')
+            second.remove_websocket_channel('chan-c')
+            status = websocket_manager.get_user_websocket_status(self.users[0].id)
+        self.assertEqual(status['total_channels'], 2)
+        self.assertEqual(status['sessions'][0]['session_id'], first.id)
+        self.assertFalse(UserSession.objects.get(pk=first.pk).has_websocket)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(presence_registry.flush(), 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.websocket_channels, ['chan-a', 'chan-b'])
+        self.assertTrue(first.has_websocket)
+        self.assertFalse(second.has_websocket)
+
+    def test_offline_sessions_leave_the_registry(self):
+        session = create_session(self.users[0], 'kick')
+        session.add_websocket_channel('chan-a')
+        with self.captureOnCommitCallbacks(execute=True):
+            UserSession.bulk_mark_offline(UserSession.objects.filter(pk=session.pk), 'kicked')
+        self.assertEqual(presence_registry.online_count(), 0)
+        self.assertFalse(websocket_manager.get_user_websocket_status(self.users[0].id)['has_websocket'])
+        self.assertEqual(presence_registry.flush(), 0)
+
+
+class HeartbeatTests(TestCase):
+    """会话心跳批量写回"""
+
+    def setUp(self):
+        presence_registry.reset()
+        self.user = User.objects.create_user(username='beat', email='beat@example.com', password='x')
+        self.token = Token.objects.create(user=self.user)
+        self.session = create_session(self.user, self.token.key[:40], minutes_idle=4)
+
+    def tearDown(self):
+        presence_registry.reset()
+
+    def test_api_requests_record_heartbeats_in_memory(self):
+        stored = UserSession.objects.get(pk=self.session.pk).last_activity
+        for _ in range(3):
+            response = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            self.assertEqual(response.status_code, 200)
+
+        session = UserSession.objects.get(pk=self.session.pk)
+        self.assertEqual(session.last_activity, stored)
+        self.assertGreater(session.current_activity, stored)
+
+        # 三次心跳合并为一次写回
+        with self.assertNumQueries(1):
+            self.assertEqual(presence_registry.flush(), 1)
+        session.refresh_from_db()
+        self.assertGreater(session.last_activity, stored)
+        self.assertEqual(presence_registry.flush(), 0)
+
+    def test_expiry_sees_pending_heartbeats(self):
+        UserSession.objects.filter(pk=self.session.pk).update(
+            last_activity=timezone.now() - timezone.timedelta(minutes=10))
+        presence_registry.touch_key(self.token.key[:40])
+        self.assertTrue(UserSession.objects.get(pk=self.session.pk).is_online)
+
+        result = sweep_expired_sessions(timeout_minutes=5)
+        self.assertEqual(result['expired'], 0)
+        self.assertTrue(UserSession.objects.get(pk=self.session.pk).is_active)
+
+
+class TokenAuthCacheTests(TestCase):
+    """HTTP和WebSocket共用的Token认证缓存"""
+
+    def setUp(self):
+        cache.clear()
+        presence_registry.reset()
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='x')
+        UserProfile.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+
+    def tearDown(self):
+        cache.clear()
+        presence_registry.reset()
+
+    def test_http_and_websocket_share_the_cache(self):
+        self.assertEqual(self.client.get('/api/auth/me/', **self.auth).status_code, 200)
+        with self.assertNumQueries(0):
+            user = async_to_sync(WebSocketTokenAuthMiddleware(None).get_user_from_token)(self.token.key)
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(get_token(self.token.key))
+        self.assertIsNone(get_token('missing'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_token('missing'))
+
+    def test_logout_invalidates_token(self):
+        self.assertEqual(self.client.post('/api/auth/logout/', **self.auth).status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/me/', **self.auth).status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.assertEqual(self.client.get('/api/auth/me/', **self.auth).status_code, 200)
+        self.user.profile.is_active = False
+        self.user.profile.save()
+        self.assertIsNone(async_to_sync(WebSocketTokenAuthMiddleware(None).get_user_from_token)(self.token.key))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/me/', **self.auth).status_code, 401)
@@ -147,9 +147,6 @@ class UserViewSet(viewsets.ModelViewSet):
         # 在线用户（使用UserSession的is_online方法）
         online_users = UserSession.get_online_users_count()
         
-        # 清理过期会话
-        UserSession.cleanup_expired_sessions()
-        
         stats_data = {
             'total': total_users,
             'active': active_users,
@@ -283,11 +280,9 @@ class UserViewSet(viewsets.ModelViewSet):
         try:
             # 获取用户的所有活跃会话
             active_sessions = user.user_sessions.filter(is_active=True)
-            kicked_sessions = active_sessions.count()
             
             # 标记所有会话为离线
-            for session in active_sessions:
-                session.mark_offline('kicked')
+            kicked_sessions, _ = UserSession.bulk_mark_offline(active_sessions, 'kicked')
             
             # 删除用户的所有token（强制退出）
             deleted_tokens = Token.objects.filter(user=user).delete()[0]
@@ -351,10 +346,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 'error': '只有管理员才能查看在线会话'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # 清理过期会话
-        UserSession.cleanup_expired_sessions()
-        
-        # 获取所有在线会话
+        # 获取所有在线会话（过期会话由后台清理任务下线，这里按 is_online 过滤）
         active_sessions = UserSession.objects.filter(is_active=True).select_related('user')
         online_sessions = [session for session in active_sessions if session.is_online]
         
@@ -369,6 +361,28 @@ class UserViewSet(viewsets.ModelViewSet):
             }
         })
 
+    @action(detail=False, methods=['get'])
+    def session_cleanup_metrics(self, request):
+        """会话清理作业的执行指标（管理员功能）"""
+        current_user = request.user
+        is_admin = current_user.is_superuser or (
+            hasattr(current_user, 'profile') and current_user.profile.role == 'admin'
+        )
+        
+        if not is_admin:
+            return Response({
+                'code': 403,
+                'message': '权限不足',
+                'error': '只有管理员才能查看会话清理指标'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        from .session_scheduler import session_scheduler
+        return Response({
+            'code': 200,
+            'message': 'success',
+            'data': session_scheduler.metrics()
+        })
+
     @action(detail=False, methods=['get'])
     def search(self, request):
         """搜索用户"""
@@ -624,12 +638,10 @@ def logout_api(request):
         current_token = request.auth.key if hasattr(request.auth, 'key') else None
         if current_token:
             # 标记当前会话为离线
-            user_sessions = user.user_sessions.filter(
-                session_key=current_token[:40],
-                is_active=True
+            UserSession.bulk_mark_offline(
+                user.user_sessions.filter(session_key=current_token[:40]),
+                'normal'
             )
-            for session in user_sessions:
-                session.mark_offline('normal')
         
         # 删除用户的token
         Token.objects.filter(user=user).delete()
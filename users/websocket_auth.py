@@ -8,7 +8,7 @@ from channels.auth import AuthMiddlewareStack
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from rest_framework.authtoken.models import Token
+from .auth_cache import get_token
 from .models import UserSession
 
 User = get_user_model()
@@ -49,9 +49,12 @@ class WebSocketTokenAuthMiddleware:
 
     @database_sync_to_async
     def get_user_from_token(self, token):
-        """根据token获取用户"""
+        """根据token获取用户（使用与HTTP认证共用的认证缓存）"""
         try:
-            token_obj = Token.objects.select_related('user').get(key=token)
+            token_obj = get_token(token)
+            if token_obj is None:
+                logger.warning(f"Token不存在: {token}")
+                return None
             user = token_obj.user
             
             # 检查用户是否活跃
@@ -65,9 +68,6 @@ class WebSocketTokenAuthMiddleware:
                 return None
                 
             return user
-        except Token.DoesNotExist:
-            logger.warning(f"Token不存在: {token}")
-            return None
         except Exception as e:
             logger.error(f"获取用户时出错: {str(e)}")
             return None
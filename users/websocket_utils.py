@@ -3,6 +3,7 @@ WebSocket工具模块
 处理用户会话和WebSocket连接的关联管理
 """
 
+import asyncio
 import json
 import logging
 from channels.layers import get_channel_layer
@@ -10,6 +11,7 @@ from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import UserSession
+from .presence import presence_registry
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -58,6 +60,45 @@ class WebSocketManager:
             logger.exception("详细错误信息:")
             return False
     
+    def send_to_users(self, user_ids, message_type, data=None):
+        """
+        向多个用户发送同一条WebSocket消息（一次 async_to_sync 内并发发送到各用户组）
+        
+        Args:
+            user_ids: 用户ID列表
+            message_type: 消息类型
+            data: 消息数据
+            
+        Returns:
+            int: 发送成功的用户数
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        
+        message_data = {
+            'type': message_type,
+            **{k: v for k, v in (data or {}).items() if k != 'type'}
+        }
+        
+        async def send_all():
+            return await asyncio.gather(
+                *(self.channel_layer.group_send(f"user_{user_id}", dict(message_data)) for user_id in user_ids),
+                return_exceptions=True
+            )
+        
+        try:
+            results = async_to_sync(send_all)()
+        except Exception as e:
+            logger.error(f"批量发送WebSocket消息失败: {str(e)}")
+            return 0
+        
+        failed = [user_id for user_id, result in zip(user_ids, results) if isinstance(result, Exception)]
+        if failed:
+            logger.warning(f"向 {len(failed)} 个用户发送WebSocket消息失败: {message_type}, 用户: {failed[:20]}")
+        logger.info(f"向 {len(user_ids) - len(failed)} 个用户发送WebSocket消息成功: {message_type}")
+        return len(user_ids) - len(failed)
+    
     def kick_out_user(self, user_id, kicked_by_user=None, reason="管理员操作"):
         """
         踢出用户（通过WebSocket）
@@ -95,6 +136,7 @@ class WebSocketManager:
             
             # 记录有多少个活跃会话
             active_sessions_count = user_sessions.count()
+            had_websocket = presence_registry.user_status(user_id)['has_websocket']
             logger.info(f"用户 {user.username} 有 {active_sessions_count} 个活跃会话")
             
             # 如果没有活跃会话，记录警告信息
@@ -102,10 +144,7 @@ class WebSocketManager:
                 logger.warning(f"用户 {user.username} 没有活跃会话，可能未建立WebSocket连接")
             
             # 更新用户会话状态（无论是否有WebSocket连接）
-            kicked_sessions = 0
-            for session in user_sessions:
-                session.mark_offline('kicked')
-                kicked_sessions += 1
+            kicked_sessions, _ = UserSession.bulk_mark_offline(user_sessions, 'kicked')
             
             logger.info(f"成功踢出用户 {user.username}，关闭了 {kicked_sessions} 个会话")
             
@@ -116,8 +155,7 @@ class WebSocketManager:
                 'username': user.username,
                 'kicked_sessions': kicked_sessions,
                 'had_active_sessions': active_sessions_count > 0,
-                'had_websocket_connection': active_sessions_count > 0 and 
-                    any(session.has_websocket for session in user_sessions)
+                'had_websocket_connection': had_websocket
             }
                 
         except User.DoesNotExist:
@@ -150,6 +188,25 @@ class WebSocketManager:
         
         return self.send_to_user(user_id, 'force_logout', message_data)
     
+    def force_logout_users(self, user_ids, reason="会话过期"):
+        """
+        批量强制用户登出
+        
+        Args:
+            user_ids: 用户ID列表
+            reason: 登出原因
+            
+        Returns:
+            int: 通知成功的用户数
+        """
+        message_data = {
+            'message': '您的会话已过期，请重新登录',
+            'reason': reason,
+            'timestamp': str(timezone.now())
+        }
+        
+        return self.send_to_users(user_ids, 'force_logout', message_data)
+    
     def notify_user_status_change(self, user_id, status_data):
         """
         通知用户状态变化
@@ -185,7 +242,7 @@ class WebSocketManager:
     
     def get_user_websocket_status(self, user_id):
         """
-        获取用户WebSocket连接状态
+        获取用户WebSocket连接状态（从内存中的在线状态登记表读取）
         
         Args:
             user_id: 用户ID
@@ -194,35 +251,7 @@ class WebSocketManager:
             dict: 连接状态信息
         """
         try:
-            sessions = UserSession.objects.filter(
-                user_id=user_id,
-                is_active=True,
-                has_websocket=True
-            )
-            
-            total_channels = 0
-            session_data = []
-            
-            for session in sessions:
-                channels = session.get_websocket_channels()
-                total_channels += len(channels)
-                
-                session_data.append({
-                    'session_id': session.id,
-                    'ip_address': session.ip_address,
-                    'login_time': session.login_time.isoformat(),
-                    'last_activity': session.last_activity.isoformat(),
-                    'channels_count': len(channels)
-                })
-            
-            return {
-                'user_id': user_id,
-                'has_websocket': total_channels > 0,
-                'total_channels': total_channels,
-                'active_sessions': len(session_data),
-                'sessions': session_data
-            }
-            
+            return presence_registry.user_status(user_id)
         except Exception as e:
             logger.error(f"获取用户WebSocket状态失败: {str(e)}")
             return {